@@ -0,0 +1,77 @@
+"""
+Benchmark de parse: frames/s de cada decoder sobre um corpus de frames no
+formato do WebSocket v5 (snapshot, deltas e respostas de controle).
+
+Por padrão o corpus é gerado pelo ``SyntheticFeed``; ``--corpus`` aceita um
+arquivo JSONL gravado (um frame bruto por linha) e ``--save`` grava o corpus
+gerado para reuso.
+
+Uso:
+    python -m bybit_depth.benchmarks.bench_decoder --messages 20000
+    python -m bybit_depth.benchmarks.bench_decoder --corpus frames.jsonl
+"""
+from __future__ import annotations
+import argparse
+import time
+from typing import List, Optional
+
+from ..core.decoder import DECODERS, available_decoders
+from ..utils.synthetic import SyntheticFeed
+
+# Respostas de controle que também passam pelo decoder no socket real
+_CONTROL_FRAMES = [
+    '{"success":true,"ret_msg":"","conn_id":"bench","req_id":"","op":"subscribe"}',
+    '{"success":true,"ret_msg":"pong","conn_id":"bench","req_id":"","op":"ping"}',
+]
+
+def build_corpus(messages: int, depth: int, levels: int = 4, control_every: int = 500) -> List[str]:
+    frames = SyntheticFeed(depth=depth).raw_frames(messages, levels)
+    corpus: List[str] = []
+    for i, raw in enumerate(frames):
+        if control_every and i and i % control_every == 0:
+            corpus.append(_CONTROL_FRAMES[(i // control_every) % len(_CONTROL_FRAMES)])
+        corpus.append(raw)
+    return corpus
+
+def load_corpus(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+def run(name: str, corpus: List[str], repeat: int = 3) -> float:
+    """Retorna a melhor taxa (frames/s) em ``repeat`` execuções."""
+    decode = DECODERS[name]
+    best = 0.0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for raw in corpus:
+            decode(raw)
+        best = max(best, len(corpus) / (time.perf_counter() - t0))
+    return best
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de throughput dos decoders de frames")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--depth", type=int, default=200)
+    parser.add_argument("--levels", type=int, default=4, help="Níveis alterados por delta")
+    parser.add_argument("--corpus", help="Arquivo JSONL com frames gravados")
+    parser.add_argument("--save", help="Grava o corpus gerado neste arquivo JSONL")
+    args = parser.parse_args()
+
+    corpus: Optional[List[str]] = load_corpus(args.corpus) if args.corpus else None
+    if corpus is None:
+        corpus = build_corpus(args.messages, args.depth, args.levels)
+        if args.save:
+            with open(args.save, "w", encoding="utf-8") as f:
+                f.write("\n".join(corpus) + "\n")
+
+    size = sum(len(raw) for raw in corpus)
+    print(f"{len(corpus)} frames, {size / len(corpus):.0f} bytes/frame em média")
+    rows = [(name, run(name, corpus)) for name in available_decoders()]
+    base = dict(rows).get("pydantic")
+    print(f"{'decoder':<10} {'frames/s':>12} {'MB/s':>8} {'vs pydantic':>12}")
+    for name, rate in rows:
+        ratio = f"{rate / base:>11.1f}x" if base else f"{'-':>12}"
+        print(f"{name:<10} {rate:>12,.0f} {rate * size / len(corpus) / 1e6:>8.1f} {ratio}")
+
+if __name__ == "__main__":
+    main()
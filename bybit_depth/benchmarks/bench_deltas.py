@@ -0,0 +1,48 @@
+"""
+Microbenchmark: deltas/s aplicados ao OrderBook em várias profundidades.
+
+Uso:
+    python -m bybit_depth.benchmarks.bench_deltas --depths 50 200 1000 --messages 20000
+"""
+from __future__ import annotations
+import argparse
+import time
+from typing import Dict, List
+
+from ..core.orderbook import OrderBook
+from ..utils.synthetic import SyntheticFeed
+
+def run(depth: int, messages: int, fixed_point: bool = False, repeat: int = 3) -> float:
+    """Retorna a melhor taxa (deltas/s) em ``repeat`` execuções."""
+    frames = list(SyntheticFeed(depth=depth).frames(messages))
+    snapshot, deltas = frames[0]["data"], [f["data"] for f in frames[1:]]
+    best = 0.0
+    for _ in range(repeat):
+        book = OrderBook(tick_size="0.10", lot_size="0.001") if fixed_point else OrderBook()
+        book.apply_snapshot(snapshot["b"], snapshot["a"], snapshot["u"])
+        t0 = time.perf_counter()
+        for d in deltas:
+            book.apply_delta(d["b"], d["a"], d["u"])
+        best = max(best, len(deltas) / (time.perf_counter() - t0))
+    return best
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Microbenchmark de aplicação de deltas")
+    parser.add_argument("--depths", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    rows: List[Dict[str, float]] = []
+    for depth in args.depths:
+        rows.append({
+            "depth": depth,
+            "decimal": run(depth, args.messages, fixed_point=False),
+            "fixed": run(depth, args.messages, fixed_point=True),
+        })
+
+    print(f"{'depth':>6} {'decimal deltas/s':>18} {'fixed-point deltas/s':>22}")
+    for r in rows:
+        print(f"{r['depth']:>6} {r['decimal']:>18,.0f} {r['fixed']:>22,.0f}")
+
+if __name__ == "__main__":
+    main()
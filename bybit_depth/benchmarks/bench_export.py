@@ -0,0 +1,93 @@
+"""
+Benchmark da exportação colunar: carregar N snapshots do histórico SQLite
+(JSON linha a linha) contra ler o mesmo período exportado em Parquet.
+
+O runner grava um snapshot a cada 5 s: uma semana são ~121 mil snapshots.
+
+Uso:
+    python -m bybit_depth.benchmarks.bench_export --snapshots 20000 --depth 200
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+
+from ..core.export import export_books, history_books
+from ..core.history import OrderbookHistory
+from ..core.orderbook import OrderBook
+from ..utils.synthetic import SyntheticFeed
+
+WEEK_SNAPSHOTS = 7 * 24 * 3600 // 5
+
+def _populate(history: OrderbookHistory, count: int, depth: int) -> None:
+    """Preenche o banco no formato de ``save_snapshot`` em uma única transação."""
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=depth, seed=1)
+    book = OrderBook()
+    rows = []
+    base = time.time() - count * 5
+    for i, frame in enumerate(feed.frames(count, levels=20)):
+        d = frame["data"]
+        (book.apply_snapshot if frame["type"] == "snapshot" else book.apply_delta)(d["b"], d["a"], d["u"])
+        snap = book.snapshot().payload
+        ts = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(base + i * 5))
+        rows.append(("BTCUSDT", "linear", ts, json.dumps({"bids": snap["bids"], "asks": snap["asks"], "timestamp": ts})))
+    with sqlite3.connect(history.db_path) as conn:
+        conn.executemany(
+            "INSERT INTO orderbook_snapshots (symbol, market_type, timestamp, snapshot_data) VALUES (?, ?, ?, ?)", rows
+        )
+
+def _baseline(history: OrderbookHistory, count: int, top_n: int) -> pd.DataFrame:
+    """Como um notebook faz hoje: get_snapshots + json.loads por linha."""
+    records = []
+    for row in history.get_snapshots("BTCUSDT", limit=count):
+        data = json.loads(row["snapshot_data"])
+        rec = {"ts": row["timestamp"]}
+        for side, key in (("bid", "bids"), ("ask", "asks")):
+            for i, (p, q) in enumerate(data[key][:top_n]):
+                rec[f"{side}_px_{i}"] = float(p)
+                rec[f"{side}_sz_{i}"] = float(q)
+        records.append(rec)
+    return pd.DataFrame.from_records(records)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark da exportação Parquet/Arrow")
+    parser.add_argument("--snapshots", type=int, default=20000)
+    parser.add_argument("--depth", type=int, default=200)
+    parser.add_argument("--top-n", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history = OrderbookHistory(os.path.join(tmp, "history.db"))
+        _populate(history, args.snapshots, args.depth)
+        db_mb = os.path.getsize(history.db_path) / 2**20
+
+        t0 = time.perf_counter()
+        _baseline(history, args.snapshots, args.top_n)
+        baseline = time.perf_counter() - t0
+
+        results = []
+        for layout in ("wide", "long"):
+            path = os.path.join(tmp, f"{layout}.parquet")
+            top_n = args.top_n if layout == "wide" else None
+            stats = export_books(history_books(history, "BTCUSDT"), path, layout=layout, top_n=top_n)
+            t1 = time.perf_counter()
+            df = pd.read_parquet(path)
+            load = time.perf_counter() - t1
+            results.append((layout, stats, load, os.path.getsize(path) / 2**20, len(df)))
+
+    n = args.snapshots
+    scale = WEEK_SNAPSHOTS / n
+    print(f"{n} snapshots depth={args.depth} (SQLite {db_mb:.1f} MiB)")
+    print(f"{'':24} {'tempo':>9} {'semana (est.)':>14} {'arquivo':>10} {'linhas':>11}")
+    print(f"{'SQLite + json (top-' + str(args.top_n) + ')':24} {baseline:8.2f}s {baseline * scale:13.1f}s {db_mb:9.1f}M {n:11,}")
+    for layout, stats, load, size, rows in results:
+        print(f"{'exportar ' + layout:24} {stats.elapsed:8.2f}s {stats.elapsed * scale:13.1f}s {size:9.1f}M {stats.rows:11,}")
+        print(f"{'read_parquet ' + layout:24} {load:8.2f}s {load * scale:13.1f}s {'':>10} {rows:11,}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: OrderBook em Decimal vs. ponto fixo (inteiros escalados por tick/lot).
+
+Uso:
+    python -m bybit_depth.benchmarks.bench_fixed_point --depth 200 --messages 20000
+"""
+from __future__ import annotations
+import argparse
+import time
+from typing import Callable, List, Optional
+
+from ..configs.symbols import get_instrument_spec
+from ..core.orderbook import OrderBook
+from ..utils.synthetic import SyntheticFeed
+
+def _make_book(fixed_point: bool, symbol: str, market: str) -> OrderBook:
+    if fixed_point:
+        tick_size, lot_size = get_instrument_spec(symbol, market)
+        return OrderBook(tick_size=tick_size, lot_size=lot_size)
+    return OrderBook()
+
+def _timeit(fn: Callable[[], None], repeat: int = 3) -> float:
+    best: Optional[float] = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best or 0.0
+
+def run(depth: int, messages: int, symbol: str = "BTCUSDT", market: str = "linear") -> List[dict]:
+    tick_size, lot_size = get_instrument_spec(symbol, market)
+    frames = list(SyntheticFeed(symbol=symbol, depth=depth, tick=tick_size, lot=lot_size).frames(messages))
+    snapshot, deltas = frames[0]["data"], [f["data"] for f in frames[1:]]
+    results = []
+
+    for fixed_point in (False, True):
+        label = "fixed-point" if fixed_point else "decimal"
+
+        def ingest() -> None:
+            book = _make_book(fixed_point, symbol, market)
+            book.apply_snapshot(snapshot["b"], snapshot["a"], snapshot["u"])
+            for d in deltas:
+                book.apply_delta(d["b"], d["a"], d["u"])
+
+        book = _make_book(fixed_point, symbol, market)
+        book.apply_snapshot(snapshot["b"], snapshot["a"], snapshot["u"])
+        for d in deltas:
+            book.apply_delta(d["b"], d["a"], d["u"])
+
+        queries = 2000
+
+        def query() -> None:
+            for _ in range(queries):
+                book.mid()
+                book.top_levels("bid", 10)
+                book.top_levels("ask", 10)
+
+        def ingest_bands() -> None:
+            # Banda de liquidez a cada delta: exercita o índice com preços inéditos chegando
+            book = _make_book(fixed_point, symbol, market)
+            book.apply_snapshot(snapshot["b"], snapshot["a"], snapshot["u"])
+            for d in deltas:
+                book.apply_delta(d["b"], d["a"], d["u"])
+                book.liquidity_within(0.1)
+
+        ingest_s = _timeit(ingest)
+        query_s = _timeit(query)
+        bands_s = _timeit(ingest_bands)
+        results.append({
+            "mode": label,
+            "deltas_per_s": len(deltas) / ingest_s,
+            "queries_per_s": queries / query_s,
+            "bands_per_s": len(deltas) / bands_s,
+        })
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark Decimal vs ponto fixo")
+    parser.add_argument("--depth", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--symbol", default="BTCUSDT")
+    parser.add_argument("--market", default="linear")
+    args = parser.parse_args()
+
+    results = run(args.depth, args.messages, args.symbol, args.market)
+    print(f"{args.symbol} ({args.market}) depth={args.depth} mensagens={args.messages}")
+    print(f"{'modo':<12} {'deltas/s':>12} {'consultas/s':>12} {'delta+banda/s':>14}")
+    for r in results:
+        print(f"{r['mode']:<12} {r['deltas_per_s']:>12,.0f} {r['queries_per_s']:>12,.0f} {r['bands_per_s']:>14,.0f}")
+    base = results[0]
+    for r in results[1:]:
+        print(f"speedup {r['mode']}: ingest x{r['deltas_per_s'] / base['deltas_per_s']:.2f}, "
+              f"consultas x{r['queries_per_s'] / base['queries_per_s']:.2f}, "
+              f"delta+banda x{r['bands_per_s'] / base['bands_per_s']:.2f}")
+
+if __name__ == "__main__":
+    main()
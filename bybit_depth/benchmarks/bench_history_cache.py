@@ -0,0 +1,86 @@
+"""
+Benchmark do cache do histórico: a mesma carga de leitura (livros
+restaurados, snapshots e séries de janelas passadas, mais estatísticas
+da janela atual) com e sem ``HistoryCache``, com gravações intercaladas
+que invalidam só as consultas que cobrem o instante gravado.
+
+Uso:
+    python -m bybit_depth.benchmarks.bench_history_cache --snapshots 20000 --rounds 200
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from ..core.history import OrderbookHistory
+from ..core.orderbook import OrderBook
+from ..utils.synthetic import SyntheticFeed
+
+def _feed(depth: int):
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=depth, seed=1)
+    book = OrderBook()
+    d = next(feed.frames(1))["data"]
+    book.apply_snapshot(d["b"], d["a"], d["u"])
+    return feed, book
+
+def _append(history: OrderbookHistory, feed, book, times) -> None:
+    conn = history.connect()
+    try:
+        for at in times:
+            d = feed.delta(4)["data"]
+            book.apply_delta(d["b"], d["a"], d["u"])
+            history.insert_snapshot(conn, book.get_stats(), book.snapshot(), "BTCUSDT", "linear", at)
+        conn.commit()
+    finally:
+        conn.close()
+
+def _workload(history: OrderbookHistory, args, start: datetime, seed: int) -> float:
+    """Roda ``--rounds`` rodadas de consultas com uma gravação a cada ``--write-every``; retorna segundos."""
+    rng = random.Random(seed)
+    feed, book = _feed(args.depth)
+    now = start + timedelta(seconds=5 * args.snapshots)
+    hot_ids = [rng.randint(1, args.snapshots) for _ in range(20)]
+    windows = [start + timedelta(hours=h) for h in range(0, int(args.snapshots * 5 / 3600) - 1)]
+    t0 = time.perf_counter()
+    for i in range(args.rounds):
+        if i % args.write_every == 0:
+            now += timedelta(seconds=5)
+            _append(history, feed, book, [now])
+        history.restore_orderbook(rng.choice(hot_ids))
+        w = windows[rng.randrange(min(len(windows), 6))]
+        history.get_snapshots("BTCUSDT", w, w + timedelta(hours=1), limit=100)
+        history.get_rollup_series("BTCUSDT", w, w + timedelta(hours=1))
+        history.get_rollup_stats("BTCUSDT", now - timedelta(hours=1), now)
+    return time.perf_counter() - t0
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark do cache de consultas do histórico")
+    parser.add_argument("--snapshots", type=int, default=20000)
+    parser.add_argument("--depth", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--write-every", type=int, default=5, help="Rodadas entre gravações")
+    parser.add_argument("--storage", default="delta", choices=["json", "delta"])
+    args = parser.parse_args()
+
+    start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(seconds=5 * args.snapshots + 3600)
+    print(f"{'cache':<10} {'tempo':>9} {'por rodada':>11} {'acertos':>8} {'MiB':>6}")
+    for label, cache_bytes in (("sem", 0), ("64 MiB", 64 * 2**20)):
+        with tempfile.TemporaryDirectory() as tmp:
+            history = OrderbookHistory(os.path.join(tmp, "history.db"), storage=args.storage,
+                                       cache_bytes=cache_bytes)
+            feed, book = _feed(args.depth)
+            _append(history, feed, book, [start + timedelta(seconds=5 * i) for i in range(args.snapshots)])
+            elapsed = _workload(history, args, start, seed=3)
+            if history.cache is not None:
+                stats = history.cache.get_stats()
+                hits, mib = f"{stats['hit_rate']:.0%}", f"{stats['bytes'] / 2**20:.1f}"
+            else:
+                hits, mib = "-", "-"
+            history.close()
+        print(f"{label:<10} {elapsed:>8.2f}s {elapsed / args.rounds * 1000:>9.1f}ms {hits:>8} {mib:>6}")
+
+if __name__ == "__main__":
+    main()
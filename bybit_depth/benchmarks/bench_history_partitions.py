@@ -0,0 +1,93 @@
+"""
+Benchmark do histórico em tabela única contra o particionado por símbolo e
+dia: gravação, leitura de uma janela de 1 h (``iter_books``), estatísticas
+de um dia e retenção (``cleanup_old_data`` descartando metade dos dias).
+
+Os snapshots são datados retroativamente (``--days`` dias até hoje, um a
+cada ``--interval`` s por símbolo), como o runner gravaria.
+
+Uso:
+    python -m bybit_depth.benchmarks.bench_history_partitions --days 8 --symbols 4 --interval 60
+"""
+from __future__ import annotations
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from ..core.history import OrderbookHistory
+from ..core.orderbook import OrderBook
+from ..core.partitioned_history import PartitionedHistory
+from ..utils.synthetic import SyntheticFeed
+
+def _fill(history: OrderbookHistory, args, now: datetime) -> float:
+    symbols = [f"SYM{i}USDT" for i in range(args.symbols)]
+    books = {}
+    for i, symbol in enumerate(symbols):
+        d = next(SyntheticFeed(symbol=symbol, depth=args.depth, seed=i).frames(1))["data"]
+        books[symbol] = OrderBook()
+        books[symbol].apply_snapshot(d["b"], d["a"], d["u"])
+    snaps = {s: (b.get_stats(), b.snapshot()) for s, b in books.items()}
+    start = now - timedelta(days=args.days)
+    steps = int(args.days * 86400 / args.interval)
+    t0 = time.perf_counter()
+    conn = history.connect()
+    try:
+        for step in range(steps):
+            at = start + timedelta(seconds=step * args.interval)
+            for symbol in symbols:
+                stats, snap = snaps[symbol]
+                history.insert_snapshot(conn, stats, snap, symbol, "linear", at)
+            if step % 500 == 0:
+                conn.commit()
+        conn.commit()
+    finally:
+        conn.close()
+    return steps * len(symbols) / (time.perf_counter() - t0)
+
+def _run(backend: str, args, tmp: str) -> dict:
+    path = os.path.join(tmp, f"{backend}.db")
+    cls = PartitionedHistory if backend == "partitioned" else OrderbookHistory
+    history = cls(path, storage=args.storage)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    rate = _fill(history, args, now)
+    size = os.path.getsize(path) / 2**20
+
+    window_end = now - timedelta(days=args.days / 2)
+    t0 = time.perf_counter()
+    rows = 0
+    for _ in range(args.repeat):
+        rows = sum(1 for _ in history.iter_books("SYM0USDT", window_end - timedelta(hours=1), window_end))
+    window = (time.perf_counter() - t0) / args.repeat
+
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        history.get_statistics("SYM0USDT", window_end - timedelta(days=1), window_end)
+    stats = (time.perf_counter() - t0) / args.repeat
+
+    t0 = time.perf_counter()
+    deleted = history.cleanup_old_data(days_to_keep=args.days // 2)
+    cleanup = time.perf_counter() - t0
+    return {"rate": rate, "size": size, "rows": rows, "window": window * 1000,
+            "stats": stats * 1000, "deleted": deleted, "cleanup": cleanup * 1000}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark do histórico particionado por dia")
+    parser.add_argument("--days", type=int, default=8)
+    parser.add_argument("--symbols", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=60.0, help="Segundos entre snapshots de um símbolo")
+    parser.add_argument("--depth", type=int, default=50)
+    parser.add_argument("--storage", default="json", choices=["json", "delta"])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {backend: _run(backend, args, tmp) for backend in ("single", "partitioned")}
+    print(f"{'backend':<12} {'grav/s':>8} {'MiB':>7} {'janela 1h':>10} {'stats 1d':>9} {'retenção':>10} {'removidos':>10}")
+    for backend, r in results.items():
+        print(f"{backend:<12} {r['rate']:>8.0f} {r['size']:>7.1f} {r['window']:>8.2f}ms {r['stats']:>7.2f}ms "
+              f"{r['cleanup']:>8.1f}ms {r['deleted']:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark do armazenamento do histórico: JSON completo (formato original)
+contra keyframe + diffs, em tamanho do banco, custo de gravação, latência
+de ``restore_orderbook`` e varredura sequencial (``iter_books``).
+
+``--deltas`` controla quantos deltas do feed sintético são aplicados entre
+dois snapshots (o runner grava um snapshot a cada 5 s).
+
+Uso:
+    python -m bybit_depth.benchmarks.bench_history_storage --snapshots 2000 --depth 200 --deltas 5
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from ..core.history import OrderbookHistory
+from ..core.orderbook import OrderBook
+from ..utils.synthetic import SyntheticFeed
+
+def _run(storage: str, args, tmp: str) -> dict:
+    path = os.path.join(tmp, f"{storage}.db")
+    history = OrderbookHistory(path, storage=storage, keyframe_every=args.keyframe_every)
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=args.depth, seed=1)
+    book = OrderBook()
+    frames = feed.frames(args.snapshots * args.deltas + 1, levels=args.levels)
+    d = next(frames)["data"]
+    book.apply_snapshot(d["b"], d["a"], d["u"])
+    save = 0.0
+    for _ in range(args.snapshots):
+        for _ in range(args.deltas):
+            d = next(frames)["data"]
+            book.apply_delta(d["b"], d["a"], d["u"])
+        t0 = time.perf_counter()
+        history.save_snapshot(book, "BTCUSDT", "linear")
+        save += time.perf_counter() - t0
+    with sqlite3.connect(path) as conn:
+        conn.execute("VACUUM")
+        ids = [r[0] for r in conn.execute("SELECT id FROM orderbook_snapshots")]
+
+    rng = random.Random(0)
+    restores = []
+    for row_id in rng.sample(ids, min(200, len(ids))):
+        t0 = time.perf_counter()
+        history.restore_orderbook(row_id)
+        restores.append(time.perf_counter() - t0)
+    restores.sort()
+    t0 = time.perf_counter()
+    scanned = sum(1 for _ in history.iter_books("BTCUSDT"))
+    scan = time.perf_counter() - t0
+    return {
+        "size": os.path.getsize(path) / 2**20,
+        "save_ms": save / args.snapshots * 1000,
+        "restore_p50": restores[len(restores) // 2] * 1000,
+        "restore_p99": restores[int(len(restores) * 0.99) - 1] * 1000,
+        "scan": scanned / scan,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark JSON x keyframe + diff no histórico")
+    parser.add_argument("--snapshots", type=int, default=2000)
+    parser.add_argument("--depth", type=int, default=200)
+    parser.add_argument("--deltas", type=int, default=5, help="Deltas aplicados entre snapshots")
+    parser.add_argument("--levels", type=int, default=4, help="Níveis alterados por delta")
+    parser.add_argument("--keyframe-every", type=int, default=60)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {storage: _run(storage, args, tmp) for storage in ("json", "delta")}
+
+    print(f"{args.snapshots} snapshots depth={args.depth}, {args.deltas}x{args.levels} níveis entre snapshots, "
+          f"keyframe a cada {args.keyframe_every}")
+    print(f"{'modo':6} {'banco':>9} {'save':>9} {'restore p50':>12} {'restore p99':>12} {'varredura':>14}")
+    for storage, r in results.items():
+        print(f"{storage:6} {r['size']:8.1f}M {r['save_ms']:7.2f}ms {r['restore_p50']:10.2f}ms "
+              f"{r['restore_p99']:10.2f}ms {r['scan']:9,.0f} livros/s")
+    ratio = results["json"]["size"] / results["delta"]["size"]
+    print(f"banco {ratio:.1f}x menor com keyframe + diff")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark da gravação do histórico: ``save_snapshot`` síncrono (conexão nova
+e commit por snapshot, no event loop) contra o ``HistoryWriter`` (thread,
+conexão WAL persistente e commits em lote).
+
+Mede a vazão de inserts e o atraso do event loop (quanto um ``sleep`` de
+1 ms atrasa) enquanto snapshots são gravados a cada ``--save-interval`` s.
+
+Uso:
+    python -m bybit_depth.benchmarks.bench_history_writer --snapshots 2000 --depth 200
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import List
+
+from ..core.history import OrderbookHistory
+from ..core.history_writer import HistoryWriter
+from ..core.orderbook import OrderBook
+from ..utils.synthetic import SyntheticFeed
+
+def _book(depth: int) -> OrderBook:
+    d = SyntheticFeed(symbol="BTCUSDT", depth=depth, seed=1).snapshot()["data"]
+    book = OrderBook()
+    book.apply_snapshot(d["b"], d["a"], d["u"])
+    return book
+
+def throughput(mode: str, path: str, book: OrderBook, count: int) -> float:
+    history = OrderbookHistory(path)
+    t0 = time.perf_counter()
+    if mode == "sync":
+        for _ in range(count):
+            history.save_snapshot(book, "BTCUSDT", "linear")
+    else:
+        with HistoryWriter(history, max_pending=count) as writer:
+            for _ in range(count):
+                writer.submit(book, "BTCUSDT", "linear")
+    return count / (time.perf_counter() - t0)
+
+async def _stalls(mode: str, path: str, book: OrderBook, duration: float, save_interval: float) -> List[float]:
+    history = OrderbookHistory(path)
+    writer = HistoryWriter(history) if mode == "writer" else None
+    lags: List[float] = []
+    stop = time.perf_counter() + duration
+
+    async def ticker() -> None:
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - t0 - 0.001)
+
+    async def saver() -> None:
+        while time.perf_counter() < stop:
+            if writer is None:
+                history.save_snapshot(book, "BTCUSDT", "linear")
+            else:
+                writer.submit(book, "BTCUSDT", "linear")
+            await asyncio.sleep(save_interval)
+
+    await asyncio.gather(ticker(), saver())
+    if writer is not None:
+        writer.close()
+    return sorted(lags)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark do HistoryWriter")
+    parser.add_argument("--snapshots", type=int, default=2000)
+    parser.add_argument("--depth", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=5.0, help="Duração da medição de atraso (s)")
+    parser.add_argument("--save-interval", type=float, default=0.05, help="Intervalo entre snapshots (s)")
+    args = parser.parse_args()
+
+    book = _book(args.depth)
+    with tempfile.TemporaryDirectory() as tmp:
+        rates = {mode: throughput(mode, os.path.join(tmp, f"tp-{mode}.db"), book, args.snapshots)
+                 for mode in ("sync", "writer")}
+        lags = {mode: asyncio.run(_stalls(mode, os.path.join(tmp, f"lag-{mode}.db"), book,
+                                          args.duration, args.save_interval))
+                for mode in ("sync", "writer")}
+
+    print(f"{args.snapshots} snapshots depth={args.depth}; atraso do loop com um snapshot a cada "
+          f"{args.save_interval * 1000:g} ms durante {args.duration:g} s")
+    print(f"{'modo':8} {'inserts/s':>10} {'atraso p50':>11} {'p99':>9} {'máx':>9}")
+    for mode in ("sync", "writer"):
+        lag = lags[mode]
+        print(f"{mode:8} {rates[mode]:10,.0f} {lag[len(lag) // 2] * 1000:9.2f}ms "
+              f"{lag[int(len(lag) * 0.99)] * 1000:7.2f}ms {lag[-1] * 1000:7.2f}ms")
+
+if __name__ == "__main__":
+    main()
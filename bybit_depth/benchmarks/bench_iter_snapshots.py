@@ -0,0 +1,73 @@
+"""
+Benchmark da varredura do histórico: ``get_snapshots`` (``fetchall`` +
+dict por linha com o JSON completo) contra ``iter_snapshots`` com projeção
+de colunas, em tempo e pico de memória Python (``tracemalloc``).
+
+Uso:
+    python -m bybit_depth.benchmarks.bench_iter_snapshots --snapshots 20000 --depth 200
+"""
+from __future__ import annotations
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from ..core.history import OrderbookHistory
+from ..core.orderbook import OrderBook
+from ..utils.synthetic import SyntheticFeed
+
+def _fill(history: OrderbookHistory, args) -> None:
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=args.depth, seed=1)
+    book = OrderBook()
+    d = next(feed.frames(1))["data"]
+    book.apply_snapshot(d["b"], d["a"], d["u"])
+    start = datetime.now(timezone.utc) - timedelta(seconds=args.snapshots * 5)
+    conn = history.connect()
+    try:
+        for i in range(args.snapshots):
+            d = feed.delta(4)["data"]
+            book.apply_delta(d["b"], d["a"], d["u"])
+            history.insert_snapshot(conn, book.get_stats(), book.snapshot(), "BTCUSDT", "linear",
+                                    start + timedelta(seconds=5 * i))
+        conn.commit()
+    finally:
+        conn.close()
+
+def _measure(fn):
+    t0 = time.perf_counter()
+    count = fn()
+    elapsed = time.perf_counter() - t0
+    # Memória numa segunda passada: o tracemalloc distorce o tempo
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak / 2**20
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de iter_snapshots contra get_snapshots")
+    parser.add_argument("--snapshots", type=int, default=20000)
+    parser.add_argument("--depth", type=int, default=200)
+    parser.add_argument("--storage", default="json", choices=["json", "delta"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history = OrderbookHistory(os.path.join(tmp, "history.db"), storage=args.storage)
+        _fill(history, args)
+        cases = {
+            "get_snapshots": lambda: sum(1 for s in history.get_snapshots("BTCUSDT", limit=args.snapshots)
+                                         if s["best_bid"]),
+            "iter (bid/ask)": lambda: sum(1 for _, bid, ask in history.iter_snapshots(
+                "BTCUSDT", columns=("timestamp", "best_bid", "best_ask")) if bid),
+            "iter (livros)": lambda: sum(1 for _, bids, _a in history.iter_snapshots(
+                "BTCUSDT", columns=("ts_ms", "bids", "asks")) if bids),
+        }
+        print(f"{'consulta':<16} {'linhas':>8} {'tempo':>9} {'pico MiB':>9}")
+        for name, fn in cases.items():
+            count, elapsed, peak = _measure(fn)
+            print(f"{name:<16} {count:>8} {elapsed:>8.2f}s {peak:>9.1f}")
+
+if __name__ == "__main__":
+    main()
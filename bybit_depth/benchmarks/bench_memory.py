@@ -0,0 +1,79 @@
+"""
+Benchmark de memória (tracemalloc): bytes por nível e por símbolo para
+OrderBook (Decimal), OrderBook em ponto fixo e CompactOrderBook.
+
+Uso:
+    python -m bybit_depth.benchmarks.bench_memory --depth 200 --deltas 200
+"""
+from __future__ import annotations
+import argparse
+import gc
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from ..configs.symbols import SYMBOLS_BY_MARKET, get_instrument_spec
+from ..core.compact_book import CompactOrderBook
+from ..core.orderbook import OrderBook
+from ..utils.synthetic import SyntheticFeed
+
+def _universe() -> List[Tuple[str, str]]:
+    return [(symbol, market) for market, symbols in SYMBOLS_BY_MARKET.items() for symbol in symbols]
+
+def _feeds(universe: List[Tuple[str, str]], depth: int, deltas: int) -> Dict[Tuple[str, str], List[dict]]:
+    out = {}
+    for i, (symbol, market) in enumerate(universe):
+        tick, lot = get_instrument_spec(symbol, market)
+        feed = SyntheticFeed(symbol=symbol, depth=depth, tick=tick, lot=lot, seed=i)
+        out[(symbol, market)] = [f["data"] for f in feed.frames(deltas + 1)]
+    return out
+
+def measure(factory: Callable[[str, str], object], feeds: Dict[Tuple[str, str], List[dict]]) -> Tuple[int, int]:
+    """Retorna (bytes alocados pelos livros, total de níveis)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    books = []
+    for (symbol, market), frames in feeds.items():
+        book = factory(symbol, market)
+        snap = frames[0]
+        book.apply_snapshot(snap["b"], snap["a"], snap["u"])
+        for d in frames[1:]:
+            book.apply_delta(d["b"], d["a"], d["u"])
+        books.append(book)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    levels = sum(b.get_stats()["total_levels"] for b in books)
+    return used, levels
+
+def _decimal_book(symbol: str, market: str) -> OrderBook:
+    return OrderBook()
+
+def _fixed_book(symbol: str, market: str) -> OrderBook:
+    tick, lot = get_instrument_spec(symbol, market)
+    return OrderBook(tick_size=tick, lot_size=lot)
+
+def _compact_book(symbol: str, market: str) -> CompactOrderBook:
+    tick, lot = get_instrument_spec(symbol, market)
+    return CompactOrderBook(tick, lot, symbol=symbol, market_type=market)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de memória por nível/símbolo")
+    parser.add_argument("--depth", type=int, default=200)
+    parser.add_argument("--deltas", type=int, default=200, help="Deltas aplicados por símbolo após o snapshot")
+    args = parser.parse_args()
+
+    universe = _universe()
+    feeds = _feeds(universe, args.depth, args.deltas)
+    print(f"{len(universe)} símbolos (SYMBOLS_BY_MARKET), depth={args.depth}, {args.deltas} deltas/símbolo")
+    print(f"{'livro':<22} {'bytes/nível':>12} {'KiB/símbolo':>12} {'MiB total':>10}")
+    for label, factory in (
+        ("OrderBook (Decimal)", _decimal_book),
+        ("OrderBook (ponto fixo)", _fixed_book),
+        ("CompactOrderBook", _compact_book),
+    ):
+        used, levels = measure(factory, feeds)
+        print(f"{label:<22} {used / max(1, levels):>12.1f} {used / len(universe) / 1024:>12.1f} {used / 2**20:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark ponta a ponta: o cliente real (BybitWSClient ou MultiplexWSClient)
+contra o servidor mock local (``utils.mock_server``) rodando em outro
+processo. Para cada taxa alvo reporta a vazão sustentada e as latências por
+estágio; se a vazão recebida fica abaixo da alvo, ou a latência rede cresce,
+o cliente não está acompanhando.
+
+Uso:
+    python -m bybit_depth.benchmarks.bench_mock_ws --rates 1000 5000 20000 --duration 5
+    python -m bybit_depth.benchmarks.bench_mock_ws --symbols 20 --gap-rate 0.001 --queue-size 1024
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import multiprocessing as mp
+from typing import Dict, List, Optional
+
+from ..core.ws_client import BybitWSClient
+from ..core.ws_multiplex import MultiplexWSClient
+from ..utils.latency import LatencyHistogram, LatencyTracker
+from ..utils.mock_server import MockBybitServer
+
+def _server_main(port_queue, rate: float, opts: dict) -> None:
+    async def run() -> None:
+        async with MockBybitServer(rate=rate, **opts) as server:
+            port_queue.put(server.port)
+            await asyncio.Event().wait()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+def _merged(trackers: List[LatencyTracker]) -> Dict[str, LatencyHistogram]:
+    merged: Dict[str, LatencyHistogram] = {}
+    for tracker in trackers:
+        for stage, hist in tracker.histograms.items():
+            merged.setdefault(stage, LatencyHistogram()).merge(hist)
+    return merged
+
+async def drive(url: str, symbols: List[str], depth: int, duration: float, client_opts: dict, warmup: float = 1.0) -> dict:
+    if len(symbols) == 1:
+        client = BybitWSClient(symbols[0], depth, "linear", **client_opts)
+        trackers = lambda: [client.latency]  # noqa: E731
+        syncs = lambda: [client.sync]  # noqa: E731
+    else:
+        client = MultiplexWSClient(symbols, depth, "linear", **client_opts)
+        trackers = lambda: list(client.latency.values())  # noqa: E731
+        syncs = lambda: list(client.syncs.values())  # noqa: E731
+    client.ws_url = url
+    task = asyncio.create_task(client.run_forever())
+    try:
+        if not await client.wait_connected(10.0):
+            raise RuntimeError(f"Não conectou em {url}")
+        await asyncio.sleep(warmup)
+        for tracker in trackers():
+            tracker.reset()
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        await asyncio.sleep(duration)
+        elapsed = loop.time() - t0
+        hists = _merged(trackers())
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    return {
+        "received_per_s": hists["receive_to_parsed"].count / elapsed,
+        "latency": {stage: hist.summary() for stage, hist in hists.items()},
+        "gaps": sum(s.gaps for s in syncs()),
+        "recoveries": sum(s.recoveries for s in syncs()),
+    }
+
+def run(rate: float, args) -> dict:
+    ctx = mp.get_context("spawn")
+    port_queue = ctx.Queue()
+    server_opts = {
+        "levels": args.levels, "gap_rate": args.gap_rate,
+        "duplicate_rate": args.duplicate_rate, "disconnect_every": args.disconnect_every,
+    }
+    proc = ctx.Process(target=_server_main, args=(port_queue, rate, server_opts), daemon=True)
+    proc.start()
+    try:
+        port = port_queue.get(timeout=30)
+        symbols = [f"MOCK{i:03d}USDT" for i in range(args.symbols)]
+        client_opts = {"decoder": args.decoder, "queue_size": args.queue_size, "queue_policy": args.queue_policy}
+        if args.symbols == 1:
+            client_opts["batch_deltas"] = args.batch_deltas
+        return asyncio.run(drive(f"ws://127.0.0.1:{port}", symbols, args.depth, args.duration, client_opts))
+    finally:
+        proc.terminate()
+        proc.join(5)
+
+def _ms(value: Optional[float]) -> str:
+    return f"{value:.3f}" if value is not None else "-"
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark do cliente WebSocket contra o servidor mock local")
+    parser.add_argument("--rates", type=float, nargs="+", default=[1000, 5000, 20000], help="Deltas/s alvo")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--symbols", type=int, default=1, help=">1 usa o MultiplexWSClient")
+    parser.add_argument("--depth", type=int, default=50)
+    parser.add_argument("--levels", type=int, default=4)
+    parser.add_argument("--decoder", default="fast")
+    parser.add_argument("--batch-deltas", action="store_true")
+    parser.add_argument("--queue-size", type=int, default=0)
+    parser.add_argument("--queue-policy", default="block")
+    parser.add_argument("--gap-rate", type=float, default=0.0)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0)
+    parser.add_argument("--disconnect-every", type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"{args.symbols} símbolo(s), depth={args.depth}, {args.duration:.0f}s por taxa, decoder={args.decoder}")
+    print(f"{'alvo/s':>8} {'recebido/s':>11} {'rede p50':>9} {'rede p99':>9} {'parse p99':>10} "
+          f"{'livro p99':>10} {'total p99':>10} {'gaps':>5} {'recup.':>6}   (ms)")
+    for rate in args.rates:
+        r = run(rate, args)
+        lat = r["latency"]
+        print(f"{rate:>8,.0f} {r['received_per_s']:>11,.0f} "
+              f"{_ms(lat['exchange_to_receive']['p50_ms']):>9} {_ms(lat['exchange_to_receive']['p99_ms']):>9} "
+              f"{_ms(lat['receive_to_parsed']['p99_ms']):>10} {_ms(lat['parsed_to_applied']['p99_ms']):>10} "
+              f"{_ms(lat['exchange_to_applied']['p99_ms']):>10} {r['gaps']:>5} {r['recoveries']:>6}")
+
+if __name__ == "__main__":
+    main()
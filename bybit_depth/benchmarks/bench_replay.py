@@ -0,0 +1,64 @@
+"""
+Benchmark do replay de capturas: velocidade da reprodução completa (frames/s
+e múltiplo do tempo real), custo do índice de keyframes e latência de seek.
+
+A captura sintética simula o orderbook.200 linear (um frame a cada 100 ms).
+
+Uso:
+    python -m bybit_depth.benchmarks.bench_replay --messages 100000 --depth 200
+"""
+from __future__ import annotations
+import argparse
+import random
+import tempfile
+import time
+
+from ..core.recorder import FeedRecorder
+from ..core.replay import ReplayEngine
+from ..utils.synthetic import SyntheticFeed
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark do replay de capturas brutas")
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--depth", type=int, default=200)
+    parser.add_argument("--levels", type=int, default=20, help="Níveis alterados por delta")
+    parser.add_argument("--interval-ms", type=float, default=100.0, help="Intervalo entre frames na captura")
+    parser.add_argument("--keyframe-interval", type=float, default=60.0, help="Segundos entre keyframes")
+    parser.add_argument("--seeks", type=int, default=20)
+    parser.add_argument("--decoder", default="fast")
+    parser.add_argument("--no-coalesce", action="store_true", help="Aplicar delta a delta")
+    args = parser.parse_args()
+
+    raws = SyntheticFeed(symbol="BTCUSDT", depth=args.depth).raw_frames(args.messages, args.levels)
+    step = int(args.interval_ms * 1e6)
+    t0 = time.time_ns()
+    with tempfile.TemporaryDirectory() as tmp:
+        with FeedRecorder(tmp, prefix="bench") as rec:
+            for i, raw in enumerate(raws):
+                rec.record(raw, t0 + i * step)
+
+        engine = ReplayEngine(tmp, decoder=args.decoder, coalesce=not args.no_coalesce)
+        full = engine.run()
+        t1 = time.perf_counter()
+        keyframes = engine.build_index(args.keyframe_interval)
+        index_time = time.perf_counter() - t1
+
+        rng = random.Random(0)
+        seek_times, seek_frames = [], []
+        for _ in range(args.seeks):
+            target = t0 + rng.randrange(len(raws)) * step
+            t2 = time.perf_counter()
+            stats = ReplayEngine(tmp, decoder=args.decoder, coalesce=not args.no_coalesce).seek(target)
+            seek_times.append(time.perf_counter() - t2)
+            seek_frames.append(stats.frames)
+
+    span = (len(raws) - 1) * args.interval_ms / 1000
+    print(f"{len(raws)} frames, depth={args.depth}, {args.levels} níveis/delta, captura de {span / 3600:.2f} h")
+    print(f"replay completo:   {full.frames_per_second:10,.0f} frames/s  ({full.speedup:,.0f}x tempo real)")
+    print(f"índice:            {keyframes} keyframes a cada {args.keyframe_interval:g} s em {index_time:.2f} s")
+    seek_times.sort()
+    print(f"seek aleatório:    mediana {seek_times[len(seek_times) // 2] * 1000:.1f} ms, "
+          f"máx {seek_times[-1] * 1000:.1f} ms (≤ {max(seek_frames)} frames reaplicados)")
+
+if __name__ == "__main__":
+    main()
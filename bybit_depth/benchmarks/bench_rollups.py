@@ -0,0 +1,88 @@
+"""
+Benchmark das estatísticas do histórico: agregação sobre as linhas brutas
+(a consulta original de ``get_statistics``) contra os rollups de 1 s / 1 min
+/ 1 h, para janelas de 1 h a ``--days`` dias, e o custo extra da gravação.
+
+Uso:
+    python -m bybit_depth.benchmarks.bench_rollups --days 30 --interval 30
+"""
+from __future__ import annotations
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from ..core.history import OrderbookHistory, _sql_ts
+from ..core.orderbook import OrderBook
+from ..utils.synthetic import SyntheticFeed
+
+RAW_QUERY = """
+    SELECT COUNT(*), AVG(spread), AVG(spread_pct), AVG(bid_levels), AVG(ask_levels),
+           AVG(error_rate), MIN(best_bid), MAX(best_ask), AVG(best_bid), AVG(best_ask)
+    FROM orderbook_snapshots WHERE symbol = ? AND timestamp >= ? AND timestamp <= ?
+"""
+
+def _fill(history: OrderbookHistory, args, now: datetime) -> float:
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=args.depth, seed=1)
+    book = OrderBook()
+    d = next(feed.frames(1))["data"]
+    book.apply_snapshot(d["b"], d["a"], d["u"])
+    steps = int(args.days * 86400 / args.interval)
+    start = now - timedelta(days=args.days)
+    conn = history.connect()
+    t0 = time.perf_counter()
+    try:
+        for step in range(steps):
+            d = feed.delta(4)["data"]
+            book.apply_delta(d["b"], d["a"], d["u"])
+            history.insert_snapshot(conn, book.get_stats(), book.snapshot(), "BTCUSDT", "linear",
+                                    start + timedelta(seconds=step * args.interval))
+            if step % 1000 == 0:
+                conn.commit()
+        conn.commit()
+    finally:
+        conn.close()
+    return (time.perf_counter() - t0) / steps * 1e6
+
+def _timed(fn, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark dos rollups do histórico")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--interval", type=float, default=30.0, help="Segundos entre snapshots")
+    parser.add_argument("--depth", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.db")
+        history = OrderbookHistory(path, storage="delta")
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        per_insert = _fill(history, args, now)
+        with sqlite3.connect(path) as conn:
+            rows = conn.execute("SELECT COUNT(*) FROM orderbook_snapshots").fetchone()[0]
+            buckets = {r: conn.execute(f"SELECT COUNT(*) FROM rollup_{r}").fetchone()[0] for r in ("1s", "1m", "1h")}
+        print(f"{rows} snapshots ({per_insert:.0f} µs por gravação, com rollups); buckets: "
+              + ", ".join(f"{r}={n}" for r, n in buckets.items()))
+        print(f"{'janela':<10} {'bruto':>10} {'rollups':>10} {'resoluções':>16}")
+        conn = sqlite3.connect(path)
+        try:
+            for label, span in (("1h", timedelta(hours=1)), ("1d", timedelta(days=1)),
+                                ("7d", timedelta(days=7)), (f"{args.days}d", timedelta(days=args.days))):
+                start = now - span + timedelta(seconds=17)   # bordas fora do alinhamento de hora/minuto
+                params = ("BTCUSDT", _sql_ts(start), _sql_ts(now))
+                raw = _timed(lambda: conn.execute(RAW_QUERY, params).fetchone(), args.repeat)
+                rollup = _timed(lambda: history.get_statistics("BTCUSDT", start, now), args.repeat)
+                used = "+".join(history.get_rollup_stats("BTCUSDT", start, now).get("resolutions", []))
+                print(f"{label:<10} {raw:>8.2f}ms {rollup:>8.2f}ms {used:>16}")
+        finally:
+            conn.close()
+
+if __name__ == "__main__":
+    main()
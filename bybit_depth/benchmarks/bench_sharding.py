@@ -0,0 +1,43 @@
+"""
+Benchmark de escalabilidade do modo shard: mensagens/s agregadas (decode +
+aplicação no livro) conforme o número de processos worker, com a fonte
+sintética local (sem rede). Cada worker pré-gera os frames dos seus símbolos
+e todos começam juntos.
+
+Uso:
+    python -m bybit_depth.benchmarks.bench_sharding --symbols 64 --workers 1 2 4
+"""
+from __future__ import annotations
+import argparse
+import os
+
+from ..core.sharding import ShardSupervisor, synthetic_throughput
+
+def run(symbols: int, workers: int, messages: int, depth: int, decoder: str) -> float:
+    universe = [f"SYN{i:03d}USDT" for i in range(symbols)]
+    with ShardSupervisor(universe, depth, "linear", workers=workers, source="synthetic",
+                         messages=messages, decoder=decoder) as sup:
+        if not sup.wait_finished(timeout=600):
+            raise RuntimeError("Workers não terminaram a tempo")
+        _, rate = synthetic_throughput(sup.finished)
+    return rate
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de ingestão em shards (multiprocessing)")
+    parser.add_argument("--symbols", type=int, default=64)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--messages", type=int, default=2000, help="Frames por símbolo")
+    parser.add_argument("--depth", type=int, default=50)
+    parser.add_argument("--decoder", default="fast")
+    args = parser.parse_args()
+
+    print(f"{args.symbols} símbolos, {args.messages} frames/símbolo, depth={args.depth}, CPUs={os.cpu_count()}")
+    print(f"{'workers':>8} {'msgs/s':>12} {'escala':>8}")
+    base = None
+    for workers in args.workers:
+        rate = run(args.symbols, workers, args.messages, args.depth, args.decoder)
+        base = base or rate
+        print(f"{workers:>8} {rate:>12,.0f} {rate / base:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
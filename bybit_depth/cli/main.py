@@ -9,10 +9,12 @@ import typer
 from rich import print
 
 from ..configs.settings import settings
+from ..configs.symbols import POPULAR_SYMBOLS
 from ..core.orderbook import OrderBook
 from ..core.ws_client import BybitWSClient
 from ..core.aggregator import imbalance, band_liquidity, detect_walls
-from ..core.history import OrderbookHistory
+from ..core.history import DEFAULT_HISTORY_DB
+from ..core.partitioned_history import open_history
 
 app = typer.Typer(help="Bybit DOM CLI")
 
@@ -28,6 +30,25 @@ def _read_json_book(path: str) -> Optional[OrderBook]:
     except Exception:
         return None
 
+# Linhas de latência da tabela do monitor: (rótulo, estágio)
+LATENCY_ROWS = (
+    ("Latência rede", "exchange_to_receive"),
+    ("Latência parse", "receive_to_parsed"),
+    ("Latência livro", "parsed_to_applied"),
+    ("Latência total", "exchange_to_applied"),
+)
+
+def _format_latency(summary: Optional[dict]) -> str:
+    if not summary or not summary.get("count"):
+        return "N/A"
+    return f"p50 {summary['p50_ms']:.3f} ms | p99 {summary['p99_ms']:.3f} ms | max {summary['max_ms']:.3f} ms"
+
+def _write_json(path: str, payload: dict) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, default=str)
+    os.replace(tmp, path)
+
 async def _connect_once(symbol: str, depth: int, market: str, duration: float = 2.0) -> OrderBook:
     client = BybitWSClient(symbol, depth, market)
     task = asyncio.create_task(client.run_forever())
@@ -104,8 +125,9 @@ def monitor_cmd(
     symbol: str = typer.Option(settings.symbol, help="Símbolo ex.: BTCUSDT, BTC-26SEP25"),
     depth: int = typer.Option(settings.depth, help="Profundidade"),
     market: str = typer.Option(settings.market, help="linear|inverse|spot"),
-    interval: float = typer.Option(1.0, help="Intervalo de atualização em segundos"),
+    interval: float = typer.Option(1.0, help="Intervalo mínimo entre atualizações da tela (segundos)"),
     duration: Optional[float] = typer.Option(None, help="Duração do monitoramento (segundos)"),
+    export: Optional[str] = typer.Option(None, help="Arquivo JSON com estatísticas e histogramas de latência"),
 ):
     """Monitora o orderbook em tempo real."""
     import time
@@ -124,11 +146,19 @@ def monitor_cmd(
             console.print(f"🔗 Conectado ao {symbol} ({market})")
             
             start_time = time.time()
+            waiter = client.watch(kinds=("top", "levels", "snapshot"), top_n=depth)
             while True:
-                if duration and (time.time() - start_time) >= duration:
-                    break
-                    
-                stats = client.book.get_stats()
+                remaining = None
+                if duration:
+                    remaining = duration - (time.time() - start_time)
+                    if remaining <= 0:
+                        break
+
+                # Redesenha apenas quando o livro muda
+                if await waiter.wait(timeout=remaining) is None:
+                    continue
+
+                stats = client.get_stats()
                 liq_stats = client.book.get_liquidity_stats(1.0)
                 
                 # Criar tabela de estatísticas
@@ -145,7 +175,11 @@ def monitor_cmd(
                 table.add_row("Liquidez Bid", f"{liq_stats['bid_liquidity']:.2f}")
                 table.add_row("Liquidez Ask", f"{liq_stats['ask_liquidity']:.2f}")
                 table.add_row("Desequilíbrio", f"{liq_stats['liquidity_imbalance']:.2f}")
+                for label, stage in LATENCY_ROWS:
+                    table.add_row(label, _format_latency(stats.get("latency", {}).get(stage)))
                 
+                if export:
+                    _write_json(export, {"stats": stats, "latency": client.export_latency()})
                 console.clear()
                 console.print(table)
                 
@@ -160,6 +194,56 @@ def monitor_cmd(
     
     asyncio.run(monitor_loop())
 
+@app.command("multi")
+def multi_cmd(
+    symbols: str = typer.Option(",".join(POPULAR_SYMBOLS), help="Símbolos separados por vírgula"),
+    depth: int = typer.Option(50, help="Profundidade"),
+    market: str = typer.Option(settings.market, help="linear|inverse|spot"),
+    interval: float = typer.Option(1.0, help="Intervalo entre atualizações da tela (segundos)"),
+    duration: Optional[float] = typer.Option(None, help="Duração do monitoramento (segundos)"),
+):
+    """Monitora vários símbolos em uma única conexão WebSocket."""
+    import time
+    from rich.console import Console
+    from rich.table import Table
+    from ..core.ws_multiplex import MultiplexWSClient
+
+    console = Console()
+    names = [s.strip() for s in symbols.split(",") if s.strip()]
+
+    async def multi_loop():
+        client = MultiplexWSClient(names, depth, market)
+        task = asyncio.create_task(client.run_forever())
+        try:
+            await client.wait_connected(10.0)
+            console.print(f"🔗 Conectado: {len(names)} símbolos em uma conexão ({market})")
+            start_time = time.time()
+            while not duration or time.time() - start_time < duration:
+                table = Table(title=f"📊 {len(names)} símbolos - {market}")
+                for col in ("Símbolo", "Best Bid", "Best Ask", "Spread %", "Níveis", "Updates"):
+                    table.add_column(col)
+                for name in names:
+                    stats = client.book(name).get_stats()
+                    table.add_row(
+                        name,
+                        f"{stats['best_bid']}" if stats['best_bid'] else "N/A",
+                        f"{stats['best_ask']}" if stats['best_ask'] else "N/A",
+                        f"{stats['spread_pct']:.4f}" if stats['spread_pct'] is not None else "N/A",
+                        f"{stats['total_levels']}",
+                        f"{stats['total_updates']} (erros: {stats['sequence_errors']})",
+                    )
+                console.clear()
+                console.print(table)
+                await asyncio.sleep(interval)
+        finally:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    asyncio.run(multi_loop())
+
 @app.command("symbols")
 def symbols_cmd():
     """Lista símbolos suportados e seus tipos."""
@@ -176,21 +260,35 @@ def symbols_cmd():
         info = parse_symbol_type(symbol)
         print(f"  {symbol:12} -> {info['type']:9} | {info['base']}/{info['quote']} | Expiry: {info['expiry'] or 'N/A'}")
 
-@app.command("history")
+history_app = typer.Typer(help="Dados históricos do orderbook")
+app.add_typer(history_app, name="history")
+
+@history_app.callback(invoke_without_command=True)
 def history_cmd(
+    ctx: typer.Context,
     symbol: str = typer.Option(settings.symbol, help="Símbolo para análise histórica"),
     hours: int = typer.Option(24, help="Horas para trás"),
     limit: int = typer.Option(100, help="Limite de registros"),
+    show: int = typer.Option(5, help="Snapshots mais recentes a listar"),
     stats: bool = typer.Option(False, help="Mostrar estatísticas agregadas"),
+    db_path: str = typer.Option(DEFAULT_HISTORY_DB, help="Banco do histórico (tabela única ou particionado)"),
 ):
     """Análise de dados históricos do orderbook."""
     from datetime import datetime, timezone, timedelta
+    from itertools import islice
+
+    if ctx.invoked_subcommand is not None:
+        return
     
-    history = OrderbookHistory()
+    history = open_history(db_path)
     end_time = datetime.now(timezone.utc)
     start_time = end_time - timedelta(hours=hours)
     
-    snapshots = history.get_snapshots(symbol, start_time, end_time, limit)
+    # Até ``limit`` registros, mais recentes primeiro; só as colunas exibidas, sem ler os livros
+    snapshots = list(islice(history.iter_snapshots(
+        symbol, start_time, end_time,
+        columns=("timestamp", "best_bid", "best_ask", "spread"), descending=True,
+    ), limit))
     
     if not snapshots:
         print(f"❌ Nenhum dado histórico encontrado para {symbol} nas últimas {hours}h")
@@ -207,20 +305,94 @@ def history_cmd(
             print(f"  Taxa de erro média: {stats_data.get('avg_error_rate', 0):.2f}%")
             print(f"  Preço bid médio: {stats_data.get('avg_bid', 0):.2f}")
             print(f"  Preço ask médio: {stats_data.get('avg_ask', 0):.2f}")
+            if stats_data.get('avg_mid') is not None:
+                print(f"  Mid: médio {stats_data['avg_mid']:.2f} | último {stats_data['last_mid']:.2f}")
+            if stats_data.get('avg_imbalance') is not None:
+                print(f"  Imbalance médio (top 10): {stats_data['avg_imbalance']:.3f}")
     
-    # Mostrar últimos 5 snapshots
-    print(f"\n📊 Últimos {min(5, len(snapshots))} snapshots:")
-    for i, snapshot in enumerate(snapshots[:5]):
-        timestamp = snapshot['timestamp']
-        print(f"  {i+1}. {timestamp} | Bid: {snapshot['best_bid']:.2f} | Ask: {snapshot['best_ask']:.2f} | Spread: {snapshot['spread']:.4f}")
+    recent = snapshots[:show]
+    print(f"\n📊 Últimos {len(recent)} snapshots:")
+    for i, (timestamp, best_bid, best_ask, spread) in enumerate(recent):
+        print(f"  {i+1}. {timestamp} | Bid: {best_bid:.2f} | Ask: {best_ask:.2f} | Spread: {spread:.4f}")
+
+@history_app.command("export")
+def history_export_cmd(
+    output_file: str = typer.Argument(..., help="Arquivo de saída (.parquet ou .arrow)"),
+    symbol: str = typer.Option(settings.symbol, help="Símbolo"),
+    hours: Optional[float] = typer.Option(None, help="Horas para trás (padrão: tudo)"),
+    layout: str = typer.Option("long", help="long (ts, side, level, price, size) | wide (top-N por linha)"),
+    top_n: Optional[int] = typer.Option(None, help="Níveis por lado (wide: padrão 10; long: todos)"),
+    fmt: Optional[str] = typer.Option(None, "--format", help="parquet|arrow (padrão: pela extensão)"),
+    capture_dir: Optional[str] = typer.Option(None, help="Exportar livros reconstruídos desta captura bruta"),
+    interval: float = typer.Option(1.0, help="Amostragem dos livros reconstruídos (segundos)"),
+    chunk_rows: int = typer.Option(100_000, help="Linhas por row group (limita a memória)"),
+    db_path: str = typer.Option(DEFAULT_HISTORY_DB, help="Banco SQLite do histórico"),
+):
+    """Exporta o histórico (SQLite ou captura bruta) para Parquet/Arrow colunar."""
+    from datetime import datetime, timezone, timedelta
+    from ..core.export import export_books, history_books, replay_books
+    from ..core.replay import ReplayEngine
+
+    if fmt is None:
+        fmt = "arrow" if output_file.endswith((".arrow", ".feather", ".ipc")) else "parquet"
+    start_time = datetime.now(timezone.utc) - timedelta(hours=hours) if hours else None
+    if capture_dir:
+        engine = ReplayEngine(capture_dir, symbol=symbol)
+        start_ns = int(start_time.timestamp() * 1e9) if start_time else None
+        books = replay_books(engine, interval, start_ns=start_ns, top_n=top_n)
+    else:
+        books = history_books(open_history(db_path), symbol, start_time=start_time)
+    try:
+        result = export_books(books, output_file, layout=layout, top_n=top_n, fmt=fmt, chunk_rows=chunk_rows)
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}")
+        raise typer.Exit(1)
+    if not result.books:
+        print(f"⚠️  Nenhum livro encontrado para {symbol}")
+    print(f"✅ {result.books} livros ({result.rows} linhas, {result.batches} row groups) "
+          f"exportados para {output_file} em {result.elapsed:.2f} s")
+
+@history_app.command("migrate")
+def history_migrate_cmd(
+    source: str = typer.Argument(DEFAULT_HISTORY_DB, help="Banco antigo (tabela orderbook_snapshots)"),
+    target: str = typer.Argument("data/orderbook_history_days.db", help="Novo banco particionado por dia"),
+    storage: str = typer.Option("delta", help="Armazenamento no destino: json | delta"),
+    keyframe_every: int = typer.Option(60, help="Modo delta: snapshots entre keyframes completos"),
+):
+    """Migra um banco de histórico para o armazenamento particionado por símbolo e dia."""
+    from ..core.partitioned_history import PartitionedHistory, migrate_history
+
+    try:
+        migrated = migrate_history(source, PartitionedHistory(target, storage, keyframe_every))
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        raise typer.Exit(1)
+    print(f"✅ {migrated} snapshots migrados para {target}")
+    if target != DEFAULT_HISTORY_DB:
+        print(f"   Use --db-path {target} na CLI e --history-backend partitioned --history-db {target} no runner")
+
+@history_app.command("rebuild-rollups")
+def history_rebuild_rollups_cmd(
+    db_path: str = typer.Option(DEFAULT_HISTORY_DB, help="Banco do histórico (tabela única ou particionado)"),
+    chunk_size: int = typer.Option(5000, help="Snapshots por commit"),
+):
+    """Recalcula os rollups de 1 s, 1 min e 1 h a partir dos snapshots gravados."""
+    if not os.path.exists(db_path):
+        print(f"❌ Banco não encontrado: {db_path}")
+        raise typer.Exit(1)
+    history = open_history(db_path)
+    rebuilt = history.rebuild_rollups(chunk_size=chunk_size)
+    history.close()
+    print(f"✅ Rollups recalculados a partir de {rebuilt} snapshots")
 
 @app.command("restore")
 def restore_cmd(
     snapshot_id: int = typer.Argument(..., help="ID do snapshot para restaurar"),
     output_file: str = typer.Option("restored_orderbook.json", help="Arquivo de saída"),
+    db_path: str = typer.Option(DEFAULT_HISTORY_DB, help="Banco do histórico (tabela única ou particionado)"),
 ):
     """Restaura um orderbook a partir de um snapshot histórico."""
-    history = OrderbookHistory()
+    history = open_history(db_path)
     book = history.restore_orderbook(snapshot_id)
     
     if not book:
@@ -240,5 +412,46 @@ def restore_cmd(
     print(f"✅ Orderbook restaurado salvo em {output_file}")
     print(f"   Níveis: {len(book.bids)} bids, {len(book.asks)} asks")
 
+@app.command("replay")
+def replay_cmd(
+    capture_dir: str = typer.Argument(..., help="Diretório com os segmentos .bdr do gravador"),
+    at: Optional[str] = typer.Option(None, help="Instante ISO-8601 (UTC se sem fuso); padrão: fim da captura"),
+    symbol: Optional[str] = typer.Option(None, help="Símbolo (obrigatório em capturas multi-símbolo)"),
+    prefix: Optional[str] = typer.Option(None, help="Prefixo dos segmentos"),
+    build_index: bool = typer.Option(False, help="(Re)gerar o índice de keyframes antes"),
+    keyframe_interval: float = typer.Option(60.0, help="Intervalo entre keyframes (segundos)"),
+    output_file: Optional[str] = typer.Option(None, help="Salvar o livro reconstruído em JSON"),
+):
+    """Reconstrói o livro a partir de uma captura bruta em qualquer instante."""
+    from datetime import datetime, timezone
+    from ..core.replay import ReplayEngine
+
+    engine = ReplayEngine(capture_dir, symbol=symbol, prefix=prefix)
+    if not engine.segments:
+        print(f"❌ Nenhum segmento encontrado em {capture_dir}")
+        return
+    if build_index:
+        count = engine.build_index(keyframe_interval)
+        print(f"🗂️  Índice gerado: {count} keyframes em {len(engine.segments)} segmentos")
+    if at:
+        when = datetime.fromisoformat(at)
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        stats = engine.seek(int(when.timestamp() * 1e9))
+    else:
+        stats = engine.seek(2**63 - 1)
+    book = engine.book(symbol)
+    if book is None:
+        print("❌ Nenhum livro reconstruído (informe --symbol em capturas multi-símbolo)")
+        return
+    speed = f", {stats.speedup:,.0f}x tempo real" if stats.speedup else ""
+    print(f"⏪ {book.symbol}: {stats.frames} frames reaplicados em {stats.elapsed * 1000:.1f} ms{speed}")
+    print(f"   Níveis: {len(book.bids)} bids, {len(book.asks)} asks | u={book.last_update_id} | "
+          f"{'consistente' if book.valid else 'INCONSISTENTE (gap sem snapshot)'}")
+    print(f"   Bid: {book.bids.best()} | Ask: {book.asks.best()}")
+    if output_file:
+        _write_json(output_file, book.snapshot().payload)
+        print(f"✅ Livro salvo em {output_file}")
+
 if __name__ == "__main__":
     app()
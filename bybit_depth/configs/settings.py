@@ -7,6 +7,7 @@ class Settings:
     market: str = os.getenv("MARKET", "linear")  # 'linear', 'inverse' ou 'spot'
     symbol: str = os.getenv("SYMBOL", "BTCUSDT")
     depth: int = int(os.getenv("DEPTH", "50"))
+    fixed_point: bool = os.getenv("FIXED_POINT", "0") == "1"  # livro em inteiros escalados por tick/lot
 
     ws_linear: str = os.getenv("WS_LINEAR", "wss://stream.bybit.com/v5/public/linear")
     ws_inverse: str = os.getenv("WS_INVERSE", "wss://stream.bybit.com/v5/public/inverse")
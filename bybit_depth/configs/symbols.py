@@ -31,6 +31,27 @@ POPULAR_SYMBOLS = [
     "MATICUSDT", "AVAXUSDT", "LINKUSDT", "UNIUSDT", "ATOMUSDT", "DOTUSDT"
 ]
 
+# Tick size (passo de preço) e lot size (passo de quantidade) por símbolo,
+# conforme /v5/market/instruments-info. Usados pelo modo de ponto fixo do OrderBook.
+INSTRUMENT_SPECS: Dict[str, Dict[str, Tuple[str, str]]] = {
+    "linear": {
+        "BTCUSDT": ("0.10", "0.001"), "ETHUSDT": ("0.01", "0.01"), "SOLUSDT": ("0.010", "0.1"),
+        "ADAUSDT": ("0.0001", "1"), "DOGEUSDT": ("0.00001", "1"), "XRPUSDT": ("0.0001", "1"),
+        "LINKUSDT": ("0.001", "0.1"), "AVAXUSDT": ("0.001", "0.1"), "DOTUSDT": ("0.001", "0.1"),
+    },
+    "inverse": {
+        "BTCUSD": ("0.50", "1"), "ETHUSD": ("0.05", "1"), "SOLUSD": ("0.010", "1"),
+        "ADAUSD": ("0.0001", "1"), "XRPUSD": ("0.0001", "1"),
+    },
+    "spot": {
+        "BTCUSDT": ("0.01", "0.000001"), "ETHUSDT": ("0.01", "0.00001"), "SOLUSDT": ("0.01", "0.001"),
+        "BTCUSDC": ("0.01", "0.000001"), "ETHUSDC": ("0.01", "0.00001"),
+    },
+}
+
+# Fallback conservador (8 casas) para símbolos sem especificação conhecida
+DEFAULT_INSTRUMENT_SPEC: Tuple[str, str] = ("0.00000001", "0.00000001")
+
 # Configurações de profundidade por tipo de mercado
 DEPTH_OPTIONS = {
     "linear": [10, 25, 50, 100, 200],
@@ -62,3 +83,7 @@ def get_depth_options(market: str) -> List[int]:
 def get_refresh_options() -> List[Tuple[int, str]]:
     """Retorna opções de refresh rate."""
     return REFRESH_OPTIONS
+
+def get_instrument_spec(symbol: str, market: str) -> Tuple[str, str]:
+    """Retorna (tick_size, lot_size) do símbolo, ou o fallback de 8 casas."""
+    return INSTRUMENT_SPECS.get(market.lower(), {}).get(symbol, DEFAULT_INSTRUMENT_SPEC)
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from decimal import Decimal
-from typing import List, Tuple, Dict, Optional
+from typing import List, Tuple, Dict, Optional, Sequence
 from statistics import mean, pstdev
 
 from .orderbook import OrderBook
@@ -31,12 +31,16 @@ def detect_walls(book: OrderBook, side: str = "ask", std_k: float = 2.5, min_abs
     return walls
 
 def band_liquidity(book: OrderBook, pct: float = 0.1) -> Optional[Dict[str, float]]:
-    mid = book.mid()
-    if mid is None:
+    band = book.liquidity_within(pct)
+    if band is None:
         return None
-    lower = mid * (Decimal(1) - Decimal(pct)/Decimal(100))
-    upper = mid * (Decimal(1) + Decimal(pct)/Decimal(100))
+    return {k: float(v) for k, v in band.items()}
 
-    bid_sum = sum(q for p, q in book.top_levels("bid", 9999) if p >= lower)
-    ask_sum = sum(q for p, q in book.top_levels("ask", 9999) if p <= upper)
-    return {"lower": float(lower), "upper": float(upper), "bids": float(bid_sum), "asks": float(ask_sum)}
+def multi_band_liquidity(book: OrderBook, pcts: Sequence[float] = (0.1, 0.5, 1.0, 2.0)) -> Dict[float, Dict[str, float]]:
+    """Liquidez em várias bandas ao redor do mid; cada banda custa O(log n) por lado."""
+    out: Dict[float, Dict[str, float]] = {}
+    for pct in pcts:
+        band = band_liquidity(book, pct)
+        if band is not None:
+            out[pct] = band
+    return out
@@ -0,0 +1,169 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_left
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from .orderbook import _decimals_of, _scaled_int
+
+log = logging.getLogger("compact_book")
+
+class CompactOrderBook:
+    """
+    Variante compacta do OrderBook para acompanhar centenas de símbolos em um
+    único processo.
+
+    Usa ``__slots__`` e arrays paralelos ``array('q')`` de preço/quantidade em
+    ponto fixo (ticks/lots), em vez de um objeto por nível. Os dois lados ficam
+    em ordem crescente com o melhor nível no final (asks armazenados com preço
+    negado), de modo que a maior parte das inserções e remoções acontece perto
+    do fim do array. Consultas devolvem ``Decimal`` como o ``OrderBook``.
+    """
+
+    __slots__ = (
+        "symbol", "market_type", "last_update_id",
+        "price_decimals", "size_decimals", "_price_unit", "_size_unit",
+        "_bid_px", "_bid_sz", "_ask_px", "_ask_sz",
+        "_sequence_errors", "_invalid_levels", "_total_updates",
+    )
+
+    def __init__(self, tick_size, lot_size, symbol: Optional[str] = None, market_type: Optional[str] = None) -> None:
+        self.symbol = symbol
+        self.market_type = market_type
+        self.last_update_id: Optional[int] = None
+        self.price_decimals = _decimals_of(tick_size)
+        self.size_decimals = _decimals_of(lot_size)
+        self._price_unit = Decimal(1).scaleb(-self.price_decimals)
+        self._size_unit = Decimal(1).scaleb(-self.size_decimals)
+        self._bid_px = array("q")
+        self._bid_sz = array("q")
+        self._ask_px = array("q")   # preços negados
+        self._ask_sz = array("q")
+        self._sequence_errors = 0
+        self._invalid_levels = 0
+        self._total_updates = 0
+
+    # ----------------- Aplicação de eventos -----------------
+    def _load(self, levels: List[List[str]], negate: bool) -> Tuple[array, array]:
+        sign = -1 if negate else 1
+        pairs = []
+        for p, s in levels:
+            q = _scaled_int(s, self.size_decimals)
+            if q <= 0:
+                self._invalid_levels += 1
+                continue
+            pairs.append((sign * _scaled_int(p, self.price_decimals), q))
+        pairs.sort()
+        return array("q", [p for p, _ in pairs]), array("q", [q for _, q in pairs])
+
+    def _upsert(self, px: array, sz: array, levels: List[List[str]], negate: bool) -> None:
+        sign = -1 if negate else 1
+        for p, s in levels:
+            key = sign * _scaled_int(p, self.price_decimals)
+            q = _scaled_int(s, self.size_decimals)
+            i = bisect_left(px, key)
+            found = i < len(px) and px[i] == key
+            if q > 0:
+                if found:
+                    sz[i] = q
+                else:
+                    px.insert(i, key)
+                    sz.insert(i, q)
+                continue
+            if q < 0:
+                self._invalid_levels += 1
+            if found:
+                del px[i]
+                del sz[i]
+
+    def apply_snapshot(self, bids: List[List[str]], asks: List[List[str]], update_id: Optional[int] = None) -> None:
+        """Aplica um snapshot completo do orderbook."""
+        self._bid_px, self._bid_sz = self._load(bids, negate=False)
+        self._ask_px, self._ask_sz = self._load(asks, negate=True)
+        self.last_update_id = update_id
+        self._total_updates += 1
+
+    def apply_delta(self, bids: List[List[str]], asks: List[List[str]], update_id: Optional[int] = None) -> bool:
+        """
+        Aplica um delta ao orderbook.
+
+        Returns:
+            bool: True se o delta foi aplicado com sucesso, False se houve erro de sequência
+        """
+        if update_id is not None and self.last_update_id is not None and update_id <= self.last_update_id:
+            self._sequence_errors += 1
+            log.warning(f"Erro de sequência: update_id={update_id} <= last_update_id={self.last_update_id}")
+            return False
+        self._upsert(self._bid_px, self._bid_sz, bids, negate=False)
+        self._upsert(self._ask_px, self._ask_sz, asks, negate=True)
+        self.last_update_id = update_id
+        self._total_updates += 1
+        return True
+
+    # ----------------- Consultas -----------------
+    def _price(self, raw: int) -> Decimal:
+        return Decimal(raw) * self._price_unit
+
+    def _size(self, raw: int) -> Decimal:
+        return Decimal(raw) * self._size_unit
+
+    def best_bid(self) -> Optional[Decimal]:
+        return self._price(self._bid_px[-1]) if self._bid_px else None
+
+    def best_ask(self) -> Optional[Decimal]:
+        return self._price(-self._ask_px[-1]) if self._ask_px else None
+
+    def mid(self) -> Optional[Decimal]:
+        if not self._bid_px or not self._ask_px:
+            return None
+        return self._price(self._bid_px[-1] - self._ask_px[-1]) / 2
+
+    def top_levels(self, side: str, n: int = 10) -> List[Tuple[Decimal, Decimal]]:
+        if n <= 0:
+            return []
+        if side == "bid":
+            px, sz, sign = self._bid_px, self._bid_sz, 1
+        else:
+            px, sz, sign = self._ask_px, self._ask_sz, -1
+        start = max(0, len(px) - n)
+        return [(self._price(sign * px[i]), self._size(sz[i])) for i in range(len(px) - 1, start - 1, -1)]
+
+    def levels(self, side: str) -> List[Tuple[Decimal, Decimal]]:
+        """Todos os níveis do lado, a partir do topo do livro."""
+        return self.top_levels(side, len(self._bid_px if side == "bid" else self._ask_px))
+
+    def size_at(self, price: Decimal) -> Tuple[Decimal, Optional[str]]:
+        key = _scaled_int(str(price), self.price_decimals)
+        for px, sz, sign, side in ((self._bid_px, self._bid_sz, 1, "bid"), (self._ask_px, self._ask_sz, -1, "ask")):
+            i = bisect_left(px, sign * key)
+            if i < len(px) and px[i] == sign * key:
+                return self._size(sz[i]), side
+        return Decimal(0), None
+
+    def __len__(self) -> int:
+        return len(self._bid_px) + len(self._ask_px)
+
+    def get_stats(self) -> Dict[str, any]:
+        """Retorna estatísticas do orderbook (mesmas chaves principais do OrderBook)."""
+        bb = self.best_bid()
+        ba = self.best_ask()
+        mid = self.mid()
+        spread = float(ba - bb) if bb is not None and ba is not None else None
+        return {
+            "symbol": self.symbol,
+            "market_type": self.market_type,
+            "best_bid": float(bb) if bb else None,
+            "best_ask": float(ba) if ba else None,
+            "mid_price": float(mid) if mid else None,
+            "spread": spread,
+            "spread_pct": (spread / float(mid)) * 100 if spread is not None and mid else None,
+            "bid_levels": len(self._bid_px),
+            "ask_levels": len(self._ask_px),
+            "total_levels": len(self),
+            "last_update_id": self.last_update_id,
+            "total_updates": self._total_updates,
+            "sequence_errors": self._sequence_errors,
+            "invalid_levels": self._invalid_levels,
+            "error_rate": (self._sequence_errors / max(1, self._total_updates)) * 100,
+        }
@@ -0,0 +1,120 @@
+from __future__ import annotations
+import json
+import logging
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from .models import WSOrderbookMessage
+
+log = logging.getLogger("decoder")
+
+try:  # decoders opcionais, do mais rápido para o mais lento
+    import msgspec
+except ImportError:  # pragma: no cover - depende do ambiente
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+class Frame(NamedTuple):
+    """Mensagem de orderbook decodificada, já no formato consumido pelo OrderBook."""
+    topic: Optional[str]
+    type: Optional[str]
+    ts: Optional[int]
+    cts: Optional[int]
+    symbol: Optional[str]
+    update_id: Optional[int]
+    bids: List[List[str]]
+    asks: List[List[str]]
+    # ``u`` anterior ao primeiro delta de um frame conflacionado (ver core/ingest.py); None nos da bolsa
+    prev_update_id: Optional[int] = None
+
+Decoder = Callable[[object], Optional[Frame]]
+
+# ----------------- Caminho rápido (sem validação) -----------------
+def _from_dict(obj) -> Optional[Frame]:
+    data = obj.get("data") if isinstance(obj, dict) else None
+    if not isinstance(data, dict):
+        return None  # respostas de subscribe/pong e afins
+    return Frame(
+        obj.get("topic"),
+        obj.get("type"),
+        obj.get("ts"),
+        obj.get("cts"),
+        data.get("s"),
+        data.get("u"),
+        data.get("b") or [],
+        data.get("a") or [],
+        data.get("pu"),
+    )
+
+def decode_json(raw) -> Optional[Frame]:
+    """Decoder da stdlib (fallback quando orjson/msgspec não estão instalados)."""
+    return _from_dict(json.loads(raw))
+
+if orjson is not None:
+    def decode_orjson(raw) -> Optional[Frame]:
+        return _from_dict(orjson.loads(raw))
+else:
+    decode_orjson = None
+
+if msgspec is not None:
+    class _MsData(msgspec.Struct):
+        s: Optional[str] = None
+        b: List[List[str]] = []
+        a: List[List[str]] = []
+        u: Optional[int] = None
+        pu: Optional[int] = None
+
+    class _MsMessage(msgspec.Struct):
+        topic: Optional[str] = None
+        type: Optional[str] = None
+        ts: Optional[int] = None
+        cts: Optional[int] = None
+        data: Optional[_MsData] = None
+
+    _ms_decoder = msgspec.json.Decoder(_MsMessage)
+
+    def decode_msgspec(raw) -> Optional[Frame]:
+        msg = _ms_decoder.decode(raw)
+        data = msg.data
+        if data is None:
+            return None
+        return Frame(msg.topic, msg.type, msg.ts, msg.cts, data.s, data.u, data.b, data.a, data.pu)
+else:
+    decode_msgspec = None
+
+# ----------------- Modo estrito (pydantic) -----------------
+def decode_pydantic(raw) -> Optional[Frame]:
+    """Validação completa via ``WSOrderbookMessage`` (opt-in)."""
+    msg = WSOrderbookMessage.model_validate_json(raw)
+    if not msg.data:
+        return None
+    # ``cts`` não faz parte do modelo pydantic
+    d = msg.data
+    return Frame(msg.topic, msg.type, msg.ts, None, d.s, d.u, d.b or [], d.a or [], d.pu)
+
+DECODERS: Dict[str, Optional[Decoder]] = {
+    "msgspec": decode_msgspec,
+    "orjson": decode_orjson,
+    "json": decode_json,
+    "pydantic": decode_pydantic,
+}
+
+def available_decoders() -> List[str]:
+    return [name for name, fn in DECODERS.items() if fn is not None]
+
+def get_decoder(name: str = "fast") -> Decoder:
+    """
+    Retorna o decoder pelo nome: ``"fast"`` (o mais rápido instalado entre
+    msgspec, orjson e json), ``"strict"`` (pydantic) ou um nome explícito.
+    """
+    if name == "fast":
+        return next(fn for fn in (decode_msgspec, decode_orjson, decode_json) if fn is not None)
+    if name == "strict":
+        return decode_pydantic
+    fn = DECODERS.get(name)
+    if fn is None:
+        raise ValueError(f"Decoder indisponível: {name} (disponíveis: {', '.join(available_decoders())})")
+    return fn
@@ -0,0 +1,174 @@
+from __future__ import annotations
+from bisect import bisect_left, bisect_right, insort
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+class DepthIndex:
+    """
+    Índice de somas de prefixo (Fenwick tree) sobre os níveis de um lado do livro.
+
+    Os slots seguem a ordem crescente de preço (na representação interna do
+    codec). Há dois layouts:
+
+    * denso (ponto fixo): um slot por tick entre ``base`` e ``base + len``,
+      com folga nas pontas; níveis novos dentro da grade não exigem rebuild;
+    * esparso (Decimal): um slot por preço conhecido; níveis removidos mantêm
+      o slot com quantidade zero. Preços inéditos entram numa lista ordenada
+      de pendentes (somada à parte nas consultas) e são incorporados à árvore
+      quando ela passa de ~sqrt(n) itens: a compressão de coordenadas é
+      refeita em O(n) a cada O(sqrt(n)) preços novos, descartando os slots
+      zerados, em vez de a cada preço novo.
+
+    O índice é construído sob demanda na primeira consulta e, a partir daí,
+    atualizado ponto a ponto em O(log n) pelo ``BookSide``. Quando invalidado
+    (``clear`` ou, no layout denso, preço fora da grade), é reconstruído (O(n))
+    uma única vez na próxima consulta.
+    """
+
+    __slots__ = ("dense", "headroom", "max_slots", "min_pending", "valid", "_zero", "_sparse", "_tree", "_keys",
+                 "_pos", "_pending_keys", "_pending", "_base", "_total")
+
+    def __init__(self, dense: bool = False, headroom: int = 256, max_slots: int = 1 << 18, min_pending: int = 64) -> None:
+        self.dense = dense
+        self.headroom = headroom
+        self.max_slots = max_slots
+        self.min_pending = min_pending
+        self.valid = False
+        self._zero = 0 if dense else Decimal(0)
+        self._sparse = not dense
+        self._tree: List = []
+        self._keys: List = []          # layout esparso
+        self._pos: Dict = {}           # layout esparso
+        self._pending_keys: List = []  # layout esparso: preços inéditos ainda fora da árvore
+        self._pending: Dict = {}
+        self._base: int = 0            # layout denso
+        self._total = self._zero
+
+    def invalidate(self) -> None:
+        self.valid = False
+
+    # ----------------- Construção -----------------
+    def rebuild(self, levels) -> None:
+        """Reconstrói o índice a partir de um ``SortedDict`` preço -> quantidade."""
+        zero = self._zero
+        dense = self.dense
+        if dense and levels:
+            lo, hi = levels.keys()[0], levels.keys()[-1]
+            span = hi - lo + 1 + 2 * self.headroom
+            dense = span <= self.max_slots
+        if dense:
+            self._base = (levels.keys()[0] - self.headroom) if levels else 0
+            size = (levels.keys()[-1] - self._base + 1 + self.headroom) if levels else 0
+            values = [zero] * size
+            for k, q in levels.items():
+                values[k - self._base] = q
+            self._keys, self._pos = [], {}
+        else:
+            self._keys = list(levels.keys())
+            self._pos = {k: i for i, k in enumerate(self._keys)}
+            values = list(levels.values())
+        self._build(values, sparse=not dense)
+
+    def _build(self, values: List, sparse: bool) -> None:
+        zero = self._zero
+        self._sparse = sparse
+        self._pending_keys, self._pending = [], {}
+        n = len(values)
+        tree = [zero] + values
+        for i in range(1, n + 1):
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        self._tree = tree
+        self._total = sum(values, zero)
+        self.valid = True
+
+    # ----------------- Atualização -----------------
+    def _slot(self, key) -> Optional[int]:
+        if self._sparse:
+            return self._pos.get(key)
+        slot = key - self._base
+        return slot if 0 <= slot < len(self._tree) - 1 else None
+
+    def add(self, key, delta) -> None:
+        """Soma ``delta`` à quantidade do nível ``key`` (O(log n); preço inédito: O(sqrt n) amortizado)."""
+        slot = self._slot(key)
+        if slot is None:
+            if not self._sparse:
+                self.valid = False
+                return
+            pending = self._pending
+            if key in pending:
+                pending[key] += delta
+            else:
+                insort(self._pending_keys, key)
+                pending[key] = delta
+            self._total += delta
+            if len(pending) > max(self.min_pending, int(len(self._keys) ** 0.5)):
+                self._merge_pending()
+            return
+        tree = self._tree
+        n = len(tree) - 1
+        i = slot + 1
+        while i <= n:
+            tree[i] += delta
+            i += i & -i
+        self._total += delta
+
+    def _merge_pending(self) -> None:
+        """Refaz a compressão de coordenadas com os preços pendentes, descartando slots zerados."""
+        tree = self._tree
+        n = len(tree) - 1
+        values = tree[1:]
+        # Inverso da construção: recupera as quantidades de cada slot em O(n)
+        for i in range(n, 0, -1):
+            j = i + (i & -i)
+            if j <= n:
+                values[j - 1] -= values[i - 1]
+        zero = self._zero
+        merged = sorted(
+            [(k, q) for k, q in zip(self._keys, values) if q != zero]
+            + [(k, q) for k, q in self._pending.items() if q != zero]
+        )
+        self._keys = [k for k, _ in merged]
+        self._pos = {k: i for i, k in enumerate(self._keys)}
+        self._build([q for _, q in merged], sparse=True)
+
+    # ----------------- Consultas -----------------
+    def _prefix(self, count: int):
+        """Soma dos ``count`` primeiros slots."""
+        tree = self._tree
+        s = self._zero
+        i = min(max(count, 0), len(tree) - 1)
+        while i > 0:
+            s += tree[i]
+            i -= i & -i
+        return s
+
+    def _count_below(self, key, inclusive: bool) -> int:
+        """Número de slots com preço < key (ou <= key se ``inclusive``)."""
+        if self._sparse:
+            return (bisect_right if inclusive else bisect_left)(self._keys, key)
+        return key - self._base + (1 if inclusive else 0)
+
+    def _pending_below(self, key, inclusive: bool):
+        """Soma dos preços pendentes < key (ou <= key se ``inclusive``)."""
+        keys = self._pending_keys
+        if not keys:
+            return self._zero
+        pending = self._pending
+        end = (bisect_right if inclusive else bisect_left)(keys, key)
+        return sum((pending[k] for k in keys[:end]), self._zero)
+
+    def sum_at_or_below(self, key):
+        """Quantidade total em níveis com preço <= ``key``."""
+        return self._prefix(self._count_below(key, inclusive=True)) + self._pending_below(key, inclusive=True)
+
+    def sum_at_or_above(self, key):
+        """Quantidade total em níveis com preço >= ``key``."""
+        return (self._total - self._prefix(self._count_below(key, inclusive=False))
+                - self._pending_below(key, inclusive=False))
+
+    @property
+    def total(self):
+        return self._total
@@ -0,0 +1,168 @@
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Callable, Iterable, Optional, Tuple
+
+log = logging.getLogger("events")
+
+# Tipos de mudança, em ordem crescente de prioridade na coalescência
+LEVELS = "levels"        # nível alterado dentro do top N
+TOP = "top"              # melhor bid/ask (preço ou quantidade) mudou
+SNAPSHOT = "snapshot"    # novo snapshot aplicado
+ALL_KINDS: Tuple[str, ...] = (LEVELS, TOP, SNAPSHOT)
+_PRIORITY = {LEVELS: 0, TOP: 1, SNAPSHOT: 2}
+
+Level = Tuple[str, str]
+
+@dataclass(frozen=True)
+class BookChange:
+    """Registro compacto de uma mudança no livro entregue aos assinantes."""
+    kind: str
+    symbol: Optional[str]
+    version: int
+    update_id: Optional[int]
+    best_bid: Optional[Decimal]
+    best_ask: Optional[Decimal]
+    bids: Tuple[Level, ...] = ()     # níveis (preço, quantidade) alterados dentro do top N
+    asks: Tuple[Level, ...] = ()
+    coalesced: int = 1               # quantas mudanças este registro representa
+    ts: float = field(default_factory=time.monotonic)
+
+    def merge(self, newer: BookChange) -> BookChange:
+        """Combina com uma mudança mais nova (último valor vence por preço)."""
+        kind = self.kind if _PRIORITY[self.kind] > _PRIORITY[newer.kind] else newer.kind
+        bids = dict(self.bids)
+        bids.update(newer.bids)
+        asks = dict(self.asks)
+        asks.update(newer.asks)
+        return BookChange(
+            kind=kind,
+            symbol=newer.symbol,
+            version=newer.version,
+            update_id=newer.update_id,
+            best_bid=newer.best_bid,
+            best_ask=newer.best_ask,
+            bids=tuple(bids.items()),
+            asks=tuple(asks.items()),
+            coalesced=self.coalesced + newer.coalesced,
+            ts=newer.ts,
+        )
+
+class Subscription:
+    """
+    Assinatura de mudanças de um ``OrderBook``.
+
+    Com ``min_interval`` > 0 as entregas são limitadas (throttle): mudanças que
+    chegam dentro do intervalo são coalescidas em um único registro pendente,
+    entregue assim que o intervalo vence (``loop.call_later`` no loop asyncio
+    que aplica os updates), na próxima mudança ou em :meth:`flush`. Fora de
+    um loop não há timer: chame :meth:`flush` para entregar o último estado.
+    """
+
+    def __init__(
+        self,
+        book,
+        callback: Callable[[BookChange], None],
+        kinds: Iterable[str] = ALL_KINDS,
+        top_n: int = 10,
+        min_interval: float = 0.0,
+    ) -> None:
+        self.book = book
+        self.callback = callback
+        self.kinds = frozenset(kinds)
+        unknown = self.kinds - set(ALL_KINDS)
+        if unknown:
+            raise ValueError(f"Tipos de mudança desconhecidos: {sorted(unknown)}")
+        self.top_n = top_n
+        self.min_interval = min_interval
+        self.delivered = 0
+        self._pending: Optional[BookChange] = None
+        self._last_delivery = float("-inf")
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def offer(self, change: BookChange) -> None:
+        if self._pending is not None:
+            change = self._pending.merge(change)
+            self._pending = None
+        if self.min_interval and change.ts - self._last_delivery < self.min_interval:
+            self._pending = change
+            self._schedule_flush()
+            return
+        self._deliver(change)
+
+    def _schedule_flush(self) -> None:
+        """Agenda a entrega do pendente para ``_last_delivery + min_interval``."""
+        if self._timer is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        delay = max(0.0, self._last_delivery + self.min_interval - time.monotonic())
+        self._timer = loop.call_later(delay, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self.flush()
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def flush(self) -> None:
+        """Entrega imediatamente a mudança pendente (se houver)."""
+        if self._pending is not None:
+            change, self._pending = self._pending, None
+            self._deliver(change)
+
+    @property
+    def pending(self) -> Optional[BookChange]:
+        return self._pending
+
+    def _deliver(self, change: BookChange) -> None:
+        self._cancel_timer()
+        # Entrega atrasada (timer/flush) conta a partir de agora, não do ts da mudança
+        self._last_delivery = max(change.ts, time.monotonic())
+        self.delivered += 1
+        try:
+            self.callback(change)
+        except Exception as e:  # noqa: BLE001
+            log.exception(f"Erro no assinante de mudanças do livro: {e}")
+
+    def close(self) -> None:
+        self._cancel_timer()
+        self.book.unsubscribe(self)
+
+class ChangeWaiter:
+    """
+    Adapta uma assinatura para consumidores asyncio: :meth:`wait` retorna a
+    próxima mudança, coalescendo tudo o que chegou desde a última espera.
+    Deve ser usado no mesmo loop/thread que aplica os updates no livro.
+    """
+
+    def __init__(self, book, kinds: Iterable[str] = ALL_KINDS, top_n: int = 10) -> None:
+        self._event = asyncio.Event()
+        self._latest: Optional[BookChange] = None
+        self.subscription = book.subscribe(self._on_change, kinds=kinds, top_n=top_n)
+
+    def _on_change(self, change: BookChange) -> None:
+        self._latest = change if self._latest is None else self._latest.merge(change)
+        self._event.set()
+
+    async def wait(self, timeout: Optional[float] = None) -> Optional[BookChange]:
+        """Aguarda a próxima mudança; retorna None se ``timeout`` expirar."""
+        if self._latest is None:
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+        change, self._latest = self._latest, None
+        self._event.clear()
+        return change
+
+    def close(self) -> None:
+        self.subscription.close()
@@ -0,0 +1,203 @@
+from __future__ import annotations
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .history import OrderbookHistory
+from .orderbook import OrderBook
+from .replay import ReplayEngine
+
+log = logging.getLogger("export")
+
+try:  # dependência opcional: só a exportação colunar precisa dela
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depende do ambiente
+    pa = None
+    pq = None
+
+LAYOUTS = ("long", "wide")
+FORMATS = ("parquet", "arrow")
+
+# Livro a exportar: (ts em ns UTC, símbolo, bids, asks), níveis do topo para fora
+BookRow = Tuple[int, str, Sequence[Sequence], Sequence[Sequence]]
+
+@dataclass
+class ExportStats:
+    books: int = 0
+    rows: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("Exportação colunar requer pyarrow (pip install pyarrow)")
+
+def long_schema():
+    _require_pyarrow()
+    return pa.schema([
+        ("ts", pa.timestamp("ns", tz="UTC")),
+        ("symbol", pa.dictionary(pa.int32(), pa.string())),
+        ("side", pa.dictionary(pa.int8(), pa.string())),
+        ("level", pa.int16()),
+        ("price", pa.float64()),
+        ("size", pa.float64()),
+    ])
+
+def wide_schema(top_n: int):
+    """``bid_px_0 .. bid_px_{N-1}``, ``bid_sz_*``, ``ask_px_*``, ``ask_sz_*`` (nulos se o livro for mais raso)."""
+    _require_pyarrow()
+    fields = [("ts", pa.timestamp("ns", tz="UTC")), ("symbol", pa.dictionary(pa.int32(), pa.string()))]
+    for side in ("bid", "ask"):
+        for kind in ("px", "sz"):
+            fields += [(f"{side}_{kind}_{i}", pa.float64()) for i in range(top_n)]
+    return pa.schema(fields)
+
+class _ChunkWriter:
+    """Acumula colunas em listas Python e grava um row group a cada ``chunk_rows`` linhas."""
+
+    def __init__(self, path, schema, fmt: str, chunk_rows: int, compression: Optional[str]) -> None:
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato desconhecido: {fmt} (use {', '.join(FORMATS)})")
+        self.schema = schema
+        self.chunk_rows = chunk_rows
+        self.columns: List[list] = [[] for _ in schema.names]
+        self.rows = 0
+        self.batches = 0
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(str(path), schema, compression=compression or "none")
+            self._write = self._writer.write_batch
+        else:
+            self._sink = pa.OSFile(str(path), "wb")
+            options = pa.ipc.IpcWriteOptions(compression=compression) if compression else None
+            self._writer = pa.ipc.new_file(self._sink, schema, options=options)
+            self._write = self._writer.write_batch
+
+    def pending(self) -> int:
+        return len(self.columns[0])
+
+    def flush(self) -> None:
+        if not self.pending():
+            return
+        batch = pa.record_batch(
+            [pa.array(col, type=field.type) for col, field in zip(self.columns, self.schema)],
+            schema=self.schema,
+        )
+        self._write(batch)
+        self.rows += batch.num_rows
+        self.batches += 1
+        for col in self.columns:
+            col.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.close()
+        if getattr(self, "_sink", None) is not None:
+            self._sink.close()
+
+def export_books(
+    books: Iterable[BookRow],
+    path,
+    layout: str = "long",
+    top_n: Optional[int] = None,
+    fmt: str = "parquet",
+    chunk_rows: int = 100_000,
+    compression: Optional[str] = "zstd",
+) -> ExportStats:
+    """
+    Grava livros em formato colunar, em row groups de até ~``chunk_rows``
+    linhas: a memória fica limitada ao chunk, não ao período exportado.
+
+    - ``long``: uma linha por nível ``(ts, symbol, side, level, price, size)``;
+      ``top_n`` limita os níveis por lado (padrão: todos).
+    - ``wide``: uma linha por livro com os ``top_n`` (padrão 10) melhores níveis.
+    """
+    _require_pyarrow()
+    if layout not in LAYOUTS:
+        raise ValueError(f"Layout desconhecido: {layout} (use {', '.join(LAYOUTS)})")
+    if layout == "wide":
+        top_n = top_n or 10
+    schema = long_schema() if layout == "long" else wide_schema(top_n)
+    if fmt == "arrow" and compression not in (None, "zstd", "lz4"):
+        compression = "zstd"
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    writer = _ChunkWriter(path, schema, fmt, chunk_rows, compression)
+    stats = ExportStats()
+    t0 = time.perf_counter()
+    try:
+        if layout == "long":
+            ts_col, sym_col, side_col, lvl_col, px_col, sz_col = writer.columns
+            for ts_ns, symbol, bids, asks in books:
+                for side, levels in (("bid", bids), ("ask", asks)):
+                    if top_n is not None:
+                        levels = levels[:top_n]
+                    n = len(levels)
+                    ts_col.extend([ts_ns] * n)
+                    sym_col.extend([symbol] * n)
+                    side_col.extend([side] * n)
+                    lvl_col.extend(range(n))
+                    px_col.extend([float(p) for p, _ in levels])
+                    sz_col.extend([float(q) for _, q in levels])
+                stats.books += 1
+                if writer.pending() >= chunk_rows:
+                    writer.flush()
+        else:
+            ts_col, sym_col, *level_cols = writer.columns
+            bid_px, bid_sz = level_cols[:top_n], level_cols[top_n:2 * top_n]
+            ask_px, ask_sz = level_cols[2 * top_n:3 * top_n], level_cols[3 * top_n:]
+            for ts_ns, symbol, bids, asks in books:
+                ts_col.append(ts_ns)
+                sym_col.append(symbol)
+                for levels, px_cols, sz_cols in ((bids, bid_px, bid_sz), (asks, ask_px, ask_sz)):
+                    n = min(len(levels), top_n)
+                    for i in range(n):
+                        p, q = levels[i]
+                        px_cols[i].append(float(p))
+                        sz_cols[i].append(float(q))
+                    for i in range(n, top_n):
+                        px_cols[i].append(None)
+                        sz_cols[i].append(None)
+                stats.books += 1
+                if writer.pending() >= chunk_rows:
+                    writer.flush()
+    finally:
+        writer.close()
+    stats.rows, stats.batches = writer.rows, writer.batches
+    stats.elapsed = time.perf_counter() - t0
+    log.info(f"Exportados {stats.books} livros ({stats.rows} linhas, {stats.batches} row groups) "
+             f"para {path} em {stats.elapsed:.2f} s")
+    return stats
+
+# ----------------- Fontes -----------------
+def history_books(
+    history: OrderbookHistory,
+    symbol: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    chunk_size: int = 1000,
+) -> Iterator[BookRow]:
+    """
+    Snapshots do SQLite em ordem cronológica, lidos em chunks (sem carregar o
+    período inteiro na memória), nos dois modos de armazenamento.
+    """
+    for ts_ms, bids, asks in history.iter_books(symbol, start_time, end_time, chunk_size):
+        yield ts_ms * 1_000_000, symbol, bids, asks
+
+def replay_books(
+    engine: ReplayEngine,
+    interval: float = 1.0,
+    start_ns: Optional[int] = None,
+    end_ns: Optional[int] = None,
+    top_n: Optional[int] = None,
+) -> Iterator[BookRow]:
+    """Livros reconstruídos de uma captura bruta, amostrados a cada ``interval`` s."""
+    for ts_ns, books in engine.sample(interval, start_ns, end_ns):
+        for symbol, book in books.items():
+            yield ts_ns, symbol, _levels(book, "bid", top_n), _levels(book, "ask", top_n)
+
+def _levels(book: OrderBook, side: str, top_n: Optional[int]):
+    book_side = book.bids if side == "bid" else book.asks
+    return book_side.top(top_n) if top_n else book_side.levels()
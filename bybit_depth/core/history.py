@@ -2,22 +2,128 @@ from __future__ import annotations
 import json
 import os
 import sqlite3
-from datetime import datetime, timezone
+import struct
+import zlib
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 import logging
+import threading
+import time
 
-from .orderbook import OrderBook
+from .history_cache import HistoryCache, copy_result
+from .orderbook import BookSnapshot, OrderBook
+from .rollups import (
+    RESOLUTIONS, create_rollup_tables, delete_rollups_before, pick_resolution,
+    query_rollups, rollup_series, snapshot_metrics, update_rollups,
+)
 
 log = logging.getLogger("history")
 
+# ----------------- Armazenamento keyframe + diff -----------------
+# Modo "json": o livro completo em JSON no snapshot_data (formato original).
+# Modo "delta": a cada ``keyframe_every`` snapshots um keyframe com o livro
+# completo; entre eles só os níveis alterados em relação ao snapshot anterior.
+# Ambos vão em book_blob (snapshot_data fica vazio) e a cadeia é ligada por
+# keyframe_id (NULL no próprio keyframe).
+STORAGE_MODES = ("json", "delta")
+
+# book_blob: <B flags | corpo (zlib se FLAG_ZLIB)
+# corpo:     <qII (ts em ms, nº de bids, nº de asks) + níveis "preço quantidade" em ASCII separados por "\n"
+FLAG_ZLIB = 1
+FLAG_KEYFRAME = 2
+_BLOB_HEADER = struct.Struct("<qII")
+
+Levels = List[List[str]]
+
+STAT_COLUMNS = (
+    "best_bid", "best_ask", "mid_price", "spread", "spread_pct",
+    "bid_levels", "ask_levels", "total_updates", "sequence_errors", "error_rate",
+)
+# Colunas aceitas por ``iter_snapshots``; "bids"/"asks" são os níveis decodificados
+SNAPSHOT_COLUMNS = ("id", "ts_ms", "timestamp", "symbol", "market_type") + STAT_COLUMNS + ("bids", "asks")
+
+def encode_levels(ts_ms: int, bids: Levels, asks: Levels, keyframe: bool) -> bytes:
+    """Serializa níveis ``[preço, quantidade]`` (quantidade "0" remove o nível num diff)."""
+    text = "\n".join([f"{p} {q}" for p, q in bids] + [f"{p} {q}" for p, q in asks])
+    body = _BLOB_HEADER.pack(ts_ms, len(bids), len(asks)) + text.encode("ascii")
+    flags = FLAG_KEYFRAME if keyframe else 0
+    compressed = zlib.compress(body, 6)
+    if len(compressed) < len(body):
+        return bytes((flags | FLAG_ZLIB,)) + compressed
+    return bytes((flags,)) + body
+
+def decode_levels(blob: bytes) -> Tuple[int, Levels, Levels, bool]:
+    """Inverso de ``encode_levels``: ``(ts_ms, bids, asks, é_keyframe)``."""
+    flags = blob[0]
+    body = zlib.decompress(blob[1:]) if flags & FLAG_ZLIB else blob[1:]
+    ts_ms, n_bids, _ = _BLOB_HEADER.unpack_from(body)
+    text = body[_BLOB_HEADER.size:].decode("ascii")
+    levels = [line.split(" ") for line in text.split("\n")] if text else []
+    return ts_ms, levels[:n_bids], levels[n_bids:], bool(flags & FLAG_KEYFRAME)
+
+def _merge_levels(side: Dict[str, str], levels: Levels) -> None:
+    for p, q in levels:
+        if q == "0":
+            side.pop(p, None)
+        else:
+            side[p] = q
+
+def _sorted_levels(side: Dict[str, str], descending: bool) -> Levels:
+    return [[p, q] for p, q in sorted(side.items(), key=lambda kv: float(kv[0]), reverse=descending)]
+
+def _diff_side(prev: Dict[str, str], cur: Dict[str, str]) -> Levels:
+    changed = [[p, q] for p, q in cur.items() if prev.get(p) != q]
+    changed += [[p, "0"] for p in prev if p not in cur]
+    return changed
+
+# Banco padrão do runner e da CLI (os dois backends usam o mesmo caminho)
+DEFAULT_HISTORY_DB = "data/orderbook_history.db"
+
 class OrderbookHistory:
-    """Gerencia persistência histórica do orderbook."""
+    """
+    Gerencia persistência histórica do orderbook.
+
+    ``storage="delta"`` grava um keyframe completo a cada ``keyframe_every``
+    snapshots do símbolo e, entre eles, só os níveis que mudaram desde o
+    snapshot anterior (ver ``encode_levels``). A leitura é transparente:
+    ``restore_orderbook`` e ``iter_books`` reconstroem a partir do keyframe.
+
+    Cada gravação também atualiza os rollups de 1 s, 1 min e 1 h
+    (``core.rollups``); ``get_statistics`` lê só deles, então o custo não
+    cresce com a retenção.
+
+    Livros restaurados e resultados de consultas ficam num LRU de até
+    ``cache_bytes`` (``HistoryCache``; 0 desliga). Antes de cada consulta o
+    ``PRAGMA data_version`` diz se alguém gravou no banco (esta instância,
+    um ``HistoryWriter`` ou outro processo); se sim, só as entradas cujo
+    intervalo cobre os snapshots novos são invalidadas.
+    """
+    
+    imbalance_levels = 10  # níveis por lado do imbalance nos rollups
     
-    def __init__(self, db_path: str = "data/orderbook_history.db"):
+    def __init__(
+        self,
+        db_path: str = DEFAULT_HISTORY_DB,
+        storage: str = "json",
+        keyframe_every: int = 60,
+        cache_bytes: int = 64 * 2**20,
+    ):
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Modo de armazenamento desconhecido: {storage} (use {', '.join(STORAGE_MODES)})")
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.storage = storage
+        self.keyframe_every = max(1, keyframe_every)
+        # Estado da cadeia por símbolo: (id do keyframe, snapshots desde ele, bids, asks)
+        self._chains: Dict[str, Tuple[int, int, Dict[str, str], Dict[str, str]]] = {}
+        self.cache: Optional[HistoryCache] = HistoryCache(cache_bytes) if cache_bytes > 0 else None
+        self._cache_conn: Optional[sqlite3.Connection] = None
+        self._cache_version: Optional[int] = None
+        self._cache_max_id = 0
+        self._cache_lock = threading.Lock()
         self._init_db()
+        self._init_rollups()
     
     def _init_db(self) -> None:
         """Inicializa o banco de dados SQLite."""
@@ -51,41 +157,136 @@ class OrderbookHistory:
                 CREATE INDEX IF NOT EXISTS idx_timestamp 
                 ON orderbook_snapshots(timestamp)
             """)
+            
+            # Colunas do modo delta (bancos antigos ganham as colunas vazias)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(orderbook_snapshots)")}
+            if "keyframe_id" not in columns:
+                conn.execute("ALTER TABLE orderbook_snapshots ADD COLUMN keyframe_id INTEGER")
+            if "book_blob" not in columns:
+                conn.execute("ALTER TABLE orderbook_snapshots ADD COLUMN book_blob BLOB")
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_keyframe 
+                ON orderbook_snapshots(keyframe_id)
+            """)
+    
+    def _init_rollups(self) -> None:
+        with sqlite3.connect(self.db_path) as conn:
+            created = create_rollup_tables(conn)
+        if created:
+            # Banco anterior aos rollups: calcula uma vez a partir dos snapshots
+            with sqlite3.connect(self.db_path) as conn:
+                total = self._snapshot_count(conn)
+            if total:
+                log.warning(
+                    f"Banco sem rollups: calculando a partir de {total} snapshots antes de abrir "
+                    f"(se interrompido, rode 'history rebuild-rollups')"
+                )
+                self.rebuild_rollups()
+    
+    def connect(self) -> sqlite3.Connection:
+        """Conexão de longa duração para gravação (WAL, fsync só nos checkpoints)."""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
     
     def save_snapshot(self, book: OrderBook, symbol: str, market_type: str) -> None:
-        """Salva um snapshot do orderbook no histórico."""
+        """Salva um snapshot do orderbook no histórico (síncrono; ver ``HistoryWriter``)."""
         try:
-            stats = book.get_stats()
-            snapshot_data = {
-                "bids": [[p, str(q)] for p, q in book.bids.items()],
-                "asks": [[p, str(q)] for p, q in book.asks.items()],
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            }
-            
             with sqlite3.connect(self.db_path) as conn:
-                conn.execute("""
-                    INSERT INTO orderbook_snapshots 
-                    (symbol, market_type, best_bid, best_ask, mid_price, spread, spread_pct,
-                     bid_levels, ask_levels, total_updates, sequence_errors, error_rate, snapshot_data)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    symbol,
-                    market_type,
-                    stats.get('best_bid'),
-                    stats.get('best_ask'),
-                    stats.get('mid_price'),
-                    stats.get('spread'),
-                    stats.get('spread_pct'),
-                    stats.get('bid_levels'),
-                    stats.get('ask_levels'),
-                    stats.get('total_updates'),
-                    stats.get('sequence_errors'),
-                    stats.get('error_rate'),
-                    json.dumps(snapshot_data)
-                ))
+                self.insert_snapshot(conn, book.get_stats(), book.snapshot(), symbol, market_type)
         except Exception as e:
             log.error(f"Erro ao salvar snapshot: {e}")
     
+    def insert_snapshot(
+        self,
+        conn: sqlite3.Connection,
+        stats: Dict,
+        snap: BookSnapshot,
+        symbol: str,
+        market_type: str,
+        captured_at: Optional[datetime] = None,
+    ) -> None:
+        """
+        Insere um snapshot já capturado (``book.get_stats()`` + ``book.snapshot()``)
+        na transação corrente de ``conn``; o commit fica com quem chama.
+        """
+        captured_at = captured_at or datetime.now(timezone.utc)
+        try:
+            snapshot_json, keyframe_id, book_blob = self._encode_book(
+                symbol, snap.payload["bids"], snap.payload["asks"], captured_at
+            )
+            
+            cursor = conn.execute("""
+                INSERT INTO orderbook_snapshots 
+                (timestamp, symbol, market_type, best_bid, best_ask, mid_price, spread, spread_pct,
+                 bid_levels, ask_levels, total_updates, sequence_errors, error_rate, snapshot_data,
+                 keyframe_id, book_blob)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                _sql_ts(captured_at),
+                symbol,
+                market_type,
+                stats.get('best_bid'),
+                stats.get('best_ask'),
+                stats.get('mid_price'),
+                stats.get('spread'),
+                stats.get('spread_pct'),
+                stats.get('bid_levels'),
+                stats.get('ask_levels'),
+                stats.get('total_updates'),
+                stats.get('sequence_errors'),
+                stats.get('error_rate'),
+                snapshot_json,
+                keyframe_id,
+                book_blob
+            ))
+            self._update_rollups(conn, symbol, captured_at, stats, snap.payload["bids"], snap.payload["asks"])
+            if self.storage == "delta" and keyframe_id is None:
+                self._start_chain(symbol, cursor.lastrowid)
+        except Exception:
+            self._chains.pop(symbol, None)  # próxima gravação recomeça com keyframe
+            raise
+    
+    def _update_rollups(
+        self, conn: sqlite3.Connection, symbol: str, captured_at: datetime, stats: Dict, bids: Levels, asks: Levels
+    ) -> None:
+        update_rollups(conn, symbol, _epoch_ms(captured_at), snapshot_metrics(stats, bids, asks, self.imbalance_levels))
+    
+    def _encode_book(
+        self, symbol: str, bids: Levels, asks: Levels, captured_at: datetime
+    ) -> Tuple[str, Optional[int], Optional[bytes]]:
+        """``(snapshot_data, keyframe_id, book_blob)`` conforme o modo de armazenamento."""
+        if self.storage == "delta":
+            book_blob, keyframe_id = self._encode_delta(symbol, bids, asks, _epoch_ms(captured_at))
+            return "", keyframe_id, book_blob
+        snapshot_json = json.dumps({
+            "bids": bids,
+            "asks": asks,
+            "timestamp": captured_at.isoformat()
+        })
+        return snapshot_json, None, None
+    
+    def _encode_delta(self, symbol: str, bids: Levels, asks: Levels, ts_ms: int) -> Tuple[bytes, Optional[int]]:
+        """Keyframe (``keyframe_id`` None) ou diff em relação ao snapshot anterior do símbolo."""
+        cur_bids, cur_asks = dict(map(tuple, bids)), dict(map(tuple, asks))
+        chain = self._chains.get(symbol)
+        if chain is None or chain[1] >= self.keyframe_every:
+            self._chains[symbol] = (0, 0, cur_bids, cur_asks)
+            return encode_levels(ts_ms, bids, asks, keyframe=True), None
+        keyframe_id, count, prev_bids, prev_asks = chain
+        blob = encode_levels(ts_ms, _diff_side(prev_bids, cur_bids), _diff_side(prev_asks, cur_asks), keyframe=False)
+        self._chains[symbol] = (keyframe_id, count + 1, cur_bids, cur_asks)
+        return blob, keyframe_id
+    
+    def reset_chains(self) -> None:
+        """Faz a próxima gravação de cada símbolo começar com um keyframe."""
+        self._chains.clear()
+    
+    def _start_chain(self, symbol: str, keyframe_id: int) -> None:
+        _, _, bids, asks = self._chains[symbol]
+        self._chains[symbol] = (keyframe_id, 1, bids, asks)
+    
     def get_snapshots(
         self, 
         symbol: str, 
@@ -94,16 +295,25 @@ class OrderbookHistory:
         limit: int = 1000
     ) -> List[Dict]:
         """Recupera snapshots históricos."""
+        start_ms, end_ms = _range_ms(start_time, end_time)
+        return self._cached(
+            ("snapshots", symbol, start_ms, end_ms, limit), symbol, start_ms, end_ms,
+            lambda: self._get_snapshots(symbol, start_time, end_time, limit),
+        )
+    
+    def _get_snapshots(
+        self, symbol: str, start_time: Optional[datetime], end_time: Optional[datetime], limit: int
+    ) -> List[Dict]:
         query = "SELECT * FROM orderbook_snapshots WHERE symbol = ?"
         params = [symbol]
         
         if start_time:
             query += " AND timestamp >= ?"
-            params.append(start_time.isoformat())
+            params.append(_sql_ts(start_time))
         
         if end_time:
             query += " AND timestamp <= ?"
-            params.append(end_time.isoformat())
+            params.append(_sql_ts(end_time))
         
         query += " ORDER BY timestamp DESC LIMIT ?"
         params.append(limit)
@@ -113,17 +323,114 @@ class OrderbookHistory:
             cursor = conn.execute(query, params)
             return [dict(row) for row in cursor.fetchall()]
     
+    def iter_snapshots(
+        self,
+        symbol: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        columns: Sequence[str] = ("id", "timestamp", "best_bid", "best_ask"),
+        chunk_size: int = 1000,
+        descending: bool = False,
+    ) -> Iterator[tuple]:
+        """
+        Tuplas com só as ``columns`` pedidas (ver ``SNAPSHOT_COLUMNS``), lidas
+        em chunks de ``fetchmany``: a memória não depende do período.
+        ``snapshot_data``/``book_blob`` só entram no SELECT (e só são
+        decodificados) se "bids" ou "asks" forem pedidos. Em ordem
+        decrescente cada diff do modo delta é reconstruído desde o keyframe.
+        """
+        stored, need_book = _projection(columns)
+        select = ["id", "timestamp"] + (["snapshot_data", "keyframe_id", "book_blob"] if need_book else []) + stored
+        query = f"SELECT {', '.join(select)} FROM orderbook_snapshots WHERE symbol = ?"
+        params: list = [symbol]
+        if start_time:
+            query += " AND timestamp >= ?"
+            params.append(_sql_ts(start_time))
+        if end_time:
+            query += " AND timestamp <= ?"
+            params.append(_sql_ts(end_time))
+        order = "DESC" if descending else "ASC"
+        query += f" ORDER BY timestamp {order}, id {order}"
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.execute(query, params)
+            yield from self._project_rows(
+                conn, cursor, symbol, columns, stored, need_book, chunk_size, not descending,
+                ts_ms=lambda v: _row_ts_ms(None, v), ts_text=lambda v: v,
+            )
+        finally:
+            conn.close()
+    
+    def _project_rows(
+        self,
+        conn: sqlite3.Connection,
+        cursor: sqlite3.Cursor,
+        symbol: str,
+        columns: Sequence[str],
+        stored: List[str],
+        need_book: bool,
+        chunk_size: int,
+        incremental: bool,
+        ts_ms: Callable,
+        ts_text: Callable,
+        table: str = "orderbook_snapshots",
+    ) -> Iterator[tuple]:
+        """Monta as tuplas de ``iter_snapshots`` a partir de linhas ``(id, ts, [livro], *stored)``."""
+        offset = 5 if need_book else 2
+        getters: List[Callable] = []
+        for col in columns:
+            if col == "id":
+                getters.append(lambda row, ts, bids, asks: row[0])
+            elif col == "ts_ms":
+                getters.append(lambda row, ts, bids, asks: ts if ts is not None else ts_ms(row[1]))
+            elif col == "timestamp":
+                getters.append(lambda row, ts, bids, asks: ts_text(row[1]))
+            elif col == "symbol":
+                getters.append(lambda row, ts, bids, asks: symbol)
+            elif col == "bids":
+                getters.append(lambda row, ts, bids, asks: bids)
+            elif col == "asks":
+                getters.append(lambda row, ts, bids, asks: asks)
+            else:
+                i = offset + stored.index(col)
+                getters.append(lambda row, ts, bids, asks, i=i: row[i])
+        if need_book:
+            rows = self._iter_levels(conn, cursor, chunk_size, table, incremental)
+        else:
+            rows = ((row, None, None, None) for row in _fetch_chunks(cursor, chunk_size))
+        for row, ts, bids, asks in rows:
+            yield tuple(get(row, ts, bids, asks) for get in getters)
+    
     def get_latest_snapshot(self, symbol: str) -> Optional[Dict]:
         """Recupera o snapshot mais recente para um símbolo."""
         snapshots = self.get_snapshots(symbol, limit=1)
         return snapshots[0] if snapshots else None
     
     def restore_orderbook(self, snapshot_id: int) -> Optional[OrderBook]:
-        """Restaura um orderbook a partir de um snapshot histórico."""
+        """
+        Restaura um orderbook a partir de um snapshot histórico. Com o cache
+        ligado guarda-se o ``BookSnapshot`` imutável e cada chamada recebe um
+        ``OrderBook`` novo, que pode ser modificado à vontade.
+        """
+        if self.cache is None:
+            return self._restore_orderbook(snapshot_id)
+        self._sync_cache()
+        found, snap = self.cache.get(("book", snapshot_id))
+        if found:
+            book = OrderBook()
+            book.symbol = snap.symbol
+            book.apply_snapshot(snap.bids, snap.asks)
+            return book
+        book = self._restore_orderbook(snapshot_id)
+        if book is not None:  # ids ausentes podem surgir depois
+            self.cache.put(("book", snapshot_id), book.snapshot())
+        return book
+    
+    def _restore_orderbook(self, snapshot_id: int) -> Optional[OrderBook]:
         with sqlite3.connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.execute(
-                "SELECT snapshot_data FROM orderbook_snapshots WHERE id = ?", 
+                "SELECT symbol, snapshot_data, keyframe_id, book_blob FROM orderbook_snapshots WHERE id = ?", 
                 (snapshot_id,)
             )
             row = cursor.fetchone()
@@ -132,6 +439,8 @@ class OrderbookHistory:
                 return None
             
             try:
+                if row['book_blob'] is not None:
+                    return self._restore_chain(conn, snapshot_id, row['keyframe_id'] or snapshot_id, row['symbol'])
                 snapshot_data = json.loads(row['snapshot_data'])
                 book = OrderBook()
                 book.apply_snapshot(
@@ -143,60 +452,341 @@ class OrderbookHistory:
                 log.error(f"Erro ao restaurar orderbook: {e}")
                 return None
     
+    @staticmethod
+    def _chain_levels(
+        conn: sqlite3.Connection, snapshot_id: int, keyframe_id: int, table: str = "orderbook_snapshots"
+    ) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """
+        Níveis ``{preço: quantidade}`` do snapshot: keyframe + diffs até
+        ``snapshot_id`` (no máximo ``keyframe_every`` blobs), mesclados em dicts.
+        """
+        rows = conn.execute(
+            f"SELECT book_blob FROM {table} "
+            "WHERE id BETWEEN ? AND ? AND (id = ? OR keyframe_id = ?) ORDER BY id",
+            (keyframe_id, snapshot_id, keyframe_id, keyframe_id),
+        )
+        bids: Dict[str, str] = {}
+        asks: Dict[str, str] = {}
+        for (blob,) in rows:
+            _, diff_bids, diff_asks, keyframe = decode_levels(blob)
+            if keyframe:
+                bids, asks = dict(map(tuple, diff_bids)), dict(map(tuple, diff_asks))
+            else:
+                _merge_levels(bids, diff_bids)
+                _merge_levels(asks, diff_asks)
+        return bids, asks
+    
+    def _restore_chain(
+        self, conn: sqlite3.Connection, snapshot_id: int, keyframe_id: int, symbol: str,
+        table: str = "orderbook_snapshots",
+    ) -> OrderBook:
+        bids, asks = self._chain_levels(conn, snapshot_id, keyframe_id, table)
+        book = OrderBook()
+        book.symbol = symbol
+        book.apply_snapshot(list(bids.items()), list(asks.items()))
+        return book
+    
+    def iter_books(
+        self,
+        symbol: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        chunk_size: int = 1000,
+    ) -> Iterator[Tuple[int, Levels, Levels]]:
+        """
+        Livros completos ``(ts em ms UTC, bids, asks)`` em ordem cronológica,
+        lidos com ``fetchmany``. Nos snapshots do modo delta os níveis são
+        mantidos incrementalmente (cada diff é aplicado uma única vez); se o
+        intervalo começar no meio de uma cadeia, ela é reconstruída desde o keyframe.
+        """
+        query = "SELECT id, timestamp, snapshot_data, keyframe_id, book_blob FROM orderbook_snapshots WHERE symbol = ?"
+        params: list = [symbol]
+        if start_time:
+            query += " AND timestamp >= ?"
+            params.append(_sql_ts(start_time))
+        if end_time:
+            query += " AND timestamp <= ?"
+            params.append(_sql_ts(end_time))
+        query += " ORDER BY timestamp, id"
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.execute(query, params)
+            for _, ts_ms, bids, asks in self._iter_levels(conn, cursor, chunk_size):
+                yield ts_ms, bids, asks
+        finally:
+            conn.close()
+    
+    def _iter_levels(
+        self,
+        conn: sqlite3.Connection,
+        cursor: sqlite3.Cursor,
+        chunk_size: int,
+        table: str = "orderbook_snapshots",
+        incremental: bool = True,
+    ) -> Iterator[Tuple[tuple, int, Levels, Levels]]:
+        """
+        ``(linha, ts em ms, bids, asks)`` para linhas ``(id, timestamp,
+        snapshot_data, keyframe_id, book_blob, ...)`` de um único símbolo.
+        Com ``incremental=False`` (linhas fora da ordem cronológica) cada diff
+        é reconstruído desde o keyframe em vez de aplicado ao anterior.
+        """
+        bids: Dict[str, str] = {}
+        asks: Dict[str, str] = {}
+        chain: Optional[int] = None
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                row_id, row_ts, snapshot_data, keyframe_id, blob = row[:5]
+                try:
+                    if blob is None:
+                        data = json.loads(snapshot_data)
+                        yield row, _row_ts_ms(data.get("timestamp"), row_ts), data.get("bids", []), data.get("asks", [])
+                        continue
+                    ts_ms, diff_bids, diff_asks, keyframe = decode_levels(blob)
+                    if keyframe:
+                        bids, asks, chain = dict(map(tuple, diff_bids)), dict(map(tuple, diff_asks)), row_id
+                    elif not incremental or chain != keyframe_id:
+                        bids, asks = self._chain_levels(conn, row_id, keyframe_id, table)
+                        chain = keyframe_id
+                    else:
+                        _merge_levels(bids, diff_bids)
+                        _merge_levels(asks, diff_asks)
+                    yield row, ts_ms, _sorted_levels(bids, descending=True), _sorted_levels(asks, descending=False)
+                except Exception as e:  # noqa: BLE001
+                    chain = None
+                    log.warning(f"Snapshot {row_id} inválido ignorado: {e}")
+    
     def get_statistics(
         self, 
         symbol: str, 
         start_time: Optional[datetime] = None,
         end_time: Optional[datetime] = None
     ) -> Dict:
-        """Calcula estatísticas agregadas do período."""
-        query = """
-            SELECT 
-                COUNT(*) as total_snapshots,
-                AVG(spread) as avg_spread,
-                AVG(spread_pct) as avg_spread_pct,
-                AVG(bid_levels) as avg_bid_levels,
-                AVG(ask_levels) as avg_ask_levels,
-                AVG(error_rate) as avg_error_rate,
-                MIN(best_bid) as min_bid,
-                MAX(best_ask) as max_ask,
-                AVG(best_bid) as avg_bid,
-                AVG(best_ask) as avg_ask
-            FROM orderbook_snapshots 
-            WHERE symbol = ?
+        """Estatísticas agregadas do período, a partir dos rollups (resolução de 1 s nas bordas)."""
+        agg = self.get_rollup_stats(symbol, start_time, end_time)
+        if not agg:
+            return {}
+        return {
+            "total_snapshots": agg["count"],
+            "avg_spread": agg["spread"]["avg"],
+            "avg_spread_pct": agg["spread_pct"]["avg"],
+            "avg_bid_levels": agg["bid_levels"]["avg"],
+            "avg_ask_levels": agg["ask_levels"]["avg"],
+            "avg_error_rate": agg["error_rate"]["avg"],
+            "min_bid": agg["best_bid"]["min"],
+            "max_ask": agg["best_ask"]["max"],
+            "avg_bid": agg["best_bid"]["avg"],
+            "avg_ask": agg["best_ask"]["avg"],
+            "avg_mid": agg["mid"]["avg"],
+            "last_mid": agg["mid"]["last"],
+            "avg_imbalance": agg["imbalance"]["avg"],
+        }
+    
+    def get_rollup_stats(
+        self,
+        symbol: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+    ) -> Dict:
         """
-        params = [symbol]
-        
-        if start_time:
-            query += " AND timestamp >= ?"
-            params.append(start_time.isoformat())
+        ``{"count", "resolutions", <métrica>: {"min", "max", "avg", "last"}}``
+        para mid, spread, spread_pct, níveis, imbalance, best_bid/ask e
+        error_rate, combinando buckets de 1 h no miolo e 1 min / 1 s nas bordas.
+        """
+        start_ms, end_ms = _range_ms(start_time, end_time)
         
-        if end_time:
-            query += " AND timestamp <= ?"
-            params.append(end_time.isoformat())
+        def query() -> Dict:
+            with sqlite3.connect(self.db_path) as conn:
+                return query_rollups(conn, symbol, start_ms, end_ms)
+        return self._cached(("stats", symbol, start_ms, end_ms, "auto"), symbol, start_ms, end_ms, query)
+    
+    def get_rollup_series(
+        self,
+        symbol: str,
+        start_time: datetime,
+        end_time: datetime,
+        resolution: Optional[str] = None,
+        max_points: int = 1000,
+    ) -> List[Dict]:
+        """Série de buckets do período; sem ``resolution``, a mais fina com até ``max_points`` pontos."""
+        start_ms, end_ms = _epoch_ms(start_time), _epoch_ms(end_time)
+        resolution = resolution or pick_resolution(start_ms, end_ms, max_points)
         
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute(query, params)
-            row = cursor.fetchone()
-            
-            if row and row['total_snapshots'] > 0:
-                return dict(row)
-            return {}
+        def query() -> List[Dict]:
+            with sqlite3.connect(self.db_path) as conn:
+                return rollup_series(conn, symbol, start_ms, end_ms, resolution)
+        return self._cached(("series", symbol, start_ms, end_ms, resolution), symbol, start_ms, end_ms, query)
+    
+    def rebuild_rollups(self, chunk_size: int = 5000) -> int:
+        """Recalcula todos os rollups a partir dos snapshots gravados; retorna quantos foram lidos."""
+        conn = self.connect()
+        count = 0
+        try:
+            total = self._snapshot_count(conn)
+            with conn:
+                for name, _ in RESOLUTIONS:
+                    conn.execute(f"DELETE FROM rollup_{name}")
+            t0 = time.monotonic()
+            for symbol, ts_ms, stats, bids, asks in self._rollup_source(conn, chunk_size):
+                update_rollups(conn, symbol, ts_ms, snapshot_metrics(stats, bids, asks, self.imbalance_levels))
+                count += 1
+                if count % chunk_size == 0:
+                    conn.commit()
+                    elapsed = time.monotonic() - t0
+                    log.info(
+                        f"Rollups: {count}/{total} snapshots ({count / max(1, total):.0%}, "
+                        f"{count / max(elapsed, 1e-9):.0f}/s)"
+                    )
+            conn.commit()
+        finally:
+            conn.close()
+        if self.cache is not None:
+            self.cache.clear()
+        if count:
+            log.info(f"Rollups recalculados a partir de {count} snapshots")
+        return count
+    
+    def _snapshot_count(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COUNT(*) FROM orderbook_snapshots").fetchone()[0]
+    
+    def _rollup_source(self, conn: sqlite3.Connection, chunk_size: int) -> Iterator[Tuple[str, int, Dict, Levels, Levels]]:
+        """``(símbolo, ts em ms, estatísticas, bids, asks)`` de todos os snapshots gravados."""
+        symbols = [row[0] for row in conn.execute("SELECT DISTINCT symbol FROM orderbook_snapshots")]
+        for symbol in symbols:
+            cursor = conn.execute(
+                f"SELECT id, timestamp, snapshot_data, keyframe_id, book_blob, {', '.join(STAT_COLUMNS)} "
+                "FROM orderbook_snapshots WHERE symbol = ? ORDER BY id",
+                (symbol,),
+            )
+            for row, ts_ms, bids, asks in self._iter_levels(conn, cursor, chunk_size):
+                yield symbol, ts_ms, dict(zip(STAT_COLUMNS, row[5:])), bids, asks
+    
+    # ----------------- Cache -----------------
+    def _cached(self, key: tuple, symbol: str, start_ms: Optional[int], end_ms: Optional[int], compute: Callable):
+        if self.cache is None:
+            return compute()
+        self._sync_cache()
+        found, value = self.cache.get(key)
+        if not found:
+            value = compute()
+            self.cache.put(key, value, symbol, start_ms, end_ms)
+        return copy_result(value)  # quem chama pode ordenar/editar sem afetar o cache
+    
+    def _sync_cache(self) -> None:
+        """Invalida as entradas afetadas pelo que foi gravado desde a última consulta."""
+        with self._cache_lock:
+            if self._cache_conn is None:
+                self._cache_conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn = self._cache_conn
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._cache_version:
+                return
+            max_id = self._max_snapshot_id(conn)
+            if self._cache_version is not None:
+                if max_id > self._cache_max_id:
+                    for symbol, start_ms, end_ms in self._appended_ranges(conn, self._cache_max_id):
+                        self.cache.invalidate_range(symbol, start_ms, end_ms)
+                else:
+                    self.cache.clear()  # remoção ou reescrita (retenção, rebuild): não dá para delimitar
+            self._cache_version = version
+            self._cache_max_id = max_id
+    
+    def _max_snapshot_id(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM orderbook_snapshots").fetchone()[0]
+    
+    def _appended_ranges(self, conn: sqlite3.Connection, after_id: int) -> List[Tuple[str, int, int]]:
+        """``(símbolo, primeiro ts, último ts)`` em ms dos snapshots com id > ``after_id``."""
+        rows = conn.execute(
+            "SELECT symbol, MIN(timestamp), MAX(timestamp) FROM orderbook_snapshots WHERE id > ? GROUP BY symbol",
+            (after_id,),
+        )
+        # A coluna timestamp tem resolução de 1 s
+        return [(symbol, _row_ts_ms(None, lo), _row_ts_ms(None, hi) + 999) for symbol, lo, hi in rows]
+    
+    def close(self) -> None:
+        """Fecha a conexão de leitura do cache (as demais são abertas por operação)."""
+        with self._cache_lock:
+            if self._cache_conn is not None:
+                self._cache_conn.close()
+                self._cache_conn = None
+                self._cache_version = None
     
     def cleanup_old_data(self, days_to_keep: int = 30) -> int:
         """Remove dados antigos do banco."""
         cutoff_date = datetime.now(timezone.utc).replace(
             hour=0, minute=0, second=0, microsecond=0
-        )
-        cutoff_date = cutoff_date.replace(day=cutoff_date.day - days_to_keep)
+        ) - timedelta(days=days_to_keep)
         
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.execute(
                 "DELETE FROM orderbook_snapshots WHERE timestamp < ?",
-                (cutoff_date.isoformat(),)
+                (_sql_ts(cutoff_date),)
             )
             deleted_count = cursor.rowcount
+            # Diffs cujo keyframe foi removido não podem mais ser reconstruídos
+            cursor = conn.execute("""
+                DELETE FROM orderbook_snapshots 
+                WHERE keyframe_id IS NOT NULL 
+                AND keyframe_id NOT IN (SELECT id FROM orderbook_snapshots)
+            """)
+            deleted_count += cursor.rowcount
+            delete_rollups_before(conn, _epoch_ms(cutoff_date))
+        if self.cache is not None:
+            self.cache.clear()
         
         log.info(f"Removidos {deleted_count} snapshots antigos")
         return deleted_count
+
+def _projection(columns: Sequence[str]) -> Tuple[List[str], bool]:
+    """Colunas armazenadas a selecionar e se o livro precisa ser lido."""
+    unknown = [c for c in columns if c not in SNAPSHOT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Colunas desconhecidas: {', '.join(unknown)} (use {', '.join(SNAPSHOT_COLUMNS)})")
+    stored = [c for c in dict.fromkeys(columns) if c == "market_type" or c in STAT_COLUMNS]
+    return stored, "bids" in columns or "asks" in columns
+
+def _range_ms(start_time: Optional[datetime], end_time: Optional[datetime]) -> Tuple[Optional[int], Optional[int]]:
+    return (_epoch_ms(start_time) if start_time else None, _epoch_ms(end_time) if end_time else None)
+
+def _fetch_chunks(cursor: sqlite3.Cursor, chunk_size: int) -> Iterator[tuple]:
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from rows
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def _epoch_ms(dt: datetime) -> int:
+    """Epoch em ms (UTC) sem passar por float; ``datetime`` sem fuso é tratado como UTC."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // timedelta(milliseconds=1)
+
+def _sql_ts(dt: datetime) -> str:
+    """
+    Limite de consulta no formato do ``CURRENT_TIMESTAMP`` do SQLite
+    (``YYYY-MM-DD HH:MM:SS`` em UTC): comparar com ``isoformat()`` misturava
+    formatos ("T" e fuso) e a comparação de strings errava nas bordas.
+    """
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+def _row_ts_ms(snapshot_ts: Optional[str], row_ts) -> int:
+    """Timestamp em ms UTC: o ISO do JSON (com fração) ou a coluna ``timestamp`` (texto do SQLite ou ms)."""
+    for value in (snapshot_ts, row_ts):
+        if not value:
+            continue
+        if isinstance(value, int):
+            return value
+        try:
+            dt = datetime.fromisoformat(value)
+        except ValueError:
+            continue
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)  # CURRENT_TIMESTAMP do SQLite é UTC
+        return _epoch_ms(dt)
+    return 0
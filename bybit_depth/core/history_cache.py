@@ -0,0 +1,131 @@
+from __future__ import annotations
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from .orderbook import BookSnapshot
+
+# Por nível de um BookSnapshot: tupla (preço, quantidade) de Decimals + slot na tupla do lado
+_SNAPSHOT_LEVEL_BYTES = 272
+
+def estimate_size(value: Any) -> int:
+    """Bytes aproximados de um resultado de consulta (recursivo em dict/list/tuple)."""
+    if isinstance(value, BookSnapshot):
+        return 512 + _SNAPSHOT_LEVEL_BYTES * (len(value.bids) + len(value.asks))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+def copy_result(value: Any) -> Any:
+    """
+    Cópia de um resultado de consulta para quem chama poder modificá-la: as
+    consultas devolvem listas de linhas planas (``dict``) ou um ``dict`` de
+    estatísticas com listas, então copia-se dois níveis de contêiner.
+    """
+    if isinstance(value, list):
+        return [dict(v) if isinstance(v, dict) else v for v in value]
+    if isinstance(value, dict):
+        return {k: v.copy() if isinstance(v, (dict, list)) else v for k, v in value.items()}
+    return value
+
+class _Entry(NamedTuple):
+    value: Any
+    size: int
+    symbol: Optional[str]    # None: não depende de novas gravações (ex.: livro de um id)
+    start_ms: Optional[int]  # None: intervalo aberto
+    end_ms: Optional[int]
+
+class HistoryCache:
+    """
+    LRU de resultados do histórico limitado por memória estimada
+    (``max_bytes``): ao passar do orçamento, descarta os menos usados.
+
+    Entradas de consultas guardam ``(símbolo, início, fim)``; uma gravação
+    nova invalida só as que cobrem o instante gravado (``invalidate_range``).
+    ``get`` devolve o próprio valor guardado; ``OrderbookHistory`` entrega
+    a quem consulta uma cópia (``copy_result``) ou um livro novo.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 2**20) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        # Contadores
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry.value
+
+    def put(
+        self,
+        key: Hashable,
+        value: Any,
+        symbol: Optional[str] = None,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+    ) -> bool:
+        """Guarda ``value``; retorna False se ele sozinho não couber no orçamento."""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.size
+            self._entries[key] = _Entry(value, size, symbol, start_ms, end_ms)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.size
+                self.evictions += 1
+        return True
+
+    def invalidate_range(self, symbol: str, start_ms: int, end_ms: int) -> int:
+        """Remove as consultas de ``symbol`` cujo intervalo cruza ``[start_ms, end_ms]``."""
+        with self._lock:
+            stale = [
+                key for key, e in self._entries.items()
+                if e.symbol == symbol
+                and (e.start_ms is None or e.start_ms <= end_ms)
+                and (e.end_ms is None or e.end_ms >= start_ms)
+            ]
+            for key in stale:
+                self.bytes -= self._entries.pop(key).size
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
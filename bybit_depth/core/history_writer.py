@@ -0,0 +1,169 @@
+from __future__ import annotations
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from .history import OrderbookHistory
+from .orderbook import OrderBook
+
+log = logging.getLogger("history_writer")
+
+class HistoryWriter:
+    """
+    Grava snapshots do histórico numa thread dedicada, fora do event loop.
+
+    ``submit`` só captura o estado do livro (``get_stats`` + o ``BookSnapshot``
+    imutável) e o entrega a uma fila limitada; a thread mantém uma única
+    conexão SQLite em modo WAL e grava em transações de até ``batch_size``
+    snapshots (ou o que chegou em ``flush_interval`` s). Com a fila cheia o
+    snapshot é descartado e contado: o loop de ingestão nunca espera o disco.
+    ``close`` grava tudo o que estiver pendente antes de retornar.
+    """
+
+    def __init__(
+        self,
+        history: OrderbookHistory,
+        max_pending: int = 1000,
+        batch_size: int = 256,
+        flush_interval: float = 1.0,
+    ) -> None:
+        self.history = history
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        # Contadores
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.commit_time = 0.0
+        self.max_commit = 0.0
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    # ----------------- Produtor (event loop) -----------------
+    def submit(self, book: OrderBook, symbol: str, market_type: str) -> bool:
+        """Enfileira o estado atual do livro; retorna False se a fila estiver cheia."""
+        if self._closed:
+            raise RuntimeError("HistoryWriter encerrado")
+        item = ("snapshot", book.get_stats(), book.snapshot(), symbol, market_type, datetime.now(timezone.utc))
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                log.warning(f"Fila do histórico cheia: {self.dropped} snapshots descartados até agora")
+            return False
+        self.submitted += 1
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Espera a gravação de tudo o que foi enfileirado até agora."""
+        if self._closed:
+            return not self._thread.is_alive()
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Grava os snapshots pendentes, faz o commit final e encerra a thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(("close",))
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            log.error(f"Thread do histórico não terminou em {timeout} s; {self._queue.qsize()} itens pendentes")
+
+    def __enter__(self) -> HistoryWriter:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ----------------- Thread de escrita -----------------
+    def _run(self) -> None:
+        conn = self.history.connect()
+        try:
+            while True:
+                item = self._queue.get()
+                batch = [item]
+                deadline = time.monotonic() + self.flush_interval
+                # Junta o que chegar até encher o lote ou vencer o intervalo
+                while item[0] == "snapshot" and len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    batch.append(item)
+                self._write(conn, [i for i in batch if i[0] == "snapshot"])
+                for i in batch:
+                    if i[0] == "flush":
+                        i[1].set()
+                if batch[-1][0] == "close":
+                    self._drain(conn)
+                    return
+        finally:
+            conn.close()
+
+    def _drain(self, conn) -> None:
+        pending = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item[0] == "snapshot":
+                pending.append(item)
+            elif item[0] == "flush":
+                item[1].set()
+        self._write(conn, pending)
+
+    def _write(self, conn, items) -> None:
+        if not items:
+            return
+        t0 = time.perf_counter()
+        written = 0
+        try:
+            with conn:  # uma transação por lote
+                if not conn.in_transaction:
+                    conn.execute("BEGIN")
+                for _, stats, snap, symbol, market_type, captured_at in items:
+                    # Savepoint por item: a linha e seus rollups entram juntos ou nenhum
+                    conn.execute("SAVEPOINT snapshot")
+                    try:
+                        self.history.insert_snapshot(conn, stats, snap, symbol, market_type, captured_at)
+                        written += 1
+                    except Exception as e:  # noqa: BLE001
+                        conn.execute("ROLLBACK TO snapshot")
+                        self.failed += 1
+                        log.error(f"Erro ao salvar snapshot de {symbol}: {e}")
+                    conn.execute("RELEASE snapshot")
+        except Exception as e:  # noqa: BLE001
+            self.failed += written
+            written = 0
+            self.history.reset_chains()  # diffs pendentes referenciam linhas que não foram gravadas
+            log.error(f"Erro no commit do histórico ({len(items)} snapshots): {e}")
+        elapsed = time.perf_counter() - t0
+        self.written += written
+        self.batches += 1
+        self.commit_time += elapsed
+        self.max_commit = max(self.max_commit, elapsed)
+
+    def get_stats(self) -> Dict[str, any]:
+        return {
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "pending": self._queue.qsize(),
+            "batches": self.batches,
+            "avg_batch": self.written / self.batches if self.batches else None,
+            "avg_commit_ms": self.commit_time / self.batches * 1000 if self.batches else None,
+            "max_commit_ms": self.max_commit * 1000 if self.batches else None,
+        }
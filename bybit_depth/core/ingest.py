@@ -0,0 +1,241 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+log = logging.getLogger("ingest")
+
+# Políticas quando a fila está cheia
+BLOCK = "block"              # o leitor do socket espera (backpressure até o TCP)
+DROP_OLDEST = "drop_oldest"  # descarta o frame mais antigo (o gap dispara a ressincronização)
+CONFLATE = "conflate"        # agrupa por tópico e funde os deltas pendentes por preço; nada é perdido
+POLICIES = (BLOCK, DROP_OLDEST, CONFLATE)
+
+Item = Tuple[object, Optional[tuple]]  # (frame bruto, carimbo de recebimento)
+
+_TOPIC_KEY = '"topic"'
+
+def frame_topic(raw) -> Optional[str]:
+    """Extrai o ``topic`` do JSON bruto sem decodificar o frame inteiro."""
+    if not isinstance(raw, str):
+        return None
+    key = raw.find(_TOPIC_KEY)
+    if key < 0:
+        return None
+    start = raw.find('"', key + len(_TOPIC_KEY)) + 1
+    end = raw.find('"', start)
+    return raw[start:end] if start > 0 and end > 0 else None
+
+def _is_snapshot(raw: str) -> bool:
+    # "type" vem logo após "topic" nos frames da Bybit; limitar a busca mantém o custo constante
+    return '"snapshot"' in raw[:160]
+
+def merge_frames(raws: List[str]) -> Optional[str]:
+    """
+    Funde frames consecutivos de um tópico em um só: por preço vence a última
+    quantidade e ``u`` é o do último frame. Começando por um snapshot, o
+    resultado é o snapshot no ``u`` final (níveis zerados removidos); só com
+    deltas, é um delta com ``pu`` = ``u`` anterior ao primeiro, que o
+    ``BookSynchronizer`` usa para validar a continuidade. Retorna None se algum
+    frame não for um frame de orderbook.
+    """
+    msgs = []
+    for raw in raws:
+        try:
+            msg = json.loads(raw)
+        except (TypeError, ValueError):
+            return None
+        if not isinstance(msg, dict) or not isinstance(msg.get("data"), dict):
+            return None
+        msgs.append(msg)
+    first, last = msgs[0], msgs[-1]
+    snapshot = first.get("type") == "snapshot"
+    bids: Dict[str, str] = {}
+    asks: Dict[str, str] = {}
+    for msg in msgs:
+        data = msg["data"]
+        for levels, side in ((data.get("b") or [], bids), (data.get("a") or [], asks)):
+            for price, size in levels:
+                side[price] = size
+    if snapshot:
+        # Remoções só fazem sentido contra um livro anterior
+        bids = {p: q for p, q in bids.items() if float(q) != 0}
+        asks = {p: q for p, q in asks.items() if float(q) != 0}
+    data = {**last["data"], "b": [[p, q] for p, q in bids.items()], "a": [[p, q] for p, q in asks.items()]}
+    if not snapshot:
+        first_data = first["data"]
+        prev = first_data.get("pu")
+        if prev is None and first_data.get("u") is not None:
+            prev = first_data["u"] - 1
+        if prev is not None:
+            data["pu"] = prev
+    merged = {"topic": last.get("topic"), "type": "snapshot" if snapshot else "delta"}
+    merged.update((k, v) for k, v in last.items() if k not in ("topic", "type", "data"))
+    merged["data"] = data
+    return json.dumps(merged, separators=(",", ":"))
+
+class IngestQueue:
+    """
+    Fila limitada entre a leitura do socket e a aplicação no livro.
+
+    O leitor só enfileira o frame bruto (com o carimbo de recebimento) e volta
+    a ler; um consumidor separado decodifica e aplica em lotes, cedendo o loop
+    entre lotes para que leituras e pings do websockets sigam em dia.
+
+    Políticas com a fila cheia (``maxsize`` frames):
+
+    - ``block``: ``put`` aguarda espaço. A pressão volta para o websockets,
+      que para de ler o TCP quando o próprio buffer enche.
+    - ``drop_oldest``: descarta o frame mais antigo. O gap de ``u`` resultante
+      é detectado pelo ``BookSynchronizer``, que pede um novo snapshot.
+    - ``conflate``: frames ficam agrupados por tópico (cada grupo é entregue
+      inteiro, para coalescer os deltas em ``apply_deltas``) e um snapshot
+      descarta os frames pendentes do seu tópico. Com a fila cheia, os frames
+      pendentes de um tópico (o que está chegando, ou o maior grupo) são
+      fundidos em um só por ``merge_frames``, sem criar gap de ``u``. Só se
+      nenhum tópico tiver dois frames para fundir (mais tópicos que
+      ``maxsize``) o frame mais antigo é descartado. ``maxsize`` nunca é
+      excedido.
+    """
+
+    def __init__(self, maxsize: int = 10_000, policy: str = BLOCK) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Política desconhecida: {policy} (use {', '.join(POLICIES)})")
+        if maxsize < 1:
+            raise ValueError("maxsize deve ser >= 1")
+        self.maxsize = maxsize
+        self.policy = policy
+        self._items: Deque[Item] = deque()
+        self._groups: "OrderedDict[Optional[str], Deque[Item]]" = OrderedDict()
+        self._size = 0
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        # Contadores
+        self.enqueued = 0
+        self.dequeued = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.blocked = 0
+        self.max_depth = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def depth(self) -> int:
+        return self._size
+
+    # ----------------- Produtor -----------------
+    async def put(self, raw, received: Optional[tuple] = None) -> None:
+        if self.policy == BLOCK and self._size >= self.maxsize:
+            self.blocked += 1
+            while self._size >= self.maxsize:
+                self._not_full.clear()
+                await self._not_full.wait()
+        self.put_nowait(raw, received)
+
+    def put_nowait(self, raw, received: Optional[tuple] = None) -> None:
+        """Enfileira sem esperar; com ``block`` e fila cheia o limite é excedido (use ``put``)."""
+        if self.policy == CONFLATE:
+            self._put_conflated(raw, received)
+        else:
+            if self.policy == DROP_OLDEST and self._size >= self.maxsize:
+                self._items.popleft()
+                self._size -= 1
+                self._count_drop()
+            self._items.append((raw, received))
+            self._size += 1
+        self.enqueued += 1
+        if self._size > self.max_depth:
+            self.max_depth = self._size
+        self._not_empty.set()
+
+    def _put_conflated(self, raw, received: Optional[tuple]) -> None:
+        topic = frame_topic(raw)
+        group = self._groups.get(topic)
+        if group is None:
+            group = self._groups[topic] = deque()
+        elif group and isinstance(raw, str) and _is_snapshot(raw):
+            # Snapshot torna obsoletos os frames anteriores do mesmo tópico
+            self.conflated += len(group)
+            self._size -= len(group)
+            group.clear()
+        group.append((raw, received))
+        self._size += 1
+        while self._size > self.maxsize:
+            self._make_room(group)
+
+    def _make_room(self, incoming: Deque[Item]) -> None:
+        """Funde um grupo (o do frame que chegou ou o maior) ou, sem alternativa, descarta o frame mais antigo."""
+        candidates = [incoming] if len(incoming) > 1 else []
+        candidates += sorted((g for g in self._groups.values() if len(g) > 1 and g is not incoming), key=len, reverse=True)
+        for group in candidates:
+            merged = merge_frames([raw for raw, _ in group])
+            if merged is None:
+                continue
+            received = group[-1][1]
+            self.conflated += len(group) - 1
+            self._size -= len(group) - 1
+            group.clear()
+            group.append((merged, received))
+            return
+        # Mais tópicos que maxsize (ou frames não fundíveis): descarta o mais antigo
+        for group in self._groups.values():
+            if group:
+                group.popleft()
+                self._size -= 1
+                self._count_drop()
+                return
+
+    def _count_drop(self) -> None:
+        self.dropped += 1
+        if self.dropped == 1 or self.dropped % 1000 == 0:
+            log.warning(f"Fila de ingestão cheia ({self.maxsize}): {self.dropped} frames descartados até agora")
+
+    # ----------------- Consumidor -----------------
+    async def get_batch(self, max_items: int = 256) -> List[Item]:
+        """
+        Aguarda e retorna até ``max_items`` frames. No modo ``conflate`` retorna
+        o grupo inteiro do tópico mais antigo (que pode exceder ``max_items``).
+        """
+        while not self._size:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        if self.policy == CONFLATE:
+            while True:
+                topic, group = self._groups.popitem(last=False)
+                if group:
+                    break
+            batch = list(group)
+        else:
+            n = min(max_items, self._size)
+            batch = [self._items.popleft() for _ in range(n)]
+        self._size -= len(batch)
+        self.dequeued += len(batch)
+        self._not_full.set()
+        return batch
+
+    def clear(self) -> int:
+        """Descarta os frames pendentes (ex.: conexão encerrada); retorna quantos."""
+        pending = self._size
+        self._items.clear()
+        self._groups.clear()
+        self._size = 0
+        self._not_full.set()
+        return pending
+
+    def get_stats(self) -> Dict[str, any]:
+        return {
+            "policy": self.policy,
+            "maxsize": self.maxsize,
+            "depth": self._size,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "dequeued": self.dequeued,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "blocked_puts": self.blocked,
+        }
@@ -9,6 +9,7 @@ class OrderbookData(BaseModel):
     a: List[List[str]] = Field(default_factory=list)  # asks: [[price, size], ...]
     ts: Optional[int] = None
     u: Optional[int] = None              # update id
+    pu: Optional[int] = None             # u anterior (frames conflacionados localmente)
 
 class WSOrderbookMessage(BaseModel):
     topic: Optional[str] = None
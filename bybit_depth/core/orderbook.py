@@ -1,42 +1,422 @@
 from __future__ import annotations
-from decimal import Decimal
-from typing import Dict, List, Tuple, Optional
+from collections.abc import MutableMapping
+from dataclasses import dataclass
+from functools import cached_property
+from decimal import Decimal, InvalidOperation, ROUND_CEILING, ROUND_FLOOR
+from typing import Any, Dict, Iterator, List, NamedTuple, Sequence, Tuple, Optional
 import logging
+import time
+
+from sortedcontainers import SortedDict
+
+from .depth_index import DepthIndex
+from .events import ALL_KINDS, LEVELS, SNAPSHOT, TOP, BookChange, ChangeWaiter, Subscription
 
 log = logging.getLogger("orderbook")
 
+# ----------------- Representação de preços/quantidades -----------------
+def _decimals_of(step) -> int:
+    """Número de casas decimais de um tick/lot size (ex.: "0.10" -> 1, "0.5" -> 1)."""
+    exponent = Decimal(str(step)).normalize().as_tuple().exponent
+    return max(0, -exponent)
+
+def _scaled_int(value, decimals: int) -> int:
+    """
+    Converte ``value`` para um inteiro escalado por ``10**decimals`` sem passar
+    por ``Decimal`` no caso comum (string decimal simples vinda do feed).
+    """
+    if isinstance(value, int):
+        return value * 10 ** decimals
+    if isinstance(value, str) and "e" not in value and "E" not in value:
+        whole, _, frac = value.partition(".")
+        if len(frac) > decimals:
+            if frac[decimals:].strip("0"):
+                raise ValueError(f"Valor {value!r} tem mais de {decimals} casas decimais")
+            frac = frac[:decimals]
+        return int(whole + frac.ljust(decimals, "0"))
+    scaled = Decimal(str(value)).scaleb(decimals)
+    if scaled != scaled.to_integral_value():
+        raise ValueError(f"Valor {value!r} tem mais de {decimals} casas decimais")
+    return int(scaled)
+
+class DecimalCodec:
+    """Representação padrão: preços e quantidades armazenados como ``Decimal``."""
+
+    fixed_point = False
+
+    @staticmethod
+    def encode_price(value) -> Decimal:
+        return value if isinstance(value, Decimal) else Decimal(value)
+
+    encode_size = encode_price
+
+    @staticmethod
+    def encode_bound(value, ceil: bool) -> Decimal:
+        return value if isinstance(value, Decimal) else Decimal(str(value))
+
+    @staticmethod
+    def decode_price(raw: Decimal) -> Decimal:
+        return raw
+
+    decode_size = decode_price
+
+class FixedPointCodec:
+    """
+    Representação em ponto fixo: preços e quantidades armazenados como ``int``
+    escalados pelas casas decimais do tick size / lot size do símbolo. A
+    conversão para ``Decimal`` acontece apenas na fronteira da API.
+    """
+
+    fixed_point = True
+
+    def __init__(self, tick_size, lot_size) -> None:
+        self.tick_size = Decimal(str(tick_size))
+        self.lot_size = Decimal(str(lot_size))
+        self.price_decimals = _decimals_of(tick_size)
+        self.size_decimals = _decimals_of(lot_size)
+        self._price_unit = Decimal(1).scaleb(-self.price_decimals)
+        self._size_unit = Decimal(1).scaleb(-self.size_decimals)
+
+    def encode_price(self, value) -> int:
+        return _scaled_int(value, self.price_decimals)
+
+    def encode_size(self, value) -> int:
+        return _scaled_int(value, self.size_decimals)
+
+    def encode_bound(self, value, ceil: bool) -> int:
+        """Converte um limite de preço arbitrário para ticks (arredondando para dentro da faixa)."""
+        scaled = Decimal(str(value)).scaleb(self.price_decimals)
+        return int(scaled.to_integral_value(ROUND_CEILING if ceil else ROUND_FLOOR))
+
+    def decode_price(self, raw: int) -> Decimal:
+        return Decimal(raw) * self._price_unit
+
+    def decode_size(self, raw: int) -> Decimal:
+        return Decimal(raw) * self._size_unit
+
+class BookSide(MutableMapping):
+    """
+    Um lado do livro (bids ou asks) mantido em ordem de preço.
+
+    Exposto como um mapeamento ``str -> Decimal`` para manter compatibilidade
+    com o antigo ``Dict[str, Decimal]``, mas indexado internamente em um
+    ``SortedDict``: inserções/remoções em O(log n), melhor preço em O(1) e
+    top-N como fatia. A iteração segue do topo do livro para fora (bids
+    decrescentes, asks crescentes). As chaves/valores internos seguem o codec
+    (``Decimal`` ou inteiros em ponto fixo).
+    """
+
+    __slots__ = ("_levels", "descending", "codec", "_index", "version")
+
+    def __init__(self, descending: bool = False, codec=None) -> None:
+        self._levels: SortedDict = SortedDict()
+        self.descending = descending
+        self.codec = codec or DecimalCodec()
+        self._index = DepthIndex(dense=self.codec.fixed_point)
+        self.version = 0  # incrementado quando o lado muda (usado pelos snapshots)
+
+    # ----------------- Interface de mapeamento -----------------
+    def _key(self, price):
+        """Chave interna de ``price``; preço que o codec não representa é KeyError (como no dict)."""
+        try:
+            return self.codec.encode_price(price)
+        except (InvalidOperation, TypeError, ValueError):
+            raise KeyError(price) from None
+
+    def __getitem__(self, price) -> Decimal:
+        return self.codec.decode_size(self._levels[self._key(price)])
+
+    def __setitem__(self, price, size) -> None:
+        """Quantidade zero remove o nível; negativa é ValueError (o livro só guarda níveis positivos)."""
+        key, raw = self.codec.encode_price(price), self.codec.encode_size(size)
+        if raw < 0:
+            raise ValueError(f"Quantidade negativa para o nível {price}: {size}")
+        if raw == 0:
+            if key in self._levels:
+                del self[price]
+            return
+        self._set_raw(key, raw)
+        self.version += 1
+
+    def __delitem__(self, price) -> None:
+        key = self._key(price)
+        old = self._levels.pop(key)
+        self.version += 1
+        if self._index.valid:
+            self._index.add(key, -old)
+
+    def __contains__(self, price) -> bool:
+        try:
+            return self._key(price) in self._levels
+        except KeyError:
+            return False
+
+    def __iter__(self) -> Iterator[str]:
+        keys = reversed(self._levels.keys()) if self.descending else iter(self._levels.keys())
+        decode = self.codec.decode_price
+        return (str(decode(p)) for p in keys)
+
+    def __len__(self) -> int:
+        return len(self._levels)
+
+    def __repr__(self) -> str:
+        return f"BookSide(descending={self.descending}, levels={len(self._levels)})"
+
+    def clear(self) -> None:
+        self._levels.clear()
+        self._index.invalidate()
+        self.version += 1
+
+    def items(self) -> List[Tuple[str, Decimal]]:  # type: ignore[override]
+        return [(str(p), q) for p, q in self.levels()]
+
+    def _set_raw(self, key, raw) -> None:
+        levels = self._levels
+        old = levels.get(key)
+        levels[key] = raw
+        if self._index.valid:
+            self._index.add(key, raw if old is None else raw - old)
+
+    def apply_level(self, price: str, size: str, allow_zero: bool = True) -> bool:
+        """
+        Aplica um nível cru do feed. Quantidade zero remove o nível (delta);
+        quantidade negativa (ou zero, com ``allow_zero=False``) é inválida:
+        o nível é removido/ignorado e o retorno é False.
+        """
+        raw = self.codec.encode_size(size)
+        key = self.codec.encode_price(price)
+        if raw > 0:
+            self._set_raw(key, raw)
+            return True
+        old = self._levels.pop(key, None)
+        if old is not None and self._index.valid:
+            self._index.add(key, -old)
+        return raw == 0 and allow_zero
+
+    # ----------------- Consultas ordenadas -----------------
+    def _decode(self, items: List[tuple]) -> List[Tuple[Decimal, Decimal]]:
+        if not self.codec.fixed_point:
+            return items
+        pu, su = self.codec._price_unit, self.codec._size_unit
+        return [(Decimal(p) * pu, Decimal(q) * su) for p, q in items]
+
+    def best_raw(self):
+        """Melhor preço na representação interna do codec (sem conversão)."""
+        if not self._levels:
+            return None
+        return self._levels.peekitem(-1 if self.descending else 0)[0]
+
+    def best_level_raw(self) -> Optional[tuple]:
+        """Melhor nível ``(preço, quantidade)`` na representação interna."""
+        if not self._levels:
+            return None
+        return self._levels.peekitem(-1 if self.descending else 0)
+
+    def nth_price_raw(self, n: int):
+        """Preço interno do n-ésimo melhor nível, ou None se o lado tem menos de ``n`` níveis."""
+        if n <= 0 or len(self._levels) < n:
+            return None
+        keys = self._levels.keys()
+        return keys[-n] if self.descending else keys[n - 1]
+
+    def within_top(self, key, threshold) -> bool:
+        """Se o preço interno ``key`` está entre os melhores níveis delimitados por ``threshold``."""
+        if threshold is None:
+            return True
+        return key >= threshold if self.descending else key <= threshold
+
+    def best(self) -> Optional[Decimal]:
+        """Melhor preço do lado (maior bid / menor ask) em O(1)."""
+        raw = self.best_raw()
+        return None if raw is None else self.codec.decode_price(raw)
+
+    def top(self, n: int) -> List[Tuple[Decimal, Decimal]]:
+        """Retorna os ``n`` melhores níveis ``(preço, quantidade)`` a partir do topo."""
+        if n <= 0:
+            return []
+        items = self._levels.items()
+        if self.descending:
+            return self._decode(items[-n:][::-1])
+        return self._decode(items[:n])
+
+    def levels(self) -> List[Tuple[Decimal, Decimal]]:
+        """Todos os níveis ordenados a partir do topo do livro."""
+        items = self._levels.items()
+        return self._decode(items[::-1] if self.descending else items[:])
+
+    def depth_to(self, price) -> Decimal:
+        """
+        Quantidade acumulada do topo do livro até ``price`` (inclusive), via
+        índice de somas de prefixo em O(log n).
+        """
+        index = self._index
+        if not index.valid:
+            index.rebuild(self._levels)
+        if self.descending:
+            raw = index.sum_at_or_above(self.codec.encode_bound(price, ceil=True))
+        else:
+            raw = index.sum_at_or_below(self.codec.encode_bound(price, ceil=False))
+        return self.codec.decode_size(raw)
+
+@dataclass(frozen=True)
+class BookSnapshot:
+    """
+    Visão imutável e consistente do livro em uma versão. Lados inalterados
+    entre versões compartilham a mesma tupla de níveis (estrutura compartilhada).
+    """
+    symbol: Optional[str]
+    market_type: Optional[str]
+    version: int
+    update_id: Optional[int]
+    bids: Tuple[Tuple[Decimal, Decimal], ...]   # do topo para fora
+    asks: Tuple[Tuple[Decimal, Decimal], ...]
+    bids_version: int = 0
+    asks_version: int = 0
+
+    def best_bid(self) -> Optional[Decimal]:
+        return self.bids[0][0] if self.bids else None
+
+    def best_ask(self) -> Optional[Decimal]:
+        return self.asks[0][0] if self.asks else None
+
+    def mid(self) -> Optional[Decimal]:
+        if not self.bids or not self.asks:
+            return None
+        return (self.bids[0][0] + self.asks[0][0]) / 2
+
+    def top_levels(self, side: str, n: int = 10) -> List[Tuple[Decimal, Decimal]]:
+        return list((self.bids if side == "bid" else self.asks)[:max(0, n)])
+
+    @cached_property
+    def payload(self) -> Dict[str, Any]:
+        """Formato JSON usado pelo runner/CLI (``[[preço, quantidade], ...]`` em strings)."""
+        return {
+            "symbol": self.symbol,
+            "version": self.version,
+            "update_id": self.update_id,
+            "bids": [[str(p), str(q)] for p, q in self.bids],
+            "asks": [[str(p), str(q)] for p, q in self.asks],
+        }
+
+class BookArrays(NamedTuple):
+    """Arrays float64 de um lado do livro, ordenados a partir do topo."""
+    prices: Any
+    sizes: Any
+    cumulative: Any
+
 class OrderBook:
-    """Mantém um livro de ofertas local (bids/asks) e aplica snapshots e deltas."""
+    """
+    Mantém um livro de ofertas local (bids/asks) e aplica snapshots e deltas.
+
+    Com ``tick_size`` e ``lot_size`` o livro opera em ponto fixo: preços e
+    quantidades viram inteiros escalados (ver ``FixedPointCodec``).
 
-    def __init__(self) -> None:
-        self.bids: Dict[str, Decimal] = {}
-        self.asks: Dict[str, Decimal] = {}
+    Níveis com quantidade inválida (negativa, ou zero em snapshot) ou que o
+    codec não representa (preço/quantidade malformados ou fora da grade do
+    tick/lot size) são tratados na ingestão, nível a nível: no modo leniente
+    (padrão) são descartados e contados em ``invalid_levels``; com
+    ``strict=True`` a mensagem inteira é rejeitada com ``ValueError`` antes
+    de alterar o livro.
+    """
+
+    def __init__(self, tick_size=None, lot_size=None, strict: bool = False) -> None:
+        codec = FixedPointCodec(tick_size, lot_size) if tick_size is not None and lot_size is not None else DecimalCodec()
+        self.bids: BookSide = BookSide(descending=True, codec=codec)
+        self.asks: BookSide = BookSide(descending=False, codec=codec)
         self.last_update_id: Optional[int] = None
         self.symbol: Optional[str] = None
         self.market_type: Optional[str] = None
+        self.strict = strict
+        # False após um gap de sequência, até o próximo snapshot (ver core/recovery.py)
+        self.valid = True
         self._sequence_errors: int = 0
+        self._invalid_levels: int = 0
         self._total_updates: int = 0
+        self._version: int = 0
+        self._seq: int = 0  # ímpar enquanto um update está sendo aplicado (ver snapshot())
+        self._snapshot: Optional[BookSnapshot] = None
+        self._array_cache: Dict[str, Tuple[int, BookArrays]] = {}
+        self._subscribers: List[Subscription] = []
+
+    @property
+    def fixed_point(self) -> bool:
+        return self.bids.codec.fixed_point
+
+    @property
+    def version(self) -> int:
+        """Contador monotônico incrementado a cada snapshot/delta aplicado."""
+        return self._version
+
+    def invalidate(self) -> None:
+        """Marca o livro como inconsistente (ex.: delta perdido); um snapshot o revalida."""
+        if self.valid:
+            self.valid = False
+            log.warning(f"Livro {self.symbol} marcado como inválido até o próximo snapshot")
 
     # ----------------- Aplicação de eventos -----------------
+    def _validate(self, levels: List[List[str]], snapshot: bool) -> None:
+        """Modo estrito: rejeita a mensagem se algum nível for inválido ou não representável."""
+        codec = self.bids.codec
+        for p, s in levels:
+            try:
+                codec.encode_price(p)
+                raw = codec.encode_size(s)
+            except (InvalidOperation, TypeError, ValueError) as e:
+                raise ValueError(f"Nível não representável {p}: {s} ({e})") from None
+            if raw < 0 or (snapshot and raw == 0):
+                raise ValueError(f"Quantidade inválida no nível {p}: {s}")
+
+    def _apply_levels(self, side: BookSide, levels: List[List[str]], snapshot: bool) -> None:
+        if levels:
+            side.version += 1
+        apply = side.apply_level
+        allow_zero = not snapshot
+        invalid = 0
+        for p, s in levels:
+            # apply_level codifica preço e quantidade antes de mexer no lado:
+            # um nível não representável é descartado sem aplicação parcial
+            try:
+                ok = apply(p, s, allow_zero)
+            except (InvalidOperation, TypeError, ValueError):
+                ok = False
+            if not ok:
+                invalid += 1
+        if invalid:
+            self._invalid_levels += invalid
+            log.debug(f"{invalid} níveis inválidos descartados")
+
     def apply_snapshot(self, bids: List[List[str]], asks: List[List[str]], update_id: Optional[int] = None) -> None:
         """Aplica um snapshot completo do orderbook."""
-        self.bids.clear()
-        self.asks.clear()
-        for p, s in bids:
-            self.bids[p] = Decimal(s)
-        for p, s in asks:
-            self.asks[p] = Decimal(s)
-        self.last_update_id = update_id
-        self._total_updates += 1
-        self._clean()
+        if self.strict:
+            self._validate(bids, snapshot=True)
+            self._validate(asks, snapshot=True)
+        top_before = self._top_state() if self._subscribers else None
+        self._seq += 1
+        try:
+            self.bids.clear()
+            self.asks.clear()
+            self._apply_levels(self.bids, bids, snapshot=True)
+            self._apply_levels(self.asks, asks, snapshot=True)
+            self.last_update_id = update_id
+            self.valid = True
+            self._total_updates += 1
+            self._version += 1
+        finally:
+            self._seq += 1
+        if self._subscribers:
+            self._publish_snapshot(top_before)
         log.debug(f"Snapshot aplicado: {len(self.bids)} bids, {len(self.asks)} asks, update_id={update_id}")
 
     def apply_delta(self, bids: List[List[str]], asks: List[List[str]], update_id: Optional[int] = None) -> bool:
         """
-        Aplica um delta ao orderbook.
+        Aplica um delta ao orderbook. O custo é proporcional ao número de
+        níveis da mensagem, não ao tamanho do livro.
         
         Returns:
             bool: True se o delta foi aplicado com sucesso, False se houve erro de sequência
+
+        Raises:
+            ValueError: no modo estrito, se algum nível tiver quantidade negativa
         """
         # Validar sequência de updates
         if update_id is not None and self.last_update_id is not None:
@@ -44,49 +424,198 @@ class OrderBook:
                 self._sequence_errors += 1
                 log.warning(f"Erro de sequência: update_id={update_id} <= last_update_id={self.last_update_id}")
                 return False
-        
+
+        if self.strict:
+            self._validate(bids, snapshot=False)
+            self._validate(asks, snapshot=False)
+
+        if self._subscribers:
+            top_before = self._top_state()
+            thresholds_before = self._thresholds()
+
         # Aplicar delta
-        for p, s in bids:
-            q = Decimal(s)
-            if q == 0:
-                self.bids.pop(p, None)
-            else:
-                self.bids[p] = q
-        for p, s in asks:
-            q = Decimal(s)
-            if q == 0:
-                self.asks.pop(p, None)
-            else:
-                self.asks[p] = q
-        
-        self.last_update_id = update_id
-        self._total_updates += 1
-        self._clean()
+        self._seq += 1
+        try:
+            self._apply_levels(self.bids, bids, snapshot=False)
+            self._apply_levels(self.asks, asks, snapshot=False)
+            self.last_update_id = update_id
+            self._total_updates += 1
+            self._version += 1
+        finally:
+            self._seq += 1
+        if self._subscribers:
+            self._publish_delta(bids, asks, top_before, thresholds_before)
         return True
 
-    def _clean(self) -> None:
-        for p in [k for k, v in self.bids.items() if v <= 0]:
-            self.bids.pop(p, None)
-        for p in [k for k, v in self.asks.items() if v <= 0]:
-            self.asks.pop(p, None)
+    def apply_deltas(self, batch: Sequence[Tuple[List[List[str]], List[List[str]], Optional[int]]]) -> int:
+        """
+        Aplica uma rajada de deltas ``(bids, asks, update_id)`` de uma vez.
+
+        A sequência é validada uma única vez para o lote (mensagens com
+        update_id não crescente são descartadas como erro de sequência), os
+        níveis são mesclados por preço (a última escrita vence) e o resultado é
+        aplicado em uma só passada, com uma única notificação aos assinantes.
+
+        Returns:
+            int: número de mensagens do lote efetivamente aplicadas
+
+        Raises:
+            ValueError: no modo estrito, se uma mensagem tiver quantidade
+                negativa; as anteriores a ela já foram aplicadas, como ao
+                aplicar os deltas um a um
+        """
+        last = self.last_update_id
+        encode_price = self.bids.codec.encode_price
+        merged_bids: Dict = {}
+        merged_asks: Dict = {}
+        applied = 0
+        error: Optional[ValueError] = None
+        for bids, asks, update_id in batch:
+            if update_id is not None and last is not None and update_id <= last:
+                self._sequence_errors += 1
+                log.warning(f"Erro de sequência: update_id={update_id} <= last_update_id={last}")
+                continue
+            if self.strict:
+                try:
+                    self._validate(bids, snapshot=False)
+                    self._validate(asks, snapshot=False)
+                except ValueError as e:
+                    error = e  # o prefixo válido é aplicado antes de propagar
+                    break
+            for levels, merged in ((bids, merged_bids), (asks, merged_asks)):
+                for p, s in levels:
+                    try:
+                        merged[encode_price(p)] = (p, s)
+                    except (InvalidOperation, TypeError, ValueError):
+                        self._invalid_levels += 1  # leniente: descartado como em _apply_levels
+            if update_id is not None:
+                last = update_id
+            applied += 1
+        if not applied:
+            if error is not None:
+                raise error
+            return 0
+        bids = list(merged_bids.values())
+        asks = list(merged_asks.values())
+
+        if self._subscribers:
+            top_before = self._top_state()
+            thresholds_before = self._thresholds()
+
+        self._seq += 1
+        try:
+            self._apply_levels(self.bids, bids, snapshot=False)
+            self._apply_levels(self.asks, asks, snapshot=False)
+            self.last_update_id = last
+            self._total_updates += applied
+            self._version += 1
+        finally:
+            self._seq += 1
+        if self._subscribers:
+            self._publish_delta(bids, asks, top_before, thresholds_before)
+        if error is not None:
+            raise error
+        return applied
+
+    # ----------------- Notificações de mudança -----------------
+    def subscribe(
+        self,
+        callback,
+        kinds=ALL_KINDS,
+        top_n: int = 10,
+        min_interval: float = 0.0,
+    ) -> Subscription:
+        """
+        Registra ``callback(BookChange)`` para mudanças do livro: ``"top"``
+        (melhor bid/ask), ``"levels"`` (nível alterado dentro do top ``top_n``)
+        e ``"snapshot"``. Sem assinantes, a aplicação de updates não tem custo extra.
+        """
+        sub = Subscription(self, callback, kinds=kinds, top_n=top_n, min_interval=min_interval)
+        self._subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        if sub in self._subscribers:
+            self._subscribers.remove(sub)
+
+    def watch(self, kinds=ALL_KINDS, top_n: int = 10) -> ChangeWaiter:
+        """Assinatura para consumidores asyncio (ver ``ChangeWaiter``)."""
+        return ChangeWaiter(self, kinds=kinds, top_n=top_n)
+
+    def _top_state(self) -> tuple:
+        return (self.bids.best_level_raw(), self.asks.best_level_raw())
+
+    def _thresholds(self) -> Dict[int, tuple]:
+        return {
+            sub.top_n: (self.bids.nth_price_raw(sub.top_n), self.asks.nth_price_raw(sub.top_n))
+            for sub in self._subscribers
+        }
+
+    def _changed_in_top(self, side: BookSide, levels: List[List[str]], before, after) -> Tuple[Tuple[str, str], ...]:
+        out = []
+        encode = side.codec.encode_price
+        for p, q in levels:
+            key = encode(p)
+            if side.within_top(key, before) or side.within_top(key, after):
+                out.append((p, q))
+        return tuple(out)
+
+    def _change(self, kind: str, bids=(), asks=()) -> BookChange:
+        return BookChange(
+            kind=kind,
+            symbol=self.symbol,
+            version=self._version,
+            update_id=self.last_update_id,
+            best_bid=self.best_bid(),
+            best_ask=self.best_ask(),
+            bids=bids,
+            asks=asks,
+        )
+
+    def _publish_delta(self, bids, asks, top_before: tuple, thresholds_before: Dict[int, tuple]) -> None:
+        top_changed = self._top_state() != top_before
+        per_n: Dict[int, tuple] = {}
+        for n, (bid_before, ask_before) in thresholds_before.items():
+            per_n[n] = (
+                self._changed_in_top(self.bids, bids, bid_before, self.bids.nth_price_raw(n)),
+                self._changed_in_top(self.asks, asks, ask_before, self.asks.nth_price_raw(n)),
+            )
+        for sub in list(self._subscribers):
+            changed_bids, changed_asks = per_n.get(sub.top_n, ((), ()))
+            if top_changed and TOP in sub.kinds:
+                kind = TOP
+            elif (changed_bids or changed_asks) and LEVELS in sub.kinds:
+                kind = LEVELS
+            else:
+                continue
+            sub.offer(self._change(kind, changed_bids, changed_asks))
+
+    def _publish_snapshot(self, top_before: tuple) -> None:
+        top_changed = self._top_state() != top_before
+        for sub in list(self._subscribers):
+            if SNAPSHOT in sub.kinds:
+                kind = SNAPSHOT
+            elif top_changed and TOP in sub.kinds:
+                kind = TOP
+            elif LEVELS in sub.kinds:
+                kind = LEVELS
+            else:
+                continue
+            sub.offer(self._change(kind))
 
     # ----------------- Consultas -----------------
     def best_bid(self) -> Optional[Decimal]:
-        if not self.bids:
-            return None
-        return max(Decimal(p) for p in self.bids.keys())
+        return self.bids.best()
 
     def best_ask(self) -> Optional[Decimal]:
-        if not self.asks:
-            return None
-        return min(Decimal(p) for p in self.asks.keys())
+        return self.asks.best()
 
     def mid(self) -> Optional[Decimal]:
-        bb = self.best_bid()
-        ba = self.best_ask()
+        bb = self.bids.best_raw()
+        ba = self.asks.best_raw()
         if bb is None or ba is None:
             return None
-        return (bb + ba) / 2
+        return self.bids.codec.decode_price(bb + ba) / 2
 
     def size_at(self, price: Decimal) -> Tuple[Decimal, Optional[str]]:
         s = self.bids.get(str(price))
@@ -99,16 +628,12 @@ class OrderBook:
 
     def top_levels(self, side: str, n: int = 10) -> List[Tuple[Decimal, Decimal]]:
         if side == "bid":
-            levels = sorted((Decimal(p), q) for p, q in self.bids.items())
-            levels = levels[::-1]
-        else:
-            levels = sorted((Decimal(p), q) for p, q in self.asks.items())
-        return levels[:n]
+            return self.bids.top(n)
+        return self.asks.top(n)
 
     # ----------------- Cumulativos p/ gráfico -----------------
-    def cumulative_bids(self) -> List[Tuple[Decimal, Decimal]]:
-        levels = sorted((Decimal(p), q) for p, q in self.bids.items())
-        levels = levels[::-1]  # desc
+    @staticmethod
+    def _cumulative(levels: List[Tuple[Decimal, Decimal]]) -> List[Tuple[Decimal, Decimal]]:
         out: List[Tuple[Decimal, Decimal]] = []
         run = Decimal(0)
         for price, qty in levels:
@@ -116,14 +641,122 @@ class OrderBook:
             out.append((price, run))
         return out
 
+    def cumulative_bids(self) -> List[Tuple[Decimal, Decimal]]:
+        return self._cumulative(self.bids.levels())  # desc
+
     def cumulative_asks(self) -> List[Tuple[Decimal, Decimal]]:
-        levels = sorted((Decimal(p), q) for p, q in self.asks.items())
-        out: List[Tuple[Decimal, Decimal]] = []
-        run = Decimal(0)
-        for price, qty in levels:
-            run += qty
-            out.append((price, run))
-        return out
+        return self._cumulative(self.asks.levels())
+
+    # ----------------- Profundidade via índice de prefixos -----------------
+    def cumulative_size(self, side: str, price) -> Decimal:
+        """Quantidade acumulada do topo do lado ``side`` até ``price`` (inclusive), em O(log n)."""
+        return (self.bids if side == "bid" else self.asks).depth_to(price)
+
+    def liquidity_within(self, pct: float) -> Optional[Dict[str, Decimal]]:
+        """
+        Liquidez de cada lado dentro de ±``pct``% do mid, em O(log n) por lado.
+
+        Returns:
+            {"lower", "upper", "bids", "asks"} ou None se o livro não tem mid.
+        """
+        mid = self.mid()
+        if mid is None:
+            return None
+        lower = mid * (Decimal(1) - Decimal(pct) / Decimal(100))
+        upper = mid * (Decimal(1) + Decimal(pct) / Decimal(100))
+        return {
+            "lower": lower,
+            "upper": upper,
+            "bids": self.bids.depth_to(lower),
+            "asks": self.asks.depth_to(upper),
+        }
+
+    # ----------------- Snapshots imutáveis -----------------
+    def snapshot(self, max_retries: int = 1000) -> BookSnapshot:
+        """
+        Retorna uma visão imutável e consistente do livro na versão atual.
+
+        O snapshot é cacheado por versão (chamadas repetidas sem updates não
+        custam nada) e lados que não mudaram reaproveitam a tupla anterior.
+        Pode ser chamado de outras threads sem travar a ingestão: a cópia é
+        validada com um contador de sequência (seqlock) e refeita se um update
+        ocorreu durante a leitura.
+        """
+        for _ in range(max_retries):
+            cached = self._snapshot
+            seq = self._seq
+            if (cached is not None and not seq & 1 and cached.version == self._version
+                    and cached.bids_version == self.bids.version and cached.asks_version == self.asks.version):
+                return cached
+            if seq & 1:
+                time.sleep(0)  # update em andamento: cede o GIL à thread de ingestão
+                continue
+            try:
+                version = self._version
+                bids_version, asks_version = self.bids.version, self.asks.version
+                bids = cached.bids if cached is not None and cached.bids_version == bids_version \
+                    else tuple(self.bids.levels())
+                asks = cached.asks if cached is not None and cached.asks_version == asks_version \
+                    else tuple(self.asks.levels())
+                update_id = self.last_update_id
+            except Exception:  # noqa: BLE001 - estrutura alterada durante a leitura
+                continue
+            if self._seq != seq:
+                continue
+            snap = BookSnapshot(
+                symbol=self.symbol,
+                market_type=self.market_type,
+                version=version,
+                update_id=update_id,
+                bids=bids,
+                asks=asks,
+                bids_version=bids_version,
+                asks_version=asks_version,
+            )
+            self._snapshot = snap
+            return snap
+        if self._snapshot is not None:
+            return self._snapshot
+        raise RuntimeError("Não foi possível obter um snapshot consistente do livro")
+
+    # ----------------- Arrays p/ consumidores vetorizados -----------------
+    def to_arrays(self, side: str, n: Optional[int] = None) -> BookArrays:
+        """
+        Retorna arrays float64 contíguos (preços, quantidades, quantidade
+        cumulativa) do lado ``side``, ordenados a partir do topo do livro.
+
+        Os arrays são construídos uma vez por versão do livro (e do lado) e reaproveitados
+        entre chamadas; são somente leitura, e ``n`` devolve views dos mesmos
+        buffers.
+        """
+        import numpy as np  # numpy só é necessário para consumidores vetorizados
+
+        key = "bid" if side == "bid" else "ask"
+        book_side = self.bids if key == "bid" else self.asks
+        # A versão do lado cobre escritas diretas (book.bids[p] = q), que não passam pelo livro
+        version = (self._version, book_side.version)
+        cached = self._array_cache.get(key)
+        if cached is None or cached[0] != version:
+            levels = book_side._levels
+            count = len(levels)
+            keys = reversed(levels.keys()) if book_side.descending else iter(levels.keys())
+            prices = np.fromiter(keys, dtype=np.float64, count=count) if book_side.codec.fixed_point \
+                else np.fromiter((float(p) for p in keys), dtype=np.float64, count=count)
+            values = reversed(levels.values()) if book_side.descending else iter(levels.values())
+            sizes = np.fromiter(values, dtype=np.float64, count=count) if book_side.codec.fixed_point \
+                else np.fromiter((float(q) for q in values), dtype=np.float64, count=count)
+            if book_side.codec.fixed_point:
+                prices /= 10 ** book_side.codec.price_decimals
+                sizes /= 10 ** book_side.codec.size_decimals
+            cumulative = np.cumsum(sizes)
+            for arr in (prices, sizes, cumulative):
+                arr.setflags(write=False)
+            cached = (version, BookArrays(prices, sizes, cumulative))
+            self._array_cache[key] = cached
+        arrays = cached[1]
+        if n is None:
+            return arrays
+        return BookArrays(arrays.prices[:n], arrays.sizes[:n], arrays.cumulative[:n])
 
     # ----------------- Métricas e Estatísticas -----------------
     def get_stats(self) -> Dict[str, any]:
@@ -151,8 +784,10 @@ class OrderBook:
             "ask_levels": len(self.asks),
             "total_levels": len(self.bids) + len(self.asks),
             "last_update_id": self.last_update_id,
+            "valid": self.valid,
             "total_updates": self._total_updates,
             "sequence_errors": self._sequence_errors,
+            "invalid_levels": self._invalid_levels,
             "error_rate": (self._sequence_errors / max(1, self._total_updates)) * 100
         }
 
@@ -162,11 +797,9 @@ class OrderBook:
         if not mid:
             return {}
         
-        lower_bound = mid * (Decimal(1) - Decimal(depth_pct) / Decimal(100))
-        upper_bound = mid * (Decimal(1) + Decimal(depth_pct) / Decimal(100))
-        
-        bid_liquidity = sum(q for p, q in self.bids.items() if Decimal(p) >= lower_bound)
-        ask_liquidity = sum(q for p, q in self.asks.items() if Decimal(p) <= upper_bound)
+        band = self.liquidity_within(depth_pct)
+        bid_liquidity = band["bids"]
+        ask_liquidity = band["asks"]
         
         return {
             "bid_liquidity": float(bid_liquidity),
@@ -0,0 +1,441 @@
+from __future__ import annotations
+import json
+import logging
+import re
+import sqlite3
+from contextlib import closing
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .history import DEFAULT_HISTORY_DB, STAT_COLUMNS, Levels, OrderbookHistory, _epoch_ms, _projection, _sql_ts
+from .orderbook import BookSnapshot, OrderBook
+from .rollups import delete_rollups_before
+
+log = logging.getLogger("history")
+
+# ----------------- Layout particionado -----------------
+# Catálogo:  history_partitions, uma linha por (símbolo, dia UTC) com a faixa
+#            de ids e de timestamps gravados na partição.
+# Partição:  tabela p_<SÍMBOLO>_<AAAAMMDD> com ts_ms INTEGER (epoch em ms) e as
+#            mesmas colunas de estatística / snapshot_data / keyframe_id /
+#            book_blob de ``orderbook_snapshots``.
+# Ids:       history_ids, tabela AUTOINCREMENT sempre vazia; o contador em
+#            sqlite_sequence é a fonte dos ids globais.
+CATALOG = "history_partitions"
+ID_SEQUENCE = "history_ids"
+DAY_MS = 86_400_000
+_MIN_MS, _MAX_MS = -2**63, 2**63 - 1
+
+def partition_name(symbol: str, day: date) -> str:
+    return f"p_{re.sub(r'[^0-9A-Za-z]', '_', symbol)}_{day:%Y%m%d}"
+
+def _day_of(ts_ms: int) -> date:
+    return (datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(milliseconds=ts_ms)).date()
+
+def _from_ms(ts_ms: int) -> datetime:
+    return datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(milliseconds=ts_ms)
+
+def _bounds(start_time: Optional[datetime], end_time: Optional[datetime]) -> Tuple[int, int]:
+    return (
+        _epoch_ms(start_time) if start_time else _MIN_MS,
+        _epoch_ms(end_time) if end_time else _MAX_MS,
+    )
+
+class PartitionedHistory(OrderbookHistory):
+    """
+    Histórico particionado por símbolo e dia (UTC), com timestamps inteiros em ms.
+
+    Cada ``(símbolo, dia)`` vira uma tabela própria registrada no catálogo
+    ``history_partitions``: consultas por intervalo só abrem as partições
+    cuja faixa de timestamps cruza o intervalo, e a retenção descarta
+    partições inteiras (``DROP TABLE``) em vez de apagar linha a linha.
+    Os ids são globais ao banco, então ``restore_orderbook(id)`` continua
+    valendo. No modo delta uma cadeia nunca atravessa partições: o primeiro
+    snapshot de cada dia é sempre um keyframe.
+    """
+
+    def __init__(
+        self,
+        db_path: str = DEFAULT_HISTORY_DB,
+        storage: str = "json",
+        keyframe_every: int = 60,
+        cache_bytes: int = 64 * 2**20,
+    ):
+        self._tables: Dict[Tuple[str, date], str] = {}
+        self._chain_tables: Dict[str, str] = {}
+        super().__init__(db_path, storage, keyframe_every, cache_bytes)
+
+    def _init_db(self) -> None:
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {CATALOG} (
+                    name TEXT PRIMARY KEY,
+                    symbol TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    start_ms INTEGER NOT NULL,
+                    min_id INTEGER,
+                    max_id INTEGER,
+                    min_ts INTEGER,
+                    max_ts INTEGER,
+                    rows INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_partitions_symbol_start
+                ON {CATALOG}(symbol, start_ms)
+            """)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {ID_SEQUENCE} (id INTEGER PRIMARY KEY AUTOINCREMENT)")
+            # Bancos anteriores ao contador: continua depois do maior id catalogado
+            conn.execute(f"""
+                INSERT INTO sqlite_sequence (name, seq)
+                SELECT ?, COALESCE(MAX(max_id), 0) FROM {CATALOG}
+                WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+            """, (ID_SEQUENCE, ID_SEQUENCE))
+
+    # ----------------- Escrita -----------------
+    def _partition(self, conn: sqlite3.Connection, symbol: str, ts_ms: int) -> str:
+        """Tabela da partição de ``ts_ms`` (criada e catalogada na primeira gravação do dia)."""
+        day = _day_of(ts_ms)
+        name = self._tables.get((symbol, day))
+        if name is not None:
+            return name
+        name = partition_name(symbol, day)
+        stat_columns = ",\n".join(
+            f"{c} {'INTEGER' if c in ('bid_levels', 'ask_levels', 'total_updates', 'sequence_errors') else 'REAL'}"
+            for c in STAT_COLUMNS
+        )
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {name} (
+                id INTEGER PRIMARY KEY,
+                ts_ms INTEGER NOT NULL,
+                market_type TEXT NOT NULL,
+                {stat_columns},
+                snapshot_data TEXT NOT NULL,
+                keyframe_id INTEGER,
+                book_blob BLOB
+            )
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_ts ON {name}(ts_ms)")
+        conn.execute(
+            f"INSERT OR IGNORE INTO {CATALOG} (name, symbol, day, start_ms) VALUES (?, ?, ?, ?)",
+            (name, symbol, day.isoformat(), _epoch_ms(datetime(day.year, day.month, day.day, tzinfo=timezone.utc))),
+        )
+        owner = conn.execute(f"SELECT symbol FROM {CATALOG} WHERE name = ?", (name,)).fetchone()[0]
+        if owner != symbol:
+            raise ValueError(f"Partição {name} já pertence a {owner}; símbolo {symbol} colide no nome")
+        self._tables[(symbol, day)] = name
+        return name
+
+    def insert_snapshot(
+        self,
+        conn: sqlite3.Connection,
+        stats: Dict,
+        snap: BookSnapshot,
+        symbol: str,
+        market_type: str,
+        captured_at: Optional[datetime] = None,
+    ) -> None:
+        self._insert_row(
+            conn, symbol, market_type, stats, snap.payload["bids"], snap.payload["asks"],
+            captured_at or datetime.now(timezone.utc),
+        )
+
+    def _insert_row(
+        self,
+        conn: sqlite3.Connection,
+        symbol: str,
+        market_type: str,
+        stats: Dict,
+        bids: Levels,
+        asks: Levels,
+        captured_at: datetime,
+        row_id: Optional[int] = None,
+    ) -> int:
+        """Grava uma linha na partição do dia; ``row_id`` None aloca o próximo id global."""
+        ts_ms = _epoch_ms(captured_at)
+        try:
+            row_id = self._allocate_id(conn, row_id)  # primeira escrita: já pega o lock de escrita
+            table = self._partition(conn, symbol, ts_ms)
+            if self._chain_tables.get(symbol) != table:
+                self._chains.pop(symbol, None)  # nova partição começa com keyframe
+                self._chain_tables[symbol] = table
+            snapshot_json, keyframe_id, book_blob = self._encode_book(symbol, bids, asks, captured_at)
+            conn.execute(
+                f"INSERT INTO {table} (id, ts_ms, market_type, {', '.join(STAT_COLUMNS)}, "
+                f"snapshot_data, keyframe_id, book_blob) VALUES ({', '.join('?' * (len(STAT_COLUMNS) + 6))})",
+                (row_id, ts_ms, market_type, *[stats.get(c) for c in STAT_COLUMNS], snapshot_json, keyframe_id, book_blob),
+            )
+            conn.execute(f"""
+                UPDATE {CATALOG} SET
+                    min_id = MIN(COALESCE(min_id, ?1), ?1), max_id = MAX(COALESCE(max_id, ?1), ?1),
+                    min_ts = MIN(COALESCE(min_ts, ?2), ?2), max_ts = MAX(COALESCE(max_ts, ?2), ?2),
+                    rows = rows + 1
+                WHERE name = ?3
+            """, (row_id, ts_ms, table))
+            self._update_rollups(conn, symbol, captured_at, stats, bids, asks)
+            if self.storage == "delta" and keyframe_id is None:
+                self._start_chain(symbol, row_id)
+            return row_id
+        except Exception:
+            self._chains.pop(symbol, None)
+            self._chain_tables.pop(symbol, None)
+            raise
+
+    def _allocate_id(self, conn: sqlite3.Connection, row_id: Optional[int]) -> int:
+        """
+        Próximo id global pelo contador AUTOINCREMENT (atômico entre processos
+        e nunca reutilizado, nem depois de partições descartadas); um
+        ``row_id`` explícito só avança o contador.
+        """
+        if row_id is None:
+            row_id = conn.execute(f"INSERT INTO {ID_SEQUENCE} DEFAULT VALUES").lastrowid
+            conn.execute(f"DELETE FROM {ID_SEQUENCE}")
+        else:
+            conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (row_id, ID_SEQUENCE))
+        return row_id
+
+    def _snapshot_count(self, conn: sqlite3.Connection) -> int:
+        return conn.execute(f"SELECT COALESCE(SUM(rows), 0) FROM {CATALOG}").fetchone()[0]
+
+    def _rollup_source(self, conn: sqlite3.Connection, chunk_size: int) -> Iterator[Tuple[str, int, Dict, Levels, Levels]]:
+        parts = conn.execute(f"SELECT name, symbol FROM {CATALOG} ORDER BY symbol, start_ms").fetchall()
+        for name, symbol in parts:
+            cursor = conn.execute(
+                f"SELECT id, ts_ms, snapshot_data, keyframe_id, book_blob, {', '.join(STAT_COLUMNS)} "
+                f"FROM {name} ORDER BY id"
+            )
+            for row, ts_ms, bids, asks in self._iter_levels(conn, cursor, chunk_size, name):
+                yield symbol, row[1], dict(zip(STAT_COLUMNS, row[5:])), bids, asks
+
+    def reset_chains(self) -> None:
+        # Um rollback pode ter desfeito a criação de partições: recria sob demanda
+        super().reset_chains()
+        self._chain_tables.clear()
+        self._tables.clear()
+
+    # ----------------- Catálogo -----------------
+    def _partition_rows(
+        self, conn: sqlite3.Connection, symbol: Optional[str], start_ms: int, end_ms: int, descending: bool = False
+    ) -> List[tuple]:
+        query = f"SELECT * FROM {CATALOG} WHERE max_ts >= ? AND min_ts <= ?"
+        params: list = [start_ms, end_ms]
+        if symbol is not None:
+            query += " AND symbol = ?"
+            params.append(symbol)
+        query += f" ORDER BY start_ms {'DESC' if descending else 'ASC'}, symbol"
+        return conn.execute(query, params).fetchall()
+
+    def partitions(
+        self,
+        symbol: Optional[str] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+    ) -> List[Dict]:
+        """Partições com dados no intervalo, em ordem cronológica."""
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in self._partition_rows(conn, symbol, *_bounds(start_time, end_time))]
+
+    def _max_snapshot_id(self, conn: sqlite3.Connection) -> int:
+        return conn.execute(f"SELECT COALESCE(MAX(max_id), 0) FROM {CATALOG}").fetchone()[0]
+
+    def _appended_ranges(self, conn: sqlite3.Connection, after_id: int) -> List[Tuple[str, int, int]]:
+        ranges = []
+        parts = conn.execute(f"SELECT name, symbol FROM {CATALOG} WHERE max_id > ?", (after_id,)).fetchall()
+        for name, symbol in parts:
+            lo, hi = conn.execute(f"SELECT MIN(ts_ms), MAX(ts_ms) FROM {name} WHERE id > ?", (after_id,)).fetchone()
+            if lo is not None:
+                ranges.append((symbol, lo, hi))
+        return ranges
+
+    # ----------------- Leitura -----------------
+    def _get_snapshots(
+        self, symbol: str, start_time: Optional[datetime], end_time: Optional[datetime], limit: int
+    ) -> List[Dict]:
+        """Snapshots do mais recente para o mais antigo, parando na partição que completar ``limit``."""
+        start_ms, end_ms = _bounds(start_time, end_time)
+        result: List[Dict] = []
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            conn.row_factory = sqlite3.Row
+            for part in self._partition_rows(conn, symbol, start_ms, end_ms, descending=True):
+                rows = conn.execute(
+                    f"SELECT * FROM {part['name']} WHERE ts_ms BETWEEN ? AND ? ORDER BY ts_ms DESC, id DESC LIMIT ?",
+                    (start_ms, end_ms, limit - len(result)),
+                )
+                for row in rows:
+                    snapshot = dict(row)
+                    snapshot["symbol"] = symbol
+                    snapshot["timestamp"] = _sql_ts(_from_ms(row["ts_ms"]))
+                    result.append(snapshot)
+                if len(result) >= limit:
+                    break
+        return result
+
+    def iter_snapshots(
+        self,
+        symbol: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        columns: Sequence[str] = ("id", "timestamp", "best_bid", "best_ask"),
+        chunk_size: int = 1000,
+        descending: bool = False,
+    ) -> Iterator[tuple]:
+        stored, need_book = _projection(columns)
+        select = ["id", "ts_ms"] + (["snapshot_data", "keyframe_id", "book_blob"] if need_book else []) + stored
+        order = "DESC" if descending else "ASC"
+        start_ms, end_ms = _bounds(start_time, end_time)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            for part in self._partition_rows(conn, symbol, start_ms, end_ms, descending):
+                name = part[0]
+                cursor = conn.execute(
+                    f"SELECT {', '.join(select)} FROM {name} WHERE ts_ms BETWEEN ? AND ? "
+                    f"ORDER BY ts_ms {order}, id {order}",
+                    (start_ms, end_ms),
+                )
+                yield from self._project_rows(
+                    conn, cursor, symbol, columns, stored, need_book, chunk_size, not descending,
+                    ts_ms=lambda v: v, ts_text=lambda v: _sql_ts(_from_ms(v)), table=name,
+                )
+        finally:
+            conn.close()
+
+    def _restore_orderbook(self, snapshot_id: int) -> Optional[OrderBook]:
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            # Faixas de ids de símbolos diferentes se intercalam: no máximo um candidato por símbolo ativo
+            candidates = conn.execute(
+                f"SELECT name, symbol FROM {CATALOG} WHERE ? BETWEEN min_id AND max_id", (snapshot_id,)
+            ).fetchall()
+            for name, symbol in candidates:
+                row = conn.execute(
+                    f"SELECT snapshot_data, keyframe_id, book_blob FROM {name} WHERE id = ?", (snapshot_id,)
+                ).fetchone()
+                if row is None:
+                    continue
+                snapshot_data, keyframe_id, book_blob = row
+                try:
+                    if book_blob is not None:
+                        return self._restore_chain(conn, snapshot_id, keyframe_id or snapshot_id, symbol, name)
+                    data = json.loads(snapshot_data)
+                    book = OrderBook()
+                    book.symbol = symbol
+                    book.apply_snapshot(data["bids"], data["asks"])
+                    return book
+                except Exception as e:
+                    log.error(f"Erro ao restaurar orderbook: {e}")
+                    return None
+        return None
+
+    def iter_books(
+        self,
+        symbol: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        chunk_size: int = 1000,
+    ) -> Iterator[Tuple[int, Levels, Levels]]:
+        start_ms, end_ms = _bounds(start_time, end_time)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            for part in self._partition_rows(conn, symbol, start_ms, end_ms):
+                name = part[0]
+                cursor = conn.execute(
+                    f"SELECT id, ts_ms, snapshot_data, keyframe_id, book_blob FROM {name} "
+                    "WHERE ts_ms BETWEEN ? AND ? ORDER BY ts_ms, id",
+                    (start_ms, end_ms),
+                )
+                for _, ts_ms, bids, asks in self._iter_levels(conn, cursor, chunk_size, name):
+                    yield ts_ms, bids, asks
+        finally:
+            conn.close()
+
+    # ----------------- Retenção -----------------
+    def cleanup_old_data(self, days_to_keep: int = 30) -> int:
+        """Descarta as partições de dias anteriores a hoje - ``days_to_keep`` (UTC); retorna os snapshots removidos."""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=days_to_keep)).date()
+        with sqlite3.connect(self.db_path) as conn:
+            old = conn.execute(
+                f"SELECT name, symbol, day, rows FROM {CATALOG} WHERE day < ?", (cutoff.isoformat(),)
+            ).fetchall()
+            for name, symbol, day, _ in old:
+                conn.execute(f"DROP TABLE IF EXISTS {name}")
+                conn.execute(f"DELETE FROM {CATALOG} WHERE name = ?", (name,))
+                self._tables.pop((symbol, date.fromisoformat(day)), None)
+                if self._chain_tables.get(symbol) == name:
+                    self._chain_tables.pop(symbol)
+                    self._chains.pop(symbol, None)
+            delete_rollups_before(conn, _epoch_ms(datetime(cutoff.year, cutoff.month, cutoff.day, tzinfo=timezone.utc)))
+        if self.cache is not None:
+            self.cache.clear()
+        deleted_count = sum(rows for *_, rows in old)
+        log.info(f"Removidas {len(old)} partições antigas ({deleted_count} snapshots)")
+        return deleted_count
+
+# ----------------- Migração e seleção de backend -----------------
+def migrate_history(source, target: PartitionedHistory, chunk_size: int = 5000) -> int:
+    """
+    Copia um banco ``orderbook_snapshots`` (JSON ou keyframe + diff) para
+    ``target``, símbolo a símbolo, preservando ids, colunas de estatística e o
+    instante de cada snapshot. Os livros são reconstruídos e regravados no modo
+    de armazenamento do destino, o que reancora as cadeias delta por dia.
+    A origem é aberta somente leitura; o destino precisa estar vazio.
+    """
+    source_path = Path(getattr(source, "db_path", source))
+    if not source_path.exists():
+        raise FileNotFoundError(f"Banco de origem não encontrado: {source_path}")
+    with closing(sqlite3.connect(target.db_path)) as conn:
+        if conn.execute(f"SELECT COUNT(*) FROM {CATALOG}").fetchone()[0]:
+            raise ValueError(f"Destino {target.db_path} já tem partições; a migração exige um banco vazio")
+    src = sqlite3.connect(f"{source_path.resolve().as_uri()}?mode=ro", uri=True)
+    dst = target.connect()
+    migrated = skipped = 0
+    try:
+        columns = {row[1] for row in src.execute("PRAGMA table_info(orderbook_snapshots)")}
+        if not columns:
+            raise ValueError(f"{source_path} não tem a tabela orderbook_snapshots")
+        # Bancos anteriores ao modo delta não têm estas colunas
+        delta_columns = ", ".join(c if c in columns else f"NULL AS {c}" for c in ("keyframe_id", "book_blob"))
+        symbols = [row[0] for row in src.execute("SELECT DISTINCT symbol FROM orderbook_snapshots ORDER BY symbol")]
+        for symbol in symbols:
+            total = src.execute("SELECT COUNT(*) FROM orderbook_snapshots WHERE symbol = ?", (symbol,)).fetchone()[0]
+            cursor = src.execute(
+                f"SELECT id, timestamp, snapshot_data, {delta_columns}, market_type, {', '.join(STAT_COLUMNS)} "
+                "FROM orderbook_snapshots WHERE symbol = ? ORDER BY id",
+                (symbol,),
+            )
+            done = 0
+            for row, ts_ms, bids, asks in target._iter_levels(src, cursor, chunk_size):
+                stats = dict(zip(STAT_COLUMNS, row[6:]))
+                target._insert_row(dst, symbol, row[5], stats, bids, asks, _from_ms(ts_ms), row_id=row[0])
+                done += 1
+                if done % chunk_size == 0:
+                    dst.commit()
+            dst.commit()
+            migrated += done
+            skipped += total - done
+            log.info(f"Migrados {done} snapshots de {symbol}")
+    finally:
+        src.close()
+        dst.close()
+        target.reset_chains()
+    log.info(f"Migração concluída: {migrated} snapshots ({skipped} ignorados) de {source_path} para {target.db_path}")
+    return migrated
+
+def history_backend(db_path: str) -> Optional[str]:
+    """``"partitioned"``, ``"single"`` ou None (arquivo inexistente ou sem histórico)."""
+    path = Path(db_path)
+    if not path.exists():
+        return None
+    with closing(sqlite3.connect(path)) as conn:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if CATALOG in tables:
+        return "partitioned"
+    return "single" if "orderbook_snapshots" in tables else None
+
+def open_history(
+    db_path: str, storage: str = "json", keyframe_every: int = 60, cache_bytes: int = 64 * 2**20
+) -> OrderbookHistory:
+    """Abre ``db_path`` no backend em que foi criado (particionado ou tabela única)."""
+    if history_backend(db_path) == "partitioned":
+        return PartitionedHistory(db_path, storage, keyframe_every, cache_bytes)
+    return OrderbookHistory(db_path, storage, keyframe_every, cache_bytes)
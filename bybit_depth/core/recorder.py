@@ -0,0 +1,322 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+log = logging.getLogger("recorder")
+
+# ----------------- Formato do arquivo de captura (.bdr) -----------------
+# Segmento:  MAGIC | <I tamanho do cabeçalho> | cabeçalho JSON | bloco*
+# Bloco:     <IIqqI (bytes comprimidos, bytes brutos, ts_ns do 1º frame, ts_ns do último, nº de frames)
+#            seguido do payload zlib
+# Payload:   registros <qI (ts_ns de recebimento, tamanho) + frame bruto em UTF-8
+MAGIC = b"BDREC1\n"
+SEGMENT_SUFFIX = ".bdr"
+_HEADER_LEN = struct.Struct("<I")
+BLOCK_HEADER = struct.Struct("<IIqqI")
+RECORD_HEADER = struct.Struct("<qI")
+
+class FeedRecorder:
+    """
+    Grava cada frame bruto do WebSocket, com o timestamp de recebimento, em
+    segmentos append-only comprimidos.
+
+    ``record`` só empacota o frame em um buffer em memória; quando o bloco
+    atinge ``block_size`` bytes ele é entregue a uma thread que comprime e
+    escreve, então o loop de ingestão não paga a compressão nem o I/O. A
+    própria thread sela o bloco que está aberto há ``flush_interval`` s, mesmo
+    que nenhum frame novo chegue. Segmentos rotacionam por tamanho
+    (``segment_bytes``, comprimido) e por tempo (``segment_seconds``).
+
+    ``record`` nunca bloqueia um event loop: com a fila de blocos cheia (disco
+    mais lento que o feed) o bloco é descartado e contado em
+    ``dropped_blocks``/``dropped_frames``. Fora de um loop (ferramentas
+    offline) a chamada espera a escrita.
+    """
+
+    def __init__(
+        self,
+        directory,
+        prefix: str = "feed",
+        meta: Optional[dict] = None,
+        block_size: int = 256 * 1024,
+        segment_bytes: int = 256 * 2**20,
+        segment_seconds: float = 3600.0,
+        flush_interval: float = 1.0,
+        level: int = 6,
+        max_pending_blocks: int = 64,
+    ) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix
+        self.meta = dict(meta or {})
+        self.block_size = block_size
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.flush_interval = flush_interval
+        self.level = level
+
+        self._buf = bytearray()
+        self._buf_count = 0
+        self._buf_first_ts = 0
+        self._buf_last_ts = 0
+        self._buf_started = time.monotonic()
+        self._lock = threading.Lock()   # buffer compartilhado com o selo por tempo da thread
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=max_pending_blocks)
+        self._closed = False
+
+        # Estado do segmento (somente na thread de escrita)
+        self._file = None
+        self._segment_started = 0.0
+        self._segment_size = 0
+        self._segment_index = 0
+        self.segments: List[Path] = []
+
+        # Contadores
+        self.frames = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.blocks = 0
+        self.stalls = 0
+        self.dropped_blocks = 0
+        self.dropped_frames = 0
+        self._error: Optional[BaseException] = None
+
+        self._thread = threading.Thread(target=self._writer, name=f"recorder-{prefix}", daemon=True)
+        self._thread.start()
+
+    # ----------------- Caminho quente -----------------
+    def record(self, raw, ts_ns: Optional[int] = None) -> None:
+        """Acrescenta um frame ao bloco corrente (``ts_ns``: relógio de parede em ns)."""
+        if ts_ns is None:
+            ts_ns = time.time_ns()
+        data = raw.encode("utf-8") if isinstance(raw, str) else bytes(raw)
+        with self._lock:
+            if not self._buf_count:
+                self._buf_first_ts = ts_ns
+                self._buf_started = time.monotonic()
+            self._buf_last_ts = ts_ns
+            self._buf += RECORD_HEADER.pack(ts_ns, len(data))
+            self._buf += data
+            self._buf_count += 1
+            self.frames += 1
+            if len(self._buf) >= self.block_size:
+                self._seal_block()
+
+    def _seal_block(self, wait: bool = False) -> bool:
+        """
+        Entrega o bloco corrente à thread de escrita (chamar com ``_lock``).
+        Com a fila cheia: descarta se estiver num event loop, espera fora dele
+        (ou com ``wait``); na própria thread de escrita mantém o bloco aberto e
+        retorna False.
+        """
+        if not self._buf_count:
+            return True
+        item = ("block", bytes(self._buf), self._buf_first_ts, self._buf_last_ts, self._buf_count)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if threading.current_thread() is self._thread and not wait:
+                return False
+            if wait or not _in_event_loop():
+                # Fora do loop de ingestão esperar o disco não atrasa ninguém
+                self.stalls += 1
+                self._queue.put(item)
+            else:
+                self.dropped_blocks += 1
+                self.dropped_frames += self._buf_count
+                if self.dropped_blocks == 1 or self.dropped_blocks % 100 == 0:
+                    log.warning(f"Fila do gravador cheia: {self.dropped_frames} frames descartados até agora "
+                                f"({self.dropped_blocks} blocos)")
+                self._reset_buffer()
+                return True
+        self.raw_bytes += len(self._buf)
+        self._reset_buffer()
+        return True
+
+    def _reset_buffer(self) -> None:
+        self._buf = bytearray()
+        self._buf_count = 0
+
+    def _seal_if_stale(self) -> None:
+        """Chamado pela thread de escrita: sela o bloco aberto há ``flush_interval`` s."""
+        if not self._lock.acquire(blocking=False):
+            return  # record() em andamento; tenta de novo na próxima volta
+        try:
+            if self._buf_count and time.monotonic() - self._buf_started >= self.flush_interval:
+                self._seal_block()
+        finally:
+            self._lock.release()
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Sela o bloco corrente e espera a thread gravá-lo no disco."""
+        with self._lock:
+            self._seal_block(wait=True)
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        done.wait(timeout)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        with self._lock:
+            self._seal_block(wait=True)
+        self._queue.put(("close", None))
+        self._thread.join()
+        if self._error is not None:
+            log.error(f"Gravador encerrado com erro: {self._error}")
+
+    def __enter__(self) -> FeedRecorder:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ----------------- Thread de escrita -----------------
+    def _writer(self) -> None:
+        while True:
+            try:
+                kind, *rest = self._queue.get(timeout=self.flush_interval / 2)
+            except queue.Empty:
+                self._seal_if_stale()
+                continue
+            try:
+                if kind == "block":
+                    self._write_block(*rest)
+                elif kind == "flush":
+                    if self._file is not None:
+                        self._file.flush()
+                    rest[0].set()
+                elif kind == "close":
+                    self._close_segment()
+                    return
+            except Exception as e:  # noqa: BLE001
+                self._error = e
+                log.exception(f"Erro ao gravar captura: {e}")
+                if kind == "flush":
+                    rest[0].set()
+
+    def _write_block(self, payload: bytes, first_ts: int, last_ts: int, count: int) -> None:
+        if self._file is None or self._should_rotate():
+            self._open_segment(first_ts)
+        compressed = zlib.compress(payload, self.level)
+        self._file.write(BLOCK_HEADER.pack(len(compressed), len(payload), first_ts, last_ts, count))
+        self._file.write(compressed)
+        self._file.flush()
+        written = BLOCK_HEADER.size + len(compressed)
+        self._segment_size += written
+        self.compressed_bytes += written
+        self.blocks += 1
+
+    def _should_rotate(self) -> bool:
+        return (
+            self._segment_size >= self.segment_bytes
+            or time.monotonic() - self._segment_started >= self.segment_seconds
+        )
+
+    def _open_segment(self, first_ts: int) -> None:
+        self._close_segment()
+        stamp = datetime.fromtimestamp(first_ts / 1e9, tz=timezone.utc).strftime("%Y%m%dT%H%M%S")
+        while True:
+            path = self.directory / f"{self.prefix}-{stamp}-{self._segment_index:04d}{SEGMENT_SUFFIX}"
+            self._segment_index += 1
+            if not path.exists():
+                break
+        header = json.dumps({**self.meta, "format": 1, "compression": "zlib", "created_ns": first_ts}).encode()
+        self._file = open(path, "xb")
+        self._file.write(MAGIC + _HEADER_LEN.pack(len(header)) + header)
+        self._segment_size = len(MAGIC) + _HEADER_LEN.size + len(header)
+        self._segment_started = time.monotonic()
+        self.segments.append(path)
+        log.info(f"Novo segmento de captura: {path}")
+
+    def _close_segment(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def get_stats(self) -> dict:
+        return {
+            "frames": self.frames,
+            "raw_bytes": self.raw_bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "ratio": self.raw_bytes / self.compressed_bytes if self.compressed_bytes else None,
+            "blocks": self.blocks,
+            "segments": len(self.segments),
+            "pending_blocks": self._queue.qsize(),
+            "stalls": self.stalls,
+            "dropped_blocks": self.dropped_blocks,
+            "dropped_frames": self.dropped_frames,
+        }
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+# ----------------- Leitura -----------------
+def read_segment_header(f) -> dict:
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Arquivo não é uma captura .bdr")
+    (size,) = _HEADER_LEN.unpack(f.read(_HEADER_LEN.size))
+    return json.loads(f.read(size))
+
+def iter_blocks(path) -> Iterator[Tuple[int, Tuple[int, int, int, int, int]]]:
+    """Percorre os cabeçalhos de bloco: ``(offset, (clen, rlen, first_ts, last_ts, count))``."""
+    with open(path, "rb") as f:
+        read_segment_header(f)
+        while True:
+            offset = f.tell()
+            head = f.read(BLOCK_HEADER.size)
+            if len(head) < BLOCK_HEADER.size:
+                return
+            header = BLOCK_HEADER.unpack(head)
+            f.seek(header[0], os.SEEK_CUR)
+            if f.tell() > os.fstat(f.fileno()).st_size:
+                return  # bloco truncado (gravação interrompida)
+            yield offset, header
+
+def decode_block(payload: bytes) -> Iterator[Tuple[int, bytes]]:
+    """Registros ``(ts_ns, frame)`` de um payload já descomprimido."""
+    pos, end = 0, len(payload)
+    unpack = RECORD_HEADER.unpack_from
+    size = RECORD_HEADER.size
+    while pos < end:
+        ts_ns, length = unpack(payload, pos)
+        pos += size
+        yield ts_ns, payload[pos:pos + length]
+        pos += length
+
+def iter_records(path) -> Iterator[Tuple[int, bytes]]:
+    """Todos os frames de um segmento, em ordem: ``(ts_ns, frame bruto)``."""
+    with open(path, "rb") as f:
+        read_segment_header(f)
+        while True:
+            head = f.read(BLOCK_HEADER.size)
+            if len(head) < BLOCK_HEADER.size:
+                return
+            clen = BLOCK_HEADER.unpack(head)[0]
+            compressed = f.read(clen)
+            if len(compressed) < clen:
+                log.warning(f"Bloco truncado no fim de {path}; ignorando")
+                return
+            yield from decode_block(zlib.decompress(compressed))
+
+def list_segments(directory, prefix: Optional[str] = None) -> List[Path]:
+    """Segmentos de um diretório em ordem cronológica (pelo nome)."""
+    pattern = f"{prefix}-*{SEGMENT_SUFFIX}" if prefix else f"*{SEGMENT_SUFFIX}"
+    return sorted(Path(directory).glob(pattern))
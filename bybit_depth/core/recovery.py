@@ -0,0 +1,269 @@
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from .orderbook import OrderBook
+
+log = logging.getLogger("recovery")
+
+# Estados do sincronizador
+SYNCED = "synced"          # deltas contíguos sendo aplicados
+RECOVERING = "recovering"  # gap detectado: livro inválido, deltas em buffer até o snapshot
+
+Delta = Tuple[List[List[str]], List[List[str]], Optional[int]]
+
+def follows(last: Optional[int], update_id: Optional[int], prev_update_id: Optional[int] = None) -> bool:
+    """
+    True se o delta ``update_id`` continua a sequência a partir de ``last``.
+    Um frame conflacionado (``prev_update_id``) cobre ``prev_update_id + 1 ..
+    update_id``; se ``last`` cai dentro do intervalo ele ainda é aplicável,
+    pois cada nível tocado recebe o valor final em ``update_id``.
+    """
+    if update_id is None or last is None:
+        return True
+    first = update_id if prev_update_id is None else prev_update_id + 1
+    return first <= last + 1 <= update_id
+
+class BookSynchronizer:
+    """
+    Garante a continuidade da sequência ``u`` dos deltas de um ``OrderBook``.
+
+    Na Bybit cada delta de um tópico tem ``u`` = ``u`` anterior + 1. Um delta
+    com ``u`` maior que o esperado indica mensagens perdidas: o livro é
+    marcado como inválido, ``on_gap`` é chamado (o cliente pede um novo
+    snapshot por resubscribe ou REST) e os deltas seguintes ficam em buffer.
+    Ao chegar o snapshot, os deltas posteriores a ele são reaplicados e o
+    tempo até o livro voltar a ser consistente é registrado.
+
+    Deltas atrasados/duplicados (``u`` <= último aplicado) são descartados e
+    contados, sem invalidar o livro: o estado aplicado continua correto.
+
+    Uma mensagem rejeitada pela validação do livro (``strict=True``) é
+    contada em ``validation_errors`` e tratada como um gap: o livro é
+    invalidado e um novo snapshot é pedido, sem derrubar a conexão.
+
+    Com ``resync=False`` (recuperação ``none``) não há ressincronização:
+    gaps e mensagens rejeitadas são contados e logados, e os deltas
+    seguintes continuam sendo aplicados.
+    """
+
+    def __init__(
+        self,
+        book: OrderBook,
+        on_gap: Optional[Callable[[], None]] = None,
+        max_buffer: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+        resync: bool = True,
+    ) -> None:
+        self.book = book
+        self.on_gap = on_gap
+        self.resync = resync
+        self.max_buffer = max_buffer
+        self._clock = clock
+        self.state = SYNCED
+        self._buffer: Deque[tuple] = deque(maxlen=max_buffer)
+        self._gap_started: Optional[float] = None
+        # Métricas
+        self.gaps = 0
+        self.stale = 0
+        self.buffered = 0
+        self.replayed = 0
+        self.overflowed = 0
+        self.validation_errors = 0
+        self.recoveries = 0
+        self.recovery_times: Deque[float] = deque(maxlen=100)
+
+    @property
+    def recovering(self) -> bool:
+        return self.state == RECOVERING
+
+    def expects(self, update_id: Optional[int], prev_update_id: Optional[int] = None) -> bool:
+        """True se ``update_id`` é o próximo delta contíguo (pode ser aplicado direto)."""
+        if self.state != SYNCED:
+            return False
+        return follows(self.book.last_update_id, update_id, prev_update_id)
+
+    # ----------------- Eventos -----------------
+    def apply_snapshot(self, bids: List[List[str]], asks: List[List[str]], update_id: Optional[int] = None) -> None:
+        try:
+            self.book.apply_snapshot(bids, asks, update_id)
+        except ValueError as e:
+            self.reject(e)
+            return
+        if self.state == RECOVERING:
+            self._replay(update_id)
+
+    def apply_delta(
+        self,
+        bids: List[List[str]],
+        asks: List[List[str]],
+        update_id: Optional[int] = None,
+        prev_update_id: Optional[int] = None,
+    ) -> bool:
+        """Aplica, descarta ou guarda o delta; retorna True se foi aplicado agora."""
+        if self.state == RECOVERING:
+            self._buffer_delta((bids, asks, update_id, prev_update_id))
+            return False
+        last = self.book.last_update_id
+        if update_id is not None and last is not None:
+            if update_id <= last:
+                self.stale += 1
+                self.book._sequence_errors += 1
+                log.debug(f"Delta duplicado/atrasado descartado para {self.book.symbol}: u={update_id} <= {last}")
+                return False
+            if not follows(last, update_id, prev_update_id):
+                if not self.resync:
+                    self.gaps += 1
+                    self.book._sequence_errors += 1
+                    log.warning(f"Gap de sequência em {self.book.symbol}: esperado u={last + 1}, "
+                                f"recebido u={update_id}; recuperação desligada, aplicando mesmo assim")
+                    return self.book.apply_delta(bids, asks, update_id)
+                self._start_recovery(update_id, last)
+                self._buffer_delta((bids, asks, update_id, prev_update_id))
+                return False
+        try:
+            return self.book.apply_delta(bids, asks, update_id)
+        except ValueError as e:
+            self.reject(e)
+            return False
+
+    def apply_deltas(self, batch: Sequence[Delta]) -> Optional[int]:
+        """
+        Aplica um lote de deltas contíguos de uma vez (``OrderBook.apply_deltas``);
+        retorna quantos foram aplicados, ou None se a validação estrita rejeitou
+        uma mensagem (ver ``reject``).
+        """
+        try:
+            return self.book.apply_deltas(batch)
+        except ValueError as e:
+            self.reject(e, batch)
+            return None
+
+    def reject(self, error: Exception, pending: Sequence[Delta] = ()) -> None:
+        """
+        Mensagem inválida (modo estrito): descarta, invalida o livro e pede um
+        novo snapshot. ``pending`` são deltas do mesmo lote ainda não aplicados,
+        guardados para o replay (o inválido é filtrado pelo ``u`` do snapshot).
+        """
+        self.validation_errors += 1
+        if not self.resync:
+            log.warning(f"Mensagem rejeitada para {self.book.symbol}: {error}; descartada")
+            # O inválido é o primeiro após o último aplicado; o restante do lote segue
+            last = self.book.last_update_id
+            rest = [d for d in pending if d[2] is not None and last is not None and d[2] > last]
+            for delta in rest[1:]:
+                self.apply_delta(*delta)
+            return
+        log.warning(f"Mensagem rejeitada para {self.book.symbol}: {error}; aguardando novo snapshot")
+        self.state = RECOVERING
+        if self._gap_started is None:
+            self._gap_started = self._clock()
+        self.book.invalidate()
+        last = self.book.last_update_id
+        for delta in pending:
+            if delta[2] is None or last is None or delta[2] > last:
+                self._buffer_delta(delta)
+        self._request_resync()
+
+    # ----------------- Recuperação -----------------
+    def _start_recovery(self, update_id: int, last: int) -> None:
+        self.gaps += 1
+        self.book._sequence_errors += 1
+        self.state = RECOVERING
+        if self._gap_started is None:
+            self._gap_started = self._clock()
+        self.book.invalidate()
+        log.warning(f"Gap de sequência em {self.book.symbol}: esperado u={last + 1}, recebido u={update_id} "
+                    f"({update_id - last - 1} deltas perdidos); aguardando novo snapshot")
+        self._request_resync()
+
+    def _request_resync(self) -> None:
+        if self.on_gap is None:
+            return
+        try:
+            self.on_gap()
+        except Exception as e:  # noqa: BLE001
+            log.exception(f"Erro ao solicitar ressincronização de {self.book.symbol}: {e}")
+
+    def _buffer_delta(self, delta: tuple) -> None:
+        if len(self._buffer) == self._buffer.maxlen:
+            self.overflowed += 1
+        # Guardado como (bids, asks, u, u anterior) para o replay
+        self._buffer.append(delta if len(delta) == 4 else (*delta, None))
+        self.buffered += 1
+
+    def _replay(self, snapshot_id: Optional[int]) -> None:
+        """Reaplica os deltas do buffer posteriores ao snapshot."""
+        pending = [d for d in self._buffer if snapshot_id is None or d[2] is None or d[2] > snapshot_id]
+        self._buffer.clear()
+        if pending and snapshot_id is not None and not follows(snapshot_id, pending[0][2], pending[0][3]):
+            # O snapshot é mais antigo que o buffer: ainda há deltas faltando
+            log.warning(f"Snapshot u={snapshot_id} anterior ao buffer (u={pending[0][2]}) em {self.book.symbol}; "
+                        "solicitando outro")
+            self.book.invalidate()
+            self._buffer.extend(pending)
+            self._request_resync()
+            return
+        self.state = SYNCED
+        for bids, asks, update_id, prev_update_id in pending:
+            if self.apply_delta(bids, asks, update_id, prev_update_id):
+                self.replayed += 1
+        if self.state == RECOVERING:
+            # novo gap dentro do próprio buffer: o restante já voltou para o buffer
+            return
+        elapsed = self._clock() - self._gap_started if self._gap_started is not None else 0.0
+        self._gap_started = None
+        self.recoveries += 1
+        self.recovery_times.append(elapsed)
+        log.info(f"Livro {self.book.symbol} consistente novamente em {elapsed * 1000:.1f} ms "
+                 f"({len(pending)} deltas reaplicados)")
+
+    def reset(self) -> None:
+        """Descarta o estado de recuperação (ex.: nova conexão, que sempre começa com snapshot)."""
+        self._buffer.clear()
+        self.state = SYNCED
+        self._gap_started = None
+
+    def get_stats(self) -> Dict[str, any]:
+        times = list(self.recovery_times)
+        return {
+            "state": self.state,
+            "gaps": self.gaps,
+            "stale_deltas": self.stale,
+            "buffered_deltas": self.buffered,
+            "replayed_deltas": self.replayed,
+            "buffer_overflows": self.overflowed,
+            "validation_errors": self.validation_errors,
+            "recoveries": self.recoveries,
+            "last_recovery_ms": times[-1] * 1000 if times else None,
+            "max_recovery_ms": max(times) * 1000 if times else None,
+            "avg_recovery_ms": sum(times) / len(times) * 1000 if times else None,
+        }
+
+async def resync_loop(
+    sync: BookSynchronizer,
+    request: Callable[[], Awaitable[None]],
+    timeout: float = 5.0,
+    attempts: int = 5,
+) -> bool:
+    """
+    Pede um novo snapshot (``request``: resubscribe ou REST) até o livro voltar
+    a ficar consistente, com no máximo ``attempts`` tentativas de ``timeout`` s.
+    """
+    loop = asyncio.get_running_loop()
+    for attempt in range(1, attempts + 1):
+        if not sync.recovering:
+            return True
+        try:
+            await request()
+        except Exception as e:  # noqa: BLE001
+            log.warning(f"Falha ao solicitar snapshot de {sync.book.symbol} (tentativa {attempt}): {e}")
+        deadline = loop.time() + timeout
+        while sync.recovering and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+    if sync.recovering:
+        log.error(f"Livro {sync.book.symbol} continua inconsistente após {attempts} tentativas")
+    return not sync.recovering
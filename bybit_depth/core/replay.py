@@ -0,0 +1,375 @@
+from __future__ import annotations
+import bisect
+import itertools
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .decoder import get_decoder
+from .orderbook import OrderBook
+from .recorder import BLOCK_HEADER, decode_block, list_segments, read_segment_header
+from .recovery import BookSynchronizer
+from .ws_client import make_book
+
+log = logging.getLogger("replay")
+
+# ----------------- Índice de keyframes (.kfx) -----------------
+# Arquivo ao lado de cada segmento .bdr:  MAGIC | keyframe*
+# Keyframe:  <qqI (ts_ns do último frame aplicado, offset do próximo bloco no segmento,
+#            bytes comprimidos) seguido do JSON zlib com o livro completo de cada símbolo
+KEYFRAME_MAGIC = b"BDKFX1\n"
+KEYFRAME_SUFFIX = ".kfx"
+KEYFRAME_HEADER = struct.Struct("<qqI")
+
+@dataclass(frozen=True)
+class Keyframe:
+    """Ponto de retomada: estado completo dos livros após os blocos anteriores a ``offset``."""
+    segment: Path
+    ts_ns: int
+    offset: int
+    position: int   # offset do payload dentro do .kfx (carregado sob demanda)
+    length: int
+
+    def load(self) -> Dict[str, dict]:
+        with open(keyframe_path(self.segment), "rb") as f:
+            f.seek(self.position)
+            return json.loads(zlib.decompress(f.read(self.length)))
+
+@dataclass
+class ReplayStats:
+    frames: int = 0
+    applied: int = 0
+    blocks: int = 0
+    first_ts: Optional[int] = None
+    last_ts: Optional[int] = None
+    elapsed: float = 0.0
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.frames / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def speedup(self) -> Optional[float]:
+        """Quantas vezes mais rápido que o tempo real da captura."""
+        if not self.elapsed or self.first_ts is None or self.last_ts is None:
+            return None
+        return (self.last_ts - self.first_ts) / 1e9 / self.elapsed
+
+def keyframe_path(segment: Path) -> Path:
+    return Path(segment).with_suffix(KEYFRAME_SUFFIX)
+
+def read_keyframes(segment: Path) -> List[Keyframe]:
+    """Cabeçalhos dos keyframes de um segmento (vazio se o índice não existe)."""
+    path = keyframe_path(segment)
+    if not path.exists():
+        return []
+    out: List[Keyframe] = []
+    with open(path, "rb") as f:
+        if f.read(len(KEYFRAME_MAGIC)) != KEYFRAME_MAGIC:
+            log.warning(f"Índice inválido ignorado: {path}")
+            return []
+        while True:
+            head = f.read(KEYFRAME_HEADER.size)
+            if len(head) < KEYFRAME_HEADER.size:
+                break
+            ts_ns, offset, length = KEYFRAME_HEADER.unpack(head)
+            position = f.tell()
+            f.seek(length, os.SEEK_CUR)
+            if f.tell() > os.fstat(f.fileno()).st_size:
+                break
+            out.append(Keyframe(Path(segment), ts_ns, offset, position, length))
+    return out
+
+class ReplayEngine:
+    """
+    Reconstrói livros a partir das capturas do ``FeedRecorder``.
+
+    Os segmentos são lidos bloco a bloco e cada frame passa pelo mesmo
+    caminho do cliente ao vivo (decoder + ``BookSynchronizer``), então a
+    reprodução é determinística: gaps gravados invalidam o livro até o
+    snapshot seguinte, exatamente como aconteceu na captura.
+
+    ``build_index`` percorre a captura uma vez e grava, ao lado de cada
+    segmento, keyframes periódicos com o livro completo. ``book_at`` carrega o
+    keyframe mais próximo antes de T e reaplica só os frames restantes.
+    """
+
+    def __init__(
+        self,
+        segments: Union[str, Path, Iterable[Union[str, Path]]],
+        symbol: Optional[str] = None,
+        market: str = "linear",
+        prefix: Optional[str] = None,
+        fixed_point: bool = False,
+        decoder: str = "fast",
+        coalesce: bool = True,
+    ) -> None:
+        if isinstance(segments, (str, Path)) and Path(segments).is_dir():
+            self.segments = list_segments(segments, prefix)
+        elif isinstance(segments, (str, Path)):
+            self.segments = [Path(segments)]
+        else:
+            self.segments = [Path(s) for s in segments]
+        self.symbol = symbol
+        self.market = market
+        self.fixed_point = fixed_point
+        self.coalesce = coalesce
+        self._decode = get_decoder(decoder)
+        self.syncs: Dict[str, BookSynchronizer] = {}
+        self.ts_ns: Optional[int] = None
+
+    # ----------------- Estado -----------------
+    @property
+    def books(self) -> Dict[str, OrderBook]:
+        return {symbol: sync.book for symbol, sync in self.syncs.items()}
+
+    def book(self, symbol: Optional[str] = None) -> Optional[OrderBook]:
+        symbol = symbol or self.symbol
+        if symbol is None and len(self.syncs) == 1:
+            symbol = next(iter(self.syncs))
+        sync = self.syncs.get(symbol)
+        return sync.book if sync is not None else None
+
+    def reset(self) -> None:
+        self.syncs.clear()
+        self.ts_ns = None
+
+    def _sync_for(self, symbol: str) -> BookSynchronizer:
+        sync = self.syncs.get(symbol)
+        if sync is None:
+            book = make_book(symbol, self.market, self.fixed_point)
+            # Sem on_gap: a captura já contém o snapshot que o cliente pediu ao vivo
+            sync = self.syncs[symbol] = BookSynchronizer(book)
+        return sync
+
+    def _keyframe_state(self) -> Optional[Dict[str, dict]]:
+        if any(sync.recovering for sync in self.syncs.values()):
+            return None  # livro inconsistente não serve como ponto de retomada
+        state = {}
+        for symbol, sync in self.syncs.items():
+            payload = sync.book.snapshot().payload
+            state[symbol] = {"bids": payload["bids"], "asks": payload["asks"], "u": payload["update_id"]}
+        return state
+
+    def _load_state(self, state: Dict[str, dict]) -> None:
+        self.reset()
+        for symbol, book in state.items():
+            self._sync_for(symbol).apply_snapshot(book["bids"], book["asks"], book["u"])
+
+    # ----------------- Leitura -----------------
+    def _blocks(self, start: int = 0, offset: Optional[int] = None) -> Iterator[Tuple[int, int, int, int, bytes]]:
+        """``(índice do segmento, offset do próximo bloco, first_ts, last_ts, payload)``."""
+        for index in range(start, len(self.segments)):
+            path = self.segments[index]
+            with open(path, "rb") as f:
+                read_segment_header(f)
+                if index == start and offset is not None:
+                    f.seek(offset)
+                while True:
+                    head = f.read(BLOCK_HEADER.size)
+                    if len(head) < BLOCK_HEADER.size:
+                        break
+                    clen, _, first_ts, last_ts, _ = BLOCK_HEADER.unpack(head)
+                    compressed = f.read(clen)
+                    if len(compressed) < clen:
+                        log.warning(f"Bloco truncado no fim de {path}; ignorando")
+                        break
+                    yield index, f.tell(), first_ts, last_ts, zlib.decompress(compressed)
+
+    def _apply_records(
+        self,
+        records: Iterator[Tuple[int, bytes]],
+        end_ns: Optional[int],
+        stats: ReplayStats,
+        first: Optional[Tuple[int, bytes]] = None,
+    ) -> Optional[Tuple[int, bytes]]:
+        """
+        Aplica os registros (``first`` antes dos demais) até ``end_ns``; retorna
+        o primeiro registro posterior a ``end_ns`` (não aplicado) ou None.
+
+        Com ``coalesce`` os deltas contíguos de um símbolo são acumulados e
+        aplicados de uma vez com ``apply_deltas`` (o estado final é o mesmo;
+        só os estados intermediários dentro do bloco não são materializados).
+        """
+        decode = self._decode
+        symbol = self.symbol
+        syncs = self.syncs
+        coalesce = self.coalesce
+        pending: list = []
+        pending_sync: Optional[BookSynchronizer] = None
+        next_u: Optional[int] = None
+        over = None
+        if first is not None:
+            records = itertools.chain((first,), records)
+        for ts_ns, raw in records:
+            if end_ns is not None and ts_ns > end_ns:
+                over = (ts_ns, raw)
+                break
+            stats.frames += 1
+            self.ts_ns = ts_ns
+            try:
+                frame = decode(raw)
+            except Exception as e:  # noqa: BLE001
+                log.debug(f"Frame inválido na captura: {e}")
+                continue
+            if frame is None or (symbol is not None and frame.symbol != symbol):
+                continue
+            stats.applied += 1
+            sync = syncs.get(frame.symbol) or self._sync_for(frame.symbol)
+            if coalesce and frame.type == "delta" and frame.update_id is not None:
+                if pending and sync is pending_sync and frame.update_id == next_u:
+                    pending.append((frame.bids, frame.asks, frame.update_id))
+                    next_u += 1
+                    continue
+                if pending:
+                    pending_sync.book.apply_deltas(pending)
+                    pending = []
+                if sync.expects(frame.update_id) and sync.book.last_update_id is not None:
+                    pending.append((frame.bids, frame.asks, frame.update_id))
+                    pending_sync, next_u = sync, frame.update_id + 1
+                    continue
+            elif pending:
+                pending_sync.book.apply_deltas(pending)
+                pending = []
+            if frame.type == "snapshot":
+                sync.apply_snapshot(frame.bids, frame.asks, frame.update_id)
+            else:
+                sync.apply_delta(frame.bids, frame.asks, frame.update_id)
+        if pending:
+            pending_sync.book.apply_deltas(pending)
+        return over
+
+    def run(self, end_ns: Optional[int] = None, start: int = 0, offset: Optional[int] = None) -> ReplayStats:
+        """Reproduz do ponto atual até ``end_ns`` (ou o fim da captura), o mais rápido possível."""
+        stats = ReplayStats()
+        t0 = time.perf_counter()
+        for _, _, first_ts, _, payload in self._blocks(start, offset):
+            if end_ns is not None and first_ts > end_ns:
+                break
+            if stats.first_ts is None:
+                stats.first_ts = first_ts
+            stats.blocks += 1
+            if self._apply_records(decode_block(payload), end_ns, stats) is not None:
+                break
+        stats.last_ts = self.ts_ns
+        stats.elapsed = time.perf_counter() - t0
+        return stats
+
+    def sample(
+        self,
+        interval: float,
+        start_ns: Optional[int] = None,
+        end_ns: Optional[int] = None,
+    ) -> Iterator[Tuple[int, Dict[str, OrderBook]]]:
+        """
+        Estado dos livros a cada ``interval`` s de captura, de ``start_ns`` (ou
+        do primeiro frame) até ``end_ns`` (ou o último). Cada item é
+        ``(ts_ns, {símbolo: livro})`` com os livros consistentes naquele
+        instante; os objetos são reaproveitados entre amostras.
+        """
+        step = max(1, int(interval * 1e9))
+        begin = self._restore_before(start_ns) if start_ns is not None else (0, None)
+        if start_ns is None:
+            self.reset()
+        next_ts = start_ns
+        stats = ReplayStats()
+
+        def due(limit: int) -> Iterator[Tuple[int, Dict[str, OrderBook]]]:
+            nonlocal next_ts
+            while next_ts < limit and (end_ns is None or next_ts <= end_ns):
+                yield next_ts, {s: sync.book for s, sync in self.syncs.items() if not sync.recovering}
+                next_ts += step
+
+        for _, _, first_ts, _, payload in self._blocks(*begin):
+            if next_ts is None:
+                next_ts = first_ts
+            if end_ns is not None and next_ts > end_ns:
+                return
+            records = decode_block(payload)
+            over = None
+            while True:
+                over = self._apply_records(records, next_ts, stats, over)
+                if over is None:
+                    break
+                yield from due(over[0])
+                if end_ns is not None and next_ts > end_ns:
+                    return
+        if next_ts is not None and self.ts_ns is not None:
+            yield from due(min(self.ts_ns, end_ns if end_ns is not None else self.ts_ns) + 1)
+
+    # ----------------- Índice -----------------
+    def build_index(self, interval: float = 60.0) -> int:
+        """
+        Reproduz a captura inteira gravando um keyframe a cada ``interval`` s
+        de captura (sempre em fronteira de bloco). Retorna quantos foram gravados.
+        """
+        self.reset()
+        stats = ReplayStats()
+        interval_ns = int(interval * 1e9)
+        last_keyframe: Optional[int] = None
+        written = 0
+        current, out = -1, None
+        try:
+            for index, next_offset, _, last_ts, payload in self._blocks():
+                if index != current:
+                    if out is not None:
+                        self._finish_index(out, self.segments[current])
+                    current = index
+                    out = open(keyframe_path(self.segments[index]).with_suffix(".kfx.tmp"), "wb")
+                    out.write(KEYFRAME_MAGIC)
+                self._apply_records(decode_block(payload), None, stats)
+                if last_keyframe is None or last_ts - last_keyframe >= interval_ns:
+                    state = self._keyframe_state()
+                    if state:
+                        data = zlib.compress(json.dumps(state, separators=(",", ":")).encode(), 6)
+                        out.write(KEYFRAME_HEADER.pack(last_ts, next_offset, len(data)))
+                        out.write(data)
+                        last_keyframe = last_ts
+                        written += 1
+            if out is not None:
+                self._finish_index(out, self.segments[current])
+                out = None
+        finally:
+            if out is not None:
+                out.close()
+        log.info(f"Índice de keyframes: {written} keyframes em {len(self.segments)} segmentos "
+                 f"({stats.frames} frames)")
+        return written
+
+    @staticmethod
+    def _finish_index(out, segment: Path) -> None:
+        out.close()
+        os.replace(out.name, keyframe_path(segment))
+
+    def keyframes(self) -> List[Keyframe]:
+        return [kf for segment in self.segments for kf in read_keyframes(segment)]
+
+    def _restore_before(self, ts_ns: int) -> Tuple[int, Optional[int]]:
+        """Carrega o último keyframe até ``ts_ns``; retorna ``(segmento, offset)`` para continuar."""
+        keyframes = self.keyframes()
+        pos = bisect.bisect_right([kf.ts_ns for kf in keyframes], ts_ns) - 1
+        if pos < 0:
+            self.reset()
+            return 0, None
+        keyframe = keyframes[pos]
+        self._load_state(keyframe.load())
+        self.ts_ns = keyframe.ts_ns
+        return self.segments.index(keyframe.segment), keyframe.offset
+
+    def seek(self, ts_ns: int) -> ReplayStats:
+        """
+        Posiciona os livros no estado em ``ts_ns``: carrega o último keyframe
+        anterior e reaplica só os frames seguintes (do início, sem índice).
+        """
+        return self.run(ts_ns, *self._restore_before(ts_ns))
+
+    def book_at(self, ts_ns: int, symbol: Optional[str] = None) -> Optional[OrderBook]:
+        """Livro de ``symbol`` como estava após o último frame recebido até ``ts_ns``."""
+        self.seek(ts_ns)
+        return self.book(symbol)
@@ -1,6 +1,6 @@
 from __future__ import annotations
 import logging
-from typing import Optional
+from typing import List, Optional, Tuple
 
 import httpx
 
@@ -18,7 +18,7 @@ class RESTClient:
     async def fetch_orderbook(self, symbol: str, limit: int = 200) -> Optional[dict]:
         # Ex.: /v5/market/orderbook?category=linear&symbol=BTCUSDT&limit=200
         params = {
-            "category": "linear" if self.market.lower() == "linear" else "spot",
+            "category": self.market.lower() if self.market.lower() in ("linear", "inverse") else "spot",
             "symbol": symbol,
             "limit": str(limit),
         }
@@ -31,3 +31,13 @@ class RESTClient:
         except Exception as e:  # noqa: BLE001
             log.warning("REST snapshot failed: %s", e)
             return None
+
+    async def fetch_snapshot(self, symbol: str, limit: int = 200) -> Optional[Tuple[List[List[str]], List[List[str]], Optional[int]]]:
+        """Snapshot REST no formato do livro: ``(bids, asks, u)``, ou None em caso de falha."""
+        payload = await self.fetch_orderbook(symbol, limit)
+        if not payload or payload.get("retCode") not in (0, None):
+            if payload:
+                log.warning("REST snapshot rejeitado: %s", payload.get("retMsg"))
+            return None
+        result = payload.get("result") or {}
+        return result.get("b") or [], result.get("a") or [], result.get("u")
@@ -0,0 +1,205 @@
+from __future__ import annotations
+import sqlite3
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# ----------------- Rollups do histórico -----------------
+# Uma tabela por resolução (rollup_1s, rollup_1m, rollup_1h), uma linha por
+# (símbolo, bucket) com contagem e, para cada métrica, min/max/soma/nº de
+# valores não nulos/último valor. Cada snapshot gravado faz um upsert nas três;
+# a média de um intervalo é soma/n combinada entre buckets.
+RESOLUTIONS: Tuple[Tuple[str, int], ...] = (("1h", 3_600_000), ("1m", 60_000), ("1s", 1_000))
+RESOLUTION_MS = dict(RESOLUTIONS)
+METRICS = (
+    "mid", "spread", "spread_pct", "bid_levels", "ask_levels",
+    "imbalance", "best_bid", "best_ask", "error_rate",
+)
+_FIELDS = ("min", "max", "sum", "n", "last")
+_STAT_KEYS = {
+    "mid": "mid_price", "spread": "spread", "spread_pct": "spread_pct",
+    "bid_levels": "bid_levels", "ask_levels": "ask_levels",
+    "best_bid": "best_bid", "best_ask": "best_ask", "error_rate": "error_rate",
+}
+
+def rollup_table(resolution: str) -> str:
+    if resolution not in RESOLUTION_MS:
+        raise ValueError(f"Resolução desconhecida: {resolution} (use {', '.join(RESOLUTION_MS)})")
+    return f"rollup_{resolution}"
+
+def _metric_columns() -> List[str]:
+    return [f"{m}_{f}" for m in METRICS for f in _FIELDS]
+
+_COLUMNS = ["symbol", "bucket", "count", "last_ts"] + _metric_columns()
+
+def _upsert_sql(table: str) -> str:
+    updates = ["count = count + 1", "last_ts = MAX(last_ts, excluded.last_ts)"]
+    for m in METRICS:
+        updates += [
+            f"{m}_min = COALESCE(MIN({m}_min, excluded.{m}_min), {m}_min, excluded.{m}_min)",
+            f"{m}_max = COALESCE(MAX({m}_max, excluded.{m}_max), {m}_max, excluded.{m}_max)",
+            f"{m}_sum = {m}_sum + excluded.{m}_sum",
+            f"{m}_n = {m}_n + excluded.{m}_n",
+            f"{m}_last = CASE WHEN excluded.{m}_n AND (excluded.last_ts >= last_ts OR {m}_last IS NULL) "
+            f"THEN excluded.{m}_last ELSE {m}_last END",
+        ]
+    return (
+        f"INSERT INTO {table} ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))}) "
+        f"ON CONFLICT(symbol, bucket) DO UPDATE SET {', '.join(updates)}"
+    )
+
+_UPSERTS = {name: _upsert_sql(f"rollup_{name}") for name, _ in RESOLUTIONS}
+
+def create_rollup_tables(conn: sqlite3.Connection) -> bool:
+    """Cria as tabelas de rollup; retorna True se elas ainda não existiam."""
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollup_1s'"
+    ).fetchone() is not None
+    metric_columns = ",\n".join(
+        f"{c} {'INTEGER' if c.endswith('_n') else 'REAL'}" for c in _metric_columns()
+    )
+    for name, _ in RESOLUTIONS:
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS rollup_{name} (
+                symbol TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                last_ts INTEGER NOT NULL,
+                {metric_columns},
+                PRIMARY KEY (symbol, bucket)
+            ) WITHOUT ROWID
+        """)
+    return not existed
+
+def top_imbalance(bids: Sequence, asks: Sequence, top_n: int = 10) -> Optional[float]:
+    """Fração do volume dos ``top_n`` melhores níveis que está no bid (como ``aggregator.imbalance``)."""
+    if not bids or not asks:
+        return None
+    sum_b = sum(float(q) for _, q in bids[:top_n])
+    sum_a = sum(float(q) for _, q in asks[:top_n])
+    total = sum_b + sum_a
+    return sum_b / total if total else None
+
+def snapshot_metrics(stats: Dict, bids: Sequence, asks: Sequence, top_n: int = 10) -> Dict[str, Optional[float]]:
+    metrics = {m: stats.get(key) for m, key in _STAT_KEYS.items()}
+    metrics["imbalance"] = top_imbalance(bids, asks, top_n)
+    return metrics
+
+def update_rollups(conn: sqlite3.Connection, symbol: str, ts_ms: int, metrics: Dict[str, Optional[float]]) -> None:
+    """Acrescenta um snapshot aos buckets de 1 s, 1 min e 1 h (na transação corrente de ``conn``)."""
+    values: list = []
+    for m in METRICS:
+        v = metrics.get(m)
+        values += [v, v, v if v is not None else 0.0, 0 if v is None else 1, v]
+    for name, size in RESOLUTIONS:
+        conn.execute(_UPSERTS[name], (symbol, ts_ms - ts_ms % size, 1, ts_ms, *values))
+
+def delete_rollups_before(conn: sqlite3.Connection, cutoff_ms: int) -> None:
+    """Remove buckets anteriores a ``cutoff_ms`` (buckets que cruzam o corte são mantidos)."""
+    for name, size in RESOLUTIONS:
+        conn.execute(f"DELETE FROM rollup_{name} WHERE bucket <= ?", (cutoff_ms - size,))
+
+def rollup_plan(start_ms: int, end_ms: int) -> List[Tuple[str, int, int]]:
+    """
+    Cobre ``[start_ms, end_ms)`` (múltiplos de 1 s) com o menor número de
+    buckets: horas inteiras no miolo, minutos e depois segundos nas bordas.
+    Retorna ``(resolução, início, fim)`` com intervalos semiabertos.
+    """
+    def cover(a: int, b: int, resolutions) -> List[Tuple[str, int, int]]:
+        if a >= b:
+            return []
+        (name, size), finer = resolutions[0], resolutions[1:]
+        if not finer:
+            return [(name, a, b)]
+        lo, hi = -(-a // size) * size, b // size * size
+        if lo >= hi:
+            return cover(a, b, finer)
+        return cover(a, lo, finer) + [(name, lo, hi)] + cover(hi, b, finer)
+    return cover(start_ms, end_ms, RESOLUTIONS)
+
+def query_rollups(conn: sqlite3.Connection, symbol: str, start_ms: Optional[int], end_ms: Optional[int]) -> Dict:
+    """
+    Agregados de ``symbol`` entre ``start_ms`` e ``end_ms`` (inclusive, com
+    resolução de 1 s; None = sem limite): ``{"count", "resolutions",
+    <métrica>: {"min", "max", "avg", "last"}}``. Lê no máximo algumas dezenas
+    de buckets nas bordas mais um por hora do intervalo.
+    """
+    if start_ms is None or end_ms is None:
+        first, last = conn.execute(
+            "SELECT MIN(bucket), MAX(bucket) FROM rollup_1h WHERE symbol = ?", (symbol,)
+        ).fetchone()
+        if first is None:
+            return {}
+        start_ms = first if start_ms is None else start_ms
+        end_ms = last + RESOLUTION_MS["1h"] - 1 if end_ms is None else end_ms
+    start_ms -= start_ms % 1000
+    end_ms = end_ms - end_ms % 1000 + 1000
+    aggregates = ", ".join(
+        f"MIN({m}_min), MAX({m}_max), SUM({m}_sum), SUM({m}_n)" for m in METRICS
+    )
+    lasts = ", ".join(f"{m}_last" for m in METRICS)
+    count = 0
+    acc = {m: [None, None, 0.0, 0] for m in METRICS}
+    latest: Optional[tuple] = None
+    used = []
+    for name, lo, hi in rollup_plan(start_ms, end_ms):
+        params = (symbol, lo, hi)
+        row = conn.execute(
+            f"SELECT SUM(count), {aggregates} FROM rollup_{name} WHERE symbol = ? AND bucket >= ? AND bucket < ?",
+            params,
+        ).fetchone()
+        if not row[0]:
+            continue
+        count += row[0]
+        used.append(name)
+        for i, m in enumerate(METRICS):
+            lo_v, hi_v, total, n = row[1 + 4 * i: 5 + 4 * i]
+            a = acc[m]
+            if lo_v is not None:
+                a[0] = lo_v if a[0] is None else min(a[0], lo_v)
+            if hi_v is not None:
+                a[1] = hi_v if a[1] is None else max(a[1], hi_v)
+            a[2] += total or 0.0
+            a[3] += n or 0
+        last_row = conn.execute(
+            f"SELECT last_ts, {lasts} FROM rollup_{name} WHERE symbol = ? AND bucket >= ? AND bucket < ? "
+            "ORDER BY bucket DESC LIMIT 1",
+            params,
+        ).fetchone()
+        if latest is None or last_row[0] > latest[0]:
+            latest = last_row
+    if not count:
+        return {}
+    result: Dict = {"count": count, "resolutions": sorted(set(used), key=RESOLUTION_MS.get, reverse=True)}
+    for i, m in enumerate(METRICS):
+        lo_v, hi_v, total, n = acc[m]
+        result[m] = {"min": lo_v, "max": hi_v, "avg": total / n if n else None, "last": latest[1 + i]}
+    return result
+
+def pick_resolution(start_ms: int, end_ms: int, max_points: int = 1000) -> str:
+    """Resolução mais fina cuja série no intervalo tem no máximo ``max_points`` buckets."""
+    for name, size in reversed(RESOLUTIONS):
+        if (end_ms - start_ms) // size + 1 <= max_points:
+            return name
+    return RESOLUTIONS[0][0]
+
+def rollup_series(
+    conn: sqlite3.Connection, symbol: str, start_ms: int, end_ms: int, resolution: str
+) -> List[Dict]:
+    """Buckets ``resolution`` de ``symbol`` que começam em ``[start_ms, end_ms]``, com avg por métrica."""
+    table = rollup_table(resolution)
+    cursor = conn.execute(
+        f"SELECT * FROM {table} WHERE symbol = ? AND bucket >= ? AND bucket <= ? ORDER BY bucket",
+        (symbol, start_ms - start_ms % RESOLUTION_MS[resolution], end_ms),
+    )
+    names = [d[0] for d in cursor.description]
+    series = []
+    for row in cursor:
+        data = dict(zip(names, row))
+        point = {"bucket": data["bucket"], "count": data["count"]}
+        for m in METRICS:
+            n = data[f"{m}_n"]
+            point[m] = {
+                "min": data[f"{m}_min"], "max": data[f"{m}_max"],
+                "avg": data[f"{m}_sum"] / n if n else None, "last": data[f"{m}_last"],
+            }
+        series.append(point)
+    return series
@@ -0,0 +1,296 @@
+from __future__ import annotations
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import queue
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+log = logging.getLogger("sharding")
+
+# Mensagens worker -> supervisor (tuplas simples, baratas de serializar):
+#   ("top", shard_id, [(symbol, best_bid, best_ask, update_id, version), ...])
+#   ("metrics", shard_id, {...})
+#   ("done", shard_id, {...})            # apenas na fonte sintética
+TOP = "top"
+METRICS = "metrics"
+DONE = "done"
+
+@dataclass(frozen=True)
+class TopOfBook:
+    """Topo do livro publicado por um worker (preços como string para manter a precisão)."""
+    symbol: str
+    best_bid: Optional[str]
+    best_ask: Optional[str]
+    update_id: Optional[int]
+    version: int
+    shard: int
+    received_at: float
+
+def partition(symbols: Sequence[str], workers: int) -> List[List[str]]:
+    """Distribui os símbolos entre ``workers`` shards (round-robin, sem shards vazios)."""
+    if workers < 1:
+        raise ValueError("workers deve ser >= 1")
+    unique = list(dict.fromkeys(symbols))
+    shards = [unique[i::workers] for i in range(workers)]
+    return [s for s in shards if s]
+
+# ----------------- Worker -----------------
+def _collect_tops(client, last_versions: Dict[str, int]) -> List[tuple]:
+    """Topos dos livros que mudaram desde a última publicação."""
+    out = []
+    for symbol, book in client.books.items():
+        version = book.version
+        if last_versions.get(symbol) == version:
+            continue
+        last_versions[symbol] = version
+        bb, ba = book.best_bid(), book.best_ask()
+        out.append((symbol, str(bb) if bb is not None else None, str(ba) if ba is not None else None,
+                    book.last_update_id, version))
+    return out
+
+def _shard_metrics(client, messages: int) -> dict:
+    books = client.books.values()
+    return {
+        "symbols": len(client.books),
+        "messages": messages,
+        "total_updates": sum(b._total_updates for b in books),
+        "sequence_errors": sum(b._sequence_errors for b in books),
+        "unrouted_frames": client._unrouted,
+        "reconnects": client._reconnect_count,
+    }
+
+async def _publish_loop(shard_id: int, client, out: mp.Queue, stop, interval: float) -> None:
+    last_versions: Dict[str, int] = {}
+    next_metrics = time.monotonic()
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        tops = _collect_tops(client, last_versions)
+        if tops:
+            out.put((TOP, shard_id, tops))
+        if time.monotonic() >= next_metrics:
+            out.put((METRICS, shard_id, _shard_metrics(client, client._frames)))
+            next_metrics = time.monotonic() + 1.0
+
+def _make_recorder(shard_id: int, symbols: List[str], opts: dict):
+    """Gravador do shard em ``<record>/shard-<id>`` (None se a gravação estiver desligada)."""
+    if not opts.get("record"):
+        return None
+    from .recorder import FeedRecorder
+
+    return FeedRecorder(
+        os.path.join(opts["record"], f"shard-{shard_id}"),
+        prefix=f"{opts['market']}-shard{shard_id}-{opts['depth']}",
+        meta={"symbols": symbols, "market": opts["market"], "depth": opts["depth"], "shard": shard_id},
+        segment_bytes=opts["record_segment_bytes"],
+        segment_seconds=opts["record_segment_seconds"],
+    )
+
+async def _run_ws_worker(shard_id: int, symbols: List[str], opts: dict, out: mp.Queue, stop) -> None:
+    from .ws_multiplex import MultiplexWSClient
+
+    recorder = _make_recorder(shard_id, symbols, opts)
+    client = MultiplexWSClient(
+        symbols, opts["depth"], opts["market"],
+        fixed_point=opts["fixed_point"], strict=opts["strict"], decoder=opts["decoder"],
+        recovery=opts["recovery"], queue_size=opts["queue_size"], queue_policy=opts["queue_policy"],
+        recorder=recorder,
+    )
+    task = asyncio.create_task(client.run_forever())
+    try:
+        publisher = asyncio.create_task(_publish_loop(shard_id, client, out, stop, opts["publish_interval"]))
+        while not stop.is_set():
+            await asyncio.sleep(0.1)
+        publisher.cancel()
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        if recorder is not None:
+            recorder.close()
+
+def _run_synthetic_worker(shard_id: int, symbols: List[str], opts: dict, out: mp.Queue, ready) -> None:
+    """Fonte sintética local: pré-gera os frames e mede só decode + aplicação no livro."""
+    from ..utils.synthetic import SyntheticFeed
+    from .ws_multiplex import MultiplexWSClient
+
+    client = MultiplexWSClient(symbols, opts["depth"], opts["market"], fixed_point=opts["fixed_point"],
+                               strict=opts["strict"], decoder=opts["decoder"])
+    per_symbol = [
+        SyntheticFeed(symbol=s, depth=opts["depth"], seed=zlib.crc32(s.encode())).raw_frames(opts["messages"])
+        for s in symbols
+    ]
+    frames = [raw for batch in zip(*per_symbol) for raw in batch]  # intercalados como no socket
+
+    # Todos os workers começam juntos, após a geração dos frames
+    if ready is not None:
+        ready.wait()
+    t0 = time.time()
+    for raw in frames:
+        client.dispatch(raw)
+    t1 = time.time()
+    out.put((TOP, shard_id, _collect_tops(client, {})))
+    out.put((DONE, shard_id, {**_shard_metrics(client, len(frames)), "start": t0, "end": t1}))
+
+def worker_main(shard_id: int, symbols: List[str], opts: dict, out: mp.Queue, stop, ready=None) -> None:
+    """Ponto de entrada do processo worker."""
+    logging.basicConfig(level=opts.get("log_level", logging.WARNING))
+    try:
+        if opts["source"] == "synthetic":
+            _run_synthetic_worker(shard_id, symbols, opts, out, ready)
+        else:
+            asyncio.run(_run_ws_worker(shard_id, symbols, opts, out, stop))
+    except KeyboardInterrupt:
+        pass
+
+# ----------------- Supervisor -----------------
+class ShardSupervisor:
+    """
+    Particiona o universo de símbolos entre ``workers`` processos, cada um com
+    seu próprio ``MultiplexWSClient`` e livros. Os workers publicam o topo do
+    livro (apenas símbolos que mudaram) e métricas numa ``multiprocessing.Queue``;
+    o supervisor consolida em :attr:`tops` e :attr:`metrics` via :meth:`poll`.
+
+    ``recovery``, ``queue_size``/``queue_policy``, ``strict`` e ``record``
+    (diretório; cada shard grava em ``shard-<id>``) são repassados ao cliente
+    de cada worker, como no modo de um processo.
+    """
+
+    def __init__(
+        self,
+        symbols: Sequence[str],
+        depth: int,
+        market: str,
+        workers: int = 2,
+        fixed_point: bool = False,
+        decoder: str = "fast",
+        publish_interval: float = 0.1,
+        source: str = "ws",
+        messages: int = 1000,
+        start_method: str = "spawn",
+        strict: bool = False,
+        recovery: str = "resubscribe",
+        queue_size: int = 0,
+        queue_policy: str = "block",
+        record: Optional[str] = None,
+        record_segment_bytes: int = 256 * 2**20,
+        record_segment_seconds: float = 3600.0,
+    ) -> None:
+        if source not in ("ws", "synthetic"):
+            raise ValueError(f"Fonte desconhecida: {source}")
+        self.shards = partition(symbols, workers)
+        self.opts = {
+            "depth": depth,
+            "market": market,
+            "fixed_point": fixed_point,
+            "decoder": decoder,
+            "publish_interval": publish_interval,
+            "source": source,
+            "messages": messages,
+            "strict": strict,
+            "recovery": recovery,
+            "queue_size": queue_size,
+            "queue_policy": queue_policy,
+            "record": str(record) if record else None,
+            "record_segment_bytes": record_segment_bytes,
+            "record_segment_seconds": record_segment_seconds,
+        }
+        self._ctx = mp.get_context(start_method)
+        self._queue: mp.Queue = self._ctx.Queue()
+        self._stop = self._ctx.Event()
+        self._ready = self._ctx.Barrier(len(self.shards)) if source == "synthetic" else None
+        self._procs: List[mp.Process] = []
+        self.tops: Dict[str, TopOfBook] = {}
+        self.metrics: Dict[int, dict] = {}
+        self.finished: Dict[int, dict] = {}
+
+    def start(self) -> None:
+        for shard_id, symbols in enumerate(self.shards):
+            proc = self._ctx.Process(
+                target=worker_main,
+                args=(shard_id, symbols, self.opts, self._queue, self._stop, self._ready),
+                name=f"bybit-shard-{shard_id}",
+                daemon=True,
+            )
+            proc.start()
+            self._procs.append(proc)
+        log.info(f"{len(self._procs)} workers iniciados para {sum(map(len, self.shards))} símbolos")
+
+    def poll(self, timeout: float = 0.1) -> int:
+        """Consome as mensagens disponíveis dos workers; retorna quantas foram lidas."""
+        count = 0
+        block_timeout: Optional[float] = timeout
+        while True:
+            try:
+                if block_timeout is None:
+                    kind, shard_id, body = self._queue.get_nowait()
+                else:
+                    kind, shard_id, body = self._queue.get(timeout=block_timeout)
+            except queue.Empty:
+                return count
+            block_timeout = None
+            count += 1
+            if kind == TOP:
+                now = time.time()
+                for symbol, bb, ba, update_id, version in body:
+                    self.tops[symbol] = TopOfBook(symbol, bb, ba, update_id, version, shard_id, now)
+            elif kind == METRICS:
+                self.metrics[shard_id] = body
+            elif kind == DONE:
+                self.metrics[shard_id] = body
+                self.finished[shard_id] = body
+
+    def wait_finished(self, timeout: float = 60.0) -> bool:
+        """Aguarda todos os workers da fonte sintética terminarem."""
+        deadline = time.monotonic() + timeout
+        while len(self.finished) < len(self._procs):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self.poll(timeout=min(0.5, remaining))
+        return True
+
+    def alive(self) -> int:
+        return sum(p.is_alive() for p in self._procs)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        # Drena a fila enquanto espera: um worker com dados no feeder da Queue não termina
+        deadline = time.monotonic() + timeout
+        while self.alive() and time.monotonic() < deadline:
+            self.poll(timeout=0.05)
+            for proc in self._procs:
+                proc.join(0)
+        for proc in self._procs:
+            if proc.is_alive():
+                log.warning(f"Worker {proc.name} não terminou; encerrando")
+                proc.terminate()
+                proc.join(1.0)
+        self.poll(timeout=0)
+
+    def get_stats(self) -> Dict[str, any]:
+        return {
+            "workers": len(self._procs),
+            "alive": self.alive(),
+            "symbols": len(self.tops),
+            "messages": sum(m.get("messages", 0) for m in self.metrics.values()),
+            "sequence_errors": sum(m.get("sequence_errors", 0) for m in self.metrics.values()),
+            "shards": dict(self.metrics),
+        }
+
+    def __enter__(self) -> ShardSupervisor:
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+def synthetic_throughput(finished: Dict[int, dict]) -> Tuple[int, float]:
+    """(mensagens, mensagens/s agregadas) a partir dos relatórios ``done`` dos workers."""
+    if not finished:
+        return 0, 0.0
+    total = sum(m["messages"] for m in finished.values())
+    elapsed = max(m["end"] for m in finished.values()) - min(m["start"] for m in finished.values())
+    return total, total / max(elapsed, 1e-9)
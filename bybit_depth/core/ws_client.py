@@ -2,34 +2,90 @@ from __future__ import annotations
 import asyncio
 import json
 import logging
-from typing import Optional
+import time
+from typing import List, Optional
 
 import websockets
 
 from ..configs.settings import settings
-from .models import WSOrderbookMessage, parse_symbol_type
+from ..configs.symbols import get_instrument_spec
+from .decoder import Frame, get_decoder
+from .models import parse_symbol_type
+from .ingest import IngestQueue
+from .events import ALL_KINDS, ChangeWaiter, Subscription
 from .orderbook import OrderBook
+from .recovery import SYNCED, BookSynchronizer, follows, resync_loop
+from .rest_client import RESTClient
+from ..utils.latency import LatencyTracker, stamp
 from ..utils.retry import backoff_retry
 
 log = logging.getLogger("ws_client")
 
+RECOVERY_MODES = ("resubscribe", "rest", "none")
+
+def ws_url_for(market: str) -> str:
+    """URL WebSocket pública conforme o tipo de mercado."""
+    if market.lower() == "linear":
+        return settings.ws_linear
+    if market.lower() == "inverse":
+        return settings.ws_inverse
+    return settings.ws_spot
+
+def make_book(symbol: str, market: str, fixed_point: bool = False, strict: bool = False) -> OrderBook:
+    """Cria o OrderBook de um símbolo (ponto fixo usa o tick/lot size do instrumento)."""
+    if fixed_point:
+        tick_size, lot_size = get_instrument_spec(symbol, market)
+        book = OrderBook(tick_size=tick_size, lot_size=lot_size, strict=strict)
+    else:
+        book = OrderBook(strict=strict)
+    book.symbol = symbol
+    book.market_type = market
+    return book
+
 class BybitWSClient:
-    def __init__(self, symbol: str, depth: int, market: str) -> None:
+    def __init__(
+        self,
+        symbol: str,
+        depth: int,
+        market: str,
+        fixed_point: bool = False,
+        strict: bool = False,
+        batch_deltas: bool = False,
+        max_batch: int = 256,
+        decoder: str = "fast",
+        recovery: str = "resubscribe",
+        resync_timeout: float = 5.0,
+        latency: bool = True,
+        queue_size: int = 0,
+        queue_policy: str = "block",
+        recorder=None,
+    ) -> None:
         self.symbol = symbol
         self.depth = depth
         self.market = market
+        # Modo de lote: drena o que já está no buffer do socket e aplica os deltas de uma vez
+        self.batch_deltas = batch_deltas
+        self.max_batch = max_batch
+        # "fast" (msgspec/orjson/json, sem validação) ou "strict" (pydantic)
+        self.decoder = decoder
+        self._decode = get_decoder(decoder)
         
-        # Determinar URL WebSocket baseado no tipo de mercado
-        if market.lower() == "linear":
-            self.ws_url = settings.ws_linear
-        elif market.lower() == "inverse":
-            self.ws_url = settings.ws_inverse
-        else:  # spot
-            self.ws_url = settings.ws_spot
-            
-        self.book = OrderBook()
-        self.book.symbol = symbol
-        self.book.market_type = market
+        self.ws_url = ws_url_for(market)
+        self.book = make_book(symbol, market, fixed_point=fixed_point, strict=strict)
+        # Recuperação de gaps de sequência: "resubscribe", "rest" ou "none"
+        if recovery not in RECOVERY_MODES:
+            raise ValueError(f"Modo de recuperação desconhecido: {recovery}")
+        self.recovery = recovery
+        self.resync_timeout = resync_timeout
+        self.sync = BookSynchronizer(self.book, on_gap=self._on_gap, resync=recovery != "none")
+        self._ws = None
+        self._resync_task: Optional[asyncio.Task] = None
+        # Histogramas de latência por estágio (bolsa -> recebido -> decodificado -> aplicado)
+        self.latency: Optional[LatencyTracker] = LatencyTracker() if latency else None
+        # Fila entre leitura do socket e aplicação no livro (0 = processamento inline)
+        self.ingest: Optional[IngestQueue] = IngestQueue(queue_size, queue_policy) if queue_size > 0 else None
+        # Gravador opcional dos frames brutos (ver core/recorder.py)
+        self.recorder = recorder
         
         # Analisar tipo de contrato
         symbol_info = parse_symbol_type(symbol)
@@ -66,10 +122,14 @@ class BybitWSClient:
                     break
                 await backoff_retry(attempt=attempt)
 
+    @property
+    def topic(self) -> str:
+        return f"orderbook.{self.depth}.{self.symbol}"
+
     async def _connect_and_listen(self) -> None:
         sub_msg = {
             "op": "subscribe",
-            "args": [f"orderbook.{self.depth}.{self.symbol}"],
+            "args": [self.topic],
         }
         ping_interval = 20
         ping_timeout = 10
@@ -84,42 +144,192 @@ class BybitWSClient:
             await ws.send(json.dumps(sub_msg))
             log.info("Inscrito em %s", sub_msg["args"][0])
             self._connected.set()
+            self._ws = ws
 
-            # Reset contador de erros de sequência ao conectar
+            # Reset contador de erros de sequência ao conectar; a nova conexão começa com snapshot
             self.book._sequence_errors = 0
+            self.sync.reset()
+
+            if self.ingest is not None:
+                await self._listen_queued(ws)
+                return
 
             async for raw in ws:
-                try:
-                    # Validar se a mensagem não está vazia
-                    if not raw or raw.strip() == "":
-                        continue
-                        
-                    msg = WSOrderbookMessage.model_validate_json(raw)
-                except Exception as e:
-                    log.debug("Payload WebSocket inválido: %s - Erro: %s", raw, e)
-                    continue
+                received = stamp()
+                if self.recorder is not None:
+                    self.recorder.record(raw, received[0])
+                if self.batch_deltas:
+                    frames, stamps = [raw], [received]
+                    # Mensagens já recebidas e enfileiradas pelo websockets: recv() não bloqueia
+                    buffered = getattr(ws, "messages", ())
+                    while buffered and len(frames) < self.max_batch:
+                        frames.append(await ws.recv())
+                        stamps.append(stamp())
+                        if self.recorder is not None:
+                            self.recorder.record(frames[-1], stamps[-1][0])
+                    self._handle_batch(frames, stamps)
+                else:
+                    self._process(raw, received)
 
-                if not msg.data:
-                    continue
+    async def _listen_queued(self, ws) -> None:
+        """Leitura do socket desacoplada: o leitor só enfileira, o consumidor aplica em lotes."""
+        consumer = asyncio.create_task(self._consume())
+        try:
+            async for raw in ws:
+                received = stamp()
+                if self.recorder is not None:
+                    self.recorder.record(raw, received[0])
+                await self.ingest.put(raw, received)
+        finally:
+            consumer.cancel()
+            await asyncio.gather(consumer, return_exceptions=True)
+            discarded = self.ingest.clear()
+            if discarded:
+                log.info(f"{discarded} frames pendentes descartados ao encerrar a conexão de {self.symbol}")
+
+    async def _consume(self) -> None:
+        while True:
+            batch = await self.ingest.get_batch(self.max_batch)
+            if self.batch_deltas or (len(batch) > 1 and self.ingest.policy == "conflate"):
+                self._handle_batch([raw for raw, _ in batch], [received for _, received in batch])
+            else:
+                for raw, received in batch:
+                    self._process(raw, received)
+            # Cede o loop entre lotes para o leitor e os pings
+            await asyncio.sleep(0)
+
+    def _process(self, raw, received=None) -> None:
+        """Decodifica e aplica um frame, registrando as latências se ``received`` for dado."""
+        frame = self._parse(raw)
+        if frame is None:
+            return
+        if received is None or self.latency is None:
+            self._handle(frame)
+            return
+        parsed_ns = time.perf_counter_ns()
+        self._handle(frame)
+        self.latency.record_message(frame.ts, received[0], received[1], parsed_ns, time.perf_counter_ns())
+
+    def _parse(self, raw) -> Optional[Frame]:
+        try:
+            # Validar se a mensagem não está vazia
+            if not raw or not raw.strip():
+                return None
+
+            frame = self._decode(raw)
+        except Exception as e:
+            log.debug("Payload WebSocket inválido: %s - Erro: %s", raw, e)
+            return None
+
+        if frame is None:
+            return None
+
+        # Validar se o símbolo corresponde
+        if frame.symbol and frame.symbol != self.symbol:
+            log.debug("Mensagem para símbolo diferente: %s (esperado: %s)", frame.symbol, self.symbol)
+            return None
+        return frame
 
-                # Validar se o símbolo corresponde
-                if msg.data.s and msg.data.s != self.symbol:
-                    log.debug("Mensagem para símbolo diferente: %s (esperado: %s)", msg.data.s, self.symbol)
+    def _handle(self, frame: Frame) -> None:
+        if frame.type == "snapshot":
+            self.sync.apply_snapshot(frame.bids, frame.asks, frame.update_id)
+            log.info(f"Snapshot aplicado para {self.symbol}: {len(frame.bids)} bids, {len(frame.asks)} asks")
+        elif frame.type == "delta":
+            self.sync.apply_delta(frame.bids, frame.asks, frame.update_id, frame.prev_update_id)
+
+    def _handle_batch(self, frames: List, stamps: Optional[List[tuple]] = None) -> None:
+        """Aplica uma rajada de frames: deltas consecutivos são coalescidos em ``apply_deltas``."""
+        track = self.latency is not None and stamps is not None
+        pending: List[tuple] = []
+        timings: List[tuple] = []   # (ts da bolsa, recebido (parede, perf), decodificado) por delta pendente
+        for i, raw in enumerate(frames):
+            frame = self._parse(raw)
+            if frame is None:
+                continue
+            parsed_ns = time.perf_counter_ns() if track else 0
+            if frame.type == "delta" and self.sync.state == SYNCED:
+                # Só entram no lote deltas contíguos; gaps e duplicados passam pelo sincronizador
+                prev = pending[-1][2] if pending else self.book.last_update_id
+                if follows(prev, frame.update_id, frame.prev_update_id):
+                    pending.append((frame.bids, frame.asks, frame.update_id))
+                    if track:
+                        timings.append((frame.ts, stamps[i], parsed_ns))
                     continue
+            if pending:
+                self._flush_deltas(pending, timings)
+                pending, timings = [], []
+            self._handle(frame)
+            if track:
+                self.latency.record_message(frame.ts, stamps[i][0], stamps[i][1], parsed_ns, time.perf_counter_ns())
+        if pending:
+            self._flush_deltas(pending, timings)
+
+    def _flush_deltas(self, pending: List[tuple], timings: Optional[List[tuple]] = None) -> None:
+        applied = self.sync.apply_deltas(pending)
+        if applied is None:
+            return  # modo estrito: mensagem inválida, livro em ressincronização
+        if timings:
+            applied_ns = time.perf_counter_ns()
+            for ts, (wall_ns, received_ns), parsed_ns in timings:
+                self.latency.record_message(ts, wall_ns, received_ns, parsed_ns, applied_ns)
+        if applied < len(pending):
+            log.warning(f"{len(pending) - applied} deltas rejeitados para {self.symbol} devido a erro de sequência")
+        if len(pending) > 1:
+            log.debug(f"Lote de {len(pending)} deltas coalescido para {self.symbol}")
+
+    # ----------------- Recuperação de gaps -----------------
+    def _on_gap(self) -> None:
+        if self.recovery == "none":
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # fora do loop (ex.: replay síncrono): o próximo snapshot revalida o livro
+        if self._resync_task is None or self._resync_task.done():
+            self._resync_task = loop.create_task(
+                resync_loop(self.sync, self._request_snapshot, timeout=self.resync_timeout)
+            )
+
+    async def _request_snapshot(self) -> None:
+        if self.recovery == "rest":
+            # /v5/market/orderbook aceita até 200 níveis no spot e 500 nos derivativos
+            limit = min(self.depth, 200 if self.market.lower() == "spot" else 500)
+            snap = await RESTClient(self.market).fetch_snapshot(self.symbol, limit=limit)
+            if snap is not None and self.sync.recovering:
+                self.sync.apply_snapshot(*snap)
+            return
+        if self._ws is None:
+            return
+        # Resubscribe: a Bybit responde com um snapshot novo do tópico
+        await self._ws.send(json.dumps({"op": "unsubscribe", "args": [self.topic]}))
+        await self._ws.send(json.dumps({"op": "subscribe", "args": [self.topic]}))
+        log.info(f"Resubscribe de {self.topic} para recuperar gap de sequência")
+
+    def get_stats(self) -> dict:
+        """Estatísticas do livro, da recuperação de gaps e das latências (em ms)."""
+        stats = {**self.book.get_stats(), "recovery": self.sync.get_stats()}
+        if self.latency is not None:
+            stats["latency"] = self.latency.summary()
+        if self.ingest is not None:
+            stats["ingest"] = self.ingest.get_stats()
+        return stats
+
+    def export_latency(self) -> dict:
+        """Histogramas completos (buckets em µs) para exportação em JSON."""
+        return {
+            "symbol": self.symbol,
+            "market": self.market,
+            "generated_at": time.time(),
+            "stages": self.latency.export() if self.latency is not None else {},
+        }
+
+    def subscribe(self, callback, kinds=ALL_KINDS, top_n: int = 10, min_interval: float = 0.0) -> Subscription:
+        """Assina mudanças do livro deste cliente (ver ``OrderBook.subscribe``)."""
+        return self.book.subscribe(callback, kinds=kinds, top_n=top_n, min_interval=min_interval)
 
-                if msg.type == "snapshot":
-                    b = msg.data.b or []
-                    a = msg.data.a or []
-                    self.book.apply_snapshot(b, a, msg.data.u)
-                    log.info(f"Snapshot aplicado para {self.symbol}: {len(b)} bids, {len(a)} asks")
-                elif msg.type == "delta":
-                    b = msg.data.b or []
-                    a = msg.data.a or []
-                    success = self.book.apply_delta(b, a, msg.data.u)
-                    if not success:
-                        log.warning(f"Delta rejeitado para {self.symbol} devido a erro de sequência")
-                        # Em caso de erro de sequência, pode ser necessário solicitar novo snapshot
-                        # ou implementar lógica de recuperação
+    def watch(self, kinds=ALL_KINDS, top_n: int = 10) -> ChangeWaiter:
+        """Assinatura para consumidores asyncio (ver ``ChangeWaiter``)."""
+        return self.book.watch(kinds=kinds, top_n=top_n)
 
     async def wait_connected(self, timeout: float = 10.0) -> bool:
         try:
@@ -0,0 +1,329 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import websockets
+
+from .decoder import Frame, get_decoder
+from .rest_client import RESTClient
+from .ingest import IngestQueue
+from .events import ALL_KINDS, ChangeWaiter, Subscription
+from .orderbook import OrderBook
+from .recovery import SYNCED, BookSynchronizer, follows, resync_loop
+from .ws_client import RECOVERY_MODES, make_book, ws_url_for
+from ..utils.latency import LatencyTracker, stamp
+from ..utils.retry import backoff_retry
+
+log = logging.getLogger("ws_multiplex")
+
+# Limite de args por requisição de subscribe (o spot da Bybit aceita até 10)
+MAX_ARGS_PER_REQUEST = 10
+
+class MultiplexWSClient:
+    """
+    Cliente WebSocket que acompanha vários símbolos em uma única conexão.
+
+    Todos os tópicos ``orderbook.{depth}.{symbol}`` são inscritos no mesmo
+    socket, em requisições de até ``max_args`` tópicos. Cada frame é roteado
+    pelo campo ``topic`` já decodificado para o ``OrderBook`` do símbolo.
+    Após uma reconexão todos os tópicos são inscritos novamente.
+    """
+
+    def __init__(
+        self,
+        symbols: Iterable[str],
+        depth: int,
+        market: str,
+        fixed_point: bool = False,
+        strict: bool = False,
+        decoder: str = "fast",
+        max_args: int = MAX_ARGS_PER_REQUEST,
+        recovery: str = "resubscribe",
+        resync_timeout: float = 5.0,
+        latency: bool = True,
+        queue_size: int = 0,
+        queue_policy: str = "block",
+        max_batch: int = 256,
+        recorder=None,
+    ) -> None:
+        self.symbols = list(dict.fromkeys(symbols))
+        if not self.symbols:
+            raise ValueError("Informe ao menos um símbolo")
+        self.depth = depth
+        self.market = market
+        self.max_args = max_args
+        self.ws_url = ws_url_for(market)
+        self.decoder = decoder
+        self._decode = get_decoder(decoder)
+
+        self.books: Dict[str, OrderBook] = {
+            symbol: make_book(symbol, market, fixed_point=fixed_point, strict=strict)
+            for symbol in self.symbols
+        }
+        if recovery not in RECOVERY_MODES:
+            raise ValueError(f"Modo de recuperação desconhecido: {recovery}")
+        self.recovery = recovery
+        self.resync_timeout = resync_timeout
+        self.syncs: Dict[str, BookSynchronizer] = {
+            symbol: BookSynchronizer(
+                book, on_gap=lambda symbol=symbol: self._on_gap(symbol), resync=recovery != "none"
+            )
+            for symbol, book in self.books.items()
+        }
+        # Roteamento direto tópico -> sincronizador do livro
+        self._routes: Dict[str, BookSynchronizer] = {self.topic(s): sync for s, sync in self.syncs.items()}
+        self._ws = None
+        self._resync_tasks: Dict[str, asyncio.Task] = {}
+        # Latências por símbolo, indexadas pelo tópico como o roteamento
+        self.latency: Dict[str, LatencyTracker] = {s: LatencyTracker() for s in self.symbols} if latency else {}
+        self._latency_routes = {self.topic(s): t for s, t in self.latency.items()}
+        # Fila entre leitura do socket e aplicação nos livros (0 = processamento inline)
+        self.ingest: Optional[IngestQueue] = IngestQueue(queue_size, queue_policy) if queue_size > 0 else None
+        self.max_batch = max_batch
+        # Gravador opcional dos frames brutos (ver core/recorder.py)
+        self.recorder = recorder
+
+        self._connected = asyncio.Event()
+        self._reconnect_count = 0
+        self._unrouted = 0
+        self._frames = 0
+
+    def topic(self, symbol: str) -> str:
+        return f"orderbook.{self.depth}.{symbol}"
+
+    def subscribe_requests(self) -> List[dict]:
+        """Mensagens de subscribe, respeitando o limite de args por requisição."""
+        topics = list(self._routes)
+        return [
+            {"op": "subscribe", "args": topics[i:i + self.max_args]}
+            for i in range(0, len(topics), self.max_args)
+        ]
+
+    async def run_forever(self) -> None:
+        attempt = 0
+        max_attempts = 10  # Limite de tentativas consecutivas
+
+        while True:
+            try:
+                await self._connect_and_listen()
+                attempt = 0
+                self._reconnect_count = 0
+            except websockets.exceptions.ConnectionClosed as e:
+                log.warning(f"Conexão WebSocket multiplexada fechada ({len(self.symbols)} símbolos): {e}")
+            except Exception as e:  # noqa: BLE001
+                log.exception(f"Erro inesperado no WebSocket multiplexado: {e}")
+            else:
+                continue
+            self._connected.clear()
+            attempt += 1
+            self._reconnect_count += 1
+            if attempt >= max_attempts:
+                log.error("Máximo de tentativas atingido para a conexão multiplexada. Parando reconexão.")
+                break
+            await backoff_retry(attempt=attempt)
+
+    async def _connect_and_listen(self) -> None:
+        log.info("Conectando ao %s (%d tópicos)", self.ws_url, len(self._routes))
+        async with websockets.connect(
+            self.ws_url,
+            ping_interval=20,
+            ping_timeout=10,
+            close_timeout=10,
+        ) as ws:
+            # (Re)inscrever todos os tópicos: a Bybit envia um snapshot novo para cada um
+            for req in self.subscribe_requests():
+                await ws.send(json.dumps(req))
+            log.info(f"Inscrito em {len(self._routes)} tópicos em {len(self.subscribe_requests())} requisições")
+            self._connected.set()
+            self._ws = ws
+
+            for sync in self.syncs.values():
+                sync.book._sequence_errors = 0
+                sync.reset()
+
+            if self.ingest is None:
+                async for raw in ws:
+                    received = stamp()
+                    if self.recorder is not None:
+                        self.recorder.record(raw, received[0])
+                    self.dispatch(raw, received)
+                return
+
+            consumer = asyncio.create_task(self._consume())
+            try:
+                async for raw in ws:
+                    received = stamp()
+                    if self.recorder is not None:
+                        self.recorder.record(raw, received[0])
+                    await self.ingest.put(raw, received)
+            finally:
+                consumer.cancel()
+                await asyncio.gather(consumer, return_exceptions=True)
+                self.ingest.clear()
+
+    async def _consume(self) -> None:
+        while True:
+            batch = await self.ingest.get_batch(self.max_batch)
+            if len(batch) > 1 and self.ingest.policy == "conflate":
+                self.dispatch_batch([raw for raw, _ in batch], [received for _, received in batch])
+            else:
+                for raw, received in batch:
+                    self.dispatch(raw, received)
+            # Cede o loop entre lotes para o leitor e os pings
+            await asyncio.sleep(0)
+
+    def _route(self, raw) -> Tuple[Optional[BookSynchronizer], Optional[Frame]]:
+        """Decodifica um frame e encontra o sincronizador do seu tópico."""
+        self._frames += 1
+        try:
+            if not raw or not raw.strip():
+                return None, None
+            frame = self._decode(raw)
+        except Exception as e:
+            log.debug("Payload WebSocket inválido: %s - Erro: %s", raw, e)
+            return None, None
+        if frame is None:
+            return None, None
+        sync = self._routes.get(frame.topic)
+        if sync is None:
+            self._unrouted += 1
+            log.debug("Frame sem livro para o tópico: %s", frame.topic)
+        return sync, frame
+
+    def dispatch(self, raw, received=None) -> Optional[OrderBook]:
+        """
+        Decodifica um frame e aplica no livro do tópico; retorna o livro
+        atualizado. Com ``received`` (ver ``utils.latency.stamp``) registra as
+        latências do símbolo.
+        """
+        sync, frame = self._route(raw)
+        if sync is None:
+            return None
+        tracker = self._latency_routes.get(frame.topic) if received is not None else None
+        if tracker is None:
+            self._apply(sync, frame)
+            return sync.book
+        parsed_ns = time.perf_counter_ns()
+        self._apply(sync, frame)
+        tracker.record_message(frame.ts, received[0], received[1], parsed_ns, time.perf_counter_ns())
+        return sync.book
+
+    def dispatch_batch(self, raws: List, stamps: Optional[List[tuple]] = None) -> None:
+        """
+        Aplica uma rajada de frames: os deltas contíguos de cada tópico são
+        coalescidos em um ``apply_deltas`` por livro (como ``BybitWSClient._handle_batch``).
+        """
+        pending: Dict[BookSynchronizer, List[tuple]] = {}
+        timings: Dict[BookSynchronizer, List[tuple]] = {}
+        for i, raw in enumerate(raws):
+            sync, frame = self._route(raw)
+            if sync is None:
+                continue
+            tracker = self._latency_routes.get(frame.topic) if stamps is not None else None
+            parsed_ns = time.perf_counter_ns() if tracker is not None else 0
+            batch = pending.get(sync)
+            if frame.type == "delta" and sync.state == SYNCED:
+                prev = batch[-1][2] if batch else sync.book.last_update_id
+                if follows(prev, frame.update_id, frame.prev_update_id):
+                    pending.setdefault(sync, []).append((frame.bids, frame.asks, frame.update_id))
+                    if tracker is not None:
+                        timings.setdefault(sync, []).append((tracker, frame.ts, stamps[i], parsed_ns))
+                    continue
+            if batch:
+                self._flush(sync, pending.pop(sync), timings.pop(sync, None))
+            self._apply(sync, frame)
+            if tracker is not None:
+                tracker.record_message(frame.ts, stamps[i][0], stamps[i][1], parsed_ns, time.perf_counter_ns())
+        for sync, batch in pending.items():
+            self._flush(sync, batch, timings.get(sync))
+
+    def _flush(self, sync: BookSynchronizer, batch: List[tuple], timings: Optional[List[tuple]]) -> None:
+        applied = sync.apply_deltas(batch)
+        if timings:
+            applied_ns = time.perf_counter_ns()
+            for tracker, ts, (wall_ns, received_ns), parsed_ns in timings:
+                tracker.record_message(ts, wall_ns, received_ns, parsed_ns, applied_ns)
+        if applied is not None and applied < len(batch):
+            log.warning(f"{len(batch) - applied} deltas rejeitados para {sync.book.symbol} devido a erro de sequência")
+
+    def _apply(self, sync: BookSynchronizer, frame: Frame) -> None:
+        if frame.type == "snapshot":
+            sync.apply_snapshot(frame.bids, frame.asks, frame.update_id)
+            log.info(f"Snapshot aplicado para {sync.book.symbol}: {len(frame.bids)} bids, {len(frame.asks)} asks")
+        elif frame.type == "delta":
+            sync.apply_delta(frame.bids, frame.asks, frame.update_id, frame.prev_update_id)
+
+    # ----------------- Recuperação de gaps -----------------
+    def _on_gap(self, symbol: str) -> None:
+        if self.recovery == "none":
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = self._resync_tasks.get(symbol)
+        if task is None or task.done():
+            request = lambda: self._request_snapshot(symbol)  # noqa: E731
+            self._resync_tasks[symbol] = loop.create_task(
+                resync_loop(self.syncs[symbol], request, timeout=self.resync_timeout)
+            )
+
+    async def _request_snapshot(self, symbol: str) -> None:
+        sync = self.syncs[symbol]
+        if self.recovery == "rest":
+            limit = min(self.depth, 200 if self.market.lower() == "spot" else 500)
+            snap = await RESTClient(self.market).fetch_snapshot(symbol, limit=limit)
+            if snap is not None and sync.recovering:
+                sync.apply_snapshot(*snap)
+            return
+        if self._ws is None:
+            return
+        topic = self.topic(symbol)
+        await self._ws.send(json.dumps({"op": "unsubscribe", "args": [topic]}))
+        await self._ws.send(json.dumps({"op": "subscribe", "args": [topic]}))
+        log.info(f"Resubscribe de {topic} para recuperar gap de sequência")
+
+    def book(self, symbol: str) -> OrderBook:
+        return self.books[symbol]
+
+    def subscribe(self, symbol: str, callback, kinds=ALL_KINDS, top_n: int = 10, min_interval: float = 0.0) -> Subscription:
+        """Assina mudanças do livro de ``symbol`` (ver ``OrderBook.subscribe``)."""
+        return self.books[symbol].subscribe(callback, kinds=kinds, top_n=top_n, min_interval=min_interval)
+
+    def watch(self, symbol: str, kinds=ALL_KINDS, top_n: int = 10) -> ChangeWaiter:
+        return self.books[symbol].watch(kinds=kinds, top_n=top_n)
+
+    async def wait_connected(self, timeout: float = 10.0) -> bool:
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _book_stats(self, symbol: str) -> dict:
+        sync = self.syncs[symbol]
+        stats = {**sync.book.get_stats(), "recovery": sync.get_stats()}
+        if symbol in self.latency:
+            stats["latency"] = self.latency[symbol].summary()
+        return stats
+
+    def export_latency(self) -> dict:
+        """Histogramas completos por símbolo (buckets em µs) para exportação em JSON."""
+        return {
+            "market": self.market,
+            "generated_at": time.time(),
+            "symbols": {symbol: tracker.export() for symbol, tracker in self.latency.items()},
+        }
+
+    def get_stats(self) -> Dict[str, any]:
+        return {
+            "symbols": len(self.symbols),
+            "reconnects": self._reconnect_count,
+            "frames": self._frames,
+            "unrouted_frames": self._unrouted,
+            "ingest": self.ingest.get_stats() if self.ingest is not None else None,
+            "books": {symbol: self._book_stats(symbol) for symbol in self.symbols},
+        }
@@ -3,13 +3,21 @@ import asyncio
 import json
 import os
 import argparse
+import logging
 from pathlib import Path
+from typing import Optional
 
 from .configs.settings import settings
 from .core.ws_client import BybitWSClient
-from .core.history import OrderbookHistory
+from .core.history import DEFAULT_HISTORY_DB, OrderbookHistory
+from .core.partitioned_history import PartitionedHistory, history_backend
+from .core.history_writer import HistoryWriter
+from .core.recorder import FeedRecorder
+from .core.sharding import ShardSupervisor
 from .utils.logging import setup_logging
 
+log = logging.getLogger("runner")
+
 DATA_PATH = Path(settings.data_file)
 
 async def main() -> None:
@@ -18,12 +26,65 @@ async def main() -> None:
     parser.add_argument("--market", default=settings.market, help="Tipo de mercado (linear, inverse, spot)")
     parser.add_argument("--depth", type=int, default=settings.depth, help="Profundidade do orderbook")
     parser.add_argument("--data-file", default=settings.data_file, help="Arquivo de dados JSON")
+    parser.add_argument("--fixed-point", action="store_true", default=settings.fixed_point,
+                        help="Armazenar preços/quantidades como inteiros escalados por tick/lot size")
+    parser.add_argument("--batch-deltas", action="store_true",
+                        help="Drenar o buffer do socket e aplicar rajadas de deltas de uma vez")
+    parser.add_argument("--decoder", default="fast", choices=["fast", "strict", "msgspec", "orjson", "json", "pydantic"],
+                        help="Decoder de frames: fast (sem validação) ou strict (pydantic)")
+    
+    parser.add_argument("--recovery", default="resubscribe", choices=["resubscribe", "rest", "none"],
+                        help="Como recuperar o livro após um gap de sequência")
+    parser.add_argument("--queue-size", type=int, default=0,
+                        help="Fila limitada entre leitura do socket e aplicação no livro (0 = inline)")
+    parser.add_argument("--queue-policy", default="block", choices=["block", "drop_oldest", "conflate"],
+                        help="Política da fila quando cheia")
+    parser.add_argument("--record", metavar="DIR",
+                        help="Gravar todos os frames brutos em segmentos comprimidos neste diretório")
+    parser.add_argument("--record-segment-mb", type=float, default=256.0, help="Rotacionar segmentos por tamanho (MiB)")
+    parser.add_argument("--record-segment-minutes", type=float, default=60.0, help="Rotacionar segmentos por tempo")
+    parser.add_argument("--history-storage", default="json", choices=["json", "delta"],
+                        help="Histórico SQLite: JSON completo ou keyframe + diffs")
+    parser.add_argument("--history-backend", default="single", choices=["single", "partitioned"],
+                        help="Histórico SQLite: tabela única ou particionado por símbolo e dia")
+    parser.add_argument("--history-db", default=DEFAULT_HISTORY_DB,
+                        help="Banco do histórico (o mesmo que a CLI lê por padrão)")
+    parser.add_argument("--keyframe-every", type=int, default=60,
+                        help="Modo delta: snapshots entre keyframes completos")
+    parser.add_argument("--symbols", help="Lista de símbolos separados por vírgula (modo shard)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Processos worker: >0 ativa o modo shard (topo do livro de cada símbolo)")
     
     args = parser.parse_args()
     
+    existing = history_backend(args.history_db)
+    if existing is not None and existing != args.history_backend:
+        parser.error(f"{args.history_db} já usa o backend '{existing}': use --history-backend {existing}, "
+                     f"outro --history-db ou 'history migrate'")
+    
     setup_logging()
-    client = BybitWSClient(args.symbol, args.depth, args.market)
-    history = OrderbookHistory()
+    if args.workers > 0:
+        if args.batch_deltas:
+            parser.error("--batch-deltas não é suportado no modo shard (use --queue-size/--queue-policy)")
+        symbols = [s.strip() for s in (args.symbols or args.symbol).split(",") if s.strip()]
+        await sharded_task(symbols, args)
+        return
+    recorder = None
+    if args.record:
+        recorder = FeedRecorder(
+            args.record,
+            prefix=f"{args.market}-{args.symbol}-{args.depth}",
+            meta={"symbol": args.symbol, "market": args.market, "depth": args.depth},
+            segment_bytes=int(args.record_segment_mb * 2**20),
+            segment_seconds=args.record_segment_minutes * 60,
+        )
+    client = BybitWSClient(
+        args.symbol, args.depth, args.market, recorder=recorder,
+        fixed_point=args.fixed_point, batch_deltas=args.batch_deltas, decoder=args.decoder,
+        recovery=args.recovery, queue_size=args.queue_size, queue_policy=args.queue_policy,
+    )
+    history_cls = PartitionedHistory if args.history_backend == "partitioned" else OrderbookHistory
+    history = history_cls(args.history_db, storage=args.history_storage, keyframe_every=args.keyframe_every)
     
     # Atualizar caminho do arquivo de dados
     global DATA_PATH
@@ -31,7 +92,9 @@ async def main() -> None:
     
     # Criar tasks para escrita de dados
     writer = asyncio.create_task(writer_task(client))
-    history_writer = asyncio.create_task(history_writer_task(client, history))
+    history_sink = HistoryWriter(history)
+    history_writer = asyncio.create_task(history_writer_task(client, history_sink))
+    stats_writer = asyncio.create_task(stats_writer_task(client, history=history_sink))
     
     try:
         await client.run_forever()
@@ -39,37 +102,108 @@ async def main() -> None:
         # Cancelar tasks de escrita
         writer.cancel()
         history_writer.cancel()
+        stats_writer.cancel()
         try:
-            await asyncio.gather(writer, history_writer, return_exceptions=True)
+            await asyncio.gather(writer, history_writer, stats_writer, return_exceptions=True)
         except Exception:
             pass
+        # Grava os snapshots que ainda estão na fila antes de sair
+        history_sink.close(timeout=10.0)
+        if recorder is not None:
+            recorder.close()
 
-async def writer_task(client: BybitWSClient) -> None:
+async def writer_task(client: BybitWSClient, min_interval: float = 0.25) -> None:
+    """Grava o livro em JSON sempre que ele muda (no máximo a cada ``min_interval`` s)."""
     await client.wait_connected(10.0)
     DATA_PATH.parent.mkdir(parents=True, exist_ok=True)
-    while True:
-        payload = {
-            "symbol": client.symbol,
-            "bids": [[p, str(q)] for p, q in client.book.bids.items()],
-            "asks": [[p, str(q)] for p, q in client.book.asks.items()],
-        }
-        tmp = DATA_PATH.with_suffix(".tmp")
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(payload, f)
-        os.replace(tmp, DATA_PATH)
-        await asyncio.sleep(1.0)
+    waiter = client.watch(top_n=client.depth)
+    last_version = None
+    try:
+        while True:
+            await waiter.wait()
+            snap = client.book.snapshot()
+            if snap.version == last_version:
+                continue
+            last_version = snap.version
+            payload = {"symbol": client.symbol, "bids": snap.payload["bids"], "asks": snap.payload["asks"]}
+            tmp = DATA_PATH.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp, DATA_PATH)
+            await asyncio.sleep(min_interval)
+    finally:
+        waiter.close()
+
+async def history_writer_task(client: BybitWSClient, history: HistoryWriter, interval: float = 5.0) -> None:
+    """
+    Task para salvar snapshots históricos; não grava se o livro não mudou desde
+    o último. A gravação em si acontece na thread do ``HistoryWriter``.
+    """
+    await client.wait_connected(10.0)
+    waiter = client.watch(top_n=client.depth)
+    try:
+        while True:
+            try:
+                await waiter.wait()
+                # Salvar snapshot histórico no máximo a cada ``interval`` segundos
+                history.submit(client.book, client.symbol, client.market)
+                await asyncio.sleep(interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.exception(f"Erro ao salvar histórico: {e}")
+                await asyncio.sleep(1.0)
+    finally:
+        waiter.close()
 
-async def history_writer_task(client: BybitWSClient, history: OrderbookHistory) -> None:
-    """Task para salvar snapshots históricos periodicamente."""
+async def stats_writer_task(client: BybitWSClient, interval: float = 5.0, history: Optional[HistoryWriter] = None) -> None:
+    """Exporta estatísticas e histogramas de latência em ``stats_latest.json`` ao lado do arquivo de dados."""
     await client.wait_connected(10.0)
+    path = DATA_PATH.with_name("stats_latest.json")
+    path.parent.mkdir(parents=True, exist_ok=True)
     while True:
-        try:
-            # Salvar snapshot histórico a cada 5 segundos
-            history.save_snapshot(client.book, client.symbol, client.market)
-            await asyncio.sleep(5.0)
-        except Exception as e:
-            print(f"Erro ao salvar histórico: {e}")
-            await asyncio.sleep(1.0)
+        await asyncio.sleep(interval)
+        payload = {"stats": client.get_stats(), "latency": client.export_latency()}
+        if client.recorder is not None:
+            payload["recorder"] = client.recorder.get_stats()
+        if history is not None:
+            payload["history"] = history.get_stats()
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, default=str)
+        os.replace(tmp, path)
+
+async def sharded_task(symbols, args, interval: float = 1.0) -> None:
+    """
+    Modo shard: um supervisor distribui os símbolos entre processos worker
+    (cada um com sua conexão multiplexada) e grava o topo do livro de todos
+    os símbolos em ``tops_latest.json`` ao lado do arquivo de dados.
+    """
+    tops_path = Path(args.data_file).with_name("tops_latest.json")
+    tops_path.parent.mkdir(parents=True, exist_ok=True)
+    supervisor = ShardSupervisor(
+        symbols, args.depth, args.market, workers=args.workers,
+        fixed_point=args.fixed_point, decoder=args.decoder,
+        recovery=args.recovery, queue_size=args.queue_size, queue_policy=args.queue_policy,
+        record=args.record, record_segment_bytes=int(args.record_segment_mb * 2**20),
+        record_segment_seconds=args.record_segment_minutes * 60,
+    )
+    supervisor.start()
+    try:
+        while supervisor.alive():
+            await asyncio.sleep(interval)
+            supervisor.poll(timeout=0)
+            payload = {
+                "tops": {s: {"best_bid": t.best_bid, "best_ask": t.best_ask, "update_id": t.update_id, "shard": t.shard}
+                         for s, t in supervisor.tops.items()},
+                "stats": supervisor.get_stats(),
+            }
+            tmp = tops_path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp, tops_path)
+    finally:
+        supervisor.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,5 +1,5 @@
 from bybit_depth.core.orderbook import OrderBook
-from bybit_depth.core.aggregator import imbalance, detect_walls, band_liquidity
+from bybit_depth.core.aggregator import imbalance, detect_walls, band_liquidity, multi_band_liquidity
 
 def make_book():
     ob = OrderBook()
@@ -21,3 +21,9 @@ def test_band():
     res = band_liquidity(ob, pct=1.0)
     assert res is not None
     assert "bids" in res and "asks" in res
+
+def test_multi_band():
+    ob = make_book()
+    res = multi_band_liquidity(ob, pcts=(0.1, 2.0))
+    assert res[0.1]["bids"] == 0.0
+    assert res[2.0]["bids"] == 3.0 and res[2.0]["asks"] == 10.0
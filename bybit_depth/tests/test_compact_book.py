@@ -0,0 +1,36 @@
+from __future__ import annotations
+from decimal import Decimal
+from bybit_depth.core.compact_book import CompactOrderBook
+from bybit_depth.core.orderbook import OrderBook
+from bybit_depth.utils.synthetic import SyntheticFeed
+
+def test_compact_book_matches_orderbook():
+    """O livro compacto deve reproduzir o OrderBook sobre o mesmo feed."""
+    compact = CompactOrderBook("0.10", "0.001", symbol="BTCUSDT", market_type="linear")
+    book = OrderBook()
+    for frame in SyntheticFeed(depth=50, seed=11).frames(500):
+        d = frame["data"]
+        if frame["type"] == "snapshot":
+            compact.apply_snapshot(d["b"], d["a"], d["u"])
+            book.apply_snapshot(d["b"], d["a"], d["u"])
+        else:
+            assert compact.apply_delta(d["b"], d["a"], d["u"]) is True
+            book.apply_delta(d["b"], d["a"], d["u"])
+    assert compact.best_bid() == book.best_bid()
+    assert compact.best_ask() == book.best_ask()
+    assert compact.mid() == book.mid()
+    assert compact.top_levels("bid", 20) == book.top_levels("bid", 20)
+    assert compact.levels("ask") == book.asks.levels()
+    assert compact.get_stats()["total_levels"] == book.get_stats()["total_levels"]
+
+def test_compact_book_edge_cases():
+    book = CompactOrderBook("0.5", "1")
+    assert book.best_bid() is None and book.mid() is None
+    book.apply_snapshot([["100", "1"], ["99.5", "0"]], [["101", "2"]], update_id=1)
+    assert book.get_stats()["invalid_levels"] == 1
+    assert book.apply_delta([["100", "0"]], [], update_id=1) is False
+    assert book.apply_delta([["100", "0"], ["100.5", "3"]], [["101", "-1"]], update_id=2) is True
+    assert book.best_bid() == Decimal("100.5")
+    assert book.best_ask() is None
+    assert book.size_at(Decimal("100.5")) == (Decimal("3"), "bid")
+    assert book.size_at(Decimal("101")) == (Decimal("0"), None)
@@ -0,0 +1,30 @@
+import pytest
+
+from bybit_depth.core.decoder import Frame, available_decoders, get_decoder
+from bybit_depth.utils.synthetic import SyntheticFeed
+
+def test_decoders_agree_with_strict():
+    raws = SyntheticFeed(depth=20).raw_frames(50)
+    strict = get_decoder("strict")
+    for name in available_decoders():
+        decode = get_decoder(name)
+        for raw in raws:
+            got, ref = decode(raw), strict(raw)
+            assert isinstance(got, Frame)
+            # cts não faz parte do modelo pydantic
+            assert got._replace(cts=None) == ref
+
+def test_control_frames_and_errors():
+    ack = '{"success":true,"ret_msg":"","conn_id":"x","op":"subscribe"}'
+    for name in available_decoders():
+        decode = get_decoder(name)
+        assert decode(ack) is None
+        with pytest.raises(Exception):
+            decode("not json")
+    with pytest.raises(ValueError):
+        get_decoder("nope")
+
+def test_fast_frame_fields():
+    raw = '{"topic":"orderbook.50.BTCUSDT","type":"delta","ts":1,"cts":2,"data":{"s":"BTCUSDT","b":[["100","1"]],"a":[],"u":7,"seq":9}}'
+    frame = get_decoder("fast")(raw)
+    assert frame == Frame("orderbook.50.BTCUSDT", "delta", 1, 2, "BTCUSDT", 7, [["100", "1"]], [])
@@ -0,0 +1,78 @@
+from __future__ import annotations
+from decimal import Decimal
+import random
+import pytest
+from sortedcontainers import SortedDict
+from bybit_depth.core.depth_index import DepthIndex
+from bybit_depth.core.orderbook import OrderBook
+from bybit_depth.utils.synthetic import SyntheticFeed
+
+def _brute_band(book: OrderBook, pct: float):
+    mid = book.mid()
+    lower = mid * (Decimal(1) - Decimal(pct) / Decimal(100))
+    upper = mid * (Decimal(1) + Decimal(pct) / Decimal(100))
+    bids = sum((q for p, q in book.bids.levels() if p >= lower), Decimal(0))
+    asks = sum((q for p, q in book.asks.levels() if p <= upper), Decimal(0))
+    return bids, asks
+
+@pytest.mark.parametrize("fixed_point", [False, True])
+def test_index_matches_full_scan(fixed_point):
+    """O índice incremental deve bater com a varredura completa após cada delta."""
+    book = OrderBook(tick_size="0.10", lot_size="0.001") if fixed_point else OrderBook()
+    feed = SyntheticFeed(depth=50, seed=7)
+    for i, frame in enumerate(feed.frames(400)):
+        d = frame["data"]
+        if frame["type"] == "snapshot":
+            book.apply_snapshot(d["b"], d["a"], d["u"])
+        else:
+            book.apply_delta(d["b"], d["a"], d["u"])
+        if i % 3 == 0:
+            for pct in (0.01, 0.05, 0.1, 1.0):
+                band = book.liquidity_within(pct)
+                assert (band["bids"], band["asks"]) == _brute_band(book, pct)
+
+def test_cumulative_size_at_price():
+    """Testa a quantidade acumulada do topo até um preço arbitrário."""
+    book = OrderBook()
+    book.apply_snapshot(
+        [["100", "1"], ["99", "2"], ["98", "3"]],
+        [["101", "1"], ["102", "2"], ["103", "3"]],
+        update_id=1
+    )
+    assert book.cumulative_size("bid", Decimal("99")) == Decimal("3")
+    assert book.cumulative_size("bid", Decimal("98.5")) == Decimal("3")
+    assert book.cumulative_size("bid", Decimal("101")) == Decimal("0")
+    assert book.cumulative_size("ask", Decimal("102.5")) == Decimal("3")
+    assert book.cumulative_size("ask", Decimal("200")) == Decimal("6")
+
+    # Atualizações pontuais (sem rebuild) e níveis novos (rebuild sob demanda)
+    book.apply_delta([["99", "5"]], [["101", "0"]], update_id=2)
+    assert book.cumulative_size("bid", Decimal("99")) == Decimal("6")
+    assert book.cumulative_size("ask", Decimal("102.5")) == Decimal("2")
+    book.apply_delta([["99.5", "4"]], [], update_id=3)
+    assert book.cumulative_size("bid", Decimal("99")) == Decimal("10")
+
+def test_sparse_index_absorbs_new_prices_without_rebuild():
+    """Preços inéditos no layout esparso entram como pendentes e são incorporados sem invalidar."""
+    rng = random.Random(11)
+    levels = SortedDict({Decimal(p): Decimal(rng.randint(1, 9)) for p in range(100, 140)})
+    index = DepthIndex(min_pending=4)
+    index.rebuild(levels)
+    for step in range(600):
+        price = Decimal(rng.randint(50, 250)) / 2
+        old = levels.get(price)
+        if old is not None and rng.random() < 0.4:
+            del levels[price]
+            index.add(price, -old)
+        else:
+            size = Decimal(rng.randint(1, 9))
+            levels[price] = size
+            index.add(price, size if old is None else size - old)
+        assert index.valid
+        if step % 7 == 0:
+            bound = Decimal(rng.randint(50, 250)) / 2
+            assert index.sum_at_or_below(bound) == sum((q for p, q in levels.items() if p <= bound), Decimal(0))
+            assert index.sum_at_or_above(bound) == sum((q for p, q in levels.items() if p >= bound), Decimal(0))
+    # A incorporação descarta slots zerados: a árvore não cresce com preços que já saíram
+    index._merge_pending()
+    assert index._keys == list(levels.keys()) and index.total == sum(levels.values())
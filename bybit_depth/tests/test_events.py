@@ -0,0 +1,102 @@
+from __future__ import annotations
+import asyncio
+from decimal import Decimal
+from bybit_depth.core.orderbook import OrderBook
+
+def make_book():
+    ob = OrderBook()
+    ob.symbol = "BTCUSDT"
+    ob.apply_snapshot(
+        [["100", "1"], ["99", "2"], ["98", "3"]],
+        [["101", "1"], ["102", "2"], ["103", "3"]],
+        update_id=1
+    )
+    return ob
+
+def test_top_and_level_notifications():
+    """Testa entregas de mudança de topo e de níveis dentro do top N."""
+    book = make_book()
+    events = []
+    book.subscribe(events.append, kinds=("top", "levels"), top_n=2)
+
+    # Fora do top 2: nenhum evento
+    book.apply_delta([["98", "5"]], [], update_id=2)
+    assert events == []
+
+    # Dentro do top 2, sem mudar o topo
+    book.apply_delta([["99", "4"]], [], update_id=3)
+    assert [e.kind for e in events] == ["levels"]
+    assert events[-1].bids == (("99", "4"),)
+
+    # Melhor ask muda
+    book.apply_delta([], [["100.5", "1"]], update_id=4)
+    assert events[-1].kind == "top"
+    assert events[-1].best_ask == Decimal("100.5")
+    assert events[-1].symbol == "BTCUSDT"
+    assert events[-1].version == book.version
+
+def test_snapshot_and_unsubscribe():
+    book = make_book()
+    events = []
+    sub = book.subscribe(events.append, kinds=("snapshot",))
+    book.apply_delta([["100", "9"]], [], update_id=2)
+    book.apply_snapshot([["90", "1"]], [["91", "1"]], update_id=10)
+    assert [e.kind for e in events] == ["snapshot"]
+    sub.close()
+    book.apply_snapshot([["90", "1"]], [["91", "1"]], update_id=11)
+    assert len(events) == 1
+
+def test_throttle_coalesces_changes():
+    """Mudanças dentro do intervalo mínimo são coalescidas em um único registro."""
+    book = make_book()
+    events = []
+    sub = book.subscribe(events.append, kinds=("top", "levels"), top_n=3, min_interval=60.0)
+    book.apply_delta([["99", "4"]], [], update_id=2)
+    book.apply_delta([["99", "5"]], [], update_id=3)
+    book.apply_delta([["100.5", "1"]], [], update_id=4)
+    assert len(events) == 1
+    sub.flush()
+    assert len(events) == 2
+    merged = events[-1]
+    assert merged.kind == "top"
+    assert merged.coalesced == 2
+    assert dict(merged.bids) == {"99": "5", "100.5": "1"}
+    assert merged.update_id == 4
+
+def test_throttle_delivers_trailing_change_without_flush():
+    """O último estado de uma rajada chega sozinho quando o intervalo vence."""
+    async def scenario():
+        book = make_book()
+        events = []
+        sub = book.subscribe(events.append, kinds=("top", "levels"), top_n=3, min_interval=0.05)
+        book.apply_delta([["99", "4"]], [], update_id=2)
+        book.apply_delta([["99", "5"]], [], update_id=3)
+        book.apply_delta([["100.5", "1"]], [], update_id=4)
+        assert len(events) == 1 and sub.pending is not None
+        await asyncio.sleep(0.02)
+        assert len(events) == 1             # ainda dentro do intervalo
+        await asyncio.sleep(0.1)
+        assert len(events) == 2 and sub.pending is None
+        assert events[-1].update_id == 4 and events[-1].coalesced == 2
+        book.apply_delta([["99", "6"]], [], update_id=5)   # intervalo já venceu: entrega direta
+        book.apply_delta([["99", "7"]], [], update_id=6)
+        assert len(events) == 3 and sub.pending is not None
+        sub.close()                          # fechar cancela o timer pendente
+        await asyncio.sleep(0.1)
+        assert len(events) == 3
+
+    asyncio.run(scenario())
+
+def test_change_waiter():
+    async def scenario():
+        book = make_book()
+        waiter = book.watch(top_n=5)
+        assert await waiter.wait(timeout=0.01) is None
+        book.apply_delta([["100", "2"]], [], update_id=2)
+        book.apply_delta([["100", "3"]], [], update_id=3)
+        change = await waiter.wait(timeout=1.0)
+        assert change.kind == "top" and change.coalesced == 2
+        waiter.close()
+        assert book._subscribers == []
+
+    asyncio.run(scenario())
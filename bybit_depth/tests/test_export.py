@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq
+
+from bybit_depth.core.export import export_books, history_books, replay_books
+from bybit_depth.core.history import OrderbookHistory
+from bybit_depth.core.orderbook import OrderBook
+from bybit_depth.core.recorder import FeedRecorder
+from bybit_depth.core.replay import ReplayEngine
+from bybit_depth.utils.synthetic import SyntheticFeed
+
+def _history(tmp_path, count=30):
+    history = OrderbookHistory(str(tmp_path / "h.db"))
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=50, seed=7)
+    book = OrderBook()
+    book.symbol = "BTCUSDT"
+    books = []
+    for frame in feed.frames(count):
+        d = frame["data"]
+        (book.apply_snapshot if frame["type"] == "snapshot" else book.apply_delta)(d["b"], d["a"], d["u"])
+        history.save_snapshot(book, "BTCUSDT", "linear")
+        books.append((book.bids.levels(), book.asks.levels()))
+    return history, books
+
+def test_long_layout_round_trip_in_chunks(tmp_path):
+    history, books = _history(tmp_path)
+    out = tmp_path / "long.parquet"
+    stats = export_books(history_books(history, "BTCUSDT", chunk_size=7), out, chunk_rows=500)
+    table = pq.read_table(out)
+    assert stats.books == len(books) and table.num_rows == stats.rows
+    assert pq.ParquetFile(out).metadata.num_row_groups == stats.batches > 1
+    assert table.schema.names == ["ts", "symbol", "side", "level", "price", "size"]
+
+    # Linhas em ordem: o último livro são as últimas len(bids) + len(asks) linhas
+    df = table.to_pandas()
+    last_bids, last_asks = books[-1]
+    last = df.iloc[len(df) - len(last_bids) - len(last_asks):]
+    assert df["ts"].is_monotonic_increasing
+    bids = last[last["side"] == "bid"]
+    assert list(bids["level"]) == list(range(len(last_bids)))
+    assert list(bids["price"]) == [float(p) for p, _ in books[-1][0]]
+    assert list(bids["size"]) == [float(q) for _, q in books[-1][0]]
+
+def test_wide_layout_pads_shallow_books(tmp_path):
+    rows = [
+        (1_000, "BTCUSDT", [["100", "1"], ["99", "2"]], [["101", "3"]]),
+        (2_000, "BTCUSDT", [["100", "5"]], []),
+    ]
+    out = tmp_path / "wide.arrow"
+    export_books(rows, out, layout="wide", top_n=3, fmt="arrow")
+    table = pa.ipc.open_file(str(out)).read_all()
+    assert table.num_rows == 2 and len(table.schema) == 2 + 4 * 3
+    first, second = table.to_pylist()
+    assert first["bid_px_0"] == 100.0 and first["bid_sz_1"] == 2.0 and first["bid_px_2"] is None
+    assert first["ask_px_0"] == 101.0 and second["ask_px_0"] is None
+
+def test_replay_books_sampled_from_capture(tmp_path):
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=50, seed=8)
+    raws = feed.raw_frames(200)
+    t0, step = 1_700_000_000_000_000_000, 100_000_000
+    with FeedRecorder(tmp_path, prefix="cap", block_size=2048) as rec:
+        for i, raw in enumerate(raws):
+            rec.record(raw, t0 + i * step)
+    engine = ReplayEngine(tmp_path, symbol="BTCUSDT")
+    rows = list(replay_books(engine, interval=1.0, top_n=5))
+    assert [ts for ts, *_ in rows] == [t0 + k * 1_000_000_000 for k in range(20)]
+
+    # Cada amostra é o livro após o último frame com ts <= instante da amostra
+    ref = OrderBook()
+    for i, raw in enumerate(raws[:51]):
+        d = json.loads(raw)
+        (ref.apply_snapshot if d["type"] == "snapshot" else ref.apply_delta)(d["data"]["b"], d["data"]["a"], d["data"]["u"])
+    assert rows[5][2] == ref.bids.top(5) and rows[5][3] == ref.asks.top(5)
@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bybit_depth.core.history import OrderbookHistory
+from bybit_depth.core.history_cache import HistoryCache, estimate_size
+from bybit_depth.core.orderbook import OrderBook
+from bybit_depth.core.partitioned_history import PartitionedHistory
+from bybit_depth.utils.synthetic import SyntheticFeed
+
+START = datetime(2024, 6, 3, 9, 0, tzinfo=timezone.utc)
+
+def _book(seed=2):
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=20, seed=seed)
+    book = OrderBook()
+    d = next(feed.frames(1))["data"]
+    book.apply_snapshot(d["b"], d["a"], d["u"])
+    return feed, book
+
+def _append(history, feed, book, times, symbol="BTCUSDT"):
+    with history.connect() as conn:
+        for at in times:
+            d = feed.delta(4)["data"]
+            book.apply_delta(d["b"], d["a"], d["u"])
+            history.insert_snapshot(conn, book.get_stats(), book.snapshot(), symbol, "linear", at)
+
+def _levels(book):
+    return book.bids.items(), book.asks.items()
+
+def test_lru_evicts_least_recently_used_within_budget():
+    size = estimate_size(list(range(100)))
+    cache = HistoryCache(max_bytes=4 * size)
+    for i in range(3):
+        assert cache.put(("k", i), list(range(100)))
+    assert cache.get(("k", 0)) == (True, list(range(100)))
+    cache.put(("k", 3), list(range(100)))
+    cache.put(("k", 4), list(range(100)))
+    assert cache.bytes <= 4 * size and cache.evictions == 1
+    assert cache.get(("k", 1)) == (False, None)      # menos usado sai primeiro
+    assert cache.get(("k", 0))[0]
+    assert not cache.put("grande", list(range(10000)))
+    stats = cache.get_stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1 and stats["hit_rate"] == pytest.approx(2 / 3)
+
+def test_invalidate_range_only_touches_overlapping_entries():
+    cache = HistoryCache()
+    cache.put("manhã", 1, "BTCUSDT", 0, 1000)
+    cache.put("tarde", 2, "BTCUSDT", 2000, 3000)
+    cache.put("aberto", 3, "BTCUSDT", 1500, None)
+    cache.put("eth", 4, "ETHUSDT", 0, 3000)
+    cache.put("livro", 5)
+    assert cache.invalidate_range("BTCUSDT", 2500, 2600) == 2
+    assert [k for k in ("manhã", "tarde", "aberto", "eth", "livro") if cache.get(k)[0]] == ["manhã", "eth", "livro"]
+
+@pytest.mark.parametrize("cls", [OrderbookHistory, PartitionedHistory])
+def test_queries_are_cached_and_invalidated_by_range(tmp_path, cls):
+    history = cls(str(tmp_path / "h.db"), storage="delta", keyframe_every=5)
+    feed, book = _book()
+    _append(history, feed, book, [START + timedelta(minutes=7 * i) for i in range(40)])
+    early = (START, START + timedelta(hours=1))
+    late = (START + timedelta(hours=3), START + timedelta(hours=6))
+
+    first = history.get_snapshots("BTCUSDT", *early)
+    assert history.get_snapshots("BTCUSDT", *early) == first
+    stats_early = history.get_rollup_stats("BTCUSDT", *early)
+    series_late = history.get_rollup_series("BTCUSDT", *late)
+    restored = history.restore_orderbook(first[0]["id"])
+    assert _levels(history.restore_orderbook(first[0]["id"])) == _levels(restored)
+    assert history.cache.get_stats()["hits"] == 2
+
+    # Gravação de outra conexão, depois do fim da janela "early"
+    _append(history, feed, book, [START + timedelta(hours=5, seconds=30)])
+    assert history.get_rollup_stats("BTCUSDT", *early) == stats_early
+    assert _levels(history.restore_orderbook(first[0]["id"])) == _levels(restored)
+    assert history.cache.get_stats()["hits"] == 4
+    new_series = history.get_rollup_series("BTCUSDT", *late)
+    assert history.cache.get_stats()["hits"] == 4     # janela "late" invalidada: recalculada
+    assert sum(p["count"] for p in new_series) == sum(p["count"] for p in series_late) + 1
+    assert history.get_snapshots("BTCUSDT", *early) == first
+    assert history.cache.get_stats()["hits"] == 5
+
+    # Consultas sem fim (ex.: CLI) sempre veem o último snapshot
+    assert history.get_rollup_stats("BTCUSDT")["count"] == 41
+    _append(history, feed, book, [START + timedelta(hours=8)])
+    assert history.get_rollup_stats("BTCUSDT")["count"] == 42
+    history.close()
+
+@pytest.mark.parametrize("cls", [OrderbookHistory, PartitionedHistory])
+def test_restored_books_are_independent_copies(tmp_path, cls):
+    history = cls(str(tmp_path / "h.db"), storage="delta", keyframe_every=5)
+    feed, book = _book()
+    _append(history, feed, book, [START + timedelta(seconds=i) for i in range(8)])
+    expected = _levels(book)
+    first = history.restore_orderbook(8)
+    assert _levels(first) == expected and first.symbol == "BTCUSDT"
+    # Mexer no livro devolvido não pode vazar para o cache
+    best_bid, best_ask = first.bids.items()[0][0], first.asks.items()[0][0]
+    first.apply_delta([[best_bid, "0"], ["1", "5"]], [[best_ask, "9"]])
+    first.bids.clear()
+    second = history.restore_orderbook(8)
+    assert second is not first
+    assert _levels(second) == expected and second.symbol == "BTCUSDT"
+    second.asks.clear()
+    assert _levels(history.restore_orderbook(8)) == expected
+    assert history.cache.get_stats()["hits"] == 2
+    history.close()
+
+@pytest.mark.parametrize("cls", [OrderbookHistory, PartitionedHistory])
+def test_query_results_are_independent_copies(tmp_path, cls):
+    history = cls(str(tmp_path / "h.db"))
+    feed, book = _book()
+    _append(history, feed, book, [START + timedelta(minutes=i) for i in range(10)])
+    window = (START, START + timedelta(hours=1))
+    rows = history.get_snapshots("BTCUSDT", *window)
+    expected = [dict(r) for r in rows]
+    rows.sort(key=lambda r: r["id"])
+    rows.pop()
+    rows[0]["best_bid"] = -1.0
+    stats = history.get_rollup_stats("BTCUSDT", *window)
+    stats["count"] = 0
+    series = history.get_rollup_series("BTCUSDT", *window)
+    series.clear()
+    assert history.get_snapshots("BTCUSDT", *window) == expected
+    assert history.get_rollup_stats("BTCUSDT", *window)["count"] == 10
+    assert history.get_rollup_series("BTCUSDT", *window) != []
+    assert history.cache.get_stats()["hits"] == 3
+    history.close()
+
+def test_other_instance_writes_and_cleanup_are_seen(tmp_path):
+    path = str(tmp_path / "h.db")
+    reader = OrderbookHistory(path)
+    writer = OrderbookHistory(path, cache_bytes=0)
+    assert writer.cache is None
+    feed, book = _book()
+    _append(writer, feed, book, [START + timedelta(seconds=10 * i) for i in range(5)])
+    assert len(reader.get_snapshots("BTCUSDT")) == 5
+    _append(writer, feed, book, [START + timedelta(minutes=30)])
+    assert len(reader.get_snapshots("BTCUSDT")) == 6
+    writer.cleanup_old_data(days_to_keep=1)   # tudo em 2024
+    assert reader.get_snapshots("BTCUSDT") == [] and reader.get_statistics("BTCUSDT") == {}
+    assert reader.restore_orderbook(1) is None
+    reader.close()
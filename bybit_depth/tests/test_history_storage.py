@@ -0,0 +1,90 @@
+import sqlite3
+
+import pytest
+
+from bybit_depth.core.history import OrderbookHistory, decode_levels, encode_levels
+from bybit_depth.core.orderbook import OrderBook
+from bybit_depth.utils.synthetic import SyntheticFeed
+
+def _fill(history, count=45, symbols=("BTCUSDT", "ETHUSDT")):
+    """Grava ``count`` snapshots por símbolo (intercalados); retorna os livros esperados por id."""
+    feeds = {s: SyntheticFeed(symbol=s, depth=50, seed=i) for i, s in enumerate(symbols)}
+    books = {s: OrderBook() for s in symbols}
+    expected = {}
+    for _ in range(count):
+        for symbol, feed in feeds.items():
+            frame = next(feed.frames(2)) if books[symbol].last_update_id is None else feed.delta(6)
+            d = frame["data"]
+            book = books[symbol]
+            (book.apply_snapshot if frame["type"] == "snapshot" else book.apply_delta)(d["b"], d["a"], d["u"])
+            history.save_snapshot(book, symbol, "linear")
+            with sqlite3.connect(history.db_path) as conn:
+                row_id = conn.execute("SELECT MAX(id) FROM orderbook_snapshots").fetchone()[0]
+            expected[row_id] = (symbol, book.bids.items(), book.asks.items())
+    return expected
+
+def test_blob_round_trip():
+    bids, asks = [["100.5", "1.25"], ["100", "0"]], [["101", "3"]]
+    blob = encode_levels(123, bids, asks, keyframe=True)
+    assert decode_levels(blob) == (123, bids, asks, True)
+
+def test_delta_storage_restores_every_snapshot(tmp_path):
+    history = OrderbookHistory(str(tmp_path / "h.db"), storage="delta", keyframe_every=10)
+    expected = _fill(history)
+    with sqlite3.connect(history.db_path) as conn:
+        keyframes = conn.execute("SELECT COUNT(*) FROM orderbook_snapshots WHERE keyframe_id IS NULL").fetchone()[0]
+        empty_json = conn.execute("SELECT COUNT(*) FROM orderbook_snapshots WHERE snapshot_data != ''").fetchone()[0]
+    assert keyframes == 2 * 5 and empty_json == 0
+    for row_id, (symbol, bids, asks) in expected.items():
+        book = history.restore_orderbook(row_id)
+        assert book.bids.items() == bids and book.asks.items() == asks
+
+@pytest.mark.parametrize("storage", ["json", "delta"])
+def test_iter_books_same_in_both_modes(tmp_path, storage):
+    history = OrderbookHistory(str(tmp_path / "h.db"), storage=storage, keyframe_every=7)
+    expected = _fill(history, count=20)
+    got = [(bids, asks) for _, bids, asks in history.iter_books("ETHUSDT", chunk_size=3)]
+    want = [(bids, asks) for _, (s, bids, asks) in sorted(expected.items()) if s == "ETHUSDT"]
+    as_str = lambda side: [[str(p), str(q)] for p, q in side]  # noqa: E731
+    assert [(b, a) for b, a in got] == [(as_str(b), as_str(a)) for b, a in want]
+
+def test_cleanup_drops_orphan_diffs(tmp_path):
+    history = OrderbookHistory(str(tmp_path / "h.db"), storage="delta", keyframe_every=10)
+    _fill(history, count=15, symbols=("BTCUSDT",))
+    with sqlite3.connect(history.db_path) as conn:
+        first_kf = conn.execute("SELECT MIN(id) FROM orderbook_snapshots").fetchone()[0]
+        conn.execute("UPDATE orderbook_snapshots SET timestamp = '2000-01-01 00:00:00' WHERE id = ?", (first_kf,))
+    assert history.cleanup_old_data(days_to_keep=1) == 10   # keyframe + 9 diffs da cadeia
+    with sqlite3.connect(history.db_path) as conn:
+        remaining = [r[0] for r in conn.execute("SELECT id FROM orderbook_snapshots ORDER BY id")]
+    assert len(remaining) == 5 and history.restore_orderbook(remaining[-1]) is not None
+
+def test_old_database_gains_delta_columns(tmp_path):
+    path = tmp_path / "old.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE orderbook_snapshots (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                     "timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, symbol TEXT NOT NULL, market_type TEXT NOT NULL, "
+                     "best_bid REAL, best_ask REAL, mid_price REAL, spread REAL, spread_pct REAL, bid_levels INTEGER, "
+                     "ask_levels INTEGER, total_updates INTEGER, sequence_errors INTEGER, error_rate REAL, "
+                     "snapshot_data TEXT NOT NULL)")
+        conn.execute("INSERT INTO orderbook_snapshots (symbol, market_type, snapshot_data) VALUES "
+                     "('BTCUSDT', 'linear', '{\"bids\": [[\"1\", \"2\"]], \"asks\": []}')")
+    history = OrderbookHistory(str(path), storage="delta")
+    assert len(history.restore_orderbook(1).bids) == 1
+    _fill(history, count=3, symbols=("BTCUSDT",))
+    assert history.restore_orderbook(4) is not None
+
+def test_cleanup_cutoff_and_bounds_use_sqlite_timestamp_format(tmp_path):
+    from datetime import datetime, timedelta, timezone
+    history = OrderbookHistory(str(tmp_path / "h.db"))
+    _fill(history, count=3, symbols=("BTCUSDT",))
+    now = datetime.now(timezone.utc)
+    with sqlite3.connect(history.db_path) as conn:
+        conn.execute("UPDATE orderbook_snapshots SET timestamp = ? WHERE id = 1",
+                     ((now - timedelta(days=45)).strftime("%Y-%m-%d %H:%M:%S"),))
+    # Limite no mesmo segundo do snapshot: "YYYY-MM-DD HH:MM:SS" contra isoformat() excluía a linha
+    row_ts = datetime.fromisoformat(history.get_snapshots("BTCUSDT", limit=1)[0]["timestamp"]).replace(tzinfo=timezone.utc)
+    assert len(history.get_snapshots("BTCUSDT", start_time=row_ts, end_time=row_ts)) >= 1
+    # days_to_keep maior que o dia do mês não pode quebrar a data de corte
+    assert history.cleanup_old_data(days_to_keep=40) == 1
+    assert len(history.get_snapshots("BTCUSDT")) == 2
@@ -0,0 +1,83 @@
+import sqlite3
+import threading
+
+import pytest
+
+from bybit_depth.core.history import OrderbookHistory
+from bybit_depth.core.history_writer import HistoryWriter
+from bybit_depth.core.orderbook import OrderBook
+from bybit_depth.utils.synthetic import SyntheticFeed
+
+def _count(history):
+    with sqlite3.connect(history.db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM orderbook_snapshots").fetchone()[0]
+
+@pytest.mark.parametrize("storage", ["json", "delta"])
+def test_batches_and_flushes_on_close(tmp_path, storage):
+    history = OrderbookHistory(str(tmp_path / "h.db"), storage=storage, keyframe_every=10)
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=50, seed=3)
+    book = OrderBook()
+    expected = []
+    with HistoryWriter(history, batch_size=16, flush_interval=10.0) as writer:
+        for frame in feed.frames(50):
+            d = frame["data"]
+            (book.apply_snapshot if frame["type"] == "snapshot" else book.apply_delta)(d["b"], d["a"], d["u"])
+            assert writer.submit(book, "BTCUSDT", "linear")
+            expected.append((book.bids.items(), book.asks.items()))
+    stats = writer.get_stats()
+    assert stats["written"] == 50 and stats["pending"] == 0 and stats["batches"] < 50
+    with sqlite3.connect(history.db_path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        ids = [r[0] for r in conn.execute("SELECT id FROM orderbook_snapshots ORDER BY id")]
+    for row_id, (bids, asks) in zip(ids, expected):
+        restored = history.restore_orderbook(row_id)
+        assert restored.bids.items() == bids and restored.asks.items() == asks
+
+def test_flush_waits_for_commit(tmp_path):
+    history = OrderbookHistory(str(tmp_path / "h.db"))
+    book = OrderBook()
+    book.apply_snapshot([["100", "1"]], [["101", "1"]])
+    with HistoryWriter(history, flush_interval=30.0) as writer:
+        writer.submit(book, "BTCUSDT", "linear")
+        assert writer.flush(timeout=5.0)
+        assert _count(history) == 1
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    history = OrderbookHistory(str(tmp_path / "h.db"))
+    book = OrderBook()
+    book.apply_snapshot([["100", "1"]], [["101", "1"]])
+    writer = HistoryWriter(history, max_pending=2, flush_interval=0.01)
+    # Segura a thread de escrita para a fila encher
+    gate = threading.Event()
+    original = history.insert_snapshot
+    history.insert_snapshot = lambda *a, **k: (gate.wait(5.0), original(*a, **k))
+    results = [writer.submit(book, "BTCUSDT", "linear") for _ in range(10)]
+    gate.set()
+    writer.close()
+    assert results.count(False) == writer.dropped > 0
+    assert _count(history) == writer.written == results.count(True)
+
+@pytest.mark.parametrize("storage", ["json", "delta"])
+def test_failed_rollup_discards_its_snapshot_row(tmp_path, storage):
+    history = OrderbookHistory(str(tmp_path / "h.db"), storage=storage, keyframe_every=4)
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=20, seed=5)
+    book = OrderBook()
+    # Falha depois de o INSERT e os upserts já terem rodado
+    original, calls = history._update_rollups, []
+    def flaky(*a, **k):
+        original(*a, **k)
+        calls.append(1)
+        if len(calls) == 3:
+            raise sqlite3.OperationalError("disk I/O error")
+    history._update_rollups = flaky
+    with HistoryWriter(history, batch_size=16, flush_interval=10.0) as writer:
+        for frame in feed.frames(8):
+            d = frame["data"]
+            (book.apply_snapshot if frame["type"] == "snapshot" else book.apply_delta)(d["b"], d["a"], d["u"])
+            writer.submit(book, "BTCUSDT", "linear")
+    assert writer.failed == 1 and writer.written == 7
+    with sqlite3.connect(history.db_path) as conn:
+        for name in ("1h", "1m", "1s"):
+            assert conn.execute(f"SELECT SUM(count) FROM rollup_{name}").fetchone()[0] == 7
+        ids = [r[0] for r in conn.execute("SELECT id FROM orderbook_snapshots ORDER BY id")]
+    assert len(ids) == 7 and all(history.restore_orderbook(i) is not None for i in ids)
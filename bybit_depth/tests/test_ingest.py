@@ -0,0 +1,149 @@
+import asyncio
+import json
+
+import pytest
+import websockets
+
+from bybit_depth.core.ingest import IngestQueue, frame_topic, merge_frames
+from bybit_depth.core.orderbook import OrderBook
+from bybit_depth.core.ws_client import BybitWSClient
+from bybit_depth.core.ws_multiplex import MultiplexWSClient
+from bybit_depth.utils.synthetic import SyntheticFeed
+
+def _frame(topic, kind, u):
+    return json.dumps({"topic": topic, "type": kind, "ts": 1, "data": {"s": "X", "b": [], "a": [], "u": u}})
+
+def test_frame_topic():
+    assert frame_topic(_frame("orderbook.50.BTCUSDT", "delta", 1)) == "orderbook.50.BTCUSDT"
+    assert frame_topic('{"op":"pong"}') is None
+    assert frame_topic(b"bytes") is None
+
+@pytest.mark.asyncio
+async def test_drop_oldest_keeps_newest():
+    q = IngestQueue(3, "drop_oldest")
+    for u in range(5):
+        q.put_nowait(u)
+    assert [raw for raw, _ in await q.get_batch(10)] == [2, 3, 4]
+    stats = q.get_stats()
+    assert stats["dropped"] == 2 and stats["max_depth"] == 3 and stats["depth"] == 0
+
+@pytest.mark.asyncio
+async def test_conflate_groups_by_topic_and_snapshot_supersedes():
+    q = IngestQueue(100, "conflate")
+    q.put_nowait(_frame("A", "delta", 1))
+    q.put_nowait(_frame("B", "delta", 1))
+    q.put_nowait(_frame("A", "delta", 2))
+    q.put_nowait(_frame("A", "snapshot", 3))
+    q.put_nowait(_frame("A", "delta", 4))
+    assert len(q) == 3 and q.conflated == 2
+    first = [json.loads(raw)["data"]["u"] for raw, _ in await q.get_batch()]
+    second = [json.loads(raw)["data"]["u"] for raw, _ in await q.get_batch()]
+    assert first == [3, 4] and second == [1]
+
+def _reference(raws):
+    ref = OrderBook()
+    for raw in raws:
+        d = json.loads(raw)
+        (ref.apply_snapshot if d["type"] == "snapshot" else ref.apply_delta)(d["data"]["b"], d["data"]["a"], d["data"]["u"])
+    return ref
+
+def test_merge_frames_keeps_last_size_per_price():
+    raws = SyntheticFeed(symbol="BTCUSDT", depth=20, seed=8).raw_frames(40)
+    deltas = json.loads(merge_frames(raws[5:40]))
+    assert deltas["type"] == "delta" and deltas["data"]["pu"] == json.loads(raws[4])["data"]["u"]
+    assert deltas["data"]["u"] == json.loads(raws[-1])["data"]["u"]
+    book = _reference(raws[:5])
+    book.apply_delta(deltas["data"]["b"], deltas["data"]["a"], deltas["data"]["u"])
+    ref = _reference(raws)
+    assert book.bids.items() == ref.bids.items() and book.asks.items() == ref.asks.items()
+    snap = json.loads(merge_frames(raws[:40]))
+    assert snap["type"] == "snapshot" and "pu" not in snap["data"]
+    assert all(float(q) > 0 for _, q in snap["data"]["b"] + snap["data"]["a"])
+    assert merge_frames([raws[1], '{"op":"pong"}']) is None
+
+@pytest.mark.asyncio
+async def test_conflate_merges_instead_of_dropping():
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=50, seed=6)
+    raws = feed.raw_frames(300)
+    q = IngestQueue(8, "conflate")
+    client = BybitWSClient("BTCUSDT", 50, "linear")
+    for i, raw in enumerate(raws):
+        q.put_nowait(raw)
+        assert len(q) <= 8
+        if i % 50 == 49:   # consumidor lento: drena de vez em quando
+            batch = await q.get_batch()
+            client._handle_batch([r for r, _ in batch])
+    while len(q):
+        client._handle_batch([r for r, _ in await q.get_batch()])
+    ref = _reference(raws)
+    assert q.dropped == 0 and q.conflated > 0
+    assert client.sync.gaps == 0 and client.book.last_update_id == ref.last_update_id
+    assert client.book.bids.items() == ref.bids.items() and client.book.asks.items() == ref.asks.items()
+
+@pytest.mark.asyncio
+async def test_conflate_never_exceeds_maxsize():
+    q = IngestQueue(2, "conflate")
+    for topic in "ABCD":
+        q.put_nowait(_frame(topic, "delta", 1))
+    assert len(q) == 2 and q.dropped == 2
+    q.put_nowait(_frame("D", "delta", 2))   # funde com o D pendente
+    assert len(q) == 2 and q.dropped == 2 and q.conflated == 1
+
+def test_multiplex_batch_coalesces_per_topic():
+    symbols = ["AAAUSDT", "BBBUSDT"]
+    feeds = {s: SyntheticFeed(symbol=s, depth=30, seed=i).raw_frames(120) for i, s in enumerate(symbols)}
+    raws = [r for pair in zip(*feeds.values()) for r in pair]
+    single = MultiplexWSClient(symbols, 30, "linear")
+    batched = MultiplexWSClient(symbols, 30, "linear")
+    for raw in raws:
+        single.dispatch(raw)
+    for i in range(0, len(raws), 40):
+        batched.dispatch_batch(raws[i:i + 40])
+    for s in symbols:
+        assert batched.book(s).bids.items() == single.book(s).bids.items()
+        assert batched.book(s).last_update_id == single.book(s).last_update_id
+        assert batched.book(s).version < single.book(s).version
+
+@pytest.mark.asyncio
+async def test_block_waits_for_consumer():
+    q = IngestQueue(2, "block")
+    await q.put(1)
+    await q.put(2)
+    producer = asyncio.create_task(q.put(3))
+    await asyncio.sleep(0.01)
+    assert not producer.done() and q.blocked == 1
+    assert [raw for raw, _ in await q.get_batch(1)] == [1]
+    await asyncio.wait_for(producer, 1.0)
+    assert len(q) == 2
+
+@pytest.mark.parametrize("policy", ["block", "conflate"])
+@pytest.mark.asyncio
+async def test_client_with_queue_matches_inline(policy):
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=50, seed=5)
+    raws = feed.raw_frames(500)
+
+    async def handler(ws):
+        await ws.recv()
+        for raw in raws:
+            await ws.send(raw)
+        await ws.wait_closed()
+
+    async with websockets.serve(handler, "127.0.0.1", 0) as server:
+        client = BybitWSClient("BTCUSDT", 50, "linear", queue_size=32, queue_policy=policy)
+        client.ws_url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        task = asyncio.create_task(client.run_forever())
+        for _ in range(300):
+            if client.book.last_update_id == feed.update_id:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    ref = OrderBook()
+    for raw in raws:
+        d = json.loads(raw)
+        (ref.apply_snapshot if d["type"] == "snapshot" else ref.apply_delta)(d["data"]["b"], d["data"]["a"], d["data"]["u"])
+    assert client.book.bids.items() == ref.bids.items()
+    assert client.book.asks.items() == ref.asks.items()
+    stats = client.get_stats()["ingest"]
+    assert stats["enqueued"] == len(raws) and stats["dropped"] == 0 and stats["max_depth"] <= 32
@@ -0,0 +1,62 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bybit_depth.core.history import OrderbookHistory
+from bybit_depth.core.orderbook import OrderBook
+from bybit_depth.core.partitioned_history import PartitionedHistory
+from bybit_depth.utils.synthetic import SyntheticFeed
+
+START = datetime(2024, 5, 10, 20, 0, tzinfo=timezone.utc)
+
+def _fill(history, count=30):
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=20, seed=5)
+    book = OrderBook()
+    d = next(feed.frames(1))["data"]
+    book.apply_snapshot(d["b"], d["a"], d["u"])
+    with history.connect() as conn:
+        for i in range(count):
+            d = feed.delta(4)["data"]
+            book.apply_delta(d["b"], d["a"], d["u"])
+            history.insert_snapshot(conn, book.get_stats(), book.snapshot(), "BTCUSDT", "linear",
+                                    START + timedelta(minutes=17 * i))
+
+def _histories(tmp_path):
+    for cls in (OrderbookHistory, PartitionedHistory):
+        for storage in ("json", "delta"):
+            history = cls(str(tmp_path / f"{cls.__name__}-{storage}.db"), storage=storage, keyframe_every=4)
+            _fill(history)
+            yield history
+
+def test_projection_matches_full_rows(tmp_path):
+    for history in _histories(tmp_path):
+        full = history.get_snapshots("BTCUSDT", limit=1000)
+        got = list(history.iter_snapshots("BTCUSDT", columns=("id", "best_bid", "spread"), chunk_size=4,
+                                          descending=True))
+        assert got == [(s["id"], s["best_bid"], s["spread"]) for s in full] and len(got) == 30
+        start, end = START + timedelta(hours=2), START + timedelta(hours=5)
+        ts = [row[0] for row in history.iter_snapshots("BTCUSDT", start, end, columns=("timestamp",))]
+        assert ts == sorted(ts) and ts[0] >= "2024-05-10 22:00:00" and ts[-1] <= "2024-05-11 01:00:00"
+
+def test_books_decoded_only_when_requested(tmp_path):
+    for history in _histories(tmp_path):
+        books = list(history.iter_books("BTCUSDT"))
+        asc = list(history.iter_snapshots("BTCUSDT", columns=("ts_ms", "bids", "asks"), chunk_size=3))
+        assert asc == books
+        desc = list(history.iter_snapshots("BTCUSDT", columns=("ts_ms", "bids", "asks"), descending=True))
+        assert desc == books[::-1]   # diffs reconstruídos fora de ordem
+        # Livros corrompidos não afetam uma projeção sem "bids"/"asks"
+        with sqlite3.connect(history.db_path) as conn:
+            tables = [r[0] for r in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' "
+                "AND (name = 'orderbook_snapshots' OR name LIKE 'p\\_%' ESCAPE '\\')")]
+            for table in tables:
+                conn.execute(f"UPDATE {table} SET snapshot_data = 'corrompido', book_blob = x'ff'")
+        rows = list(history.iter_snapshots("BTCUSDT", columns=("id", "mid_price", "symbol")))
+        assert len(rows) == 30 and all(r[2] == "BTCUSDT" and r[1] > 0 for r in rows)
+
+def test_unknown_column_is_rejected(tmp_path):
+    history = OrderbookHistory(str(tmp_path / "h.db"))
+    with pytest.raises(ValueError):
+        list(history.iter_snapshots("BTCUSDT", columns=("id", "snapshot_data")))
@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+from bybit_depth.core.ws_client import BybitWSClient
+from bybit_depth.utils.latency import LatencyHistogram, stamp
+from bybit_depth.utils.synthetic import SyntheticFeed
+
+def test_histogram_percentiles_within_bucket_precision():
+    rng = random.Random(7)
+    values = sorted(int(rng.lognormvariate(7, 1.5)) for _ in range(20000))
+    hist = LatencyHistogram()
+    for v in values:
+        hist.record(v)
+    for pct in (50, 90, 99, 99.9):
+        exact = values[int(len(values) * pct / 100) - 1]
+        assert hist.percentile(pct) == pytest.approx(exact, rel=0.02, abs=1)
+    assert hist.percentile(100) == hist.max == values[-1]
+    assert hist.count == len(values) and sum(n for _, n in hist.buckets()) == len(values)
+
+def test_histogram_merge_negative_and_saturation():
+    a, b = LatencyHistogram(max_value_us=1000), LatencyHistogram(max_value_us=1000)
+    a.record(-5)
+    a.record(10)
+    b.record(5000)
+    a.merge(b)
+    assert a.count == 3 and a.negative == 1
+    assert a.min == 0 and a.max == 1000
+    assert a.summary()["negative"] == 1
+    with pytest.raises(ValueError):
+        a.merge(LatencyHistogram())
+
+def test_client_records_stage_latencies():
+    raws = SyntheticFeed(symbol="BTCUSDT", depth=50).raw_frames(100)
+    single = BybitWSClient("BTCUSDT", 50, "linear")
+    for raw in raws:
+        single._process(raw, stamp())
+    batched = BybitWSClient("BTCUSDT", 50, "linear", batch_deltas=True)
+    for i in range(0, len(raws), 32):
+        chunk = raws[i:i + 32]
+        batched._handle_batch(chunk, [stamp() for _ in chunk])
+    for client in (single, batched):
+        latency = client.get_stats()["latency"]
+        for stage in ("exchange_to_receive", "receive_to_parsed", "parsed_to_applied", "exchange_to_applied"):
+            assert latency[stage]["count"] == len(raws)
+        assert latency["receive_to_parsed"]["p50_ms"] < 1000
+    export = single.export_latency()
+    assert export["symbol"] == "BTCUSDT" and export["stages"]["receive_to_parsed"]["count"] == len(raws)
+    # desligado: nada é registrado
+    off = BybitWSClient("BTCUSDT", 50, "linear", latency=False)
+    off._process(raws[0], stamp())
+    assert "latency" not in off.get_stats()
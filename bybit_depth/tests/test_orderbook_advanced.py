@@ -144,3 +144,207 @@ def test_cumulative_calculations():
     cum_asks = book.cumulative_asks()
     expected_asks = [(Decimal("101"), Decimal("1")), (Decimal("102"), Decimal("3")), (Decimal("103"), Decimal("6"))]
     assert cum_asks == expected_asks
+
+def test_sorted_engine_best_and_top_levels():
+    """Testa que o índice ordenado mantém melhor preço e top-N após deltas."""
+    book = OrderBook()
+    book.apply_snapshot(
+        [["99.5", "1"], ["100", "2"], ["98", "3"]],
+        [["102", "1"], ["101.5", "2"], ["103", "3"]],
+        update_id=1
+    )
+    assert book.best_bid() == Decimal("100")
+    assert book.best_ask() == Decimal("101.5")
+    assert book.top_levels("bid", 2) == [(Decimal("100"), Decimal("2")), (Decimal("99.5"), Decimal("1"))]
+    assert book.top_levels("ask", 0) == []
+
+    # Remover o topo e inserir níveis novos
+    book.apply_delta([["100", "0"], ["99.9", "4"]], [["101.5", "0"], ["101", "5"]], update_id=2)
+    assert book.best_bid() == Decimal("99.9")
+    assert book.best_ask() == Decimal("101")
+    assert book.mid() == Decimal("100.45")
+
+    # Iteração segue do topo para fora e mantém as chaves como string
+    assert list(book.bids) == ["99.9", "99.5", "98"]
+    assert list(book.asks) == ["101", "102", "103"]
+    assert book.bids.items()[0] == ("99.9", Decimal("4"))
+
+def test_sorted_engine_numeric_price_keys():
+    """Preços numericamente iguais ("100" e "100.0") são o mesmo nível."""
+    book = OrderBook()
+    book.apply_snapshot([["100", "1"]], [], update_id=1)
+    book.apply_delta([["100.0", "3"]], [], update_id=2)
+    assert len(book.bids) == 1
+    assert book.bids["100"] == Decimal("3")
+    assert book.size_at(Decimal("100.00")) == (Decimal("3"), "bid")
+    assert "abc" not in book.bids
+
+@pytest.mark.parametrize("kwargs", [{}, {"tick_size": "0.10", "lot_size": "0.001"}])
+def test_mapping_interface_matches_dict(kwargs):
+    """Chaves malformadas são KeyError; o livro nunca guarda quantidade <= 0."""
+    book = OrderBook(**kwargs)
+    book.apply_snapshot([["100", "1"], ["99", "2"]], [["101", "1"]], update_id=1)
+    assert book.bids.get("abc") is None and book.bids.get("99.999") is None
+    assert book.size_at("abc") == (Decimal(0), None)
+    assert "abc" not in book.asks
+    with pytest.raises(KeyError):
+        book.bids["abc"]
+    with pytest.raises(KeyError):
+        del book.bids["abc"]
+    with pytest.raises(ValueError):
+        book.bids["99"] = Decimal("-1")
+    assert book.bids["99"] == Decimal("2")
+    book.bids["99"] = Decimal("0")          # zero remove o nível
+    book.bids["98"] = "0"                   # e não cria um nível vazio
+    assert book.top_levels("bid", 5) == [(Decimal("100"), Decimal("1"))]
+    book.bids["98"] = Decimal("3")
+    assert book.top_levels("bid", 5) == [(Decimal("100"), Decimal("1")), (Decimal("98"), Decimal("3"))]
+
+def test_fixed_point_mode():
+    """Testa o modo de ponto fixo (inteiros escalados por tick/lot size)."""
+    book = OrderBook(tick_size="0.10", lot_size="0.001")
+    assert book.fixed_point is True
+    book.apply_snapshot(
+        [["65000.10", "1.5"], ["65000.0", "0.25"]],
+        [["65000.20", "2"], ["65000.30", "0.001"]],
+        update_id=1
+    )
+    assert book.best_bid() == Decimal("65000.1")
+    assert book.best_ask() == Decimal("65000.2")
+    assert book.mid() == Decimal("65000.15")
+    assert book.top_levels("bid", 2) == [(Decimal("65000.1"), Decimal("1.5")), (Decimal("65000"), Decimal("0.25"))]
+
+    # "65000.00" e "65000" são o mesmo nível
+    book.apply_delta([["65000", "0"]], [["65000.2", "3.5"]], update_id=2)
+    assert len(book.bids) == 1
+    assert book.asks["65000.20"] == Decimal("3.5")
+    assert book.get_liquidity_stats(1.0)["ask_liquidity"] == 3.501
+
+    # Preço/quantidade fora da grade não podem ser representados sem perda:
+    # no modo leniente o nível é descartado, sem aplicar a mensagem pela metade
+    arrays = book.to_arrays("bid")
+    assert book.apply_delta([["65000.3", "1"], ["65000.15", "1"], ["65000.2", "0.0005"]],
+                            [["65000.40", "1"]], update_id=3)
+    assert book.get_stats()["invalid_levels"] == 2
+    assert book.last_update_id == 3 and book.version == 3
+    assert book.best_bid() == Decimal("65000.3") and book.asks["65000.4"] == Decimal("1")
+    assert book.to_arrays("bid") is not arrays and list(book.to_arrays("bid").prices) == [65000.3, 65000.1]
+    assert book.apply_deltas([([["65000.25", "1"]], [], 4), ([["64999.9", "1"]], [], 5)]) == 2
+    assert book.last_update_id == 5 and book.get_stats()["invalid_levels"] == 3
+    assert len(book.bids) == 3
+
+    strict = OrderBook(tick_size="0.10", lot_size="0.001", strict=True)
+    strict.apply_snapshot([["100.0", "1"]], [["100.1", "1"]], update_id=1)
+    with pytest.raises(ValueError):
+        strict.apply_delta([["99.9", "1"], ["99.95", "1"]], [], update_id=2)
+    assert strict.last_update_id == 1 and list(strict.bids) == ["100.0"]
+
+def test_to_arrays_cached_per_version():
+    """Testa arrays float64 por lado e o cache por versão do livro."""
+    np = pytest.importorskip("numpy")
+    book = OrderBook()
+    book.apply_snapshot(
+        [["100", "1"], ["99", "2"], ["98", "3"]],
+        [["101", "1"], ["102", "2"], ["103", "3"]],
+        update_id=1
+    )
+    bids = book.to_arrays("bid")
+    assert bids.prices.tolist() == [100.0, 99.0, 98.0]
+    assert bids.cumulative.tolist() == [1.0, 3.0, 6.0]
+    assert book.to_arrays("ask", 2).prices.tolist() == [101.0, 102.0]
+
+    # Mesma versão -> mesmos buffers; nova versão -> arrays reconstruídos
+    assert book.to_arrays("bid").prices is bids.prices
+    assert not bids.prices.flags.writeable
+    book.apply_delta([["100", "0"]], [], update_id=2)
+    assert book.to_arrays("bid").prices.tolist() == [99.0, 98.0]
+    assert bids.prices.tolist() == [100.0, 99.0, 98.0]
+    assert np.searchsorted(book.to_arrays("ask").prices, 102.5) == 2
+
+    # Escritas diretas no lado também invalidam o cache
+    book.bids["97"] = "4"
+    assert book.to_arrays("bid").prices.tolist() == [99.0, 98.0, 97.0]
+    del book.bids["99"]
+    assert book.to_arrays("bid").cumulative.tolist() == [3.0, 7.0]
+    version = book.bids.version
+    with pytest.raises(KeyError):
+        del book.bids["42"]
+    assert book.bids.version == version
+
+def test_ingest_validation_modes():
+    """Testa validação por nível na ingestão (modo leniente vs estrito)."""
+    lenient = OrderBook()
+    lenient.apply_snapshot([["100", "1"], ["99", "0"]], [["101", "1"]], update_id=1)
+    assert lenient.get_stats()["invalid_levels"] == 1
+    # Quantidade negativa em delta remove o nível e é contada como inválida
+    assert lenient.apply_delta([["100", "-1"]], [["101", "0"]], update_id=2) is True
+    assert len(lenient.bids) == 0 and len(lenient.asks) == 0
+    assert lenient.get_stats()["invalid_levels"] == 2
+
+    strict = OrderBook(strict=True)
+    with pytest.raises(ValueError):
+        strict.apply_snapshot([["100", "1"], ["99", "0"]], [], update_id=1)
+    strict.apply_snapshot([["100", "1"]], [["101", "1"]], update_id=1)
+    with pytest.raises(ValueError):
+        strict.apply_delta([["99", "2"]], [["101", "-1"]], update_id=2)
+    # Mensagem rejeitada não altera o livro
+    assert "99" not in strict.bids
+    assert strict.last_update_id == 1
+    assert strict.apply_delta([["100", "0"]], [], update_id=2) is True
+    assert strict.best_bid() is None
+
+def test_apply_deltas_batch_matches_sequential():
+    """Um lote coalescido deve produzir o mesmo livro que deltas individuais."""
+    from bybit_depth.utils.synthetic import SyntheticFeed
+    frames = list(SyntheticFeed(depth=50, seed=3).frames(300))
+    snap = frames[0]["data"]
+    seq, batched = OrderBook(), OrderBook()
+    seq.apply_snapshot(snap["b"], snap["a"], snap["u"])
+    batched.apply_snapshot(snap["b"], snap["a"], snap["u"])
+    deltas = [(f["data"]["b"], f["data"]["a"], f["data"]["u"]) for f in frames[1:]]
+    for b, a, u in deltas:
+        seq.apply_delta(b, a, u)
+    for i in range(0, len(deltas), 37):
+        batched.apply_deltas(deltas[i:i + 37])
+    assert batched.bids.items() == seq.bids.items()
+    assert batched.asks.items() == seq.asks.items()
+    assert batched.last_update_id == seq.last_update_id
+    assert batched.get_stats()["total_updates"] == seq.get_stats()["total_updates"]
+
+def test_apply_deltas_sequence_and_last_write_wins():
+    book = OrderBook()
+    book.apply_snapshot([["100", "1"]], [["101", "1"]], update_id=5)
+    applied = book.apply_deltas([
+        ([["99", "1"]], [], 4),         # antigo: descartado
+        ([["100", "2"]], [], 6),
+        ([["100", "0"], ["99.5", "3"]], [], 7),
+        ([["100", "4"]], [["101", "0"]], 8),
+    ])
+    assert applied == 3
+    assert book.last_update_id == 8
+    assert book.get_stats()["sequence_errors"] == 1
+    assert book.bids["100"] == Decimal("4")
+    assert "99" not in book.bids
+    assert len(book.asks) == 0
+
+def test_apply_deltas_strict_applies_prefix_before_raising():
+    """Modo estrito: mensagens anteriores à inválida ficam aplicadas, como no caminho um a um."""
+    seq, batched = OrderBook(strict=True), OrderBook(strict=True)
+    batch = [
+        ([["99", "2"]], [], 2),
+        ([["100", "-1"]], [], 3),
+        ([["98", "5"]], [], 4),
+    ]
+    for book in (seq, batched):
+        book.apply_snapshot([["100", "1"]], [["101", "1"]], update_id=1)
+    with pytest.raises(ValueError):
+        for b, a, u in batch:
+            seq.apply_delta(b, a, u)
+    with pytest.raises(ValueError):
+        batched.apply_deltas(batch)
+    assert batched.bids.items() == seq.bids.items() == [("100", Decimal("1")), ("99", Decimal("2"))]
+    assert batched.last_update_id == seq.last_update_id == 2
+    # Inválida logo na primeira mensagem: nada muda
+    with pytest.raises(ValueError):
+        batched.apply_deltas([([], [["101", "-2"]], 3)])
+    assert batched.last_update_id == 2 and batched.asks["101"] == Decimal("1")
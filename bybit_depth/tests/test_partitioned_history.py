@@ -0,0 +1,152 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bybit_depth.core.history import DEFAULT_HISTORY_DB, OrderbookHistory
+from bybit_depth.core.orderbook import OrderBook
+from bybit_depth.core.partitioned_history import PartitionedHistory, history_backend, migrate_history, open_history
+from bybit_depth.utils.synthetic import SyntheticFeed
+
+START = datetime(2024, 1, 30, 18, 0, tzinfo=timezone.utc)   # atravessa a virada de mês
+STEP = timedelta(hours=5)
+
+def _books(count, symbols=("BTCUSDT", "ETHUSDT")):
+    """``(instante, símbolo, livro)`` com ``count`` snapshots por símbolo, intercalados."""
+    feeds = {s: SyntheticFeed(symbol=s, depth=30, seed=i) for i, s in enumerate(symbols)}
+    books = {s: OrderBook() for s in symbols}
+    for i in range(count):
+        for symbol, feed in feeds.items():
+            frame = next(feed.frames(2)) if books[symbol].last_update_id is None else feed.delta(5)
+            d = frame["data"]
+            book = books[symbol]
+            (book.apply_snapshot if frame["type"] == "snapshot" else book.apply_delta)(d["b"], d["a"], d["u"])
+            yield START + i * STEP, symbol, book
+
+def _fill(history, count=20, symbols=("BTCUSDT", "ETHUSDT")):
+    expected = []
+    with history.connect() as conn:
+        for at, symbol, book in _books(count, symbols):
+            history.insert_snapshot(conn, book.get_stats(), book.snapshot(), symbol, "linear", at)
+            expected.append((at, symbol, book.bids.items(), book.asks.items()))
+    return expected
+
+def _as_str(side):
+    return [[str(p), str(q)] for p, q in side]
+
+@pytest.mark.parametrize("storage", ["json", "delta"])
+def test_range_reads_cross_day_partitions(tmp_path, storage):
+    history = PartitionedHistory(str(tmp_path / "p.db"), storage=storage, keyframe_every=4)
+    expected = _fill(history)
+    # 20 snapshots a cada 5 h a partir de 30/01 18h: 5 dias por símbolo
+    assert [p["day"] for p in history.partitions("BTCUSDT")] == [
+        "2024-01-30", "2024-01-31", "2024-02-01", "2024-02-02", "2024-02-03"
+    ]
+    start, end = datetime(2024, 1, 31, 12, tzinfo=timezone.utc), datetime(2024, 2, 2, 3, tzinfo=timezone.utc)
+    assert [p["day"] for p in history.partitions("ETHUSDT", start, end)] == ["2024-01-31", "2024-02-01", "2024-02-02"]
+    got = [(ts, b, a) for ts, b, a in history.iter_books("ETHUSDT", start, end, chunk_size=3)]
+    want = [(int(at.timestamp() * 1000), _as_str(b), _as_str(a))
+            for at, s, b, a in expected if s == "ETHUSDT" and start <= at <= end]
+    assert got == want and len(got) == 8
+    latest = history.get_snapshots("BTCUSDT", limit=7)
+    assert [s["ts_ms"] for s in latest] == sorted((s["ts_ms"] for s in latest), reverse=True)
+    assert latest[0]["timestamp"] == "2024-02-03 17:00:00" and len(latest) == 7
+    stats = history.get_statistics("BTCUSDT", start, end)
+    assert stats["total_snapshots"] == 8 and stats["avg_spread"] > 0
+
+def test_ids_are_global_and_chains_restart_each_day(tmp_path):
+    history = PartitionedHistory(str(tmp_path / "p.db"), storage="delta", keyframe_every=100)
+    expected = _fill(history, count=12)
+    for row_id, (_, symbol, bids, asks) in enumerate(expected, start=1):
+        book = history.restore_orderbook(row_id)
+        assert book.symbol == symbol and book.bids.items() == bids and book.asks.items() == asks
+    assert history.restore_orderbook(len(expected) + 1) is None
+    with sqlite3.connect(history.db_path) as conn:
+        for part in history.partitions():
+            first = conn.execute(f"SELECT keyframe_id FROM {part['name']} ORDER BY id LIMIT 1").fetchone()[0]
+            assert first is None  # keyframe no início de toda partição
+
+def test_concurrent_writers_never_share_ids(tmp_path):
+    path = str(tmp_path / "p.db")
+    PartitionedHistory(path).connect().close()   # passar para WAL pede lock exclusivo: antes das threads
+    errors = []
+    def write(symbol):
+        history = PartitionedHistory(path, cache_bytes=0)
+        book = OrderBook()
+        book.apply_snapshot([["100", "1"]], [["101", "1"]], 1)
+        try:
+            for i in range(40):
+                with history.connect() as conn:   # um commit por snapshot
+                    history.insert_snapshot(conn, book.get_stats(), book.snapshot(), symbol, "linear",
+                                            START + timedelta(seconds=i))
+        except Exception as e:  # noqa: BLE001
+            errors.append(e)
+    threads = [threading.Thread(target=write, args=(s,)) for s in ("BTCUSDT", "ETHUSDT", "SOLUSDT")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    with sqlite3.connect(path) as conn:
+        ids = [r[0] for p in ("BTCUSDT", "ETHUSDT", "SOLUSDT")
+               for r in conn.execute(f"SELECT id FROM p_{p}_20240130")]
+    assert sorted(ids) == list(range(1, 121))
+
+def test_ids_are_not_reused_after_partitions_are_dropped(tmp_path):
+    history = PartitionedHistory(str(tmp_path / "p.db"))
+    expected = _fill(history, count=4)
+    history.cleanup_old_data(days_to_keep=1)   # tudo em 2024
+    assert history.partitions() == []
+    book = OrderBook()
+    book.apply_snapshot([["100", "1"]], [["101", "1"]], 1)
+    with history.connect() as conn:
+        history.insert_snapshot(conn, book.get_stats(), book.snapshot(), "BTCUSDT", "linear")
+    assert history.get_latest_snapshot("BTCUSDT")["id"] == len(expected) + 1
+
+def test_retention_drops_whole_partitions(tmp_path):
+    history = PartitionedHistory(str(tmp_path / "p.db"), storage="delta", keyframe_every=10)
+    today = datetime.now(timezone.utc).replace(hour=12, minute=0, second=0, microsecond=0)
+    book = OrderBook()
+    book.apply_snapshot([["100", "1"]], [["101", "1"]], 1)
+    with history.connect() as conn:
+        for days_ago in range(40, -1, -1):
+            for symbol in ("BTCUSDT", "ETHUSDT"):
+                history.insert_snapshot(conn, book.get_stats(), book.snapshot(), symbol, "linear",
+                                        today - timedelta(days=days_ago))
+    assert history.cleanup_old_data(days_to_keep=30) == 2 * 10
+    days = sorted({p["day"] for p in history.partitions()})
+    assert days[0] == (today - timedelta(days=30)).date().isoformat() and len(days) == 31
+    with sqlite3.connect(history.db_path) as conn:
+        tables = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name LIKE 'p_%'").fetchone()[0]
+    assert tables == 2 * 31
+    # A gravação seguinte no dia corrente continua restaurável
+    with history.connect() as conn:
+        history.insert_snapshot(conn, book.get_stats(), book.snapshot(), "BTCUSDT", "linear", today)
+    assert history.restore_orderbook(history.get_latest_snapshot("BTCUSDT")["id"]) is not None
+
+@pytest.mark.parametrize("storage", ["json", "delta"])
+def test_migrate_legacy_database(tmp_path, storage):
+    legacy = OrderbookHistory(str(tmp_path / "old.db"), storage=storage, keyframe_every=4)
+    expected = _fill(legacy, count=10)
+    target = PartitionedHistory(str(tmp_path / "new.db"), storage="delta", keyframe_every=4)
+    assert migrate_history(legacy, target, chunk_size=3) == len(expected)
+    for symbol in ("BTCUSDT", "ETHUSDT"):
+        old = list(legacy.iter_books(symbol))
+        assert list(target.iter_books(symbol)) == old and len(old) == 10
+    for row_id, (_, symbol, bids, asks) in enumerate(expected, start=1):
+        book = target.restore_orderbook(row_id)   # ids preservados
+        assert book.bids.items() == bids and book.asks.items() == asks
+    assert target.get_statistics("BTCUSDT") == pytest.approx(legacy.get_statistics("BTCUSDT"))
+    with pytest.raises(ValueError):
+        migrate_history(legacy, target)
+    assert isinstance(open_history(str(tmp_path / "new.db")), PartitionedHistory)
+    assert type(open_history(str(tmp_path / "old.db"))) is OrderbookHistory
+
+def test_backends_share_the_default_path_and_are_detected(tmp_path):
+    assert PartitionedHistory.__init__.__defaults__[0] == OrderbookHistory.__init__.__defaults__[0] == DEFAULT_HISTORY_DB
+    assert history_backend(str(tmp_path / "nada.db")) is None
+    OrderbookHistory(str(tmp_path / "single.db"))
+    PartitionedHistory(str(tmp_path / "days.db"))
+    assert history_backend(str(tmp_path / "single.db")) == "single"
+    assert history_backend(str(tmp_path / "days.db")) == "partitioned"
@@ -0,0 +1,152 @@
+import asyncio
+import json
+
+import pytest
+import websockets
+
+from bybit_depth.core.orderbook import OrderBook
+from bybit_depth.core.recovery import RECOVERING, SYNCED, BookSynchronizer
+from bybit_depth.core.ws_client import BybitWSClient
+from bybit_depth.utils.synthetic import SyntheticFeed
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_gap_buffers_and_replays_after_snapshot():
+    clock = FakeClock()
+    requests = []
+    book = OrderBook()
+    sync = BookSynchronizer(book, on_gap=lambda: requests.append(book.last_update_id), clock=clock)
+    sync.apply_snapshot([["100", "1"]], [["101", "1"]], update_id=10)
+    assert sync.apply_delta([["99", "2"]], [], update_id=11)
+
+    # u=12 perdido
+    assert not sync.apply_delta([["98", "3"]], [], update_id=13)
+    assert sync.state == RECOVERING and not book.valid and requests == [11]
+    assert not sync.apply_delta([["97", "4"]], [], update_id=14)
+    assert book.size_at(book.bids.codec.decode_price(book.bids.codec.encode_price("97")))[1] is None
+
+    clock.now = 0.25
+    # snapshot novo (u=13): só o delta 14 é reaplicado
+    sync.apply_snapshot([["100", "1"], ["98", "3"]], [["101", "1"]], update_id=13)
+    assert sync.state == SYNCED and book.valid
+    assert book.last_update_id == 14 and [str(p) for p in book.bids] == ["100", "98", "97"]
+    stats = sync.get_stats()
+    assert stats["gaps"] == 1 and stats["replayed_deltas"] == 1
+    assert stats["last_recovery_ms"] == pytest.approx(250.0)
+
+def test_stale_delta_dropped_without_invalidating():
+    book = OrderBook()
+    sync = BookSynchronizer(book)
+    sync.apply_snapshot([["100", "1"]], [["101", "1"]], update_id=5)
+    assert sync.apply_delta([["100", "2"]], [], update_id=6)
+    assert not sync.apply_delta([["100", "9"]], [], update_id=6)
+    assert book.valid and sync.state == SYNCED and sync.stale == 1
+    assert str(book.bids["100"]) == "2"
+
+def test_snapshot_older_than_buffer_requests_again():
+    requests = []
+    book = OrderBook()
+    sync = BookSynchronizer(book, on_gap=lambda: requests.append(1))
+    sync.apply_snapshot([["100", "1"]], [["101", "1"]], update_id=1)
+    sync.apply_delta([], [["102", "1"]], update_id=5)
+    sync.apply_snapshot([["100", "1"]], [["101", "1"]], update_id=3)
+    assert sync.state == RECOVERING and not book.valid and len(requests) == 2
+    sync.apply_snapshot([["100", "1"]], [["101", "1"]], update_id=4)
+    assert sync.state == SYNCED and book.last_update_id == 5
+
+@pytest.mark.parametrize("strict", [False, True])
+def test_resync_off_logs_and_keeps_applying(strict):
+    requests = []
+    book = OrderBook(strict=strict)
+    sync = BookSynchronizer(book, on_gap=lambda: requests.append(1), resync=False)
+    sync.apply_snapshot([["100", "1"]], [["101", "1"]], update_id=10)
+    assert sync.apply_delta([["98", "3"]], [], update_id=13)     # gap: aplicado mesmo assim
+    assert sync.state == SYNCED and book.valid and book.last_update_id == 13
+    if strict:
+        assert sync.apply_deltas([([["97", "1"]], [], 14), ([["96", "-1"]], [], 15), ([["95", "1"]], [], 16)]) is None
+        assert sync.validation_errors == 1 and book.last_update_id == 16   # u=15 descartado conta como gap
+        assert [str(p) for p in book.bids] == ["100", "98", "97", "95"]
+    assert sync.apply_delta([], [["102", "1"]], update_id=20)   # outro gap
+    assert sync.apply_delta([], [["102", "2"]], update_id=21)
+    assert sync.state == SYNCED and book.valid and book.last_update_id == 21
+    assert requests == [] and sync.gaps == (3 if strict else 2) and sync.get_stats()["buffered_deltas"] == 0
+
+@pytest.mark.asyncio
+async def test_client_resubscribes_on_gap():
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=50, seed=3)
+    first = [json.dumps(f) for f in feed.frames(21)]
+    skipped = first.pop(11)
+    ops = []
+
+    async def handler(ws):
+        ops.append(json.loads(await ws.recv())["op"])
+        for raw in first:
+            await ws.send(raw)
+        # aguarda unsubscribe + subscribe e responde com snapshot novo
+        ops.append(json.loads(await ws.recv())["op"])
+        ops.append(json.loads(await ws.recv())["op"])
+        await ws.send(json.dumps(feed.snapshot()))
+        for _ in range(10):
+            await ws.send(json.dumps(feed.delta()))
+        await ws.wait_closed()
+
+    async with websockets.serve(handler, "127.0.0.1", 0) as server:
+        client = BybitWSClient("BTCUSDT", 50, "linear", resync_timeout=2.0)
+        client.ws_url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        task = asyncio.create_task(client.run_forever())
+        for _ in range(200):
+            if client.sync.recoveries and client.book.last_update_id == feed.update_id:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    assert ops == ["subscribe", "unsubscribe", "subscribe"]
+    stats = client.get_stats()
+    assert stats["valid"] and stats["recovery"]["gaps"] == 1 and stats["recovery"]["recoveries"] == 1
+    assert stats["recovery"]["last_recovery_ms"] is not None
+    assert skipped  # o delta perdido nunca chegou ao cliente
+    assert client.book.last_update_id == feed.update_id
+    assert len(client.book.bids) == len(client.book.asks) == 50
+
+@pytest.mark.parametrize("batch_deltas", [False, True])
+@pytest.mark.asyncio
+async def test_strict_client_resyncs_on_invalid_level(batch_deltas):
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=50, seed=4)
+    first = [json.loads(f) for f in feed.raw_frames(11)]
+    bad = feed.delta()
+    bad["data"]["b"] = [[bad["data"]["b"][0][0] if bad["data"]["b"] else "1", "-1"]]
+    ops = []
+
+    async def handler(ws):
+        ops.append(json.loads(await ws.recv())["op"])
+        for frame in first + [bad, feed.delta(), feed.delta()]:
+            await ws.send(json.dumps(frame))
+        ops.append(json.loads(await ws.recv())["op"])
+        ops.append(json.loads(await ws.recv())["op"])
+        await ws.send(json.dumps(feed.snapshot()))
+        for _ in range(5):
+            await ws.send(json.dumps(feed.delta()))
+        await ws.wait_closed()
+
+    async with websockets.serve(handler, "127.0.0.1", 0) as server:
+        client = BybitWSClient("BTCUSDT", 50, "linear", strict=True, batch_deltas=batch_deltas, resync_timeout=2.0)
+        client.ws_url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        task = asyncio.create_task(client.run_forever())
+        for _ in range(200):
+            if client.sync.recoveries and client.book.last_update_id == feed.update_id:
+                break
+            await asyncio.sleep(0.01)
+        assert not task.done()   # a mensagem inválida não derruba o consumidor
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    assert ops == ["subscribe", "unsubscribe", "subscribe"] and client._reconnect_count == 0
+    stats = client.get_stats()
+    assert stats["valid"] and stats["recovery"]["validation_errors"] == 1 and stats["recovery"]["recoveries"] == 1
+    assert client.book.last_update_id == feed.update_id
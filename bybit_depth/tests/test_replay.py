@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from bybit_depth.core.orderbook import OrderBook
+from bybit_depth.core.recorder import FeedRecorder
+from bybit_depth.core.replay import ReplayEngine, keyframe_path
+from bybit_depth.utils.synthetic import SyntheticFeed
+
+T0 = 1_700_000_000_000_000_000
+STEP = 100_000_000  # 10 msgs/s, como o orderbook.200
+
+def _capture(tmp_path, count=600):
+    """Grava um feed com um gap no meio (seguido de novo snapshot) em vários segmentos."""
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=50, seed=11)
+    frames = [feed.snapshot(), {"success": True, "op": "subscribe"}]   # controle é ignorado
+    for i in range(1, count):
+        delta = feed.delta()
+        if i == 200:
+            continue                             # delta perdido
+        frames.append(feed.snapshot() if i == 210 else delta)   # resubscribe: snapshot novo
+    raws = [json.dumps(f) for f in frames]
+    with FeedRecorder(tmp_path, prefix="BTCUSDT", block_size=2048, segment_bytes=16384) as rec:
+        for i, raw in enumerate(raws):
+            rec.record(raw, T0 + i * STEP)
+    return raws
+
+def _reference(raws, upto):
+    """Aplica os frames até o índice ``upto`` com o livro puro, sem reaproveitar nada."""
+    book = None
+    for raw in raws[:upto + 1]:
+        d = json.loads(raw)
+        if "data" not in d:
+            continue
+        if book is None:
+            book = OrderBook()
+            book.symbol = "BTCUSDT"
+        if d["type"] == "snapshot":
+            book.apply_snapshot(d["data"]["b"], d["data"]["a"], d["data"]["u"])
+        elif book.valid and d["data"]["u"] == book.last_update_id + 1:
+            book.apply_delta(d["data"]["b"], d["data"]["a"], d["data"]["u"])
+        else:
+            book.invalidate()
+    return book
+
+@pytest.mark.parametrize("coalesce", [True, False])
+def test_full_replay_matches_reference(tmp_path, coalesce):
+    raws = _capture(tmp_path)
+    engine = ReplayEngine(tmp_path, prefix="BTCUSDT", coalesce=coalesce)
+    assert len(engine.segments) > 1
+    stats = engine.run()
+    ref = _reference(raws, len(raws) - 1)
+    book = engine.book("BTCUSDT")
+    assert stats.frames == len(raws) and book.valid
+    assert book.bids.items() == ref.bids.items() and book.asks.items() == ref.asks.items()
+    assert engine.syncs["BTCUSDT"].gaps == 1
+    assert stats.speedup > 100
+
+@pytest.mark.parametrize("index", [0, 150, 205, 212, 333, 599])
+def test_seek_with_keyframes_matches_reference(tmp_path, index):
+    raws = _capture(tmp_path)
+    engine = ReplayEngine(tmp_path, symbol="BTCUSDT")
+    assert engine.build_index(interval=5.0) > 3
+    assert all(keyframe_path(s).exists() for s in engine.segments)
+
+    book = engine.book_at(T0 + index * STEP)
+    ref = _reference(raws, index)
+    assert book.valid == ref.valid
+    if ref.valid:
+        assert book.bids.items() == ref.bids.items() and book.asks.items() == ref.asks.items()
+        assert book.last_update_id == ref.last_update_id
+
+def test_seek_replays_only_the_tail(tmp_path):
+    _capture(tmp_path)
+    engine = ReplayEngine(tmp_path)
+    assert engine.seek(T0 + 580 * STEP).frames == 581   # sem índice: desde o início
+    engine.build_index(interval=5.0)
+    stats = engine.seek(T0 + 580 * STEP)
+    assert stats.frames < 100   # keyframe a no máximo ~5 s (50 frames) + um bloco
@@ -0,0 +1,100 @@
+import logging
+import random
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bybit_depth.core.history import OrderbookHistory
+from bybit_depth.core.orderbook import OrderBook
+from bybit_depth.core.partitioned_history import PartitionedHistory
+from bybit_depth.core.rollups import rollup_plan, top_imbalance
+from bybit_depth.utils.synthetic import SyntheticFeed
+
+START = datetime(2024, 3, 1, 22, 50, 3, 250000, tzinfo=timezone.utc)
+
+def _ms(dt):
+    return int(dt.timestamp() * 1000)
+
+def _fill(history, count=400, step=timedelta(seconds=23.7)):
+    """Grava snapshots irregulares de BTCUSDT; retorna ``(ts_ms, métricas)`` de cada um."""
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=20, seed=3)
+    book = OrderBook()
+    d = next(feed.frames(1))["data"]
+    book.apply_snapshot(d["b"], d["a"], d["u"])
+    records = []
+    with history.connect() as conn:
+        for i in range(count):
+            d = feed.delta(4)["data"]
+            book.apply_delta(d["b"], d["a"], d["u"])
+            at = START + i * step
+            stats, snap = book.get_stats(), book.snapshot()
+            history.insert_snapshot(conn, stats, snap, "BTCUSDT", "linear", at)
+            imb = top_imbalance(snap.payload["bids"], snap.payload["asks"])
+            records.append((_ms(at), stats["mid_price"], stats["spread"], imb))
+    return records
+
+def test_plan_uses_coarsest_buckets_inside_the_range():
+    h = 3_600_000
+    plan = rollup_plan(10 * h - 30_000, 13 * h + 65_000)
+    assert plan == [
+        ("1s", 10 * h - 30_000, 10 * h),
+        ("1h", 10 * h, 13 * h),
+        ("1m", 13 * h, 13 * h + 60_000),
+        ("1s", 13 * h + 60_000, 13 * h + 65_000),
+    ]
+
+@pytest.mark.parametrize("cls", [OrderbookHistory, PartitionedHistory])
+def test_rollup_stats_match_raw_snapshots(tmp_path, cls):
+    history = cls(str(tmp_path / "h.db"))
+    records = _fill(history)
+    rng = random.Random(7)
+    first, last = records[0][0], records[-1][0]
+    for _ in range(25):
+        a, b = sorted(rng.randint(first - 5000, last + 5000) for _ in range(2))
+        lo, hi = a - a % 1000, b - b % 1000 + 1000   # resolução de 1 s nas bordas
+        inside = [r for r in records if lo <= r[0] < hi]
+        agg = history.get_rollup_stats("BTCUSDT", datetime.fromtimestamp(a / 1000, timezone.utc),
+                                       datetime.fromtimestamp(b / 1000, timezone.utc))
+        if not inside:
+            assert agg == {}
+            continue
+        assert agg["count"] == len(inside)
+        mids = [r[1] for r in inside]
+        assert agg["mid"]["min"] == min(mids) and agg["mid"]["max"] == max(mids)
+        assert agg["mid"]["avg"] == pytest.approx(sum(mids) / len(mids))
+        assert agg["mid"]["last"] == mids[-1]
+        assert agg["spread"]["avg"] == pytest.approx(sum(r[2] for r in inside) / len(inside))
+        assert agg["imbalance"]["avg"] == pytest.approx(sum(r[3] for r in inside) / len(inside))
+    stats = history.get_statistics("BTCUSDT")
+    assert stats["total_snapshots"] == len(records) and stats["last_mid"] == records[-1][1]
+    assert history.get_rollup_stats("BTCUSDT")["resolutions"][0] == "1h"
+
+def test_existing_database_is_backfilled(tmp_path, caplog):
+    history = OrderbookHistory(str(tmp_path / "h.db"), storage="delta", keyframe_every=7)
+    _fill(history, count=60)
+    before = history.get_statistics("BTCUSDT")
+    with sqlite3.connect(history.db_path) as conn:
+        for name in ("1s", "1m", "1h"):
+            conn.execute(f"DROP TABLE rollup_{name}")
+    with caplog.at_level(logging.INFO, logger="history"):
+        reopened = OrderbookHistory(str(tmp_path / "h.db"), storage="delta")
+        assert "a partir de 60 snapshots antes de abrir" in caplog.text
+        caplog.clear()
+        assert reopened.rebuild_rollups(chunk_size=20) == 60
+    assert [r.getMessage().split(" (")[0] for r in caplog.records][:3] == [
+        "Rollups: 20/60 snapshots", "Rollups: 40/60 snapshots", "Rollups: 60/60 snapshots",
+    ]
+    assert reopened.get_statistics("BTCUSDT") == pytest.approx(before)
+
+def test_series_picks_resolution_and_retention_trims_rollups(tmp_path):
+    history = OrderbookHistory(str(tmp_path / "h.db"))
+    records = _fill(history, count=200)
+    end = START + timedelta(hours=2)
+    series = history.get_rollup_series("BTCUSDT", START, end, max_points=200)
+    assert sum(p["count"] for p in series) == sum(1 for r in records if r[0] <= _ms(end))
+    assert series[1]["bucket"] - series[0]["bucket"] == 60_000   # 2 h em 1 s passaria de 200 pontos
+    history.cleanup_old_data(days_to_keep=1)   # tudo em 2024: sai tudo
+    assert history.get_statistics("BTCUSDT") == {}
+    with sqlite3.connect(history.db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM rollup_1s").fetchone()[0] == 0
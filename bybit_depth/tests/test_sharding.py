@@ -0,0 +1,30 @@
+import time
+
+from bybit_depth.core.sharding import ShardSupervisor, partition, synthetic_throughput
+
+def test_partition_round_robin():
+    shards = partition([f"S{i}" for i in range(7)] + ["S0"], 3)
+    assert shards == [["S0", "S3", "S6"], ["S1", "S4"], ["S2", "S5"]]
+    assert partition(["A"], 4) == [["A"]]
+
+def test_synthetic_workers_publish_tops():
+    symbols = [f"SYN{i}USDT" for i in range(6)]
+    with ShardSupervisor(symbols, 20, "linear", workers=2, source="synthetic", messages=50) as sup:
+        assert sup.wait_finished(timeout=60)
+        sup.poll(timeout=0.2)
+    assert set(sup.tops) == set(symbols)
+    assert all(t.best_bid and t.best_ask and float(t.best_bid) < float(t.best_ask) for t in sup.tops.values())
+    total, rate = synthetic_throughput(sup.finished)
+    assert total == 6 * 50 and rate > 0
+    assert sup.get_stats()["sequence_errors"] == 0
+
+def test_stop_drains_queue_so_workers_exit():
+    """Workers com muito a publicar só terminam se o supervisor drenar a fila ao parar."""
+    symbols = [f"SYN{i}USDT" for i in range(3000)]
+    sup = ShardSupervisor(symbols, 5, "linear", workers=2, source="synthetic", messages=2)
+    sup.start()
+    started = time.monotonic()
+    sup.stop(timeout=30.0)   # sem poll antes: a fila só é lida durante o stop
+    assert time.monotonic() - started < 30.0
+    assert [p.exitcode for p in sup._procs] == [0, 0]
+    assert len(sup.tops) == len(symbols) and len(sup.finished) == 2
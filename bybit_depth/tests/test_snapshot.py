@@ -0,0 +1,57 @@
+from __future__ import annotations
+import threading
+from decimal import Decimal
+import pytest
+from bybit_depth.core.orderbook import OrderBook
+from bybit_depth.utils.synthetic import SyntheticFeed
+
+def test_snapshot_cached_and_shared():
+    """Snapshots são cacheados por versão e compartilham lados inalterados."""
+    book = OrderBook()
+    book.apply_snapshot([["100", "1"], ["99", "2"]], [["101", "1"]], update_id=1)
+    snap = book.snapshot()
+    assert snap.version == book.version
+    assert snap.best_bid() == Decimal("100") and snap.best_ask() == Decimal("101")
+    assert snap.mid() == Decimal("100.5")
+    assert book.snapshot() is snap
+
+    book.apply_delta([], [["101", "3"]], update_id=2)
+    snap2 = book.snapshot()
+    assert snap2.version == snap.version + 1
+    assert snap2.bids is snap.bids          # lado inalterado: mesma tupla
+    assert snap2.asks == ((Decimal("101"), Decimal("3")),)
+    assert snap.asks == ((Decimal("101"), Decimal("1")),)   # snapshot antigo não muda
+    assert snap2.payload["asks"] == [["101", "3"]]
+    with pytest.raises(AttributeError):
+        snap2.version = 10
+
+def test_snapshot_consistent_across_threads():
+    """Leitores em outra thread só veem estados completos do livro."""
+    book = OrderBook()
+    frames = list(SyntheticFeed(depth=50, seed=5).frames(1500))
+    reference = {}
+    seen = []
+    done = threading.Event()
+
+    def reader():
+        while not done.is_set():
+            seen.append(book.snapshot())
+
+    t = threading.Thread(target=reader)
+    t.start()
+    try:
+        for frame in frames:
+            d = frame["data"]
+            if frame["type"] == "snapshot":
+                book.apply_snapshot(d["b"], d["a"], d["u"])
+            else:
+                book.apply_delta(d["b"], d["a"], d["u"])
+            reference[book.version] = (tuple(book.bids.levels()), tuple(book.asks.levels()))
+    finally:
+        done.set()
+        t.join()
+
+    assert seen
+    for snap in seen:
+        if snap.version in reference:
+            assert (snap.bids, snap.asks) == reference[snap.version]
@@ -7,3 +7,51 @@ async def test_dummy_ws_flow():
     ob.apply_snapshot([], [])
     assert ob.best_bid() is None
     assert ob.best_ask() is None
+
+def test_client_batch_handling():
+    """Frames drenados do socket: deltas consecutivos viram um único apply_deltas."""
+    from bybit_depth.core.ws_client import BybitWSClient
+    from bybit_depth.utils.synthetic import SyntheticFeed
+
+    feed = SyntheticFeed(symbol="BTCUSDT", depth=50, seed=1)
+    raws = feed.raw_frames(200)
+    single = BybitWSClient("BTCUSDT", 50, "linear")
+    batched = BybitWSClient("BTCUSDT", 50, "linear", batch_deltas=True)
+    for raw in raws:
+        msg = single._parse(raw)
+        single._handle(msg)
+    for i in range(0, len(raws), 64):
+        batched._handle_batch(raws[i:i + 64] + ["", "not json"])
+    assert batched.book.bids.items() == single.book.bids.items()
+    assert batched.book.asks.items() == single.book.asks.items()
+    assert batched.book.version < single.book.version
+
+@pytest.mark.asyncio
+async def test_client_against_mock_server_with_faults(monkeypatch):
+    """Cliente real contra o servidor mock com gaps, duplicatas e desconexões injetados."""
+    import asyncio
+    from bybit_depth.core import ws_client
+    from bybit_depth.core.ws_client import BybitWSClient
+    from bybit_depth.utils.mock_server import MockBybitServer
+
+    async def no_backoff(*args, **kwargs):
+        await asyncio.sleep(0)
+
+    monkeypatch.setattr(ws_client, "backoff_retry", no_backoff)
+    async with MockBybitServer(rate=2000, gap_rate=0.01, duplicate_rate=0.01, disconnect_every=600) as server:
+        client = BybitWSClient("BTCUSDT", 50, "linear", resync_timeout=1.0)
+        client.ws_url = server.url
+        task = asyncio.create_task(client.run_forever())
+        for _ in range(300):
+            if server.stats.disconnects >= 1 and client.sync.recoveries >= 2 and client.book.valid:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    assert server.stats.connections >= 2 and server.stats.gaps >= 1 and server.stats.duplicates >= 1
+    stats = client.get_stats()
+    assert stats["valid"] and stats["recovery"]["recoveries"] >= 2
+    assert stats["recovery"]["stale_deltas"] >= 1
+    assert len(client.book.bids) == len(client.book.asks) == 50
+    assert client.book.best_bid() < client.book.best_ask()
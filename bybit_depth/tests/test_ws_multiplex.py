@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import pytest
+import websockets
+
+from bybit_depth.core import ws_multiplex
+from bybit_depth.core.orderbook import OrderBook
+from bybit_depth.core.ws_multiplex import MultiplexWSClient
+from bybit_depth.utils.synthetic import SyntheticFeed
+
+SYMBOLS = [f"SYM{i}USDT" for i in range(25)]
+
+def test_subscribe_requests_respect_arg_limit():
+    client = MultiplexWSClient(SYMBOLS, 50, "linear")
+    reqs = client.subscribe_requests()
+    assert [len(r["args"]) for r in reqs] == [10, 10, 5]
+    assert sum((r["args"] for r in reqs), []) == [f"orderbook.50.{s}" for s in SYMBOLS]
+
+def test_dispatch_routes_by_topic():
+    """Frames intercalados de vários símbolos chegam cada um ao seu livro."""
+    client = MultiplexWSClient(SYMBOLS[:3], 50, "linear")
+    feeds = {s: SyntheticFeed(symbol=s, depth=50, seed=i) for i, s in enumerate(SYMBOLS[:3])}
+    raws = {s: f.raw_frames(100) for s, f in feeds.items()}
+    refs = {s: OrderBook() for s in feeds}
+    for i in range(100):
+        for s in feeds:
+            assert client.dispatch(raws[s][i]) is client.book(s)
+            d = json.loads(raws[s][i])["data"]
+            apply = refs[s].apply_snapshot if i == 0 else refs[s].apply_delta
+            apply(d["b"], d["a"], d["u"])
+    for s, ref in refs.items():
+        assert client.book(s).bids.items() == ref.bids.items()
+        assert client.book(s).asks.items() == ref.asks.items()
+    other = SyntheticFeed(symbol="OTHERUSDT", depth=50).raw_frames(0)[0]
+    assert client.dispatch(other) is None
+    assert client.dispatch('{"success":true,"op":"subscribe"}') is None
+    assert client.get_stats()["unrouted_frames"] == 1
+
+@pytest.mark.asyncio
+async def test_resubscribes_after_reconnect(monkeypatch):
+    received = []
+    connections = 0
+
+    async def handler(ws):
+        nonlocal connections
+        connections += 1
+        for _ in range(3):
+            received.append((connections, json.loads(await ws.recv())))
+        feed = SyntheticFeed(symbol=SYMBOLS[0], depth=50)
+        await ws.send(json.dumps(feed.snapshot()))
+        if connections == 1:
+            await ws.close()
+        else:
+            await ws.wait_closed()
+
+    async def no_backoff(*args, **kwargs):
+        await asyncio.sleep(0)
+
+    monkeypatch.setattr(ws_multiplex, "backoff_retry", no_backoff)
+    async with websockets.serve(handler, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        client = MultiplexWSClient(SYMBOLS, 50, "linear")
+        client.ws_url = f"ws://127.0.0.1:{port}"
+        task = asyncio.create_task(client.run_forever())
+        for _ in range(200):
+            if len(received) == 6:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    assert [c for c, _ in received] == [1, 1, 1, 2, 2, 2]
+    topics = [t for _, r in received[3:] for t in r["args"]]
+    assert topics == [client.topic(s) for s in SYMBOLS]
+    assert client.book(SYMBOLS[0]).best_bid() is not None
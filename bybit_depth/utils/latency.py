@@ -0,0 +1,175 @@
+from __future__ import annotations
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Estágios medidos por mensagem
+EXCHANGE_TO_RECEIVE = "exchange_to_receive"   # ts da Bybit -> recebido no socket (rede + relógio)
+RECEIVE_TO_PARSED = "receive_to_parsed"       # recebido -> frame decodificado
+PARSED_TO_APPLIED = "parsed_to_applied"       # decodificado -> aplicado no livro
+EXCHANGE_TO_APPLIED = "exchange_to_applied"   # ponta a ponta
+STAGES: Tuple[str, ...] = (EXCHANGE_TO_RECEIVE, RECEIVE_TO_PARSED, PARSED_TO_APPLIED, EXCHANGE_TO_APPLIED)
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+class LatencyHistogram:
+    """
+    Histograma log-linear no estilo HDR, em microssegundos.
+
+    Cada potência de 2 é dividida em ``2**sub_bucket_bits`` sub-buckets, o que
+    dá erro relativo máximo de ``1 / 2**(sub_bucket_bits - 1)`` (≈1,6% com 7 bits)
+    com memória fixa e ``record`` O(1). Valores acima de ``max_value_us`` são
+    saturados; valores negativos (relógios dessincronizados) contam como 0 e
+    são contados em ``negative``.
+    """
+
+    __slots__ = ("sub_bucket_bits", "max_value_us", "_counts", "count", "total", "min", "max", "negative")
+
+    def __init__(self, sub_bucket_bits: int = 7, max_value_us: int = 60_000_000) -> None:
+        self.sub_bucket_bits = sub_bucket_bits
+        self.max_value_us = max_value_us
+        self._counts: List[int] = [0] * (self._index(max_value_us) + 1)
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+        self.negative = 0
+
+    def _index(self, value: int) -> int:
+        bits = self.sub_bucket_bits
+        length = value.bit_length()
+        if length <= bits:
+            return value
+        shift = length - bits
+        return (shift << bits) + (value >> shift)
+
+    def _bucket_bounds(self, index: int) -> Tuple[int, int]:
+        """Intervalo ``[low, high]`` de valores mapeados para o bucket."""
+        bits = self.sub_bucket_bits
+        shift, sub = index >> bits, index & ((1 << bits) - 1)
+        if shift == 0:
+            return index, index
+        low = sub << shift
+        return low, low + (1 << shift) - 1
+
+    def record(self, value_us: int) -> None:
+        if value_us < 0:
+            self.negative += 1
+            value_us = 0
+        elif value_us > self.max_value_us:
+            value_us = self.max_value_us
+        self._counts[self._index(value_us)] += 1
+        self.count += 1
+        self.total += value_us
+        if self.min is None or value_us < self.min:
+            self.min = value_us
+        if self.max is None or value_us > self.max:
+            self.max = value_us
+
+    def percentile(self, pct: float) -> Optional[int]:
+        """Valor (µs, limite superior do bucket) abaixo do qual estão ``pct``% das amostras."""
+        if not self.count:
+            return None
+        target = max(1, -(-self.count * pct // 100))
+        seen = 0
+        for index, n in enumerate(self._counts):
+            if n:
+                seen += n
+                if seen >= target:
+                    return min(self._bucket_bounds(index)[1], self.max)
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def merge(self, other: LatencyHistogram) -> None:
+        if other.sub_bucket_bits != self.sub_bucket_bits or other.max_value_us != self.max_value_us:
+            raise ValueError("Histogramas com parâmetros diferentes")
+        for i, n in enumerate(other._counts):
+            if n:
+                self._counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.negative += other.negative
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def reset(self) -> None:
+        self._counts = [0] * len(self._counts)
+        self.count = self.total = self.negative = 0
+        self.min = self.max = None
+
+    def buckets(self) -> List[Tuple[int, int]]:
+        """Buckets não vazios como ``(limite superior em µs, contagem)``."""
+        return [(self._bucket_bounds(i)[1], n) for i, n in enumerate(self._counts) if n]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """Resumo em milissegundos."""
+        out: Dict[str, Optional[float]] = {
+            "count": self.count,
+            "mean_ms": self.mean / 1000 if self.count else None,
+            "min_ms": self.min / 1000 if self.min is not None else None,
+            "max_ms": self.max / 1000 if self.max is not None else None,
+        }
+        for pct in PERCENTILES:
+            value = self.percentile(pct)
+            out[f"p{pct:g}_ms"] = value / 1000 if value is not None else None
+        if self.negative:
+            out["negative"] = self.negative
+        return out
+
+    def export(self) -> dict:
+        """Formato completo (JSON) com os buckets, para análise externa."""
+        return {
+            "unit": "us",
+            "sub_bucket_bits": self.sub_bucket_bits,
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+            "negative": self.negative,
+            "buckets": self.buckets(),
+        }
+
+class LatencyTracker:
+    """Histogramas por estágio para um símbolo (ver ``STAGES``)."""
+
+    def __init__(self, stages: Iterable[str] = STAGES, **histogram_kwargs) -> None:
+        self.histograms: Dict[str, LatencyHistogram] = {s: LatencyHistogram(**histogram_kwargs) for s in stages}
+
+    def record_message(
+        self,
+        exchange_ts_ms: Optional[int],
+        received_wall_ns: int,
+        received_ns: int,
+        parsed_ns: int,
+        applied_ns: int,
+    ) -> None:
+        """
+        Registra os carimbos de uma mensagem. ``received_wall_ns`` é o relógio
+        de parede (comparável ao ``ts`` da Bybit); os demais são
+        ``time.perf_counter_ns()``.
+        """
+        h = self.histograms
+        h[RECEIVE_TO_PARSED].record((parsed_ns - received_ns) // 1000)
+        h[PARSED_TO_APPLIED].record((applied_ns - parsed_ns) // 1000)
+        if exchange_ts_ms is not None:
+            network_us = received_wall_ns // 1000 - exchange_ts_ms * 1000
+            h[EXCHANGE_TO_RECEIVE].record(network_us)
+            h[EXCHANGE_TO_APPLIED].record(network_us + (applied_ns - received_ns) // 1000)
+
+    def summary(self) -> Dict[str, Dict[str, Optional[float]]]:
+        return {stage: hist.summary() for stage, hist in self.histograms.items()}
+
+    def export(self) -> Dict[str, dict]:
+        return {stage: hist.export() for stage, hist in self.histograms.items()}
+
+    def reset(self) -> None:
+        for hist in self.histograms.values():
+            hist.reset()
+
+def stamp() -> Tuple[int, int]:
+    """Carimbo de recebimento: (relógio de parede em ns, perf_counter_ns)."""
+    return time.time_ns(), time.perf_counter_ns()
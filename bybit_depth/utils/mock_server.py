@@ -0,0 +1,243 @@
+"""
+Servidor WebSocket local que imita o protocolo público v5 da Bybit para
+testes de carga e latência, sem acessar a bolsa.
+
+Suporta ``subscribe``/``unsubscribe`` (com ack), ``ping``/``pong`` e tópicos
+``orderbook.{N}.{SYMBOL}``: cada tópico recebe um snapshot e depois deltas do
+``SyntheticFeed`` na taxa configurada. Opcionalmente injeta gaps (deltas
+não enviados), duplicatas e desconexões.
+
+Uso:
+    python -m bybit_depth.utils.mock_server --port 8765 --rate 2000 --gap-rate 0.001
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+import uuid
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import websockets
+
+from .synthetic import SyntheticFeed
+
+log = logging.getLogger("mock_server")
+
+TOPIC_RE = re.compile(r"^orderbook\.(\d+)\.([A-Z0-9\-]+)$")
+
+@dataclass
+class MockStats:
+    connections: int = 0
+    subscriptions: int = 0
+    messages: int = 0
+    gaps: int = 0
+    duplicates: int = 0
+    disconnects: int = 0
+    pings: int = 0
+
+@dataclass
+class _Connection:
+    ws: object
+    conn_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    feeds: Dict[str, SyntheticFeed] = field(default_factory=dict)
+    retired: Dict[str, SyntheticFeed] = field(default_factory=dict)   # tópicos cancelados
+    sent: int = 0
+    cursor: int = 0   # posição do round-robin entre tópicos
+
+class MockBybitServer:
+    """
+    Servidor mock do WebSocket público v5.
+
+    ``rate`` é a taxa total de deltas por conexão (distribuída em round-robin
+    entre os tópicos inscritos). ``gap_rate`` e ``duplicate_rate`` são
+    probabilidades por delta; ``disconnect_every`` fecha a conexão após esse
+    número de mensagens.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        rate: float = 1000.0,
+        levels: int = 4,
+        gap_rate: float = 0.0,
+        duplicate_rate: float = 0.0,
+        disconnect_every: Optional[int] = None,
+        seed: Optional[int] = 0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.levels = levels
+        self.gap_rate = gap_rate
+        self.duplicate_rate = duplicate_rate
+        self.disconnect_every = disconnect_every
+        self._rng = random.Random(seed)
+        self._seed = seed
+        self._server = None
+        self.stats = MockStats()
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self) -> MockBybitServer:
+        self._server = await websockets.serve(self._handler, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        log.info(f"Mock Bybit v5 em {self.url} (rate={self.rate}/s)")
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> MockBybitServer:
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    # ----------------- Protocolo -----------------
+    async def _handler(self, ws, path: str = "/") -> None:
+        conn = _Connection(ws)
+        self.stats.connections += 1
+        streamer = asyncio.create_task(self._stream(conn))
+        try:
+            async for raw in ws:
+                await self._on_request(conn, raw)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            streamer.cancel()
+            await asyncio.gather(streamer, return_exceptions=True)
+
+    async def _on_request(self, conn: _Connection, raw) -> None:
+        try:
+            req = json.loads(raw)
+        except ValueError:
+            await self._send(conn, {"success": False, "ret_msg": "invalid request", "conn_id": conn.conn_id})
+            return
+        op = req.get("op")
+        ack = {"success": True, "ret_msg": "", "conn_id": conn.conn_id, "req_id": req.get("req_id", ""), "op": op}
+        if op == "ping":
+            self.stats.pings += 1
+            ack["ret_msg"] = "pong"
+            await self._send(conn, ack)
+        elif op == "subscribe":
+            bad = [t for t in req.get("args", []) if not TOPIC_RE.match(t)]
+            if bad:
+                ack.update(success=False, ret_msg=f"error:handler not found,topic:{bad[0]}")
+                await self._send(conn, ack)
+                return
+            await self._send(conn, ack)
+            for topic in req.get("args", []):
+                self._subscribe(conn, topic)
+                # Como a Bybit: o primeiro frame após o subscribe é sempre um snapshot
+                await self._send(conn, conn.feeds[topic].snapshot())
+        elif op == "unsubscribe":
+            for topic in req.get("args", []):
+                feed = conn.feeds.pop(topic, None)
+                if feed is not None:
+                    conn.retired[topic] = feed
+            await self._send(conn, ack)
+        else:
+            ack.update(success=False, ret_msg=f"unsupported op: {op}")
+            await self._send(conn, ack)
+
+    def _subscribe(self, conn: _Connection, topic: str) -> None:
+        self.stats.subscriptions += 1
+        depth, symbol = TOPIC_RE.match(topic).groups()
+        # Resubscribe na mesma conexão mantém a sequência ``u`` (como na Bybit)
+        feed = conn.retired.pop(topic, None) or conn.feeds.get(topic)
+        if feed is None:
+            seed = None if self._seed is None else zlib.crc32(f"{self._seed}:{symbol}".encode())
+            feed = SyntheticFeed(symbol=symbol, depth=int(depth), seed=seed)
+        conn.feeds[topic] = feed
+
+    async def _send(self, conn: _Connection, payload: dict) -> None:
+        await conn.ws.send(json.dumps(payload, separators=(",", ":")))
+
+    # ----------------- Streaming -----------------
+    async def _stream(self, conn: _Connection) -> None:
+        """Envia deltas em round-robin entre os tópicos, na taxa configurada."""
+        interval = 1.0 / self.rate if self.rate > 0 else None
+        start = time.perf_counter()
+        due = 0
+        while True:
+            if not conn.feeds or interval is None:
+                await asyncio.sleep(0.01)
+                start, due = time.perf_counter(), 0
+                continue
+            # Quantas mensagens já deveriam ter saído desde o início (envio em rajadas)
+            target = int((time.perf_counter() - start) / interval)
+            if due >= target:
+                await asyncio.sleep(min(interval * 8, 0.005))
+                continue
+            # Rajadas limitadas para não monopolizar o loop quando o cliente atrasa
+            for topic in self._round_robin(conn, min(target - due, 1000)):
+                feed = conn.feeds.get(topic)
+                if feed is None:
+                    continue
+                due += 1
+                frame = feed.delta(self.levels)
+                if self.gap_rate and self._rng.random() < self.gap_rate:
+                    self.stats.gaps += 1
+                    continue
+                raw = json.dumps(frame, separators=(",", ":"))
+                await conn.ws.send(raw)
+                self.stats.messages += 1
+                conn.sent += 1
+                if self.duplicate_rate and self._rng.random() < self.duplicate_rate:
+                    self.stats.duplicates += 1
+                    await conn.ws.send(raw)
+                if self.disconnect_every and conn.sent >= self.disconnect_every:
+                    self.stats.disconnects += 1
+                    log.info(f"Desconexão injetada após {conn.sent} mensagens ({conn.conn_id})")
+                    await conn.ws.close(code=1011, reason="mock disconnect")
+                    return
+
+    def _round_robin(self, conn: _Connection, count: int):
+        topics = list(conn.feeds)
+        for _ in range(count):
+            conn.cursor += 1
+            yield topics[conn.cursor % len(topics)]
+
+async def _serve(args) -> None:
+    server = MockBybitServer(
+        host=args.host, port=args.port, rate=args.rate, levels=args.levels,
+        gap_rate=args.gap_rate, duplicate_rate=args.duplicate_rate,
+        disconnect_every=args.disconnect_every,
+    )
+    async with server:
+        print(f"Mock Bybit v5 ouvindo em {server.url}")
+        while True:
+            await asyncio.sleep(5)
+            s = server.stats
+            print(f"conexões={s.connections} msgs={s.messages} gaps={s.gaps} dups={s.duplicates} desconexões={s.disconnects}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Servidor mock do WebSocket público v5 da Bybit")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate", type=float, default=1000.0, help="Deltas/s por conexão")
+    parser.add_argument("--levels", type=int, default=4, help="Níveis alterados por delta")
+    parser.add_argument("--gap-rate", type=float, default=0.0, help="Probabilidade de omitir um delta")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0, help="Probabilidade de duplicar um delta")
+    parser.add_argument("--disconnect-every", type=int, default=None, help="Fecha a conexão após N mensagens")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
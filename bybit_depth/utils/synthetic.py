@@ -0,0 +1,133 @@
+from __future__ import annotations
+import json
+import random
+import time
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional
+
+class SyntheticFeed:
+    """
+    Gera mensagens de orderbook no formato da Bybit v5 (snapshot + deltas).
+
+    O estado interno é mantido para que os deltas sejam coerentes com o livro
+    (atualizações de níveis existentes, remoções e níveis novos), o que torna o
+    gerador útil para benchmarks e testes sem depender da exchange.
+    """
+
+    def __init__(
+        self,
+        symbol: str = "BTCUSDT",
+        depth: int = 200,
+        mid: float = 65000.0,
+        tick: str = "0.10",
+        lot: str = "0.001",
+        seed: Optional[int] = 0,
+    ) -> None:
+        self.symbol = symbol
+        self.depth = depth
+        self.topic = f"orderbook.{depth}.{symbol}"
+        self._rng = random.Random(seed)
+        self._tick = Decimal(tick)
+        self._lot = Decimal(lot)
+        self._mid_ticks = int(Decimal(str(mid)) / self._tick)
+        self._bids: Dict[int, int] = {}
+        self._asks: Dict[int, int] = {}
+        self.update_id = 0
+        self.seq = 0
+
+    # ----------------- Formatação -----------------
+    def _price(self, ticks: int) -> str:
+        return str(self._tick * ticks)
+
+    def _size(self, lots: int) -> str:
+        return str(self._lot * lots)
+
+    def _random_lots(self) -> int:
+        # Distribuição com cauda longa para gerar "paredes" ocasionais
+        return max(1, int(self._rng.paretovariate(1.5) * 10))
+
+    # ----------------- Mensagens -----------------
+    def _frame(self, kind: str, bids: List[List[str]], asks: List[List[str]]) -> dict:
+        self.update_id += 1
+        self.seq += self._rng.randint(1, 50)
+        ts = int(time.time() * 1000)
+        return {
+            "topic": self.topic,
+            "type": kind,
+            "ts": ts,
+            "data": {"s": self.symbol, "b": bids, "a": asks, "u": self.update_id, "seq": self.seq},
+            "cts": ts - self._rng.randint(0, 5),
+        }
+
+    def snapshot(self) -> dict:
+        """Gera um snapshot completo com ``depth`` níveis de cada lado."""
+        self._bids = {self._mid_ticks - 1 - i: self._random_lots() for i in range(self.depth)}
+        self._asks = {self._mid_ticks + 1 + i: self._random_lots() for i in range(self.depth)}
+        bids = [[self._price(p), self._size(q)] for p, q in sorted(self._bids.items(), reverse=True)]
+        asks = [[self._price(p), self._size(q)] for p, q in sorted(self._asks.items())]
+        return self._frame("snapshot", bids, asks)
+
+    def _mutate_side(self, side: Dict[int, int], is_bid: bool, n: int) -> List[List[str]]:
+        out: List[List[str]] = []
+        best = max(side) if is_bid else min(side)
+        for _ in range(n):
+            roll = self._rng.random()
+            # Concentra as mudanças perto do topo, como no feed real
+            # (offsets negativos melhoram o topo, sem cruzar o mid)
+            offset = int(self._rng.expovariate(1 / 8)) - 2
+            if is_bid:
+                price = min(best - offset, self._mid_ticks - 1)
+            else:
+                price = max(best + offset, self._mid_ticks + 1)
+            if roll < 0.2 and price in side and len(side) > 1:
+                del side[price]
+                out.append([self._price(price), "0"])
+            else:
+                lots = self._random_lots()
+                side[price] = lots
+                out.append([self._price(price), self._size(lots)])
+        # Mantém o livro com exatamente ``depth`` níveis
+        while len(side) < self.depth:
+            worst = (min(side) - 1) if is_bid else (max(side) + 1)
+            lots = self._random_lots()
+            side[worst] = lots
+            out.append([self._price(worst), self._size(lots)])
+        while len(side) > self.depth:
+            worst = min(side) if is_bid else max(side)
+            del side[worst]
+            out.append([self._price(worst), "0"])
+        return out
+
+    def delta(self, levels: int = 4) -> dict:
+        """Gera um delta que altera ~``levels`` níveis de cada lado."""
+        if not self._bids or not self._asks:
+            return self.snapshot()
+        # Passeio aleatório do mid, sem cruzar o livro
+        self._mid_ticks += self._rng.choice((-1, 0, 0, 1))
+        bids: List[List[str]] = []
+        asks: List[List[str]] = []
+        for p in [p for p in self._bids if p >= self._mid_ticks]:
+            del self._bids[p]
+            bids.append([self._price(p), "0"])
+        for p in [p for p in self._asks if p <= self._mid_ticks]:
+            del self._asks[p]
+            asks.append([self._price(p), "0"])
+        if not self._bids:
+            self._bids[self._mid_ticks - 1] = lots = self._random_lots()
+            bids.append([self._price(self._mid_ticks - 1), self._size(lots)])
+        if not self._asks:
+            self._asks[self._mid_ticks + 1] = lots = self._random_lots()
+            asks.append([self._price(self._mid_ticks + 1), self._size(lots)])
+        bids += self._mutate_side(self._bids, True, levels)
+        asks += self._mutate_side(self._asks, False, levels)
+        return self._frame("delta", bids, asks)
+
+    def frames(self, count: int, levels: int = 4) -> Iterator[dict]:
+        """Gera um snapshot seguido de ``count - 1`` deltas."""
+        yield self.snapshot()
+        for _ in range(count - 1):
+            yield self.delta(levels)
+
+    def raw_frames(self, count: int, levels: int = 4) -> List[str]:
+        """Mesmo que :meth:`frames`, já serializado como JSON (como chega do socket)."""
+        return [json.dumps(f, separators=(",", ":")) for f in self.frames(count, levels)]
@@ -1,8 +1,10 @@
 from __future__ import annotations
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from decimal import Decimal
 import plotly.graph_objects as go
 
+from ..core.orderbook import OrderBook
+
 def depth_figure(bids: List[Tuple[Decimal, Decimal]], asks: List[Tuple[Decimal, Decimal]]):
     fig = go.Figure()
     if bids:
@@ -13,6 +15,21 @@ def depth_figure(bids: List[Tuple[Decimal, Decimal]], asks: List[Tuple[Decimal,
         x_a = [float(p) for p, _ in asks]
         y_a = [float(c) for _, c in asks]
         fig.add_trace(go.Scatter(x=x_a, y=y_a, mode="lines", name="Asks"))
+    return _layout(fig)
+
+def book_depth_figure(book: OrderBook, n: Optional[int] = None):
+    """Mesmo gráfico de :func:`depth_figure`, a partir dos arrays cacheados do livro."""
+    fig = go.Figure()
+    bids = book.to_arrays("bid", n)
+    asks = book.to_arrays("ask", n)
+    if len(bids.prices):
+        # desenhar crescente
+        fig.add_trace(go.Scatter(x=bids.prices[::-1], y=bids.cumulative[::-1], mode="lines", name="Bids"))
+    if len(asks.prices):
+        fig.add_trace(go.Scatter(x=asks.prices, y=asks.cumulative, mode="lines", name="Asks"))
+    return _layout(fig)
+
+def _layout(fig):
     fig.update_layout(
         title="Depth Chart (cumulativo)",
         xaxis_title="Preço",
@@ -18,7 +18,7 @@ from bybit_depth.configs.settings import settings
 from bybit_depth.configs.symbols import get_symbols_for_market, get_market_types, get_depth_options, get_refresh_options
 from bybit_depth.core.orderbook import OrderBook
 from bybit_depth.core.models import parse_symbol_type
-from bybit_depth.viz.plots import depth_figure
+from bybit_depth.viz.plots import book_depth_figure
 
 st.set_page_config(page_title="Bybit DOM", layout="wide")
 
@@ -241,9 +241,7 @@ if st.session_state.config_applied and st.session_state.current_config:
                 ba = book.best_ask()
                 mid = book.mid()
 
-                c_b = book.cumulative_bids()
-                c_a = book.cumulative_asks()
-                fig = depth_figure(c_b, c_a)
+                fig = book_depth_figure(book)
 
                 # Métricas principais
                 col1, col2, col3, col4 = st.columns(4)